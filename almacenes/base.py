@@ -0,0 +1,298 @@
+"""Interfaz común de los almacenes de datos de la vinoteca."""
+import heapq
+from abc import ABC, abstractmethod
+from array import array
+from datetime import datetime
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple,
+    TYPE_CHECKING
+)
+
+if TYPE_CHECKING:
+    from modelos.entidad_vineria import EntidadVineria
+    from modelos.bodega import Bodega
+    from modelos.cepa import Cepa
+    from modelos.vino import Vino
+
+
+def _nombre_bodega(vino: 'Vino') -> str:
+    """Nombre de la bodega de un vino, vacío si la bodega no existe."""
+    bodega = vino.obtener_bodega()
+    return bodega.obtener_nombre() if bodega is not None else ""
+
+
+# Campos de ordenamiento admitidos por cada colección y su clave
+CLAVES_BODEGAS: Dict[str, Callable[['Bodega'], Any]] = {
+    "id": lambda bodega: bodega.obtener_id(),
+    "nombre": lambda bodega: bodega.obtener_nombre(),
+}
+CLAVES_CEPAS: Dict[str, Callable[['Cepa'], Any]] = {
+    "id": lambda cepa: cepa.obtener_id(),
+    "nombre": lambda cepa: cepa.obtener_nombre(),
+}
+CLAVES_VINOS: Dict[str, Callable[['Vino'], Any]] = {
+    "id": lambda vino: vino.obtener_id(),
+    "nombre": lambda vino: vino.obtener_nombre(),
+    "bodega": _nombre_bodega,
+    "anio": lambda vino: max(vino.obtener_partidas(), default=0),
+    "anio_inicial": lambda vino: min(vino.obtener_partidas(), default=0),
+}
+CLAVES_POR_TIPO: Dict[str, Dict[str, Callable[[Any], Any]]] = {
+    "Bodega": CLAVES_BODEGAS,
+    "Cepa": CLAVES_CEPAS,
+    "Vino": CLAVES_VINOS,
+}
+
+# Rango de los años de las partidas, el mismo al cargar el archivo de datos
+# y al escribir por la API: los índices por año los guardan como enteros
+# con signo de 32 bits ('i')
+ANIO_MINIMO = -2 ** 31
+ANIO_MAXIMO = 2 ** 31 - 1
+
+
+def validar_partidas(vino_id: str, partidas: Sequence[Any]) -> None:
+    """
+    Valida los años de las partidas de un vino.
+
+    Args:
+        vino_id: ID del vino, para el mensaje de error
+        partidas: Años de las partidas
+
+    Raises:
+        ValueError: Si algún año no es un entero entre ANIO_MINIMO y
+            ANIO_MAXIMO
+    """
+    for anio in partidas:
+        if type(anio) is not int or not ANIO_MINIMO <= anio <= ANIO_MAXIMO:
+            raise ValueError(
+                f"Año de partida no válido en el vino {vino_id}: {anio!r}"
+            )
+
+
+def fila_json(entidad: 'EntidadVineria') -> Dict[str, Any]:
+    """
+    Obtiene la fila del archivo de datos que corresponde a una entidad.
+
+    Los vinos se representan con los IDs de su bodega y sus cepas, estén o
+    no resueltas sus referencias.
+
+    Args:
+        entidad: Bodega, cepa o vino
+
+    Returns:
+        Diccionario con los campos de la fila JSON de la entidad
+    """
+    fila = {"id": entidad.obtener_id(), "nombre": entidad.obtener_nombre()}
+    if type(entidad).__name__ == "Vino":
+        fila["bodega"] = entidad.obtener_bodega_id()
+        fila["cepas"] = list(entidad.obtener_cepa_ids())
+        fila["partidas"] = list(entidad.obtener_partidas())
+    return fila
+
+
+def bisecar(
+    posiciones: Sequence[int],
+    objetivo: Tuple[Any, str],
+    clave: Callable[[int], Tuple[Any, str]],
+    derecha: bool = False
+) -> int:
+    """
+    Búsqueda binaria sobre una secuencia de posiciones ordenada por clave.
+
+    Args:
+        posiciones: Posiciones ordenadas de forma ascendente según clave
+        objetivo: Clave buscada
+        clave: Función que obtiene la clave de una posición
+        derecha: True para ubicarse después de las claves iguales
+
+    Returns:
+        Índice de inserción del objetivo dentro de posiciones
+    """
+    bajo, alto = 0, len(posiciones)
+    while bajo < alto:
+        medio = (bajo + alto) // 2
+        valor = clave(posiciones[medio])
+        if valor < objetivo or (derecha and valor == objetivo):
+            bajo = medio + 1
+        else:
+            alto = medio
+    return bajo
+
+
+def mezclar_sin_repetidos(listas: Sequence[Sequence[int]]) -> Iterator[int]:
+    """
+    Mezcla listas de posiciones ordenadas, descartando las repetidas.
+
+    Args:
+        listas: Listas de posiciones, cada una en orden creciente
+
+    Returns:
+        Iterador de posiciones en orden creciente y sin repetir
+    """
+    anterior = None
+    for posicion in heapq.merge(*listas):
+        if posicion != anterior:
+            yield posicion
+            anterior = posicion
+
+
+class Almacen(ABC):
+    """
+    Versión inmutable de los datos cargados de la vinoteca: entidades e
+    índices.
+
+    Un almacén no se modifica una vez construido; para cambiar los datos
+    se construye uno nuevo y la Vinoteca lo publica reemplazando la
+    referencia al anterior. Las colecciones se exponen por posición, de
+    modo que los índices y permutaciones son posiciones dentro de ellas.
+    """
+
+    @abstractmethod
+    def obtener_version(self) -> str:
+        """Huella del contenido del que se cargaron los datos."""
+
+    @abstractmethod
+    def obtener_fecha_modificacion(self) -> Optional[datetime]:
+        """Fecha de modificación del origen de los datos, en UTC."""
+
+    @abstractmethod
+    def obtener_bodegas(self) -> Sequence['Bodega']:
+        """Bodegas en el orden del archivo de datos."""
+
+    @abstractmethod
+    def obtener_cepas(self) -> Sequence['Cepa']:
+        """Cepas en el orden del archivo de datos."""
+
+    @abstractmethod
+    def obtener_vinos(self) -> Sequence['Vino']:
+        """Vinos en el orden del archivo de datos."""
+
+    @abstractmethod
+    def buscar_bodega(self, id: str) -> Optional['Bodega']:
+        """Bodega con el ID indicado, o None si no existe."""
+
+    @abstractmethod
+    def buscar_cepa(self, id: str) -> Optional['Cepa']:
+        """Cepa con el ID indicado, o None si no existe."""
+
+    @abstractmethod
+    def buscar_vino(self, id: str) -> Optional['Vino']:
+        """Vino con el ID indicado, o None si no existe."""
+
+    @abstractmethod
+    def obtener_vinos_de_bodega(self, bodega_id: str) -> List['Vino']:
+        """Vinos producidos por una bodega."""
+
+    @abstractmethod
+    def obtener_vinos_de_cepa(self, cepa_id: str) -> List['Vino']:
+        """Vinos elaborados con una cepa."""
+
+    @abstractmethod
+    def obtener_cepas_de_bodega(self, bodega_id: str) -> List['Cepa']:
+        """Cepas distintas utilizadas en los vinos de una bodega."""
+
+    @abstractmethod
+    def obtener_permutacion(self, coleccion: str, orden: str) -> array:
+        """
+        Posiciones de una colección en orden ascendente por (campo, id).
+
+        Raises:
+            ValueError: Si el campo de ordenamiento no es válido
+        """
+
+    @abstractmethod
+    def obtener_rangos_vinos(self, orden: str) -> array:
+        """Posición de cada vino dentro de la permutación de un campo."""
+
+    @abstractmethod
+    def posiciones_por_anios(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> Optional[Iterable[int]]:
+        """
+        Posiciones ordenadas de los vinos con alguna partida en el rango,
+        o None si el rango no está acotado.
+        """
+
+    @abstractmethod
+    def listas_por_anio(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> List[Sequence[int]]:
+        """
+        Posiciones ordenadas de los vinos de cada año con partidas en el
+        rango, una lista por año.
+        """
+
+    @abstractmethod
+    def listas_por_relacion(
+        self,
+        coleccion: str,
+        ids: Iterable[str]
+    ) -> List[Sequence[int]]:
+        """
+        Posiciones ordenadas de los vinos de cada bodega (coleccion
+        bodegas) o de cada cepa (cepas) indicada, una lista por ID; la de
+        una bodega o cepa que no existe está vacía.
+        """
+
+    @abstractmethod
+    def contar_facetas(
+        self,
+        posiciones: Optional[Sequence[int]]
+    ) -> Tuple[int, Dict[str, Dict[int, int]]]:
+        """
+        Cantidad de vinos y, entre ellos, cantidad por año, por bodega y
+        por cepa (por posición en su colección), con las claves de FACETAS
+        (ver FacetasVinos.contar). Cuenta los vinos de las posiciones
+        ordenadas indicadas, o todos si es None.
+        """
+
+    @abstractmethod
+    def buscar_por_prefijo(
+        self,
+        coleccion: str,
+        prefijo: str,
+        limite: int
+    ) -> List[int]:
+        """
+        Posiciones de las entidades con alguna palabra del nombre que
+        empieza con el prefijo, sin distinguir mayúsculas ni acentos, de la
+        más relevante a la menos (ver IndiceNombres.buscar).
+        """
+
+    @abstractmethod
+    def buscar_similares(
+        self,
+        coleccion: str,
+        texto: str,
+        limite: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Posiciones y similitud de las entidades con el nombre más parecido
+        al texto, tolerando errores de tipeo, de la más parecida a la menos
+        (ver IndiceTrigramas.buscar).
+        """
+
+    @abstractmethod
+    def obtener_fragmentos(self) -> Dict[Tuple[str, str, bool], bytes]:
+        """Caché de JSON codificado de las entidades de este almacén."""
+
+    def contiene(self, entidad: 'EntidadVineria') -> bool:
+        """
+        Indica si la entidad es la instancia publicada por este almacén.
+
+        Args:
+            entidad: Bodega, cepa o vino
+
+        Returns:
+            True si la búsqueda por ID devuelve esa misma instancia
+        """
+        buscar = {
+            "Bodega": self.buscar_bodega,
+            "Cepa": self.buscar_cepa,
+            "Vino": self.buscar_vino,
+        }.get(type(entidad).__name__)
+        return buscar is not None and buscar(entidad.obtener_id()) is entidad
@@ -0,0 +1,387 @@
+"""
+Bitácora de cambios de la vinoteca: registro de solo agregado de las
+escrituras, con confirmación agrupada, y compactación en el archivo de datos.
+
+Cada línea de la bitácora es un cambio completo en JSON, [colección, ID,
+fila], con la fila null para una baja. Como cada cambio guarda el estado
+final de la entidad y no una diferencia, aplicarlo más de una vez da el
+mismo resultado: la bitácora puede volver a aplicarse sobre un archivo de
+datos que ya la incluye, que es lo que ocurre si el proceso termina en
+medio de una compactación.
+"""
+import json
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from almacenes.base import Almacen, fila_json
+from almacenes.memoria import Cambio
+
+# Secciones del archivo de datos que pueden modificarse
+_COLECCIONES = ('bodegas', 'cepas', 'vinos')
+
+
+def ruta_bitacora(archivo: str) -> str:
+    """Ruta de la bitácora de cambios de un archivo de datos."""
+    return archivo + ".bitacora"
+
+
+def ruta_compactacion(archivo: str) -> str:
+    """Ruta de la bitácora apartada mientras se compacta."""
+    return archivo + ".bitacora.compactando"
+
+
+def codificar_cambio(cambio: Cambio) -> bytes:
+    """
+    Codifica un cambio como una línea de la bitácora.
+
+    Args:
+        cambio: Tupla (colección, ID, fila o None)
+
+    Returns:
+        Línea JSON en UTF-8, terminada en salto de línea
+    """
+    return json.dumps(
+        list(cambio), ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8') + b"\n"
+
+
+def _decodificar_cambio(linea: bytes) -> Optional[Cambio]:
+    """
+    Decodifica una línea completa de la bitácora.
+
+    Returns:
+        Cambio de la línea, o None si no es un cambio válido
+    """
+    try:
+        coleccion, id_, fila = json.loads(linea)
+    except (ValueError, TypeError):
+        return None
+    if (
+        coleccion not in _COLECCIONES or not isinstance(id_, str)
+        or not (fila is None or isinstance(fila, dict))
+    ):
+        return None
+    return coleccion, id_, fila
+
+
+def _recorrer_lineas(contenido: bytes) -> Iterator[Tuple[Cambio, bytes, int]]:
+    """
+    Recorre las líneas válidas de una bitácora hasta la primera que no lo
+    es, que solo puede ser una escritura interrumpida al final.
+
+    Returns:
+        Iterador de (cambio, línea, offset del final de la línea)
+    """
+    inicio = 0
+    while True:
+        fin = contenido.find(b"\n", inicio)
+        if fin < 0:
+            return
+        linea = contenido[inicio:fin + 1]
+        cambio = _decodificar_cambio(linea)
+        if cambio is None:
+            return
+        inicio = fin + 1
+        yield cambio, linea, inicio
+
+
+def leer_cambios(archivo: str) -> List[Tuple[Cambio, bytes]]:
+    """
+    Lee los cambios pendientes de un archivo de datos: los de la bitácora
+    apartada por una compactación que no terminó y luego los de la
+    bitácora actual, en el orden en que se escribieron.
+
+    Args:
+        archivo: Ruta del archivo de datos
+
+    Returns:
+        Lista de (cambio, línea codificada), vacía si no hay bitácora
+
+    Raises:
+        OSError: Si una bitácora existe pero no puede leerse
+    """
+    cambios = []
+    for ruta in (ruta_compactacion(archivo), ruta_bitacora(archivo)):
+        if not os.path.exists(ruta):
+            continue
+        with open(ruta, 'rb') as bitacora:
+            contenido = bitacora.read()
+        cambios.extend(
+            (cambio, linea) for cambio, linea, _ in _recorrer_lineas(contenido)
+        )
+    return cambios
+
+
+def _sincronizar_directorio(ruta: str) -> None:
+    """Sincroniza el directorio de un archivo para que su entrada sea durable."""
+    descriptor = os.open(os.path.dirname(os.path.abspath(ruta)), os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def compactar(almacen: Almacen, archivo: str) -> None:
+    """
+    Escribe los datos de un almacén como nuevo archivo de datos.
+
+    El archivo se escribe con otro nombre en el mismo directorio, se
+    sincroniza y se renombra sobre el anterior, de modo que ante una falla
+    queda el archivo anterior o el nuevo completo. El almacén es inmutable,
+    por lo que puede recorrerse mientras se siguen atendiendo consultas.
+
+    Args:
+        almacen: Almacén con los datos a escribir
+        archivo: Ruta del archivo de datos
+
+    Raises:
+        OSError: Si el archivo no puede escribirse
+    """
+    directorio = os.path.dirname(os.path.abspath(archivo))
+    descriptor, temporal = tempfile.mkstemp(
+        prefix=os.path.basename(archivo) + ".", dir=directorio
+    )
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as destino:
+            separador_seccion = "{\n"
+            for clave, entidades in (
+                ("bodegas", almacen.obtener_bodegas()),
+                ("cepas", almacen.obtener_cepas()),
+                ("vinos", almacen.obtener_vinos()),
+            ):
+                destino.write(f'{separador_seccion}  "{clave}": [')
+                separador = "\n    "
+                for entidad in entidades:
+                    destino.write(separador + json.dumps(
+                        fila_json(entidad), ensure_ascii=False
+                    ))
+                    separador = ",\n    "
+                destino.write("\n  ]" if separador != "\n    " else "]")
+                separador_seccion = ",\n"
+            destino.write("\n}\n")
+            destino.flush()
+            os.fsync(destino.fileno())
+        os.replace(temporal, archivo)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    _sincronizar_directorio(archivo)
+
+
+class Bitacora:
+    """
+    Bitácora de cambios de un archivo de datos, de solo agregado.
+
+    Los cambios se agregan en el orden en que se publican y se confirman
+    con escritura agrupada: el primer hilo que espera la confirmación de
+    un cambio escribe, con un único fsync, todos los cambios pendientes,
+    incluidos los que otros hilos agregaron mientras tanto; esos hilos solo
+    esperan a que termine. Con muchas escrituras concurrentes, el costo de
+    sincronizar el disco se reparte entre todas las del lote.
+
+    Si una escritura falla, no se sabe qué parte llegó al disco, por lo que
+    la bitácora deja de aceptar cambios hasta que se vuelva a cargar.
+    """
+
+    def __init__(self, archivo: str) -> None:
+        """
+        Inicializa la bitácora de un archivo de datos. El archivo de la
+        bitácora se abre recién al escribir el primer cambio.
+
+        Args:
+            archivo: Ruta del archivo de datos
+        """
+        self.__ruta = ruta_bitacora(archivo)
+        self.__ruta_compactacion = ruta_compactacion(archivo)
+        self.__archivo: Optional[BinaryIO] = None
+        self.__tamanio = 0
+        self.__condicion = threading.Condition(threading.Lock())
+        # Líneas agregadas que todavía no se escribieron
+        self.__pendientes: List[bytes] = []
+        # Cantidad de cambios agregados y de cambios ya sincronizados
+        self.__agregados = 0
+        self.__confirmados = 0
+        self.__escribiendo = False
+        self.__error: Optional[OSError] = None
+
+    def agregar(self, linea: bytes) -> int:
+        """
+        Agrega un cambio codificado, sin esperar a que se escriba.
+
+        Args:
+            linea: Cambio codificado con codificar_cambio
+
+        Returns:
+            Número del cambio, para esperar su confirmación
+
+        Raises:
+            OSError: Si una escritura anterior de la bitácora falló
+        """
+        with self.__condicion:
+            self.__verificar()
+            self.__pendientes.append(linea)
+            self.__agregados += 1
+            return self.__agregados
+
+    def confirmar(self, numero: int) -> None:
+        """
+        Espera a que un cambio y todos los anteriores estén en el disco.
+
+        Args:
+            numero: Número devuelto por agregar
+
+        Raises:
+            OSError: Si la bitácora no pudo escribirse
+        """
+        with self.__condicion:
+            self.__confirmarHasta(numero)
+
+    def sincronizar(self) -> None:
+        """
+        Escribe todos los cambios agregados hasta el momento.
+
+        Raises:
+            OSError: Si la bitácora no pudo escribirse
+        """
+        with self.__condicion:
+            self.__confirmarHasta(self.__agregados)
+
+    def obtener_tamanio(self) -> int:
+        """Bytes escritos en la bitácora actual, sin contar la apartada."""
+        return self.__tamanio
+
+    def rotar(self) -> bool:
+        """
+        Aparta la bitácora actual para compactarla y comienza una vacía.
+
+        Los cambios pendientes se escriben antes. Si quedó una bitácora
+        apartada por una compactación anterior que no terminó, la actual se
+        agrega a continuación. Quien la llame debe impedir que se agreguen
+        cambios mientras tanto.
+
+        Returns:
+            True si hay una bitácora apartada para compactar
+
+        Raises:
+            OSError: Si la bitácora no puede escribirse o moverse
+        """
+        with self.__condicion:
+            self.__confirmarHasta(self.__agregados)
+            if self.__archivo is not None:
+                self.__archivo.close()
+                self.__archivo = None
+            self.__tamanio = 0
+            if os.path.exists(self.__ruta):
+                if os.path.exists(self.__ruta_compactacion):
+                    with open(self.__ruta, 'rb') as actual:
+                        contenido = actual.read()
+                    with open(self.__ruta_compactacion, 'r+b') as apartada:
+                        # Descartar una escritura interrumpida al final
+                        valido = 0
+                        for _, _, valido in _recorrer_lineas(apartada.read()):
+                            pass
+                        apartada.seek(valido)
+                        apartada.truncate()
+                        apartada.write(contenido)
+                        apartada.flush()
+                        os.fsync(apartada.fileno())
+                    os.remove(self.__ruta)
+                else:
+                    os.replace(self.__ruta, self.__ruta_compactacion)
+                _sincronizar_directorio(self.__ruta)
+            return os.path.exists(self.__ruta_compactacion)
+
+    def descartar_compactada(self) -> None:
+        """
+        Elimina la bitácora apartada, una vez que sus cambios quedaron en
+        el archivo de datos.
+        """
+        try:
+            os.remove(self.__ruta_compactacion)
+        except FileNotFoundError:
+            return
+        _sincronizar_directorio(self.__ruta_compactacion)
+
+    def cerrar(self) -> None:
+        """
+        Escribe los cambios pendientes y cierra el archivo de la bitácora.
+
+        Raises:
+            OSError: Si la bitácora no pudo escribirse
+        """
+        with self.__condicion:
+            self.__confirmarHasta(self.__agregados)
+            if self.__archivo is not None:
+                self.__archivo.close()
+                self.__archivo = None
+
+    def __verificar(self) -> None:
+        """Lanza OSError si una escritura anterior falló."""
+        if self.__error is not None:
+            raise OSError(
+                f"La bitácora {self.__ruta} no pudo escribirse: {self.__error}"
+            )
+
+    def __confirmarHasta(self, numero: int) -> None:
+        """
+        Espera, o escribe como líder del lote, hasta que el cambio numero
+        esté en el disco. Se llama con la condición tomada, que se libera
+        mientras se escribe para que otros hilos sigan agregando cambios.
+        """
+        while self.__confirmados < numero:
+            self.__verificar()
+            if self.__escribiendo:
+                self.__condicion.wait()
+                continue
+            lote, self.__pendientes = self.__pendientes, []
+            hasta = self.__agregados
+            self.__escribiendo = True
+            self.__condicion.release()
+            error = None
+            try:
+                self.__escribir(b"".join(lote))
+            except OSError as falla:
+                error = falla
+            finally:
+                self.__condicion.acquire()
+                self.__escribiendo = False
+                self.__condicion.notify_all()
+            if error is not None:
+                self.__error = error
+                raise error
+            self.__confirmados = hasta
+
+    def __escribir(self, contenido: bytes) -> None:
+        """Escribe y sincroniza un lote de líneas al final de la bitácora."""
+        if self.__archivo is None:
+            self.__archivo = self.__abrir()
+        self.__archivo.write(contenido)
+        self.__archivo.flush()
+        os.fsync(self.__archivo.fileno())
+        self.__tamanio += len(contenido)
+
+    def __abrir(self) -> BinaryIO:
+        """
+        Abre la bitácora para agregar cambios, descartando una línea
+        incompleta que haya dejado una escritura interrumpida.
+        """
+        nueva = not os.path.exists(self.__ruta)
+        archivo = open(self.__ruta, 'a+b')
+        try:
+            archivo.seek(0)
+            contenido = archivo.read()
+            valido = 0
+            for _, _, valido in _recorrer_lineas(contenido):
+                pass
+            if valido < len(contenido):
+                archivo.truncate(valido)
+            if nueva:
+                _sincronizar_directorio(self.__ruta)
+        except OSError:
+            archivo.close()
+            raise
+        self.__tamanio = valido
+        return archivo
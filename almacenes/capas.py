@@ -0,0 +1,1198 @@
+"""
+Almacén con cambios puntuales sobre un AlmacenEnMemoria, que lo comparte
+sin copiarlo.
+
+Aplicar cambios a un AlmacenEnMemoria no copia sus colecciones ni sus
+índices: el almacén resultante usa el original como base y guarda, por
+colección, una capa con las entidades que cambiaron. Las entidades
+agregadas ocupan posiciones internas a continuación de las de la base y
+las eliminadas dejan un hueco, de modo que las posiciones de la base, y
+con ellas todos sus índices, siguen siendo válidas. Las posiciones que se
+publican descuentan los huecos anteriores, como si la colección se hubiera
+vuelto a armar, y las consultas combinan los índices de la base, sin las
+entradas de las posiciones cambiadas, con las entidades de la capa.
+
+Cada cambio siguiente copia solo las capas, con un costo proporcional a
+los cambios acumulados y no al tamaño del catálogo. consolidar incorpora
+las capas a un AlmacenEnMemoria con índices propios, lo que con bajas
+implica reconstruirlos: la Vinoteca lo hace en segundo plano cuando se
+acumulan cambios, y aplicar, si se superan MAXIMO_CAMBIOS, para que las
+consultas no recorran capas sin límite.
+"""
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from itertools import chain
+from typing import (
+    Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional,
+    Sequence, Set, Tuple, TYPE_CHECKING
+)
+
+from almacenes.base import (
+    Almacen, CLAVES_BODEGAS, CLAVES_CEPAS, CLAVES_VINOS, bisecar, fila_json,
+    mezclar_sin_repetidos
+)
+from almacenes.facetas import FACETAS, fila_de_vino, valores_de_fila
+from almacenes.memoria import (
+    AlmacenEnMemoria, Cambio, Datos, Version, crear_entidad,
+    derivar_con_cambios, huella_vino
+)
+from almacenes.nombres import (
+    UMBRAL_SIMILITUD, coincidencia, normalizar, similitud, trigramas
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se convierte de a una posición
+    np = None
+
+if TYPE_CHECKING:
+    from modelos.bodega import Bodega
+    from modelos.cepa import Cepa
+    from modelos.vino import Vino
+
+# Entidades reemplazadas, agregadas o eliminadas por encima de las cuales
+# aplicar consolida las capas en un almacén con índices propios
+MAXIMO_CAMBIOS = 4096
+
+# Colecciones, en el orden en que se aplican sus cambios, con las claves
+# de sus campos de ordenamiento
+_CLAVES: Dict[str, Dict[str, Callable[[Any], Any]]] = {
+    "bodegas": CLAVES_BODEGAS,
+    "cepas": CLAVES_CEPAS,
+    "vinos": CLAVES_VINOS,
+}
+
+# Tipo de entidad de cada colección, como en las claves de los fragmentos
+_TIPOS = {"bodegas": "Bodega", "cepas": "Cepa", "vinos": "Vino"}
+
+
+def _invertir(permutacion: array) -> array:
+    """Inversa de una permutación: el índice de cada posición en ella."""
+    rangos = array('I', bytes(permutacion.itemsize * len(permutacion)))
+    if np is not None and permutacion:
+        np.frombuffer(rangos, dtype=np.uint32)[
+            np.frombuffer(permutacion, dtype=np.uint32)
+        ] = np.arange(len(permutacion), dtype=np.uint32)
+        return rangos
+    for rango, posicion in enumerate(permutacion):
+        rangos[posicion] = rango
+    return rangos
+
+
+def _separar(
+    posiciones: Sequence[int],
+    buscadas: Sequence[int]
+) -> Tuple[Sequence[int], List[int]]:
+    """
+    Separa de una lista ordenada de posiciones las que están en otra, que
+    se buscan con búsqueda binaria.
+
+    Args:
+        posiciones: Posiciones en orden creciente
+        buscadas: Posiciones a separar, en orden creciente
+
+    Returns:
+        Tupla con las posiciones restantes y las encontradas, ambas en
+        orden creciente
+    """
+    restantes: List[int] = []
+    encontradas: List[int] = []
+    desde = 0
+    for buscada in buscadas:
+        indice = bisect_left(posiciones, buscada, desde)
+        if indice < len(posiciones) and posiciones[indice] == buscada:
+            restantes.extend(posiciones[desde:indice])
+            encontradas.append(buscada)
+            desde = indice + 1
+    if not encontradas:
+        return posiciones, encontradas
+    restantes.extend(posiciones[desde:])
+    return restantes, encontradas
+
+
+class _Capa:
+    """
+    Cambios de una colección respecto de la colección de la base.
+
+    Las posiciones internas son las de la base seguidas de las de las
+    entidades agregadas; las de las eliminadas quedan como huecos. Es
+    inmutable: con_cambios devuelve una capa nueva.
+    """
+
+    def __init__(self, cantidad_base: int) -> None:
+        """
+        Crea una capa sin cambios.
+
+        Args:
+            cantidad_base: Cantidad de entidades de la colección de la base
+        """
+        self.cantidad_base = cantidad_base
+        # Cantidad de posiciones internas, incluidos los huecos
+        self.total = cantidad_base
+        # Entidad de cada posición interna reemplazada o agregada, y su
+        # nombre normalizado para las búsquedas
+        self.entidades: Dict[int, Any] = {}
+        self.nombres: Dict[int, str] = {}
+        # Posiciones internas eliminadas en orden creciente y, para cada
+        # una, la cantidad de posiciones publicadas que la preceden
+        self.huecos: List[int] = []
+        self.ajustes: List[int] = []
+        # Posiciones de la base reemplazadas o eliminadas
+        self.sucias: Set[int] = set()
+        # Posición interna de cada ID cambiado, o None si se eliminó
+        self.posiciones: Dict[str, Optional[int]] = {}
+        self.__ordenadas: Optional[List[int]] = None
+        self.__cambiadas: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return self.total - len(self.huecos)
+
+    def vacia(self) -> bool:
+        """Indica si la colección es la de la base."""
+        return not self.entidades and not self.huecos
+
+    def cantidad_de_cambios(self) -> int:
+        """Cantidad de entidades reemplazadas, agregadas o eliminadas."""
+        return len(self.entidades) + len(self.huecos)
+
+    def ordenadas(self) -> List[int]:
+        """Posiciones internas de las entidades de la capa, en orden."""
+        if self.__ordenadas is None:
+            self.__ordenadas = sorted(self.entidades)
+        return self.__ordenadas
+
+    def cambiadas(self) -> List[int]:
+        """Posiciones internas de las entidades de la capa y de los huecos."""
+        if self.__cambiadas is None:
+            self.__cambiadas = sorted(chain(self.entidades, self.huecos))
+        return self.__cambiadas
+
+    def posicion(
+        self,
+        id_: str,
+        posicion_en_base: Callable[[str], Optional[int]]
+    ) -> Optional[int]:
+        """
+        Posición interna de la entidad con un ID, o None si no existe.
+
+        Args:
+            id_: ID buscado
+            posicion_en_base: Posición de un ID en la colección de la base
+        """
+        if id_ in self.posiciones:
+            return self.posiciones[id_]
+        return posicion_en_base(id_)
+
+    def externa(self, posicion: int) -> int:
+        """Posición publicada de una posición interna que no es un hueco."""
+        return posicion - bisect_left(self.huecos, posicion)
+
+    def interna(self, posicion: int) -> int:
+        """Posición interna de una posición publicada."""
+        return posicion + bisect_right(self.ajustes, posicion)
+
+    def externas(self, posiciones: Sequence[int]) -> Sequence[int]:
+        """Posiciones publicadas de posiciones internas que no son huecos."""
+        if not self.huecos:
+            return posiciones
+        if np is not None and len(posiciones):
+            internas = np.asarray(posiciones, dtype=np.int64)
+            return array('I', (
+                internas - np.searchsorted(np.asarray(self.huecos), internas)
+            ).astype(np.uint32).tobytes())
+        huecos = self.huecos
+        return array('I', [
+            posicion - bisect_left(huecos, posicion) for posicion in posiciones
+        ])
+
+    def internas(self, posiciones: Sequence[int]) -> Sequence[int]:
+        """Posiciones internas de posiciones publicadas."""
+        if not self.ajustes:
+            return posiciones
+        if np is not None and len(posiciones):
+            externas = np.asarray(posiciones, dtype=np.int64)
+            return (externas + np.searchsorted(
+                np.asarray(self.ajustes), externas, side='right'
+            )).tolist()
+        return [self.interna(posicion) for posicion in posiciones]
+
+    def entidad(self, posicion: int, base: Sequence[Any]) -> Any:
+        """Entidad de una posición interna que no es un hueco."""
+        entidad = self.entidades.get(posicion)
+        return entidad if entidad is not None else base[posicion]
+
+    def con_cambios(
+        self,
+        cambios: Iterable[Tuple[str, Optional[Dict]]],
+        base: Sequence[Any],
+        posicion_en_base: Callable[[str], Optional[int]],
+        crear: Callable[[Dict], Any]
+    ) -> Tuple['_Capa', Dict[int, Tuple[Any, Any]]]:
+        """
+        Obtiene la capa con cambios aplicados en orden. Un reemplazo
+        conserva la posición de la entidad; un alta, incluso la de un ID
+        eliminado, agrega una posición al final.
+
+        Args:
+            cambios: Pares (ID, fila o None para eliminar)
+            base: Colección de la base
+            posicion_en_base: Posición de un ID en la colección de la base
+            crear: Crea la entidad de una fila
+
+        Returns:
+            Tupla con la capa nueva y, por posición interna cambiada, la
+            entidad anterior y la nueva (None si no había o si se eliminó)
+        """
+        capa = _Capa.__new__(_Capa)
+        capa.cantidad_base = self.cantidad_base
+        capa.total = self.total
+        capa.entidades = dict(self.entidades)
+        capa.nombres = dict(self.nombres)
+        capa.huecos = self.huecos
+        capa.ajustes = self.ajustes
+        capa.sucias = set(self.sucias)
+        capa.posiciones = dict(self.posiciones)
+        capa.__ordenadas = None
+        capa.__cambiadas = None
+        cambiadas: Dict[int, Tuple[Any, Any]] = {}
+        for id_, fila in cambios:
+            posicion = capa.posicion(id_, posicion_en_base)
+            if posicion is None:
+                if fila is None:
+                    continue
+                antes = None
+                posicion = capa.total
+                capa.total += 1
+            else:
+                antes = capa.entidad(posicion, base)
+            if fila is None:
+                despues = None
+                capa.entidades.pop(posicion, None)
+                capa.nombres.pop(posicion, None)
+                if capa.huecos is self.huecos:
+                    capa.huecos = list(self.huecos)
+                insort(capa.huecos, posicion)
+                capa.posiciones[id_] = None
+            else:
+                despues = capa.entidades[posicion] = crear(fila)
+                capa.nombres[posicion] = normalizar(despues.obtener_nombre())
+                capa.posiciones[id_] = posicion
+            if posicion < capa.cantidad_base:
+                capa.sucias.add(posicion)
+            if posicion in cambiadas:
+                antes = cambiadas[posicion][0]
+            cambiadas[posicion] = (antes, despues)
+        if capa.huecos is not self.huecos:
+            capa.ajustes = [
+                hueco - indice for indice, hueco in enumerate(capa.huecos)
+            ]
+        return capa, cambiadas
+
+
+class _Orden:
+    """
+    Diferencias de la permutación de una colección por un campo respecto
+    de la permutación de la base: los índices de la base que se quitan y
+    las entradas que se insertan.
+    """
+
+    def __init__(self) -> None:
+        """Crea las diferencias de una colección sin cambios."""
+        # Índices de la permutación de la base de las posiciones cambiadas,
+        # en orden creciente
+        self.quitados: List[int] = []
+        # Entradas (índice de inserción en la permutación de la base,
+        # (clave, id), posición interna) en orden, y la de cada posición
+        self.insertados: List[Tuple[int, Tuple[Any, str], int]] = []
+        self.por_posicion: Dict[int, Tuple[int, Tuple[Any, str], int]] = {}
+
+    def copiar(self) -> '_Orden':
+        """Copia las diferencias, para corregirlas sin alterar estas."""
+        orden = _Orden()
+        orden.quitados = list(self.quitados)
+        orden.insertados = list(self.insertados)
+        orden.por_posicion = dict(self.por_posicion)
+        return orden
+
+    def aplicar(self, permutacion: array) -> array:
+        """
+        Arma la permutación con las diferencias, copiando por tramos la de
+        la base.
+
+        Args:
+            permutacion: Permutación de la base
+
+        Returns:
+            Posiciones internas en orden
+        """
+        resultado = array('I')
+        quitados = self.quitados
+        insertados = self.insertados
+        desde = i = j = 0
+        while i < len(quitados) or j < len(insertados):
+            if j < len(insertados) and (
+                i == len(quitados) or insertados[j][0] <= quitados[i]
+            ):
+                indice, _, posicion = insertados[j]
+                resultado.extend(permutacion[desde:indice])
+                resultado.append(posicion)
+                desde = max(desde, indice)
+                j += 1
+            else:
+                resultado.extend(permutacion[desde:quitados[i]])
+                desde = quitados[i] + 1
+                i += 1
+        resultado.extend(permutacion[desde:])
+        return resultado
+
+
+class _Coleccion(Sequence):
+    """
+    Secuencia de solo lectura de una colección de la base con las
+    entidades de una capa, por posición publicada.
+    """
+
+    def __init__(self, base: Sequence[Any], capa: _Capa) -> None:
+        """
+        Args:
+            base: Colección de la base
+            capa: Cambios de la colección
+        """
+        self.__base = base
+        self.__capa = capa
+
+    def __len__(self) -> int:
+        return len(self.__capa)
+
+    def __getitem__(self, indice):
+        cantidad = len(self.__capa)
+        if isinstance(indice, slice):
+            return [self[i] for i in range(*indice.indices(cantidad))]
+        if indice < 0:
+            indice += cantidad
+        if not 0 <= indice < cantidad:
+            raise IndexError("Posición fuera de rango")
+        return self.__capa.entidad(self.__capa.interna(indice), self.__base)
+
+    def __iter__(self) -> Iterator[Any]:
+        base = self.__base
+        entidades = self.__capa.entidades
+        desde = 0
+        for posicion in self.__capa.cambiadas():
+            if desde < posicion:
+                yield from base[desde:posicion]
+            entidad = entidades.get(posicion)
+            if entidad is not None:
+                yield entidad
+            desde = posicion + 1
+        if desde < len(base):
+            yield from base[desde:]
+
+
+class _PorId:
+    """
+    Búsqueda por ID en una colección de un almacén con el get de un
+    diccionario, para resolver las referencias de los vinos.
+    """
+
+    def __init__(self, buscar: Callable[[str], Any]) -> None:
+        self.__buscar = buscar
+
+    def get(self, id_: str, defecto: Any = None) -> Any:
+        entidad = self.__buscar(id_)
+        return defecto if entidad is None else entidad
+
+
+class _Fragmentos:
+    """
+    JSON codificado de las entidades de un almacén con cambios, con el get
+    y la asignación de un diccionario. El de las entidades que no cambiaron
+    respecto de la base se guarda en los fragmentos de la base, y el de las
+    demás en un diccionario propio.
+    """
+
+    def __init__(
+        self,
+        base: Dict[Tuple[str, str, bool], bytes],
+        propios: Dict[Tuple[str, str, bool], bytes],
+        propio: Callable[[Tuple[str, str, bool]], bool]
+    ) -> None:
+        """
+        Args:
+            base: Fragmentos de la base
+            propios: Fragmentos de las entidades cambiadas
+            propio: Indica si una clave corresponde a una entidad cambiada
+        """
+        self.__base = base
+        self.__propios = propios
+        self.__propio = propio
+
+    def get(
+        self,
+        clave: Tuple[str, str, bool],
+        defecto: Optional[bytes] = None
+    ) -> Optional[bytes]:
+        destino = self.__propios if self.__propio(clave) else self.__base
+        return destino.get(clave, defecto)
+
+    def __setitem__(self, clave: Tuple[str, str, bool], fragmento: bytes) -> None:
+        destino = self.__propios if self.__propio(clave) else self.__base
+        destino[clave] = fragmento
+
+    def __iter__(self) -> Iterator[Tuple[str, str, bool]]:
+        yield from (clave for clave in self.__base if not self.__propio(clave))
+        yield from self.__propios
+
+    def derivar(
+        self,
+        propio: Callable[[Tuple[str, str, bool]], bool],
+        invalidos: Dict[str, Set[str]]
+    ) -> '_Fragmentos':
+        """
+        Obtiene los fragmentos de un almacén derivado de este.
+
+        Args:
+            propio: Indica si una clave corresponde a una entidad cambiada
+                en el almacén derivado
+            invalidos: IDs por tipo de entidad cuyo JSON cambió
+
+        Returns:
+            Fragmentos con los propios que siguen siendo válidos
+        """
+        return _Fragmentos(self.__base, {
+            clave: fragmento for clave, fragmento in self.__propios.items()
+            if clave[1] not in invalidos[clave[0]]
+        }, propio)
+
+
+class AlmacenConCambios(Almacen):
+    """
+    Almacén formado por un AlmacenEnMemoria, que comparte sin copiarlo, y
+    las entidades que cambiaron respecto de él (ver el módulo).
+    """
+
+    def __init__(self, base: AlmacenEnMemoria) -> None:
+        """
+        Crea un almacén sin cambios sobre la base.
+
+        Args:
+            base: Almacén cuyas colecciones e índices se comparten
+        """
+        self.__base = base
+        self.__version = base.obtener_version()
+        self.__fecha_modificacion = base.obtener_fecha_modificacion()
+        self.__capas: Dict[str, _Capa] = {
+            coleccion: _Capa(len(self.__coleccionBase(coleccion)))
+            for coleccion in _CLAVES
+        }
+        self.__ordenes: Dict[str, Dict[str, _Orden]] = {
+            coleccion: {campo: _Orden() for campo in claves}
+            for coleccion, claves in _CLAVES.items()
+        }
+        # Posiciones de vinos que se quitan y se agregan a la lista de la
+        # base de cada (faceta, valor), con los códigos de las bodegas y
+        # cepas de la base como posiciones internas
+        self.__facetas: Dict[
+            Tuple[str, int], Tuple[FrozenSet[int], FrozenSet[int]]
+        ] = {}
+        # IDs de las bodegas y cepas cuyos vinos pueden diferir de la base
+        self.__afectadas: Dict[str, FrozenSet[str]] = {
+            "bodegas": frozenset(), "cepas": frozenset()
+        }
+        self.__fragmentos = _Fragmentos(
+            base.obtener_fragmentos(), {}, self.__fragmentoPropio
+        )
+        # Resultados calculados de las consultas sobre este almacén
+        self.__cache: Dict[Any, Any] = {}
+
+    def aplicar(
+        self,
+        cambios: Iterable[Cambio],
+        version: str = "",
+        fecha_modificacion: Optional[datetime] = None
+    ) -> Almacen:
+        """
+        Obtiene el almacén que resulta de aplicar cambios puntuales a este,
+        que no se modifica, como AlmacenEnMemoria.con_cambios: los vinos
+        cuya bodega o cepas cambiaron también se recrean. Solo se copian
+        las capas, no la base.
+
+        Args:
+            cambios: Tuplas (colección, ID, fila o None), donde la colección
+                es bodegas, cepas o vinos
+            version: Versión de los datos resultantes
+            fecha_modificacion: Fecha de modificación de los datos
+
+        Returns:
+            Almacén con los cambios aplicados, consolidado si los cambios
+            acumulados superan MAXIMO_CAMBIOS
+
+        Raises:
+            ValueError: Si la colección de algún cambio no existe
+            KeyError: Si a una fila le falta un campo
+        """
+        por_coleccion: Dict[str, List[Tuple[str, Optional[Dict]]]] = {
+            coleccion: [] for coleccion in _CLAVES
+        }
+        for coleccion, id_, fila in cambios:
+            if coleccion not in por_coleccion:
+                raise ValueError(f"Colección no válida: {coleccion}")
+            por_coleccion[coleccion].append((id_, fila))
+
+        nuevo = AlmacenConCambios.__new__(AlmacenConCambios)
+        nuevo.__base = self.__base
+        nuevo.__version = version
+        nuevo.__fecha_modificacion = fecha_modificacion
+        nuevo.__capas = dict(self.__capas)
+        nuevo.__cache = {}
+        cambiadas: Dict[str, Dict[int, Tuple[Any, Any]]] = {}
+        for coleccion in ("bodegas", "cepas"):
+            nuevo.__capas[coleccion], cambiadas[coleccion] = (
+                self.__aplicarEnCapa(coleccion, por_coleccion[coleccion])
+            )
+
+        # Los vinos cuya bodega o cepas cambiaron se recrean con su misma
+        # fila, ya que mantienen referencias a los objetos reemplazados
+        modificados = {id_ for id_, _ in por_coleccion["vinos"]}
+        referentes: Dict[str, 'Vino'] = {}
+        for vinos_de, coleccion in (
+            (self.obtener_vinos_de_bodega, "bodegas"),
+            (self.obtener_vinos_de_cepa, "cepas"),
+        ):
+            for id_ in dict.fromkeys(id_ for id_, _ in por_coleccion[coleccion]):
+                for vino in vinos_de(id_):
+                    if vino.obtener_id() not in modificados:
+                        referentes[vino.obtener_id()] = vino
+        nuevo.__capas["vinos"], cambiadas["vinos"] = self.__aplicarEnCapa(
+            "vinos",
+            [(id_, fila_json(vino)) for id_, vino in referentes.items()]
+            + por_coleccion["vinos"]
+        )
+        bodegas_por_id = _PorId(nuevo.buscar_bodega)
+        cepas_por_id = _PorId(nuevo.buscar_cepa)
+        for _, vino in cambiadas["vinos"].values():
+            if vino is not None:
+                vino.resolver_referencias(bodegas_por_id, cepas_por_id)
+
+        nuevo.__ordenes = dict(self.__ordenes)
+        for coleccion, cambios_coleccion in cambiadas.items():
+            if cambios_coleccion:
+                nuevo.__ordenes[coleccion] = self.__corregirOrdenes(
+                    coleccion, cambios_coleccion
+                )
+
+        # Bodegas y cepas cuyos vinos cambiaron: sus listas de vinos y su
+        # JSON (que incluye los vinos) dejan de ser los de la base
+        bodegas_afectadas: Set[str] = set()
+        cepas_afectadas: Set[str] = set()
+        for anterior, vino in cambiadas["vinos"].values():
+            for entidad in (anterior, vino):
+                if entidad is not None:
+                    bodegas_afectadas.add(entidad.obtener_bodega_id())
+                    cepas_afectadas.update(entidad.obtener_cepa_ids())
+        nuevo.__afectadas = {
+            "bodegas": self.__afectadas["bodegas"].union(bodegas_afectadas),
+            "cepas": self.__afectadas["cepas"].union(cepas_afectadas),
+        }
+        nuevo.__facetas = (
+            self.__corregirFacetas(nuevo, cambiadas["vinos"])
+            if cambiadas["vinos"] else self.__facetas
+        )
+        invalidos = {
+            _TIPOS[coleccion]: {
+                entidad.obtener_id()
+                for par in cambios_coleccion.values()
+                for entidad in par if entidad is not None
+            }
+            for coleccion, cambios_coleccion in cambiadas.items()
+        }
+        invalidos["Bodega"].update(bodegas_afectadas)
+        invalidos["Cepa"].update(cepas_afectadas)
+        nuevo.__fragmentos = self.__fragmentos.derivar(
+            nuevo.__fragmentoPropio, invalidos
+        )
+        if nuevo.obtener_cantidad_de_cambios() > MAXIMO_CAMBIOS:
+            return nuevo.consolidar()
+        return nuevo
+
+    def consolidar(self) -> AlmacenEnMemoria:
+        """
+        Incorpora las capas a un almacén con colecciones e índices propios,
+        equivalente a este, aplicando a la base sus cambios netos: las
+        bajas de entidades de la base y las entidades de las capas en orden
+        de posición. Con bajas los índices se reconstruyen.
+
+        Returns:
+            Almacén en memoria con los mismos datos y versión
+        """
+        cambios: List[Cambio] = []
+        for coleccion, capa in self.__capas.items():
+            base = self.__coleccionBase(coleccion)
+            cambios.extend(
+                (coleccion, base[posicion].obtener_id(), None)
+                for posicion in capa.huecos if posicion < capa.cantidad_base
+            )
+            cambios.extend(
+                (coleccion, entidad.obtener_id(), fila_json(entidad))
+                for entidad in map(capa.entidades.__getitem__, capa.ordenadas())
+            )
+        return self.__base.con_cambios(
+            cambios, self.__version, self.__fecha_modificacion
+        )
+
+    def derivar(
+        self,
+        datos: Datos,
+        version: Version = "",
+        fecha_modificacion: Optional[datetime] = None
+    ) -> Almacen:
+        """
+        Obtiene el almacén de una nueva versión de los datos a partir de
+        este almacén, como AlmacenEnMemoria.derivar: si difieren en pocas
+        entidades se le aplican solo esas diferencias, y si no se
+        reconstruye desde este almacén consolidado.
+        """
+        return derivar_con_cambios(
+            self, datos, version, fecha_modificacion,
+            lambda *argumentos: self.consolidar().reconstruir(*argumentos)
+        )
+
+    def posicion_de(self, coleccion: str, entidad: Any) -> int:
+        """
+        Posición publicada de una entidad de este almacén en su colección,
+        sin recorrerla.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            entidad: Instancia publicada por este almacén
+        """
+        capa = self.__capas[coleccion]
+        id_ = entidad.obtener_id()
+        if id_ in capa.posiciones:
+            return capa.externa(capa.posiciones[id_])
+        return capa.externa(self.__base.posicion_de(coleccion, entidad))
+
+    def obtener_cantidad_de_cambios(self) -> int:
+        """Entidades reemplazadas, agregadas o eliminadas respecto de la base."""
+        return sum(capa.cantidad_de_cambios() for capa in self.__capas.values())
+
+    def __coleccionBase(self, coleccion: str) -> Sequence[Any]:
+        """Colección de la base."""
+        return {
+            "bodegas": self.__base.obtener_bodegas,
+            "cepas": self.__base.obtener_cepas,
+            "vinos": self.__base.obtener_vinos,
+        }[coleccion]()
+
+    def __posicionEnBase(self, coleccion: str, id_: str) -> Optional[int]:
+        """Posición de un ID en la colección de la base, o None."""
+        entidad = {
+            "bodegas": self.__base.buscar_bodega,
+            "cepas": self.__base.buscar_cepa,
+            "vinos": self.__base.buscar_vino,
+        }[coleccion](id_)
+        if entidad is None:
+            return None
+        return self.__base.posicion_de(coleccion, entidad)
+
+    def __codigo(self, coleccion: str) -> Callable[[str], int]:
+        """
+        Función que da la posición interna de una bodega o cepa por ID, o
+        -1 si no existe, como código de las facetas.
+        """
+        capa = self.__capas[coleccion]
+
+        def codigo(id_: str) -> int:
+            posicion = capa.posicion(
+                id_, lambda id_: self.__posicionEnBase(coleccion, id_)
+            )
+            return -1 if posicion is None else posicion
+
+        return codigo
+
+    def __aplicarEnCapa(
+        self,
+        coleccion: str,
+        cambios: List[Tuple[str, Optional[Dict]]]
+    ) -> Tuple[_Capa, Dict[int, Tuple[Any, Any]]]:
+        """Aplica los cambios de una colección a su capa (ver _Capa.con_cambios)."""
+        if not cambios:
+            return self.__capas[coleccion], {}
+        return self.__capas[coleccion].con_cambios(
+            cambios, self.__coleccionBase(coleccion),
+            lambda id_: self.__posicionEnBase(coleccion, id_),
+            lambda fila: crear_entidad(coleccion, fila)
+        )
+
+    def __corregirOrdenes(
+        self,
+        coleccion: str,
+        cambiadas: Dict[int, Tuple[Any, Any]]
+    ) -> Dict[str, _Orden]:
+        """
+        Corrige las diferencias de las permutaciones de una colección:
+        cada posición cambiada se quita de la permutación de la base y su
+        entidad nueva se inserta donde le corresponde.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            cambiadas: Entidad anterior y nueva por posición interna
+
+        Returns:
+            Diferencias por campo de ordenamiento
+        """
+        base = self.__coleccionBase(coleccion)
+        cantidad = len(base)
+        ordenes = {}
+        for campo, clave in _CLAVES[coleccion].items():
+            permutacion = self.__base.obtener_permutacion(coleccion, campo)
+
+            def clave_base(posicion: int) -> Tuple[Any, str]:
+                entidad = base[posicion]
+                return clave(entidad), entidad.obtener_id()
+
+            orden = self.__ordenes[coleccion][campo].copiar()
+            for posicion, (_, entidad) in cambiadas.items():
+                entrada = orden.por_posicion.pop(posicion, None)
+                if entrada is not None:
+                    del orden.insertados[bisect_left(orden.insertados, entrada)]
+                elif posicion < cantidad:
+                    insort(orden.quitados, self.__indiceEnBase(
+                        coleccion, campo, posicion, permutacion, clave_base
+                    ))
+                if entidad is not None:
+                    objetivo = (clave(entidad), entidad.obtener_id())
+                    entrada = (
+                        bisecar(permutacion, objetivo, clave_base),
+                        objetivo, posicion
+                    )
+                    insort(orden.insertados, entrada)
+                    orden.por_posicion[posicion] = entrada
+            ordenes[campo] = orden
+        return ordenes
+
+    def __indiceEnBase(
+        self,
+        coleccion: str,
+        campo: str,
+        posicion: int,
+        permutacion: array,
+        clave_base: Callable[[int], Tuple[Any, str]]
+    ) -> int:
+        """Índice de una posición de la base en su permutación por un campo."""
+        if coleccion == "vinos":
+            return self.__base.obtener_rangos_vinos(campo)[posicion]
+        indice = bisecar(permutacion, clave_base(posicion), clave_base)
+        while permutacion[indice] != posicion:
+            indice += 1
+        return indice
+
+    def __corregirFacetas(
+        self,
+        nuevo: 'AlmacenConCambios',
+        cambiadas: Dict[int, Tuple[Any, Any]]
+    ) -> Dict[Tuple[str, int], Tuple[FrozenSet[int], FrozenSet[int]]]:
+        """
+        Corrige las posiciones que se quitan y se agregan a las listas de
+        las facetas de la base por los vinos cambiados.
+
+        Args:
+            nuevo: Almacén derivado de este con los vinos cambiados
+            cambiadas: Vino anterior y nuevo por posición interna
+
+        Returns:
+            Posiciones quitadas y agregadas por (faceta, valor)
+        """
+        vinos = self.__base.obtener_vinos()
+        cantidad = len(vinos)
+        codigos_base = (
+            self.__base.obtener_codigos("bodegas"),
+            self.__base.obtener_codigos("cepas"),
+        )
+        codigos_antes = (self.__codigo("bodegas"), self.__codigo("cepas"))
+        codigos_despues = (nuevo.__codigo("bodegas"), nuevo.__codigo("cepas"))
+        vacios: Dict[str, Set[int]] = {faceta: set() for faceta in FACETAS}
+
+        def registro(
+            en_base: Dict[str, Set[int]],
+            actuales: Dict[str, Set[int]],
+            faceta: str,
+            valor: int
+        ) -> int:
+            # 0 si la posición está en la lista de la base tal como es, 1
+            # si hay que quitarla y 2 si hay que agregarla
+            if valor in en_base[faceta]:
+                return 0 if valor in actuales[faceta] else 1
+            return 2 if valor in actuales[faceta] else 0
+
+        operaciones: Dict[Tuple[str, int], List[Tuple[int, int, int]]] = {}
+        for posicion, (anterior, vino) in cambiadas.items():
+            en_base = (
+                valores_de_fila(fila_de_vino(vinos[posicion], *codigos_base))
+                if posicion < cantidad else vacios
+            )
+            if anterior is None:
+                previos = vacios
+            elif posicion < cantidad and anterior is vinos[posicion]:
+                previos = en_base
+            else:
+                previos = valores_de_fila(fila_de_vino(anterior, *codigos_antes))
+            actuales = (
+                valores_de_fila(fila_de_vino(vino, *codigos_despues))
+                if vino is not None else vacios
+            )
+            for faceta in FACETAS:
+                for valor in en_base[faceta] | previos[faceta] | actuales[faceta]:
+                    antes = registro(en_base, previos, faceta, valor)
+                    despues = registro(en_base, actuales, faceta, valor)
+                    if antes != despues:
+                        operaciones.setdefault((faceta, valor), []).append(
+                            (posicion, antes, despues)
+                        )
+
+        facetas = dict(self.__facetas)
+        for clave, cambios in operaciones.items():
+            listas = [set(lista) for lista in facetas.get(clave, ((), ()))]
+            for posicion, antes, despues in cambios:
+                if antes:
+                    listas[antes - 1].discard(posicion)
+                if despues:
+                    listas[despues - 1].add(posicion)
+            if listas[0] or listas[1]:
+                facetas[clave] = (frozenset(listas[0]), frozenset(listas[1]))
+            else:
+                facetas.pop(clave, None)
+        return facetas
+
+    def __fragmentoPropio(self, clave: Tuple[str, str, bool]) -> bool:
+        """Indica si el JSON de una entidad puede diferir del de la base."""
+        tipo, id_, _ = clave
+        if tipo == "Vino":
+            return id_ in self.__capas["vinos"].posiciones
+        coleccion = "bodegas" if tipo == "Bodega" else "cepas"
+        return (
+            id_ in self.__capas[coleccion].posiciones
+            or id_ in self.__afectadas[coleccion]
+        )
+
+    def __coleccion(self, coleccion: str) -> Sequence[Any]:
+        """Colección publicada, la misma instancia en cada llamada."""
+        capa = self.__capas[coleccion]
+        if capa.vacia():
+            return self.__coleccionBase(coleccion)
+        return self.__cache.setdefault(
+            ("coleccion", coleccion),
+            _Coleccion(self.__coleccionBase(coleccion), capa)
+        )
+
+    def __buscar(self, coleccion: str, id_: str) -> Any:
+        """Entidad con un ID en una colección, o None si no existe."""
+        capa = self.__capas[coleccion]
+        if id_ in capa.posiciones:
+            posicion = capa.posiciones[id_]
+            return capa.entidades[posicion] if posicion is not None else None
+        return {
+            "bodegas": self.__base.buscar_bodega,
+            "cepas": self.__base.buscar_cepa,
+            "vinos": self.__base.buscar_vino,
+        }[coleccion](id_)
+
+    def __vinosDe(
+        self,
+        coleccion: str,
+        id_: str,
+        pertenece: Callable[['Vino'], bool]
+    ) -> List['Vino']:
+        """
+        Vinos de una bodega o cepa: los de la lista de la base que no
+        cambiaron, intercalados por posición con los de la capa.
+        """
+        if coleccion == "bodegas":
+            lista = self.__base.obtener_vinos_de_bodega(id_)
+        else:
+            lista = self.__base.obtener_vinos_de_cepa(id_)
+        if id_ not in self.__afectadas[coleccion]:
+            return lista
+        clave = ("vinos_de", coleccion, id_)
+        resultado = self.__cache.get(clave)
+        if resultado is not None:
+            return resultado
+        capa = self.__capas["vinos"]
+        vinos = self.__base.obtener_vinos()
+        obsoletos = {id(vinos[posicion]) for posicion in capa.sucias}
+        vigentes = [vino for vino in lista if id(vino) not in obsoletos]
+        resultado = []
+        desde = 0
+        for posicion in capa.ordenadas():
+            vino = capa.entidades[posicion]
+            if not pertenece(vino):
+                continue
+            hasta = bisecar(
+                range(len(vigentes)), posicion,
+                lambda indice: self.__base.posicion_de("vinos", vigentes[indice])
+            )
+            resultado.extend(vigentes[desde:hasta])
+            resultado.append(vino)
+            desde = max(desde, hasta)
+        resultado.extend(vigentes[desde:])
+        self.__cache[clave] = resultado
+        return resultado
+
+    def __lista(self, faceta: str, valor: int) -> Sequence[int]:
+        """
+        Posiciones publicadas en orden de los vinos con un valor de una
+        faceta, con el valor como posición interna si es una bodega o cepa.
+        """
+        lista = self.__base.obtener_facetas().lista(faceta, valor)
+        cambios = self.__facetas.get((faceta, valor))
+        capa = self.__capas["vinos"]
+        if cambios is None and not capa.huecos:
+            return lista
+        clave = ("lista", faceta, valor)
+        resultado = self.__cache.get(clave)
+        if resultado is None:
+            quitadas, agregadas = cambios or (frozenset(), frozenset())
+            if quitadas:
+                lista = [posicion for posicion in lista if posicion not in quitadas]
+            if agregadas:
+                lista = sorted(chain(lista, agregadas))
+            resultado = self.__cache[clave] = capa.externas(lista)
+        return resultado
+
+    def __conCodigosExternos(
+        self,
+        conteos: Dict[str, Dict[int, int]]
+    ) -> Dict[str, Dict[int, int]]:
+        """Reemplaza las posiciones internas de bodegas y cepas por las publicadas."""
+        for faceta in ("bodegas", "cepas"):
+            capa = self.__capas[faceta]
+            if capa.huecos:
+                conteos[faceta] = {
+                    capa.externa(codigo): cantidad
+                    for codigo, cantidad in conteos[faceta].items()
+                }
+        return conteos
+
+    def obtener_version(self) -> str:
+        return self.__version
+
+    def obtener_fecha_modificacion(self) -> Optional[datetime]:
+        return self.__fecha_modificacion
+
+    def obtener_bodegas(self) -> Sequence['Bodega']:
+        return self.__coleccion("bodegas")
+
+    def obtener_cepas(self) -> Sequence['Cepa']:
+        return self.__coleccion("cepas")
+
+    def obtener_vinos(self) -> Sequence['Vino']:
+        return self.__coleccion("vinos")
+
+    def buscar_bodega(self, id: str) -> Optional['Bodega']:
+        return self.__buscar("bodegas", id)
+
+    def buscar_cepa(self, id: str) -> Optional['Cepa']:
+        return self.__buscar("cepas", id)
+
+    def buscar_vino(self, id: str) -> Optional['Vino']:
+        return self.__buscar("vinos", id)
+
+    def obtener_vinos_de_bodega(self, bodega_id: str) -> List['Vino']:
+        return self.__vinosDe(
+            "bodegas", bodega_id,
+            lambda vino: vino.obtener_bodega_id() == bodega_id
+        )
+
+    def obtener_vinos_de_cepa(self, cepa_id: str) -> List['Vino']:
+        return self.__vinosDe(
+            "cepas", cepa_id, lambda vino: cepa_id in vino.obtener_cepa_ids()
+        )
+
+    def obtener_cepas_de_bodega(self, bodega_id: str) -> List['Cepa']:
+        if bodega_id not in self.__afectadas["bodegas"]:
+            return self.__base.obtener_cepas_de_bodega(bodega_id)
+        clave = ("cepas_de", bodega_id)
+        resultado = self.__cache.get(clave)
+        if resultado is None:
+            cepas: Dict[str, 'Cepa'] = {}
+            for vino in self.obtener_vinos_de_bodega(bodega_id):
+                for cepa_id in vino.obtener_cepa_ids():
+                    if cepa_id not in cepas:
+                        cepa = self.buscar_cepa(cepa_id)
+                        if cepa is not None:
+                            cepas[cepa_id] = cepa
+            resultado = self.__cache[clave] = list(cepas.values())
+        return resultado
+
+    def obtener_permutacion(self, coleccion: str, orden: str) -> array:
+        permutacion = self.__base.obtener_permutacion(coleccion, orden)
+        capa = self.__capas[coleccion]
+        if capa.vacia():
+            return permutacion
+        clave = ("permutacion", coleccion, orden)
+        resultado = self.__cache.get(clave)
+        if resultado is None:
+            resultado = self.__cache[clave] = capa.externas(
+                self.__ordenes[coleccion][orden].aplicar(permutacion)
+            )
+        return resultado
+
+    def obtener_rangos_vinos(self, orden: str) -> array:
+        if self.__capas["vinos"].vacia():
+            return self.__base.obtener_rangos_vinos(orden)
+        clave = ("rangos", orden)
+        rangos = self.__cache.get(clave)
+        if rangos is None:
+            rangos = self.__cache[clave] = _invertir(
+                self.obtener_permutacion("vinos", orden)
+            )
+        return rangos
+
+    def posiciones_por_anios(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> Optional[Iterable[int]]:
+        if anio_desde is None and anio_hasta is None:
+            return None
+        listas = self.listas_por_anio(anio_desde, anio_hasta)
+        if len(listas) <= 1:
+            return listas[0] if listas else []
+        return mezclar_sin_repetidos(listas)
+
+    def listas_por_anio(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> List[Sequence[int]]:
+        capa = self.__capas["vinos"]
+        if capa.vacia():
+            return self.__base.listas_por_anio(anio_desde, anio_hasta)
+        anios = set(self.__base.obtener_facetas().anios(anio_desde, anio_hasta))
+        anios.update(
+            valor for (faceta, valor), (_, agregadas) in self.__facetas.items()
+            if faceta == "anios" and agregadas
+            and (anio_desde is None or valor >= anio_desde)
+            and (anio_hasta is None or valor <= anio_hasta)
+        )
+        listas = [self.__lista("anios", anio) for anio in sorted(anios)]
+        return [lista for lista in listas if lista]
+
+    def listas_por_relacion(
+        self,
+        coleccion: str,
+        ids: Iterable[str]
+    ) -> List[Sequence[int]]:
+        codigo = self.__codigo(coleccion)
+        listas = []
+        for id_ in ids:
+            posicion = codigo(id_)
+            listas.append(self.__lista(coleccion, posicion) if posicion >= 0 else ())
+        return listas
+
+    def contar_facetas(
+        self,
+        posiciones: Optional[Sequence[int]]
+    ) -> Tuple[int, Dict[str, Dict[int, int]]]:
+        capa = self.__capas["vinos"]
+        if posiciones is None:
+            _, conteos = self.__base.contar_facetas(None)
+            for (faceta, valor), (quitadas, agregadas) in self.__facetas.items():
+                cantidad = (
+                    conteos[faceta].get(valor, 0) + len(agregadas) - len(quitadas)
+                )
+                if cantidad:
+                    conteos[faceta][valor] = cantidad
+                else:
+                    conteos[faceta].pop(valor, None)
+            return len(capa), self.__conCodigosExternos(conteos)
+        limpias, sucias = _separar(capa.internas(posiciones), capa.ordenadas())
+        _, conteos = self.__base.contar_facetas(limpias)
+        codigos = (self.__codigo("bodegas"), self.__codigo("cepas"))
+        for posicion in sucias:
+            fila = fila_de_vino(capa.entidades[posicion], *codigos)
+            for faceta, valores in valores_de_fila(fila).items():
+                for valor in valores:
+                    conteos[faceta][valor] = conteos[faceta].get(valor, 0) + 1
+        return len(posiciones), self.__conCodigosExternos(conteos)
+
+    def buscar_por_prefijo(
+        self,
+        coleccion: str,
+        prefijo: str,
+        limite: int
+    ) -> List[int]:
+        capa = self.__capas[coleccion]
+        if capa.vacia() or limite < 1:
+            return self.__base.buscar_por_prefijo(coleccion, prefijo, limite)
+        # Los resultados de la base se piden con margen para descartar los
+        # de las posiciones cambiadas, y se ordenan con los de la capa
+        # según la entrada por la que coinciden
+        clave = normalizar(prefijo)
+        base = self.__coleccionBase(coleccion)
+        candidatos = [
+            (coincidencia(clave, normalizar(base[posicion].obtener_nombre())), posicion)
+            for posicion in self.__base.buscar_por_prefijo(
+                coleccion, prefijo, limite + len(capa.sucias)
+            )
+            if posicion not in capa.sucias
+        ]
+        for posicion, nombre in capa.nombres.items():
+            entrada = coincidencia(clave, nombre)
+            if entrada is not None:
+                candidatos.append((entrada, posicion))
+        candidatos.sort()
+        return [capa.externa(posicion) for _, posicion in candidatos[:limite]]
+
+    def buscar_similares(
+        self,
+        coleccion: str,
+        texto: str,
+        limite: int
+    ) -> List[Tuple[int, float]]:
+        capa = self.__capas[coleccion]
+        if capa.vacia():
+            return self.__base.buscar_similares(coleccion, texto, limite)
+        buscados = trigramas(normalizar(texto))
+        if not buscados or limite < 1:
+            return []
+        candidatos = [
+            (-parecido, posicion)
+            for posicion, parecido in self.__base.buscar_similares(
+                coleccion, texto, limite + len(capa.sucias)
+            )
+            if posicion not in capa.sucias
+        ]
+        for posicion, nombre in capa.nombres.items():
+            parecido = similitud(buscados, nombre)
+            if parecido >= UMBRAL_SIMILITUD:
+                candidatos.append((-parecido, posicion))
+        candidatos.sort()
+        return [
+            (capa.externa(posicion), -negativo)
+            for negativo, posicion in candidatos[:limite]
+        ]
+
+    def obtener_huellas_vinos(self) -> Sequence[int]:
+        """Huella del contenido de cada vino, por posición publicada."""
+        huellas = self.__base.obtener_huellas_vinos()
+        capa = self.__capas["vinos"]
+        if capa.vacia():
+            return huellas
+        resultado = self.__cache.get("huellas")
+        if resultado is None:
+            resultado = array('q')
+            desde = 0
+            for posicion in capa.cambiadas():
+                resultado.extend(huellas[desde:posicion])
+                vino = capa.entidades.get(posicion)
+                if vino is not None:
+                    resultado.append(huella_vino(fila_json(vino)))
+                desde = posicion + 1
+            resultado.extend(huellas[desde:])
+            self.__cache["huellas"] = resultado
+        return resultado
+
+    def obtener_fragmentos(self) -> _Fragmentos:
+        return self.__fragmentos
@@ -0,0 +1,536 @@
+"""
+Facetas de los vinos: cantidad de vinos por año, por bodega y por cepa.
+
+Para cada faceta se guarda, por valor (año de alguna partida, o código de
+la bodega o de alguna cepa del vino), la lista ordenada de posiciones de
+los vinos que lo tienen, y una tabla con la cantidad de cada valor. Sin
+filtros las cantidades se leen de esas tablas. Con filtros, que la
+Vinoteca resuelve intersecando estas mismas listas, se cuenta cuántas
+posiciones del resultado hay en la lista de cada valor, sin recorrer los
+vinos del catálogo. Con NumPy disponible ese conteo se hace para todos los
+valores de una faceta a la vez, sobre las listas concatenadas.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import (
+    TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Optional, Sequence,
+    Set, Tuple
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se cuenta valor por valor
+    np = None
+
+if TYPE_CHECKING:
+    from modelos.vino import Vino
+
+# Facetas de los vinos
+FACETAS = ("anios", "bodegas", "cepas")
+
+# Valores de un vino para las facetas: código de bodega (o -1), años de las
+# partidas y códigos de las cepas (-1 las inexistentes)
+Fila = Tuple[int, Sequence[int], Sequence[int]]
+
+
+def valores_de_fila(fila: Fila) -> Dict[str, Set[int]]:
+    """Valores distintos de cada faceta en una fila."""
+    bodega, partidas, cepas = fila
+    return {
+        "anios": set(partidas),
+        "bodegas": {bodega} if bodega >= 0 else set(),
+        "cepas": {cepa for cepa in cepas if cepa >= 0},
+    }
+
+
+def fila_de_vino(
+    vino: 'Vino',
+    codigo_de_bodega: Callable[[str], int],
+    codigo_de_cepa: Callable[[str], int]
+) -> Fila:
+    """
+    Obtiene los valores de un vino para las facetas.
+
+    Args:
+        vino: Vino a convertir
+        codigo_de_bodega: Código (posición) de una bodega por ID, o -1 si
+            no existe
+        codigo_de_cepa: Código (posición) de una cepa por ID, o -1 si no
+            existe
+
+    Returns:
+        Fila del vino
+    """
+    return (
+        codigo_de_bodega(vino.obtener_bodega_id()),
+        vino.obtener_partidas(),
+        [codigo_de_cepa(cepa_id) for cepa_id in vino.obtener_cepa_ids()],
+    )
+
+
+def listas_por_valor(
+    valores: Sequence[int],
+    offsets: Optional[Sequence[int]] = None,
+    descartar_negativos: bool = True
+) -> Dict[int, array]:
+    """
+    Invierte una columna de valores de los vinos: para cada valor, las
+    posiciones de los vinos que lo contienen.
+
+    Con NumPy disponible la inversión se hace ordenando los pares (valor,
+    posición) de la columna completa; sin NumPy se recorre vino por vino.
+
+    Args:
+        valores: Arreglo con el valor de cada vino o, si se indican
+            offsets, los valores de todos los vinos concatenados
+        offsets: Arreglo donde cada vino i ocupa
+            valores[offsets[i]:offsets[i + 1]], o None si cada vino tiene
+            un único valor
+        descartar_negativos: Si se omiten los valores negativos, que en
+            los códigos de bodegas y cepas marcan referencias inexistentes
+
+    Returns:
+        Posiciones en orden creciente y sin repetir de los vinos de cada
+        valor
+    """
+    if np is not None:
+        return _invertir_vectorizado(valores, offsets, descartar_negativos)
+    listas: Dict[int, array] = {}
+    if offsets is None:
+        for posicion, valor in enumerate(valores):
+            if valor >= 0 or not descartar_negativos:
+                listas.setdefault(valor, array('I')).append(posicion)
+        return listas
+    for posicion in range(len(offsets) - 1):
+        for valor in set(valores[offsets[posicion]:offsets[posicion + 1]]):
+            if valor >= 0 or not descartar_negativos:
+                listas.setdefault(valor, array('I')).append(posicion)
+    return listas
+
+
+def _invertir_vectorizado(
+    valores: Sequence[int],
+    offsets: Optional[Sequence[int]],
+    descartar_negativos: bool
+) -> Dict[int, array]:
+    """Invierte una columna ordenando sus pares (valor, posición) con NumPy."""
+    valores = np.asarray(valores).astype(np.int64)
+    if offsets is None:
+        posiciones = np.arange(len(valores), dtype=np.int64)
+    else:
+        offsets = np.asarray(offsets).astype(np.int64)
+        posiciones = np.repeat(
+            np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets)
+        )
+    if descartar_negativos:
+        validos = valores >= 0
+        valores, posiciones = valores[validos], posiciones[validos]
+    orden = np.lexsort((posiciones, valores))
+    valores, posiciones = valores[orden], posiciones[orden]
+    # Descartar un mismo valor repetido en un vino
+    if len(valores):
+        distintos = np.ones(len(valores), dtype=bool)
+        distintos[1:] = (
+            (valores[1:] != valores[:-1]) | (posiciones[1:] != posiciones[:-1])
+        )
+        valores, posiciones = valores[distintos], posiciones[distintos]
+    claves, inicios = np.unique(valores, return_index=True)
+    posiciones = posiciones.astype(np.uint32)
+    inicios = inicios.tolist()
+    return {
+        clave: array('I', posiciones[inicio:fin].tobytes())
+        for clave, inicio, fin in zip(
+            claves.tolist(), inicios, inicios[1:] + [len(posiciones)]
+        )
+    }
+
+
+def _intersecar(menor: Sequence[int], mayor: Sequence[int]) -> List[int]:
+    """
+    Interseca dos listas ordenadas de posiciones. Si una es mucho más
+    corta, sus posiciones se buscan en la otra con búsqueda binaria.
+    """
+    if len(menor) * 8 < len(mayor):
+        resultado = []
+        inicio = 0
+        for posicion in menor:
+            inicio = bisect_left(mayor, posicion, inicio)
+            if inicio == len(mayor):
+                break
+            if mayor[inicio] == posicion:
+                resultado.append(posicion)
+        return resultado
+    conjunto = set(mayor)
+    return [posicion for posicion in menor if posicion in conjunto]
+
+
+class FacetasVinos:
+    """
+    Listas de posiciones y cantidades de vinos por año, bodega y cepa.
+
+    Es inmutable: con_cambios devuelve facetas nuevas y deja estas intactas.
+    """
+
+    def __init__(
+        self,
+        cantidad: int,
+        listas: Mapping[str, Mapping[int, Sequence[int]]]
+    ) -> None:
+        """
+        Construye las facetas.
+
+        Args:
+            cantidad: Cantidad de vinos de la colección
+            listas: Para cada faceta de FACETAS, las posiciones en orden
+                creciente y sin repetir de los vinos de cada valor
+        """
+        self.__cantidad = cantidad
+        self.__listas: Dict[str, Dict[int, array]] = {
+            faceta: {
+                valor: posiciones if isinstance(posiciones, array)
+                else array('I', posiciones)
+                for valor, posiciones in listas[faceta].items()
+            }
+            for faceta in FACETAS
+        }
+        self.__calcularConteos()
+
+    def __calcularConteos(self) -> None:
+        """Arma las tablas de cantidades y la lista ordenada de años."""
+        self.__conteos: Dict[str, Dict[int, int]] = {
+            faceta: {valor: len(posiciones) for valor, posiciones in listas.items()}
+            for faceta, listas in self.__listas.items()
+        }
+        self.__anios: List[int] = sorted(self.__listas["anios"])
+        self.__concatenadas: Dict[str, Tuple[List[int], Any, Any]] = {}
+
+    @classmethod
+    def desde_columnas(
+        cls,
+        bodegas: Sequence[int],
+        partidas: Sequence[int],
+        offsets_partidas: Sequence[int],
+        cepas: Sequence[int],
+        offsets_cepas: Sequence[int]
+    ) -> 'FacetasVinos':
+        """
+        Construye las facetas invirtiendo los valores de los vinos
+        guardados como columnas: arreglos con el valor de cada vino, o con
+        los valores de todos concatenados y sus offsets.
+
+        Args:
+            bodegas: Código de la bodega de cada vino (negativo si no existe)
+            partidas: Años de las partidas de todos los vinos
+            offsets_partidas: Offsets de los años de cada vino
+            cepas: Códigos de las cepas de todos los vinos (negativos las
+                inexistentes)
+            offsets_cepas: Offsets de los códigos de cada vino
+
+        Returns:
+            Facetas de los vinos
+        """
+        return cls(len(bodegas), {
+            "anios": listas_por_valor(partidas, offsets_partidas, False),
+            "bodegas": listas_por_valor(bodegas),
+            "cepas": listas_por_valor(cepas, offsets_cepas),
+        })
+
+    @classmethod
+    def desde_vinos(
+        cls,
+        vinos: Sequence['Vino'],
+        codigo_de_bodega: Callable[[str], int],
+        codigo_de_cepa: Callable[[str], int]
+    ) -> 'FacetasVinos':
+        """
+        Construye las facetas de una colección de vinos.
+
+        Args:
+            vinos: Vinos en el orden de la colección
+            codigo_de_bodega: Código (posición) de una bodega por ID, o -1
+            codigo_de_cepa: Código (posición) de una cepa por ID, o -1
+
+        Returns:
+            Facetas de los vinos
+        """
+        bodegas = array('i')
+        partidas = array('i')
+        offsets_partidas = array('I', [0])
+        cepas = array('i')
+        offsets_cepas = array('I', [0])
+        for vino in vinos:
+            bodega, anios, codigos = fila_de_vino(
+                vino, codigo_de_bodega, codigo_de_cepa
+            )
+            bodegas.append(bodega)
+            partidas.extend(anios)
+            offsets_partidas.append(len(partidas))
+            cepas.extend(codigos)
+            offsets_cepas.append(len(cepas))
+        return cls.desde_columnas(
+            bodegas, partidas, offsets_partidas, cepas, offsets_cepas
+        )
+
+    def __len__(self) -> int:
+        return self.__cantidad
+
+    def exportar(self) -> Dict[str, Any]:
+        """
+        Obtiene el contenido de las facetas, para guardarlo en una
+        instantánea.
+
+        Returns:
+            Cantidad de vinos y bytes de la lista de cada valor
+        """
+        return {
+            "cantidad": self.__cantidad,
+            "listas": {
+                faceta: {
+                    valor: posiciones.tobytes()
+                    for valor, posiciones in listas.items()
+                }
+                for faceta, listas in self.__listas.items()
+            },
+        }
+
+    @classmethod
+    def restaurar(cls, estado: Mapping[str, Any]) -> 'FacetasVinos':
+        """
+        Reconstruye las facetas desde el contenido obtenido con exportar.
+
+        Args:
+            estado: Contenido exportado en esta plataforma
+
+        Returns:
+            Facetas equivalentes a las exportadas
+        """
+        facetas = cls.__new__(cls)
+        facetas.__cantidad = estado["cantidad"]
+        facetas.__listas = {}
+        for faceta, listas in estado["listas"].items():
+            facetas.__listas[faceta] = {}
+            for valor, contenido in listas.items():
+                posiciones = facetas.__listas[faceta][valor] = array('I')
+                posiciones.frombytes(contenido)
+        facetas.__calcularConteos()
+        return facetas
+
+    def con_cambios(
+        self,
+        cambios: Mapping[int, Tuple[Optional[Fila], Fila]],
+        cantidad: int
+    ) -> 'FacetasVinos':
+        """
+        Obtiene las facetas de la colección con algunos vinos cambiados o
+        agregados al final, sin que los demás cambien de posición. Solo se
+        copian las listas de los valores que cambian.
+
+        Args:
+            cambios: Fila anterior (None si la posición es nueva) y fila
+                nueva, por posición
+            cantidad: Cantidad de vinos de la colección nueva
+
+        Returns:
+            Facetas nuevas
+        """
+        afectados: Dict[Tuple[str, int], Tuple[List[int], List[int]]] = {}
+        for posicion, (anterior, nueva) in cambios.items():
+            antes = valores_de_fila(anterior) if anterior is not None else {}
+            despues = valores_de_fila(nueva)
+            for faceta in FACETAS:
+                previos = antes.get(faceta, set())
+                for valor in previos - despues[faceta]:
+                    afectados.setdefault((faceta, valor), ([], []))[0].append(
+                        posicion
+                    )
+                for valor in despues[faceta] - previos:
+                    afectados.setdefault((faceta, valor), ([], []))[1].append(
+                        posicion
+                    )
+
+        facetas = FacetasVinos.__new__(FacetasVinos)
+        facetas.__cantidad = cantidad
+        facetas.__listas = {
+            faceta: dict(listas) for faceta, listas in self.__listas.items()
+        }
+        facetas.__conteos = {
+            faceta: dict(conteos) for faceta, conteos in self.__conteos.items()
+        }
+        for (faceta, valor), (salientes, entrantes) in afectados.items():
+            listas = facetas.__listas[faceta]
+            posiciones = array('I', listas.get(valor, ()))
+            for posicion in salientes:
+                del posiciones[bisect_left(posiciones, posicion)]
+            for posicion in sorted(entrantes):
+                posiciones.insert(bisect_left(posiciones, posicion), posicion)
+            if posiciones:
+                listas[valor] = posiciones
+                facetas.__conteos[faceta][valor] = len(posiciones)
+            else:
+                listas.pop(valor, None)
+                facetas.__conteos[faceta].pop(valor, None)
+        facetas.__anios = (
+            sorted(facetas.__listas["anios"])
+            if any(faceta == "anios" for faceta, _ in afectados)
+            else self.__anios
+        )
+        facetas.__concatenadas = {
+            faceta: concatenadas
+            for faceta, concatenadas in self.__concatenadas.items()
+            if all(afectada != faceta for afectada, _ in afectados)
+        }
+        return facetas
+
+    def lista(self, faceta: str, valor: int) -> Sequence[int]:
+        """
+        Posiciones en orden creciente de los vinos con un valor de una
+        faceta.
+
+        Args:
+            faceta: anios, bodegas o cepas
+            valor: Año, o código de la bodega o de la cepa
+
+        Returns:
+            Lista de posiciones, vacía si ningún vino tiene el valor
+        """
+        return self.__listas[faceta].get(valor, ())
+
+    def listas_de_anios(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> List[Sequence[int]]:
+        """
+        Listas de posiciones de los años con vinos dentro de un rango.
+
+        Args:
+            anio_desde: Año mínimo (inclusive), o None si no está acotado
+            anio_hasta: Año máximo (inclusive), o None si no está acotado
+
+        Returns:
+            Lista de posiciones de cada año del rango, en orden de año
+        """
+        return [
+            self.__listas["anios"][anio]
+            for anio in self.anios(anio_desde, anio_hasta)
+        ]
+
+    def anios(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> List[int]:
+        """
+        Años con vinos dentro de un rango.
+
+        Args:
+            anio_desde: Año mínimo (inclusive), o None si no está acotado
+            anio_hasta: Año máximo (inclusive), o None si no está acotado
+
+        Returns:
+            Años del rango en orden creciente
+        """
+        inicio = (
+            bisect_left(self.__anios, anio_desde)
+            if anio_desde is not None else 0
+        )
+        fin = (
+            bisect_right(self.__anios, anio_hasta)
+            if anio_hasta is not None else len(self.__anios)
+        )
+        return self.__anios[inicio:fin]
+
+    def contar(
+        self,
+        posiciones: Optional[Sequence[int]] = None
+    ) -> Tuple[int, Dict[str, Dict[int, int]]]:
+        """
+        Cuenta los vinos de cada valor de cada faceta, entre todos o entre
+        algunos.
+
+        Args:
+            posiciones: Posiciones en orden creciente de los vinos a contar,
+                o None para contarlos todos
+
+        Returns:
+            Tupla (cantidad de vinos contados, cantidad por valor de cada
+            faceta); los valores sin vinos no se incluyen
+        """
+        if posiciones is None:
+            return self.__cantidad, {
+                faceta: dict(conteos)
+                for faceta, conteos in self.__conteos.items()
+            }
+        if not posiciones:
+            return 0, {faceta: {} for faceta in FACETAS}
+        if np is not None:
+            return len(posiciones), self.__contarVectorizado(posiciones)
+        conjunto: Optional[Set[int]] = None
+        resultado: Dict[str, Dict[int, int]] = {}
+        for faceta, listas in self.__listas.items():
+            conteos = resultado[faceta] = {}
+            for valor, lista in listas.items():
+                if len(lista) <= len(posiciones):
+                    if conjunto is None:
+                        conjunto = set(posiciones)
+                    cantidad = sum(map(conjunto.__contains__, lista))
+                else:
+                    cantidad = len(_intersecar(posiciones, lista))
+                if cantidad:
+                    conteos[valor] = cantidad
+        return len(posiciones), resultado
+
+    def __contarVectorizado(
+        self,
+        posiciones: Sequence[int]
+    ) -> Dict[str, Dict[int, int]]:
+        """
+        Cuenta las posiciones en la lista de cada valor marcándolas en un
+        arreglo y sumando las marcas de cada tramo de las listas
+        concatenadas de la faceta.
+        """
+        marcas = np.zeros(self.__cantidad, dtype=np.int32)
+        marcas[np.asarray(posiciones, dtype=np.int64)] = 1
+        resultado: Dict[str, Dict[int, int]] = {}
+        for faceta in FACETAS:
+            valores, concatenadas, inicios = self.__concatenar(faceta)
+            if not valores:
+                resultado[faceta] = {}
+                continue
+            cantidades = np.add.reduceat(marcas[concatenadas], inicios)
+            presentes = np.flatnonzero(cantidades)
+            resultado[faceta] = dict(zip(
+                [valores[i] for i in presentes.tolist()],
+                cantidades[presentes].tolist()
+            ))
+        return resultado
+
+    def __concatenar(self, faceta: str) -> Tuple[List[int], Any, Any]:
+        """
+        Concatena las listas de una faceta, la primera vez que se cuentan
+        con filtros.
+
+        Returns:
+            Tupla (valores, posiciones concatenadas de sus listas, inicio
+            del tramo de cada valor)
+        """
+        concatenadas = self.__concatenadas.get(faceta)
+        if concatenadas is None:
+            listas = self.__listas[faceta]
+            valores = list(listas)
+            largos = np.fromiter(
+                (len(listas[valor]) for valor in valores),
+                dtype=np.int64, count=len(valores)
+            )
+            inicios = np.zeros(len(valores), dtype=np.int64)
+            np.cumsum(largos[:-1], out=inicios[1:])
+            concatenadas = (
+                valores,
+                np.frombuffer(
+                    b"".join(listas[valor].tobytes() for valor in valores),
+                    dtype=np.uint32
+                ),
+                inicios,
+            )
+            self.__concatenadas[faceta] = concatenadas
+        return concatenadas
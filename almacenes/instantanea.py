@@ -0,0 +1,167 @@
+"""
+Instantáneas binarias del almacén en memoria.
+
+Una instantánea guarda el estado exportado de un AlmacenEnMemoria (entidades
+e índices) junto al archivo de datos, para que el próximo arranque lo
+restaure sin parsear el JSON ni recalcular los índices. Su cabecera registra
+el tamaño, la fecha de modificación y la huella SHA-1 del archivo del que
+proviene: si alguno no coincide con el archivo actual la instantánea se
+ignora.
+
+El contenido se serializa con marshal, que conserva el internado de las
+cadenas y las guarda una sola vez aunque se repitan. Los arreglos se guardan
+en el orden de bytes de la plataforma, por lo que la instantánea solo es
+válida en la plataforma que la escribió.
+"""
+import gc
+import hashlib
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from datetime import datetime
+from typing import Optional
+
+from almacenes.memoria import AlmacenEnMemoria
+
+# Cabecera: marca, versión del formato, plataforma, tamaño y fecha de
+# modificación (en nanosegundos) del archivo de datos y su huella SHA-1
+_MARCA = b"VINOTECA"
+_FORMATO = 6
+_CABECERA = struct.Struct("<8sH8sQq20s")
+_PLATAFORMA = (
+    sys.byteorder[0] + str(array('I').itemsize) + str(array('q').itemsize)
+).encode("ascii").ljust(8, b"\0")
+
+
+def ruta_instantanea(archivo: str) -> str:
+    """
+    Obtiene la ruta de la instantánea de un archivo de datos.
+
+    Args:
+        archivo: Ruta del archivo de datos
+
+    Returns:
+        Ruta del archivo de instantánea, junto al de datos
+    """
+    return archivo + ".instantanea"
+
+
+def huella_archivo(archivo: str) -> bytes:
+    """
+    Calcula la huella SHA-1 del contenido de un archivo, leído por bloques.
+
+    Args:
+        archivo: Ruta del archivo
+
+    Returns:
+        Huella SHA-1 binaria (20 bytes)
+    """
+    huella = hashlib.sha1()
+    with open(archivo, "rb") as origen:
+        for bloque in iter(lambda: origen.read(1 << 20), b""):
+            huella.update(bloque)
+    return huella.digest()
+
+
+def guardar_instantanea(
+    almacen: AlmacenEnMemoria,
+    archivo: str,
+    tamanio: int,
+    mtime_ns: int
+) -> bool:
+    """
+    Guarda la instantánea de un almacén construido desde un archivo de datos.
+
+    La instantánea se escribe en un archivo temporal que luego reemplaza al
+    anterior, por lo que un lector nunca ve una instantánea a medio escribir.
+
+    Args:
+        almacen: Almacén a guardar
+        archivo: Ruta del archivo de datos del que se construyó el almacén
+        tamanio: Tamaño del archivo de datos al leerlo
+        mtime_ns: Fecha de modificación del archivo de datos al leerlo
+
+    Returns:
+        False si el archivo de datos cambió desde que se leyó, en cuyo caso
+        no se guarda nada
+
+    Raises:
+        OSError: Si la instantánea no puede escribirse
+    """
+    huella = huella_archivo(archivo)
+    estado = os.stat(archivo)
+    if (estado.st_size, estado.st_mtime_ns) != (tamanio, mtime_ns):
+        return False
+    cabecera = _CABECERA.pack(
+        _MARCA, _FORMATO, _PLATAFORMA, tamanio, mtime_ns, huella
+    )
+    contenido = marshal.dumps(almacen.exportar())
+    destino = ruta_instantanea(archivo)
+    descriptor, temporal = tempfile.mkstemp(
+        prefix=os.path.basename(destino) + ".",
+        dir=os.path.dirname(os.path.abspath(destino))
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as salida:
+            salida.write(cabecera)
+            salida.write(contenido)
+        os.replace(temporal, destino)
+    except BaseException:
+        os.remove(temporal)
+        raise
+    return True
+
+
+def cargar_instantanea(
+    archivo: str,
+    tamanio: int,
+    mtime_ns: int,
+    fecha_modificacion: Optional[datetime] = None
+) -> Optional[AlmacenEnMemoria]:
+    """
+    Restaura el almacén de un archivo de datos desde su instantánea, si es
+    válida para el contenido actual del archivo.
+
+    Args:
+        archivo: Ruta del archivo de datos
+        tamanio: Tamaño actual del archivo de datos
+        mtime_ns: Fecha de modificación actual del archivo de datos
+        fecha_modificacion: Fecha de modificación para el almacén restaurado
+
+    Returns:
+        Almacén restaurado, o None si no hay instantánea, es de otro
+        archivo, de otro formato o plataforma, o está dañada
+    """
+    try:
+        with open(ruta_instantanea(archivo), "rb") as origen:
+            cabecera = origen.read(_CABECERA.size)
+            if len(cabecera) != _CABECERA.size:
+                return None
+            marca, formato, plataforma, tamanio_origen, mtime_origen, huella = (
+                _CABECERA.unpack(cabecera)
+            )
+            # Las comparaciones baratas van primero: la huella requiere
+            # leer el archivo de datos completo
+            if (
+                (marca, formato, plataforma) != (_MARCA, _FORMATO, _PLATAFORMA)
+                or (tamanio_origen, mtime_origen) != (tamanio, mtime_ns)
+                or huella != huella_archivo(archivo)
+            ):
+                return None
+            contenido = origen.read()
+        # Restaurar crea millones de objetos que sobreviven a la carga: el
+        # recolector de ciclos los recorrería repetidamente sin liberar nada
+        recolectar = gc.isenabled()
+        gc.disable()
+        try:
+            return AlmacenEnMemoria.restaurar(
+                marshal.loads(contenido), fecha_modificacion
+            )
+        finally:
+            if recolectar:
+                gc.enable()
+    except (OSError, EOFError, ValueError, TypeError, KeyError, IndexError):
+        return None
@@ -0,0 +1,185 @@
+"""Lectura incremental del archivo JSON de la vinoteca."""
+import hashlib
+import json
+import re
+from typing import Any, Iterator, TextIO, Tuple
+
+# Espacios en blanco admitidos por JSON entre elementos
+_ESPACIOS = re.compile(r'[ \t\n\r]*')
+# Caracteres que pueden continuar un número JSON
+_CONTINUACION_NUMERO = frozenset('0123456789.eE+-')
+
+
+class LectorJson:
+    """
+    Lee un objeto JSON cuyos valores son arreglos (como vinoteca.json)
+    recorriendo cada arreglo de a un elemento.
+
+    El archivo se lee por bloques y solo se decodifica un elemento por vez,
+    de modo que nunca se mantienen en memoria el texto completo ni el árbol
+    completo de diccionarios y listas. Mientras lee calcula la huella SHA-1
+    del texto leído, que identifica la versión del contenido.
+
+    Las claves cuyo valor no es un arreglo se leen y se descartan. La
+    lectura termina al cerrar el objeto: lo que siga en el último bloque
+    leído solo puede ser espacio en blanco.
+    """
+
+    def __init__(self, archivo: TextIO, tamanio_bloque: int = 1 << 16) -> None:
+        """
+        Args:
+            archivo: Archivo de texto abierto para lectura
+            tamanio_bloque: Cantidad de caracteres a leer por vez
+        """
+        self.__archivo = archivo
+        self.__tamanio_bloque = tamanio_bloque
+        self.__decodificador = json.JSONDecoder()
+        self.__huella = hashlib.sha1()
+        self.__texto = ""
+        self.__posicion = 0
+        self.__agotado = False
+
+    def __iter__(self) -> Iterator[Tuple[str, Iterator[Any]]]:
+        """
+        Recorre las claves del objeto en el orden del archivo.
+
+        Cada sección debe recorrerse por completo (o abandonarse) antes de
+        pedir la siguiente; los elementos no consumidos se descartan.
+
+        Returns:
+            Iterador de tuplas (clave, iterador de los elementos del arreglo)
+
+        Raises:
+            ValueError: Si el contenido no es un objeto JSON válido
+        """
+        self.__esperar('{')
+        if self.__siguiente() == '}':
+            self.__posicion += 1
+        else:
+            while True:
+                clave = self.__valor()
+                if not isinstance(clave, str):
+                    raise ValueError("Se esperaba una clave del objeto JSON")
+                self.__esperar(':')
+                if self.__siguiente() == '[':
+                    self.__posicion += 1
+                    elementos = self.__elementos()
+                    yield clave, elementos
+                    for _ in elementos:
+                        pass
+                else:
+                    self.__valor()
+                if self.__esperar(',}') == '}':
+                    break
+        if self.__texto[self.__posicion:].strip():
+            raise ValueError("Contenido adicional después del objeto JSON")
+
+    def obtener_huella(self) -> str:
+        """
+        Obtiene la huella SHA-1 del texto leído hasta el momento.
+
+        Returns:
+            Huella hexadecimal; tras recorrer todas las secciones identifica
+            el contenido del archivo
+        """
+        return self.__huella.hexdigest()
+
+    def __elementos(self) -> Iterator[Any]:
+        """Recorre los elementos del arreglo que comienza en la posición actual."""
+        if self.__siguiente() == ']':
+            self.__posicion += 1
+            return
+        while True:
+            yield self.__valor()
+            if self.__esperar(',]') == ']':
+                return
+
+    def __leerBloque(self) -> bool:
+        """
+        Lee el bloque siguiente, descartando el texto ya procesado.
+
+        Returns:
+            False si el archivo no tiene más contenido
+        """
+        if self.__agotado:
+            return False
+        bloque = self.__archivo.read(self.__tamanio_bloque)
+        if not bloque:
+            self.__agotado = True
+            return False
+        self.__huella.update(bloque.encode('utf-8'))
+        self.__texto = self.__texto[self.__posicion:] + bloque
+        self.__posicion = 0
+        return True
+
+    def __siguiente(self) -> str:
+        """
+        Avanza sobre los espacios y devuelve el carácter siguiente sin
+        consumirlo.
+
+        Returns:
+            Carácter siguiente, o cadena vacía al final del archivo
+        """
+        while True:
+            self.__posicion = _ESPACIOS.match(
+                self.__texto, self.__posicion
+            ).end()
+            if self.__posicion < len(self.__texto):
+                return self.__texto[self.__posicion]
+            if not self.__leerBloque():
+                return ""
+
+    def __esperar(self, admitidos: str) -> str:
+        """
+        Consume el carácter siguiente, que debe ser uno de los admitidos.
+
+        Args:
+            admitidos: Caracteres estructurales válidos en esta posición
+
+        Returns:
+            Carácter consumido
+
+        Raises:
+            ValueError: Si el carácter siguiente no es uno de los admitidos
+        """
+        caracter = self.__siguiente()
+        if not caracter or caracter not in admitidos:
+            raise ValueError(
+                f"Se esperaba {' o '.join(admitidos)} en el archivo JSON"
+            )
+        self.__posicion += 1
+        return caracter
+
+    def __valor(self) -> Any:
+        """
+        Decodifica el valor JSON que comienza en la posición actual, leyendo
+        más bloques mientras esté incompleto.
+
+        Returns:
+            Valor decodificado
+
+        Raises:
+            ValueError: Si el valor no es JSON válido
+        """
+        self.__siguiente()
+        while True:
+            try:
+                valor, fin = self.__decodificador.raw_decode(
+                    self.__texto, self.__posicion
+                )
+            except json.JSONDecodeError:
+                if self.__leerBloque():
+                    continue
+                raise
+            # Un número cortado por el fin del bloque se decodifica como un
+            # prefijo válido ("12" de "12.5"): se relee con el bloque siguiente
+            if (
+                fin == len(self.__texto)
+                or (
+                    isinstance(valor, (int, float))
+                    and self.__texto[fin] in _CONTINUACION_NUMERO
+                )
+            ) and self.__leerBloque():
+                continue
+            self.__posicion = fin
+            return valor
@@ -0,0 +1,720 @@
+"""
+Almacén de solo lectura sobre un archivo mapeado en memoria.
+
+El archivo de mapa guarda el catálogo en un formato que se consulta sin
+convertirlo en objetos: registros de ancho fijo para bodegas, cepas y vinos,
+un montículo de cadenas UTF-8 con su tabla de offsets, y los índices como
+arreglos de posiciones con tablas de offsets (cada lista i ocupa
+posiciones[offsets[i]:offsets[i + 1]]). Al abrirlo con mmap, varios procesos
+que sirven el mismo catálogo comparten una única copia física a través de la
+caché de páginas del sistema operativo; cada consulta crea solo los objetos
+Bodega, Cepa y Vino de su resultado, que se liberan al terminar.
+
+Las referencias de un vino a su bodega y a sus cepas son posiciones en la
+colección correspondiente, o -(k + 1) para un ID inexistente guardado como
+la cadena k. Los enteros se guardan en el orden de bytes de la plataforma,
+por lo que el mapa solo es válido en la plataforma que lo escribió.
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Optional,
+    Sequence, Tuple, TYPE_CHECKING
+)
+
+from almacenes.base import (
+    Almacen, CLAVES_VINOS, bisecar, mezclar_sin_repetidos
+)
+from almacenes.instantanea import huella_archivo
+from almacenes.memoria import AlmacenEnMemoria
+from almacenes.facetas import FacetasVinos
+from almacenes.nombres import IndiceNombres, IndiceTrigramas
+
+if TYPE_CHECKING:
+    from modelos.bodega import Bodega
+    from modelos.cepa import Cepa
+    from modelos.vino import Vino
+
+# Cabecera: marca, versión del formato, plataforma, tamaño, fecha de
+# modificación y huella SHA-1 del archivo de datos, y cantidad de secciones.
+# La sigue el directorio de secciones: nombre, tipo de array, desplazamiento
+# y longitud en bytes.
+_MARCA = b"VINOMAPA"
+_FORMATO = 3
+_CABECERA = struct.Struct("<8sH8sQq20sI")
+_ENTRADA = struct.Struct("<32sc7xQQ")
+_PLATAFORMA = (
+    sys.byteorder[0] + str(array('I').itemsize)
+    + str(array('Q').itemsize)
+).encode("ascii").ljust(8, b"\0")
+# Alineación de cada sección dentro del archivo
+_ALINEACION = 8
+# Enteros por registro de bodega o cepa (id, nombre) y de vino
+# (id, nombre, referencia a la bodega)
+_ANCHO_ENTIDAD = 2
+_ANCHO_VINO = 3
+
+
+def ruta_mapa(archivo: str) -> str:
+    """
+    Obtiene la ruta del mapa de un archivo de datos.
+
+    Args:
+        archivo: Ruta del archivo de datos
+
+    Returns:
+        Ruta del archivo de mapa, junto al de datos
+    """
+    return archivo + ".mapa"
+
+
+def _secciones_del_almacen(almacen: AlmacenEnMemoria) -> Dict[str, array]:
+    """
+    Convierte el estado exportado de un almacén en las secciones del mapa.
+
+    Args:
+        almacen: Almacén a convertir
+
+    Returns:
+        Arreglo de cada sección, por nombre
+    """
+    estado = almacen.exportar()
+    cadenas: Dict[str, int] = {}
+
+    def cadena(texto: str) -> int:
+        return cadenas.setdefault(texto, len(cadenas))
+
+    def posiciones(contenido: bytes) -> array:
+        arreglo = array('I')
+        arreglo.frombytes(contenido)
+        return arreglo
+
+    def registros(entidades: Iterable[Tuple[str, str]]) -> array:
+        arreglo = array('i')
+        for id_, nombre in entidades:
+            arreglo.extend((cadena(id_), cadena(nombre)))
+        return arreglo
+
+    def tabla(listas: Iterable[Iterable[int]], tipo: str) -> Tuple[array, array]:
+        valores = array(tipo)
+        offsets = array('I', [0])
+        for lista in listas:
+            valores.extend(lista)
+            offsets.append(len(valores))
+        return valores, offsets
+
+    secciones: Dict[str, array] = {
+        "version": array('i', [cadena(estado["version"])]),
+        "bodegas": registros(estado["bodegas"]),
+        "cepas": registros(estado["cepas"]),
+    }
+    posicion_bodega = {id_: i for i, (id_, _) in enumerate(estado["bodegas"])}
+    posicion_cepa = {id_: i for i, (id_, _) in enumerate(estado["cepas"])}
+
+    def referencia(id_: str, posiciones_por_id: Dict[str, int]) -> int:
+        posicion = posiciones_por_id.get(id_)
+        return posicion if posicion is not None else -cadena(id_) - 1
+
+    vinos = array('i')
+    for id_, nombre, bodega_id, _, _ in estado["vinos"]:
+        vinos.extend((
+            cadena(id_), cadena(nombre), referencia(bodega_id, posicion_bodega)
+        ))
+    secciones["vinos"] = vinos
+    secciones["vinos.cepas"], secciones["vinos.cepas.offsets"] = tabla((
+        [referencia(cepa_id, posicion_cepa) for cepa_id in cepa_ids]
+        for _, _, _, cepa_ids, _ in estado["vinos"]
+    ), 'i')
+    secciones["vinos.partidas"], secciones["vinos.partidas.offsets"] = tabla(
+        (partidas for _, _, _, _, partidas in estado["vinos"]), 'i'
+    )
+
+    # Índices de relaciones por ID, con las claves ordenadas por su texto
+    for nombre, relacion in (
+        ("vinos_por_bodega", estado["vinos_por_bodega"]),
+        ("vinos_por_cepa", estado["vinos_por_cepa"]),
+    ):
+        claves = sorted(relacion)
+        secciones[nombre + ".claves"] = array('i', map(cadena, claves))
+        secciones[nombre], secciones[nombre + ".offsets"] = tabla(
+            (posiciones(relacion[clave]) for clave in claves), 'I'
+        )
+    claves = sorted(estado["cepas_por_bodega"])
+    secciones["cepas_por_bodega.claves"] = array('i', map(cadena, claves))
+    secciones["cepas_por_bodega"], secciones["cepas_por_bodega.offsets"] = tabla(
+        (
+            [posicion_cepa[cepa_id] for cepa_id in estado["cepas_por_bodega"][clave]]
+            for clave in claves
+        ), 'I'
+    )
+
+    anios = sorted(estado["posiciones_por_anio"])
+    secciones["anios"] = array('i', anios)
+    secciones["anios.posiciones"], secciones["anios.offsets"] = tabla(
+        (posiciones(estado["posiciones_por_anio"][anio]) for anio in anios), 'I'
+    )
+
+    for coleccion, permutaciones in estado["permutaciones"].items():
+        for campo, permutacion in permutaciones.items():
+            secciones[f"permutacion.{coleccion}.{campo}"] = posiciones(permutacion)
+    for campo, rangos in estado["rangos_vinos"].items():
+        secciones["rangos." + campo] = posiciones(rangos)
+
+    # Montículo de cadenas, en el orden de sus índices
+    textos = [texto.encode("utf-8") for texto in cadenas]
+    secciones["cadenas"] = array('B', b"".join(textos))
+    offsets = array('Q', [0])
+    for texto in textos:
+        offsets.append(offsets[-1] + len(texto))
+    secciones["cadenas.offsets"] = offsets
+    return secciones
+
+
+def escribir_mapa(
+    almacen: AlmacenEnMemoria,
+    archivo: str,
+    tamanio: int,
+    mtime_ns: int
+) -> bool:
+    """
+    Escribe el mapa de un almacén construido desde un archivo de datos.
+
+    El mapa se escribe en un archivo temporal que luego reemplaza al
+    anterior; los procesos que tienen abierto el anterior lo siguen leyendo
+    sin cambios hasta que lo descartan.
+
+    Args:
+        almacen: Almacén a escribir
+        archivo: Ruta del archivo de datos del que se construyó el almacén
+        tamanio: Tamaño del archivo de datos al leerlo
+        mtime_ns: Fecha de modificación del archivo de datos al leerlo
+
+    Returns:
+        False si el archivo de datos cambió desde que se leyó, en cuyo caso
+        no se escribe nada
+
+    Raises:
+        OSError: Si el mapa no puede escribirse
+    """
+    huella = huella_archivo(archivo)
+    estado = os.stat(archivo)
+    if (estado.st_size, estado.st_mtime_ns) != (tamanio, mtime_ns):
+        return False
+    secciones = _secciones_del_almacen(almacen)
+
+    directorio = []
+    desplazamiento = _CABECERA.size + _ENTRADA.size * len(secciones)
+    for nombre, arreglo in secciones.items():
+        desplazamiento += -desplazamiento % _ALINEACION
+        longitud = len(arreglo) * arreglo.itemsize
+        directorio.append(_ENTRADA.pack(
+            nombre.encode("ascii"), arreglo.typecode.encode("ascii"),
+            desplazamiento, longitud
+        ))
+        desplazamiento += longitud
+
+    destino = ruta_mapa(archivo)
+    descriptor, temporal = tempfile.mkstemp(
+        prefix=os.path.basename(destino) + ".",
+        dir=os.path.dirname(os.path.abspath(destino))
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as salida:
+            salida.write(_CABECERA.pack(
+                _MARCA, _FORMATO, _PLATAFORMA, tamanio, mtime_ns, huella,
+                len(secciones)
+            ))
+            salida.write(b"".join(directorio))
+            for arreglo in secciones.values():
+                salida.write(bytes(-salida.tell() % _ALINEACION))
+                arreglo.tofile(salida)
+        os.replace(temporal, destino)
+    except BaseException:
+        os.remove(temporal)
+        raise
+    return True
+
+
+def abrir_mapa(
+    archivo: str,
+    tamanio: int,
+    mtime_ns: int,
+    fecha_modificacion: Optional[datetime] = None
+) -> Optional['AlmacenMapeado']:
+    """
+    Abre el mapa de un archivo de datos, si corresponde a su contenido
+    actual.
+
+    Args:
+        archivo: Ruta del archivo de datos
+        tamanio: Tamaño actual del archivo de datos
+        mtime_ns: Fecha de modificación actual del archivo de datos
+        fecha_modificacion: Fecha de modificación para el almacén
+
+    Returns:
+        Almacén sobre el mapa, o None si no hay mapa, es de otro archivo,
+        de otro formato o plataforma, o está dañado
+    """
+    try:
+        almacen = AlmacenMapeado(ruta_mapa(archivo), fecha_modificacion)
+    except (OSError, ValueError):
+        return None
+    tamanio_origen, mtime_origen, huella = almacen.obtener_origen()
+    if (tamanio_origen, mtime_origen) != (tamanio, mtime_ns):
+        return None
+    try:
+        if huella != huella_archivo(archivo):
+            return None
+    except OSError:
+        return None
+    return almacen
+
+
+class _Coleccion(Sequence):
+    """
+    Secuencia de solo lectura que crea cada entidad al accederla, sin
+    guardarla.
+    """
+
+    def __init__(self, cantidad: int, crear: Callable[[int], Any]) -> None:
+        """
+        Args:
+            cantidad: Cantidad de entidades
+            crear: Crea la entidad de una posición
+        """
+        self.__cantidad = cantidad
+        self.__crear = crear
+
+    def __len__(self) -> int:
+        return self.__cantidad
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self.__crear(i) for i in range(*indice.indices(self.__cantidad))]
+        if indice < 0:
+            indice += self.__cantidad
+        if not 0 <= indice < self.__cantidad:
+            raise IndexError("Posición fuera de rango")
+        return self.__crear(indice)
+
+
+class AlmacenMapeado(Almacen):
+    """
+    Almacén de solo lectura que resuelve las consultas directamente sobre
+    un archivo de mapa abierto con mmap.
+
+    Las colecciones, búsquedas e índices devuelven entidades creadas en cada
+    consulta, por lo que dos consultas sobre la misma entidad obtienen
+    objetos distintos; por eso el JSON de las entidades no se guarda entre
+    consultas. Las permutaciones, rangos y posiciones se devuelven como
+    memoryview sobre el mapa, sin copiarlos.
+    """
+
+    def __init__(
+        self,
+        ruta: str,
+        fecha_modificacion: Optional[datetime] = None
+    ) -> None:
+        """
+        Abre un archivo de mapa.
+
+        Args:
+            ruta: Ruta del archivo de mapa
+            fecha_modificacion: Fecha de modificación del archivo de datos
+
+        Raises:
+            OSError: Si el mapa no puede abrirse
+            ValueError: Si el archivo no es un mapa válido en esta plataforma
+        """
+        with open(ruta, "rb") as archivo:
+            if os.fstat(archivo.fileno()).st_size < _CABECERA.size:
+                raise ValueError("Mapa incompleto")
+            self.__mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        vista = memoryview(self.__mapa)
+        (
+            marca, formato, plataforma, tamanio, mtime_ns, huella, cantidad
+        ) = _CABECERA.unpack_from(vista)
+        if (marca, formato, plataforma) != (_MARCA, _FORMATO, _PLATAFORMA):
+            raise ValueError("Formato de mapa no válido")
+        self.__origen = (tamanio, mtime_ns, huella)
+        self.__fecha_modificacion = fecha_modificacion
+
+        secciones: Dict[str, memoryview] = {}
+        for i in range(cantidad):
+            nombre, tipo, desplazamiento, longitud = _ENTRADA.unpack_from(
+                vista, _CABECERA.size + i * _ENTRADA.size
+            )
+            if desplazamiento + longitud > len(vista):
+                raise ValueError("Mapa incompleto")
+            secciones[nombre.rstrip(b"\0").decode("ascii")] = vista[
+                desplazamiento:desplazamiento + longitud
+            ].cast(tipo.decode("ascii"))
+        try:
+            self.__cadenas = secciones["cadenas"]
+            self.__offsets_cadenas = secciones["cadenas.offsets"]
+            self.__bodegas = secciones["bodegas"]
+            self.__cepas = secciones["cepas"]
+            self.__vinos = secciones["vinos"]
+            self.__cepas_de_vino = secciones["vinos.cepas"]
+            self.__offsets_cepas_de_vino = secciones["vinos.cepas.offsets"]
+            self.__relaciones = {
+                nombre: (
+                    secciones[nombre + ".claves"],
+                    secciones[nombre + ".offsets"],
+                    secciones[nombre],
+                )
+                for nombre in (
+                    "vinos_por_bodega", "vinos_por_cepa", "cepas_por_bodega"
+                )
+            }
+            self.__anios = secciones["anios"]
+            self.__offsets_anios = secciones["anios.offsets"]
+            self.__posiciones_anios = secciones["anios.posiciones"]
+            self.__permutaciones = {
+                coleccion: {
+                    campo: secciones[f"permutacion.{coleccion}.{campo}"]
+                    for campo in claves
+                }
+                for coleccion, claves in (
+                    ("bodegas", ("id", "nombre")),
+                    ("cepas", ("id", "nombre")),
+                    ("vinos", tuple(CLAVES_VINOS)),
+                )
+            }
+            self.__rangos_vinos = {
+                campo: secciones["rangos." + campo] for campo in CLAVES_VINOS
+            }
+            self.__partidas = secciones["vinos.partidas"]
+            self.__offsets_partidas = secciones["vinos.partidas.offsets"]
+            self.__version = self.__cadena(secciones["version"][0])
+        except KeyError as error:
+            raise ValueError(f"Falta la sección {error} del mapa") from None
+
+        self.__nombres: Dict[str, IndiceNombres] = {}
+        self.__trigramas: Dict[str, IndiceTrigramas] = {}
+        self.__facetas: Optional[FacetasVinos] = None
+        self.__cantidad_bodegas = len(self.__bodegas) // _ANCHO_ENTIDAD
+        self.__cantidad_cepas = len(self.__cepas) // _ANCHO_ENTIDAD
+        self.__cantidad_vinos = len(self.__vinos) // _ANCHO_VINO
+        self.__coleccion_bodegas = _Coleccion(
+            self.__cantidad_bodegas, self.__bodegaEn
+        )
+        self.__coleccion_cepas = _Coleccion(self.__cantidad_cepas, self.__cepaEn)
+        self.__coleccion_vinos = _Coleccion(self.__cantidad_vinos, self.__vinoEn)
+
+    def obtener_origen(self) -> Tuple[int, int, bytes]:
+        """
+        Obtiene los datos del archivo del que se escribió el mapa.
+
+        Returns:
+            Tupla (tamaño, fecha de modificación en nanosegundos, huella
+            SHA-1 binaria)
+        """
+        return self.__origen
+
+    def __cadena(self, indice: int) -> str:
+        """Texto de una cadena del montículo."""
+        return str(
+            self.__cadenas[
+                self.__offsets_cadenas[indice]:self.__offsets_cadenas[indice + 1]
+            ],
+            "utf-8"
+        )
+
+    def __bytesDeCadena(self, indice: int) -> bytes:
+        """Bytes UTF-8 de una cadena del montículo, para compararla."""
+        return self.__cadenas[
+            self.__offsets_cadenas[indice]:self.__offsets_cadenas[indice + 1]
+        ].tobytes()
+
+    def __idEn(self, registros: memoryview, ancho: int, posicion: int) -> str:
+        """ID del registro de una posición."""
+        return self.__cadena(registros[posicion * ancho])
+
+    def __buscarPosicion(
+        self,
+        registros: memoryview,
+        ancho: int,
+        permutacion: memoryview,
+        id_: str
+    ) -> Optional[int]:
+        """
+        Busca la posición de un ID con búsqueda binaria sobre la permutación
+        por ID. El orden de los bytes UTF-8 coincide con el de los textos.
+
+        Returns:
+            Posición del registro con ese ID, o None si no existe. Si el ID
+            está repetido, la del último registro, como en los demás
+            almacenes.
+        """
+        objetivo = id_.encode("utf-8")
+        indice = bisecar(
+            permutacion, objetivo,
+            lambda posicion: self.__bytesDeCadena(registros[posicion * ancho])
+        )
+        encontrada = None
+        while indice < len(permutacion):
+            posicion = permutacion[indice]
+            if self.__bytesDeCadena(registros[posicion * ancho]) != objetivo:
+                break
+            if encontrada is None or posicion > encontrada:
+                encontrada = posicion
+            indice += 1
+        return encontrada
+
+    def __posicionDeBodega(self, id_: str) -> Optional[int]:
+        return self.__buscarPosicion(
+            self.__bodegas, _ANCHO_ENTIDAD,
+            self.__permutaciones["bodegas"]["id"], id_
+        )
+
+    def __posicionDeCepa(self, id_: str) -> Optional[int]:
+        return self.__buscarPosicion(
+            self.__cepas, _ANCHO_ENTIDAD, self.__permutaciones["cepas"]["id"], id_
+        )
+
+    def __posicionDeVino(self, id_: str) -> Optional[int]:
+        return self.__buscarPosicion(
+            self.__vinos, _ANCHO_VINO, self.__permutaciones["vinos"]["id"], id_
+        )
+
+    def __bodegaEn(self, posicion: int) -> 'Bodega':
+        """Crea la bodega de una posición."""
+        from modelos.bodega import Bodega
+        inicio = posicion * _ANCHO_ENTIDAD
+        return Bodega(
+            self.__cadena(self.__bodegas[inicio]),
+            self.__cadena(self.__bodegas[inicio + 1])
+        )
+
+    def __cepaEn(self, posicion: int) -> 'Cepa':
+        """Crea la cepa de una posición."""
+        from modelos.cepa import Cepa
+        inicio = posicion * _ANCHO_ENTIDAD
+        return Cepa(
+            self.__cadena(self.__cepas[inicio]),
+            self.__cadena(self.__cepas[inicio + 1])
+        )
+
+    def __vinoEn(self, posicion: int) -> 'Vino':
+        """Crea el vino de una posición con sus referencias resueltas."""
+        from modelos.vino import Vino
+        inicio = posicion * _ANCHO_VINO
+        id_, nombre, bodega = self.__vinos[inicio:inicio + _ANCHO_VINO]
+        cepas = self.__cepas_de_vino[
+            self.__offsets_cepas_de_vino[posicion]:
+            self.__offsets_cepas_de_vino[posicion + 1]
+        ]
+        return Vino(
+            self.__cadena(id_),
+            self.__cadena(nombre),
+            self.__referencia(bodega, self.__bodegaEn),
+            [self.__referencia(cepa, self.__cepaEn) for cepa in cepas],
+            self.__partidas[
+                self.__offsets_partidas[posicion]:
+                self.__offsets_partidas[posicion + 1]
+            ].tolist()
+        )
+
+    def __referencia(self, referencia: int, crear: Callable[[int], Any]) -> Any:
+        """Entidad de una referencia, o su ID si la entidad no existe."""
+        if referencia >= 0:
+            return crear(referencia)
+        return self.__cadena(-referencia - 1)
+
+    def __relacion(self, nombre: str, id_: str) -> memoryview:
+        """Posiciones asociadas a un ID en un índice de relación."""
+        claves, offsets, posiciones = self.__relaciones[nombre]
+        objetivo = id_.encode("utf-8")
+        indice = bisecar(
+            range(len(claves)), objetivo,
+            lambda i: self.__bytesDeCadena(claves[i])
+        )
+        if indice < len(claves) and self.__bytesDeCadena(claves[indice]) == objetivo:
+            return posiciones[offsets[indice]:offsets[indice + 1]]
+        return posiciones[0:0]
+
+    def obtener_version(self) -> str:
+        return self.__version
+
+    def obtener_fecha_modificacion(self) -> Optional[datetime]:
+        return self.__fecha_modificacion
+
+    def obtener_bodegas(self) -> Sequence['Bodega']:
+        return self.__coleccion_bodegas
+
+    def obtener_cepas(self) -> Sequence['Cepa']:
+        return self.__coleccion_cepas
+
+    def obtener_vinos(self) -> Sequence['Vino']:
+        return self.__coleccion_vinos
+
+    def buscar_bodega(self, id: str) -> Optional['Bodega']:
+        posicion = self.__posicionDeBodega(id)
+        return self.__bodegaEn(posicion) if posicion is not None else None
+
+    def buscar_cepa(self, id: str) -> Optional['Cepa']:
+        posicion = self.__posicionDeCepa(id)
+        return self.__cepaEn(posicion) if posicion is not None else None
+
+    def buscar_vino(self, id: str) -> Optional['Vino']:
+        posicion = self.__posicionDeVino(id)
+        return self.__vinoEn(posicion) if posicion is not None else None
+
+    def obtener_vinos_de_bodega(self, bodega_id: str) -> List['Vino']:
+        return list(map(
+            self.__vinoEn, self.__relacion("vinos_por_bodega", bodega_id)
+        ))
+
+    def obtener_vinos_de_cepa(self, cepa_id: str) -> List['Vino']:
+        return list(map(
+            self.__vinoEn, self.__relacion("vinos_por_cepa", cepa_id)
+        ))
+
+    def obtener_cepas_de_bodega(self, bodega_id: str) -> List['Cepa']:
+        return list(map(
+            self.__cepaEn, self.__relacion("cepas_por_bodega", bodega_id)
+        ))
+
+    def obtener_permutacion(self, coleccion: str, orden: str) -> memoryview:
+        permutaciones = self.__permutaciones[coleccion]
+        if orden not in permutaciones:
+            raise ValueError(f"Orden no válido: {orden}")
+        return permutaciones[orden]
+
+    def obtener_rangos_vinos(self, orden: str) -> memoryview:
+        return self.__rangos_vinos[orden]
+
+    def posiciones_por_anios(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> Optional[Iterable[int]]:
+        if anio_desde is None and anio_hasta is None:
+            return None
+        inicio = (
+            bisect_left(self.__anios, anio_desde) if anio_desde is not None
+            else 0
+        )
+        fin = (
+            bisect_right(self.__anios, anio_hasta) if anio_hasta is not None
+            else len(self.__anios)
+        )
+        offsets = self.__offsets_anios
+        listas = [
+            self.__posiciones_anios[offsets[i]:offsets[i + 1]]
+            for i in range(inicio, fin)
+        ]
+        if len(listas) <= 1:
+            return listas[0] if listas else []
+        return mezclar_sin_repetidos(listas)
+
+    def listas_por_anio(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> List[Sequence[int]]:
+        return self.__obtenerFacetas().listas_de_anios(anio_desde, anio_hasta)
+
+    def listas_por_relacion(
+        self,
+        coleccion: str,
+        ids: Iterable[str]
+    ) -> List[Sequence[int]]:
+        posicion_de = {
+            "bodegas": self.__posicionDeBodega,
+            "cepas": self.__posicionDeCepa,
+        }[coleccion]
+        facetas = self.__obtenerFacetas()
+        listas = []
+        for id_ in ids:
+            posicion = posicion_de(id_)
+            listas.append(
+                facetas.lista(coleccion, posicion) if posicion is not None
+                else ()
+            )
+        return listas
+
+    def contar_facetas(
+        self,
+        posiciones: Optional[Sequence[int]]
+    ) -> Tuple[int, Dict[str, Dict[int, int]]]:
+        return self.__obtenerFacetas().contar(posiciones)
+
+    def __obtenerFacetas(self) -> FacetasVinos:
+        """
+        El mapa no incluye las listas por bodega y cepa en el formato de las
+        facetas: se arman en memoria invirtiendo las referencias de los
+        registros de vinos y sus partidas la primera vez que se usan, y se
+        conservan mientras viva el almacén.
+        """
+        if self.__facetas is None:
+            self.__facetas = FacetasVinos.desde_columnas(
+                self.__vinos[_ANCHO_VINO - 1::_ANCHO_VINO],
+                self.__partidas, self.__offsets_partidas,
+                self.__cepas_de_vino, self.__offsets_cepas_de_vino
+            )
+        return self.__facetas
+
+    def buscar_por_prefijo(
+        self,
+        coleccion: str,
+        prefijo: str,
+        limite: int
+    ) -> List[int]:
+        """
+        El mapa no incluye un índice de nombres normalizados: se arma en
+        memoria la primera vez que se busca en la colección, leyendo solo
+        los nombres del montículo, y se conserva mientras viva el almacén.
+        """
+        indice = self.__nombres.get(coleccion)
+        if indice is None:
+            indice = IndiceNombres(self.__nombresDe(coleccion))
+            self.__nombres[coleccion] = indice
+        return indice.buscar(prefijo, limite)
+
+    def buscar_similares(
+        self,
+        coleccion: str,
+        texto: str,
+        limite: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Como el de nombres, el índice de trigramas se arma en memoria la
+        primera vez que se busca en la colección.
+        """
+        indice = self.__trigramas.get(coleccion)
+        if indice is None:
+            indice = IndiceTrigramas(self.__nombresDe(coleccion))
+            self.__trigramas[coleccion] = indice
+        return indice.buscar(texto, limite)
+
+    def __nombresDe(self, coleccion: str) -> Iterator[str]:
+        """Nombres de una colección, leídos del montículo, por posición."""
+        registros, ancho = {
+            "bodegas": (self.__bodegas, _ANCHO_ENTIDAD),
+            "cepas": (self.__cepas, _ANCHO_ENTIDAD),
+            "vinos": (self.__vinos, _ANCHO_VINO),
+        }[coleccion]
+        return map(self.__cadena, registros[1::ancho])
+
+    def obtener_fragmentos(self) -> Dict[Tuple[str, str, bool], bytes]:
+        # Las entidades no se conservan entre consultas: no hay JSON que
+        # reutilizar
+        return {}
+
+    def contiene(self, entidad: Any) -> bool:
+        """
+        Las entidades se crean en cada consulta, por lo que ninguna es la
+        instancia publicada por este almacén.
+
+        Returns:
+            Siempre False
+        """
+        return False
@@ -0,0 +1,1708 @@
+"""Almacén de la vinoteca con todas las entidades e índices en memoria."""
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from itertools import chain
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional,
+    Sequence, Set, Tuple, TYPE_CHECKING, Union
+)
+
+from almacenes.base import (
+    Almacen, CLAVES_BODEGAS, CLAVES_CEPAS, CLAVES_VINOS, bisecar, fila_json,
+    mezclar_sin_repetidos, validar_partidas
+)
+from almacenes.facetas import FacetasVinos, fila_de_vino
+from almacenes.nombres import IndiceNombres, IndiceTrigramas
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se recorre el tramo
+    np = None
+
+if TYPE_CHECKING:
+    from modelos.bodega import Bodega
+    from modelos.cepa import Cepa
+    from modelos.vino import Vino
+
+
+# Secciones del archivo de datos, en el orden en que se construyen
+_SECCIONES = ('bodegas', 'cepas', 'vinos')
+
+# Datos de un almacén: el diccionario del archivo JSON o sus secciones
+# (clave, filas) en el orden del archivo, como las recorre LectorJson
+Datos = Union[Mapping[str, Iterable[Dict]], Iterable[Tuple[str, Iterable[Dict]]]]
+
+# Versión de los datos, o función que la obtiene una vez leídos
+Version = Union[str, Callable[[], str]]
+
+# Cambio puntual de una entidad: (colección, ID, fila JSON completa), con
+# la fila None para eliminarla
+Cambio = Tuple[str, str, Optional[Dict]]
+
+
+def _secciones_en_orden(datos: Datos) -> Iterator[Iterable[Dict]]:
+    """
+    Recorre las filas de bodegas, cepas y vinos, en ese orden.
+
+    Si los datos son un recorrido de secciones, cada sección se entrega sin
+    copiarla cuando llega en su turno; solo las que llegan antes de tiempo
+    se guardan en una lista. Las secciones desconocidas se descartan y,
+    una vez entregados los vinos, el recorrido se agota para que el origen
+    termine de leerse.
+
+    Args:
+        datos: Diccionario con las listas o recorrido de secciones
+
+    Returns:
+        Iterador con las filas de cada sección; las ausentes están vacías
+    """
+    if isinstance(datos, Mapping):
+        for clave in _SECCIONES:
+            yield datos.get(clave, [])
+        return
+    secciones = iter(datos)
+    pendientes: Dict[str, List[Dict]] = {}
+    for clave in _SECCIONES:
+        if clave in pendientes:
+            yield pendientes.pop(clave)
+            continue
+        for otra, filas in secciones:
+            if otra == clave:
+                yield filas
+                break
+            if otra in _SECCIONES:
+                pendientes[otra] = list(filas)
+        else:
+            yield []
+    for _ in secciones:
+        pass
+
+
+def _registrar_huellas(filas: Iterable[Dict], huellas: array) -> Iterator[Dict]:
+    """
+    Recorre las filas de vinos agregando la huella de cada una a huellas
+    antes de entregarla.
+
+    Args:
+        filas: Filas JSON de los vinos
+        huellas: Arreglo donde se acumulan las huellas, por posición
+
+    Returns:
+        Iterador de las mismas filas
+    """
+    for fila in filas:
+        huellas.append(huella_vino(fila))
+        yield fila
+
+
+def _crear_vino(vino_data: Dict) -> 'Vino':
+    """
+    Crea un vino, sin resolver sus referencias, desde su fila JSON.
+
+    Raises:
+        ValueError: Si el año de alguna partida no es válido
+    """
+    from modelos.vino import Vino
+    validar_partidas(vino_data['id'], vino_data['partidas'])
+    return Vino(
+        sys.intern(vino_data['id']),
+        vino_data['nombre'],
+        sys.intern(vino_data['bodega']),
+        [sys.intern(cepa_id) for cepa_id in vino_data['cepas']],
+        vino_data['partidas']
+    )
+
+
+def crear_entidad(coleccion: str, fila: Dict) -> Any:
+    """
+    Crea una bodega, cepa o vino, sin resolver sus referencias, desde su
+    fila JSON.
+
+    Raises:
+        ValueError: Si el año de alguna partida de un vino no es válido
+    """
+    from modelos.bodega import Bodega
+    from modelos.cepa import Cepa
+    if coleccion == 'vinos':
+        return _crear_vino(fila)
+    clase = Bodega if coleccion == 'bodegas' else Cepa
+    return clase(sys.intern(fila['id']), fila['nombre'])
+
+
+def huella_vino(vino_data: Dict) -> int:
+    """Huella del contenido de la fila JSON de un vino."""
+    return hash((
+        vino_data['nombre'], vino_data['bodega'],
+        tuple(vino_data['cepas']), tuple(vino_data['partidas'])
+    ))
+
+
+def _agrupar_por_relacion(
+    vino: 'Vino',
+    posicion: int,
+    por_bodega: Dict[str, List[Tuple[int, 'Vino']]],
+    por_cepa: Dict[str, List[Tuple[int, 'Vino']]]
+) -> None:
+    """Agrega (posición, vino) al grupo de su bodega y de cada cepa."""
+    por_bodega.setdefault(vino.obtener_bodega_id(), []).append((posicion, vino))
+    for cepa_id in dict.fromkeys(vino.obtener_cepa_ids()):
+        por_cepa.setdefault(cepa_id, []).append((posicion, vino))
+
+
+def _parchear_listas(
+    anteriores: Dict[str, List['Vino']],
+    salientes: Dict[str, List[Tuple[int, 'Vino']]],
+    entrantes: Dict[str, List[Tuple[int, 'Vino']]],
+    posicion_de: Callable[['Vino'], int]
+) -> Dict[str, List['Vino']]:
+    """
+    Copia un índice inverso rearmando solo las listas de las claves en las
+    que entran o salen vinos.
+
+    Las listas se copian por tramos entre los vinos que salen o entran,
+    que se ubican por búsqueda binaria según su posición.
+
+    Args:
+        anteriores: Índice inverso clave -> vinos, en orden de posición
+        salientes: Vinos reemplazados por clave, como (posición, vino)
+        entrantes: Vinos creados por clave, como (posición, vino)
+        posicion_de: Posición de un vino de las listas anteriores
+
+    Returns:
+        Índice inverso nuevo
+    """
+    indice = dict(anteriores)
+    for clave in set(salientes).union(entrantes):
+        anterior = anteriores.get(clave, [])
+        operaciones = sorted(
+            [(posicion, 0, vino) for posicion, vino in salientes.get(clave, [])]
+            + [(posicion, 1, vino) for posicion, vino in entrantes.get(clave, [])],
+            key=lambda operacion: operacion[:2]
+        )
+        lista: List['Vino'] = []
+        desde = 0
+        for posicion, entra, vino in operaciones:
+            hasta = bisecar(
+                range(len(anterior)), posicion,
+                lambda indice_anterior: posicion_de(anterior[indice_anterior])
+            )
+            lista.extend(anterior[desde:hasta])
+            desde = max(desde, hasta)
+            if entra:
+                lista.append(vino)
+            else:
+                desde = hasta + 1
+        lista.extend(anterior[desde:])
+        if lista:
+            indice[clave] = lista
+        else:
+            indice.pop(clave, None)
+    return indice
+
+
+def _parchear_permutacion(
+    permutacion: array,
+    anteriores: Sequence[Any],
+    nuevas: Sequence[Any],
+    creadas: Sequence[int],
+    clave: Callable[[Any], Any]
+) -> Tuple[array, int, int]:
+    """
+    Corrige una permutación ordenada por (clave, id) reubicando solo las
+    posiciones de las entidades creadas cuya clave cambió.
+
+    Args:
+        permutacion: Permutación de la colección anterior
+        anteriores: Colección anterior
+        nuevas: Colección nueva; las posiciones anteriores se conservan
+        creadas: Posiciones de las entidades creadas, en orden creciente
+        clave: Función de clave del campo de ordenamiento
+
+    Returns:
+        Tupla con la permutación nueva y el tramo [inicio, fin) de índices
+        cuyo contenido puede haber cambiado
+    """
+    def clave_anterior(posicion: int) -> Tuple[Any, str]:
+        entidad = anteriores[posicion]
+        return clave(entidad), entidad.obtener_id()
+
+    def clave_nueva(posicion: int) -> Tuple[Any, str]:
+        entidad = nuevas[posicion]
+        return clave(entidad), entidad.obtener_id()
+
+    cantidad = len(anteriores)
+    movidas = [
+        posicion for posicion in creadas
+        if posicion >= cantidad or clave_anterior(posicion) != clave_nueva(posicion)
+    ]
+    if not movidas:
+        return permutacion, 0, 0
+    quitados = []
+    for posicion in movidas:
+        if posicion < cantidad:
+            indice = bisecar(permutacion, clave_anterior(posicion), clave_anterior)
+            while permutacion[indice] != posicion:
+                indice += 1
+            quitados.append(indice)
+    resultado = array('I', permutacion)
+    for indice in sorted(quitados, reverse=True):
+        del resultado[indice]
+    for posicion in movidas:
+        resultado.insert(
+            bisecar(resultado, clave_nueva(posicion), clave_nueva), posicion
+        )
+    insertados = [
+        bisecar(resultado, clave_nueva(posicion), clave_nueva)
+        for posicion in movidas
+    ]
+    inicio = min(quitados + insertados)
+    if len(resultado) != len(permutacion):
+        return resultado, inicio, len(resultado)
+    return resultado, inicio, max(quitados + insertados) + 1
+
+
+def _parchear_rangos(
+    rangos: array,
+    permutacion: array,
+    inicio: int,
+    fin: int
+) -> array:
+    """
+    Actualiza la inversa de una permutación en un tramo de índices.
+
+    Args:
+        rangos: Inversa de la permutación anterior
+        permutacion: Permutación nueva
+        inicio: Primer índice de la permutación que cambió
+        fin: Índice siguiente al último que cambió
+
+    Returns:
+        Inversa de la permutación nueva
+    """
+    if inicio == fin and len(rangos) == len(permutacion):
+        return rangos
+    nuevos = array('I', rangos)
+    if len(nuevos) < len(permutacion):
+        nuevos.extend([0] * (len(permutacion) - len(nuevos)))
+    if np is not None and fin > inicio:
+        # Asignación vectorizada sobre el mismo buffer del array nuevo
+        np.frombuffer(nuevos, dtype=np.uint32)[
+            np.frombuffer(permutacion, dtype=np.uint32)[inicio:fin]
+        ] = np.arange(inicio, fin, dtype=np.uint32)
+        return nuevos
+    for rango in range(inicio, fin):
+        nuevos[permutacion[rango]] = rango
+    return nuevos
+
+
+def _eliminar_tramo(
+    coleccion: str,
+    entidades: Sequence[Any],
+    buscar: Callable[[str], Any],
+    desde: int,
+    hasta: int,
+    cambios: List[Cambio],
+    maximo: int
+) -> bool:
+    """
+    Agrega a cambios las bajas de las entidades de un tramo de posiciones.
+
+    Returns:
+        False si los cambios superarían el máximo o si alguna entidad no
+        es la que se encuentra por su ID (IDs repetidos)
+    """
+    if len(cambios) + hasta - desde > maximo:
+        return False
+    for posicion in range(desde, hasta):
+        entidad = entidades[posicion]
+        if buscar(entidad.obtener_id()) is not entidad:
+            return False
+        cambios.append((coleccion, entidad.obtener_id(), None))
+    return True
+
+
+def _diferencias_de_seccion(
+    almacen: Almacen,
+    coleccion: str,
+    filas: Iterator[Dict],
+    leidas: List[Any],
+    cambios: List[Cambio],
+    maximo: int
+) -> bool:
+    """
+    Compara las filas de una sección con la colección de un almacén,
+    recorriéndolas en paralelo: mientras las entidades conserven su orden
+    cada fila se compara con la de la posición siguiente (los vinos, por
+    la huella de su contenido), y solo las que no coinciden se buscan por
+    ID.
+
+    Args:
+        almacen: Almacén con la versión anterior de los datos
+        coleccion: bodegas, cepas o vinos
+        filas: Filas de la sección, que se consumen
+        leidas: Donde se agrega, por cada fila consumida, la posición de
+            su entidad si no cambió o la fila misma
+        cambios: Donde se agregan los cambios de la colección
+        maximo: Cantidad máxima de cambios
+
+    Returns:
+        True si la sección equivale a aplicar los cambios: las entidades
+        que siguen existiendo conservan su orden, las nuevas están al final
+        y no se supera el máximo
+    """
+    entidades, buscar = {
+        "bodegas": (almacen.obtener_bodegas(), almacen.buscar_bodega),
+        "cepas": (almacen.obtener_cepas(), almacen.buscar_cepa),
+        "vinos": (almacen.obtener_vinos(), almacen.buscar_vino),
+    }[coleccion]
+    if not isinstance(entidades, list):
+        entidades = list(entidades)
+    cantidad = len(entidades)
+    if coleccion == "vinos":
+        huellas = almacen.obtener_huellas_vinos()
+
+        def sin_cambios(posicion: int, fila: Dict) -> bool:
+            return huellas[posicion] == huella_vino(fila)
+    else:
+        def sin_cambios(posicion: int, fila: Dict) -> bool:
+            return entidades[posicion].obtener_nombre() == fila['nombre']
+    siguiente = 0
+    altas: Set[str] = set()
+    for fila in filas:
+        id_ = fila['id']
+        if (
+            not altas and siguiente < cantidad
+            and entidades[siguiente].obtener_id() == id_
+        ):
+            posicion = siguiente
+        else:
+            entidad = buscar(id_)
+            if entidad is None and id_ not in altas:
+                altas.add(id_)
+                cambios.append((coleccion, id_, fila))
+                leidas.append(fila)
+                if len(cambios) > maximo:
+                    return False
+                continue
+            if entidad is None or altas:
+                leidas.append(fila)
+                return False
+            posicion = almacen.posicion_de(coleccion, entidad)
+            if posicion < siguiente or not _eliminar_tramo(
+                coleccion, entidades, buscar, siguiente, posicion, cambios,
+                maximo
+            ):
+                leidas.append(fila)
+                return False
+        siguiente = posicion + 1
+        if sin_cambios(posicion, fila):
+            leidas.append(posicion)
+            continue
+        leidas.append(fila)
+        # Con IDs repetidos el cambio no se aplicaría a esta entidad
+        if buscar(id_) is not entidades[posicion]:
+            return False
+        cambios.append((coleccion, id_, fila))
+        if len(cambios) > maximo:
+            return False
+    return _eliminar_tramo(
+        coleccion, entidades, buscar, siguiente, cantidad, cambios, maximo
+    )
+
+
+def _releer(
+    almacen: Almacen,
+    leidas: List[List[Any]],
+    filas: Iterator[Dict],
+    secciones: Iterator[Iterable[Dict]]
+) -> Iterator[Tuple[str, Iterable[Dict]]]:
+    """
+    Recorre las secciones de unos datos de los que ya se consumieron
+    algunas filas: las consumidas se rearman desde las entidades sin
+    cambios del almacén o desde la fila guardada.
+
+    Args:
+        almacen: Almacén con el que se compararon las filas
+        leidas: Filas consumidas de cada sección (ver
+            _diferencias_de_seccion); la última puede estar incompleta
+        filas: Resto de las filas de la última sección consumida
+        secciones: Resto de las secciones de _secciones_en_orden
+    """
+    colecciones = (
+        almacen.obtener_bodegas(), almacen.obtener_cepas(),
+        almacen.obtener_vinos(),
+    )
+    for indice, (clave, entidades) in enumerate(zip(_SECCIONES, colecciones)):
+        if indice < len(leidas):
+            rearmadas = (
+                fila_json(entidades[fila]) if isinstance(fila, int) else fila
+                for fila in leidas[indice]
+            )
+            if indice == len(leidas) - 1:
+                rearmadas = chain(rearmadas, filas)
+            yield clave, rearmadas
+        else:
+            yield clave, next(secciones)
+    for _ in secciones:
+        pass
+
+
+def derivar_con_cambios(
+    almacen: Almacen,
+    datos: Datos,
+    version: Version,
+    fecha_modificacion: Optional[datetime],
+    reconstruir: Callable[[Datos, Version, Optional[datetime]], Almacen]
+) -> Almacen:
+    """
+    Deriva de un almacén que admite aplicar cambios el de una nueva versión
+    de los datos, aplicándole solo las diferencias.
+
+    Las filas se comparan con las entidades por posición y contenido. Si
+    las entidades que siguen existiendo conservan su orden, las nuevas
+    están al final y las diferencias no superan MAXIMO_CAMBIOS, el almacén
+    nuevo se obtiene con aplicar, sin copiar las colecciones ni los
+    índices. Si no, todas las filas se entregan a reconstruir.
+
+    Args:
+        almacen: Almacén con la versión anterior de los datos
+        datos: Diccionario con las listas bodegas, cepas y vinos, o
+            recorrido de sus secciones (clave, filas)
+        version: Huella del contenido del que provienen los datos, o
+            función que la obtiene una vez recorridos los datos
+        fecha_modificacion: Fecha de modificación del archivo de datos
+        reconstruir: Construye el almacén nuevo desde todas las filas
+
+    Returns:
+        Almacén nuevo, equivalente a construirlo desde cero con datos
+    """
+    # Importación dinámica para evitar ciclos
+    from almacenes.capas import MAXIMO_CAMBIOS
+    secciones = _secciones_en_orden(datos)
+    leidas: List[List[Any]] = []
+    cambios: List[Cambio] = []
+    for coleccion in _SECCIONES:
+        filas = iter(next(secciones))
+        leidas.append([])
+        if not _diferencias_de_seccion(
+            almacen, coleccion, filas, leidas[-1], cambios, MAXIMO_CAMBIOS
+        ):
+            return reconstruir(
+                _releer(almacen, leidas, filas, secciones), version,
+                fecha_modificacion
+            )
+    for _ in secciones:
+        pass
+    return almacen.aplicar(
+        cambios, version() if callable(version) else version,
+        fecha_modificacion
+    )
+
+
+class AlmacenEnMemoria(Almacen):
+    """
+    Almacén que construye los objetos del modelo y todos sus índices en
+    memoria a partir del contenido del archivo JSON.
+
+    Todo el trabajo se hace en el constructor o en derivar, sin tocar el
+    almacén publicado, por lo que una recarga puede construir el nuevo
+    almacén mientras se siguen atendiendo consultas sobre el anterior.
+    """
+
+    def __init__(
+        self,
+        datos: Datos,
+        version: Version = "",
+        fecha_modificacion: Optional[datetime] = None
+    ) -> None:
+        """
+        Convierte los datos JSON en objetos y construye los índices.
+
+        Las filas se recorren una sola vez y cada una se descarta apenas se
+        crea su entidad, de modo que si los datos llegan como secciones de
+        un LectorJson nunca se mantiene el árbol JSON completo en memoria.
+
+        Args:
+            datos: Diccionario con las listas bodegas, cepas y vinos, o
+                recorrido de sus secciones (clave, filas)
+            version: Huella del contenido del que provienen los datos, o
+                función que la obtiene una vez recorridos los datos
+            fecha_modificacion: Fecha de modificación del archivo de datos
+        """
+        # Importaciones dinámicas para evitar ciclos
+        from modelos.bodega import Bodega
+        from modelos.cepa import Cepa
+        from modelos.vino import Vino
+
+        self.__fecha_modificacion = fecha_modificacion
+        # JSON codificado de cada entidad, válido mientras viva el almacén
+        self.__fragmentos: Dict[Tuple[str, str, bool], bytes] = {}
+
+        # Convertir datos JSON en objetos. Los IDs se internan para que
+        # cada identificador exista una sola vez en memoria.
+        secciones = _secciones_en_orden(datos)
+        self.__bodegas: List['Bodega'] = [
+            Bodega(sys.intern(bodega_data['id']), bodega_data['nombre'])
+            for bodega_data in next(secciones)
+        ]
+        self.__cepas: List['Cepa'] = [
+            Cepa(sys.intern(cepa_data['id']), cepa_data['nombre'])
+            for cepa_data in next(secciones)
+        ]
+        # Huella del contenido de cada vino, por posición, para detectar
+        # los cambios en la próxima recarga sin comparar campo por campo
+        self.__huellas_vinos = array('q')
+        self.__vinos: List['Vino'] = [
+            _crear_vino(vino_data)
+            for vino_data in _registrar_huellas(
+                next(secciones), self.__huellas_vinos
+            )
+        ]
+        for _ in secciones:
+            pass
+        self.__version = version() if callable(version) else version
+
+        # Índices por clave primaria para búsquedas en tiempo constante
+        self.__bodegas_por_id: Dict[str, 'Bodega'] = {
+            bodega.obtener_id(): bodega for bodega in self.__bodegas
+        }
+        self.__cepas_por_id: Dict[str, 'Cepa'] = {
+            cepa.obtener_id(): cepa for cepa in self.__cepas
+        }
+        self.__vinos_por_id: Dict[str, 'Vino'] = {
+            vino.obtener_id(): vino for vino in self.__vinos
+        }
+
+        # Resolver una única vez las referencias de cada vino
+        for vino in self.__vinos:
+            vino.resolver_referencias(self.__bodegas_por_id, self.__cepas_por_id)
+
+        self.__construirIndices()
+
+    def derivar(
+        self,
+        datos: Datos,
+        version: Version = "",
+        fecha_modificacion: Optional[datetime] = None
+    ) -> Almacen:
+        """
+        Obtiene el almacén de una nueva versión de los datos a partir de
+        este almacén, que no se modifica: si difieren en pocas entidades se
+        le aplican solo esas diferencias (ver derivar_con_cambios), y si no
+        se reconstruye.
+
+        Args:
+            datos: Diccionario con las listas bodegas, cepas y vinos, o
+                recorrido de sus secciones (clave, filas)
+            version: Huella del contenido del que provienen los datos, o
+                función que la obtiene una vez recorridos los datos
+            fecha_modificacion: Fecha de modificación del archivo de datos
+
+        Returns:
+            Almacén nuevo, equivalente a construirlo desde cero con datos
+        """
+        return derivar_con_cambios(
+            self, datos, version, fecha_modificacion, self.reconstruir
+        )
+
+    def reconstruir(
+        self,
+        datos: Datos,
+        version: Version = "",
+        fecha_modificacion: Optional[datetime] = None
+    ) -> 'AlmacenEnMemoria':
+        """
+        Construye el almacén de una nueva versión de los datos reutilizando
+        lo que no cambió respecto de este almacén, que no se modifica.
+
+        Las entidades se comparan por ID y contenido (los vinos que
+        conservan su posición, por la huella de su fila): las que no cambiaron
+        se reutilizan junto con su JSON ya codificado, y solo se crean
+        objetos para las nuevas, las modificadas y los vinos cuya bodega o
+        cepas cambiaron. Si las entidades existentes conservan su posición
+        (ediciones y altas al final), los índices se copian y se corrigen
+        solo en las entradas afectadas; si hubo bajas o cambios de orden,
+        los índices se reconstruyen sobre las entidades reutilizadas.
+
+        Args:
+            datos: Diccionario con las listas bodegas, cepas y vinos, o
+                recorrido de sus secciones (clave, filas)
+            version: Huella del contenido del que provienen los datos, o
+                función que la obtiene una vez recorridos los datos
+            fecha_modificacion: Fecha de modificación del archivo de datos
+
+        Returns:
+            Almacén nuevo, equivalente a construirlo desde cero con datos
+        """
+        from modelos.bodega import Bodega
+        from modelos.cepa import Cepa
+
+        nuevo = AlmacenEnMemoria.__new__(AlmacenEnMemoria)
+        nuevo.__fecha_modificacion = fecha_modificacion
+        secciones = _secciones_en_orden(datos)
+
+        nuevo.__bodegas, bodegas_nuevas, ids_bodegas, bodegas_estables = (
+            self.__reutilizar(
+                next(secciones), self.__bodegas, self.__bodegas_por_id,
+                lambda anterior, fila, _: anterior.obtener_nombre() == fila['nombre'],
+                lambda fila: Bodega(sys.intern(fila['id']), fila['nombre'])
+            )
+        )
+        nuevo.__cepas, cepas_nuevas, ids_cepas, cepas_estables = (
+            self.__reutilizar(
+                next(secciones), self.__cepas, self.__cepas_por_id,
+                lambda anterior, fila, _: anterior.obtener_nombre() == fila['nombre'],
+                lambda fila: Cepa(sys.intern(fila['id']), fila['nombre'])
+            )
+        )
+
+        nuevo.__huellas_vinos = array('q')
+        huellas_anteriores = self.__huellas_vinos
+        huellas = nuevo.__huellas_vinos
+        referencias_cambiadas = bool(ids_bodegas or ids_cepas)
+
+        def vino_sin_cambios(
+            anterior: 'Vino',
+            fila: Dict,
+            posicion: Optional[int]
+        ) -> bool:
+            if posicion is not None:
+                if huellas_anteriores[posicion] != huellas[posicion]:
+                    return False
+            elif not (
+                anterior.obtener_nombre() == fila['nombre']
+                and anterior.obtener_partidas() == fila['partidas']
+                and anterior.obtener_bodega_id() == fila['bodega']
+                and anterior.obtener_cepa_ids() == tuple(fila['cepas'])
+            ):
+                return False
+            # Un vino cuya bodega o cepas cambiaron también se recrea, ya
+            # que mantiene referencias a los objetos reemplazados
+            return not referencias_cambiadas or (
+                fila['bodega'] not in ids_bodegas
+                and ids_cepas.isdisjoint(fila['cepas'])
+            )
+
+        nuevo.__vinos, vinos_nuevos, ids_vinos, vinos_estables = (
+            self.__reutilizar(
+                _registrar_huellas(next(secciones), nuevo.__huellas_vinos),
+                self.__vinos, self.__vinos_por_id, vino_sin_cambios,
+                _crear_vino
+            )
+        )
+        for _ in secciones:
+            pass
+        nuevo.__version = version() if callable(version) else version
+        estables = bodegas_estables and cepas_estables and vinos_estables
+
+        nuevo.__completarDerivacion(
+            self, bodegas_nuevas, cepas_nuevas, vinos_nuevos,
+            ids_bodegas, ids_cepas, ids_vinos, estables
+        )
+        return nuevo
+
+    def aplicar(
+        self,
+        cambios: Iterable[Cambio],
+        version: str = "",
+        fecha_modificacion: Optional[datetime] = None
+    ) -> Almacen:
+        """
+        Obtiene el almacén que resulta de aplicar cambios puntuales a este
+        almacén, sin modificarlo ni copiarlo: el resultado guarda solo las
+        entidades cambiadas y usa este almacén como base para el resto (ver
+        AlmacenConCambios). Los cambios se interpretan como en con_cambios.
+
+        Args:
+            cambios: Tuplas (colección, ID, fila o None), donde la colección
+                es bodegas, cepas o vinos
+            version: Versión de los datos resultantes
+            fecha_modificacion: Fecha de modificación de los datos
+
+        Returns:
+            Almacén con los cambios aplicados (ver AlmacenConCambios.aplicar)
+
+        Raises:
+            ValueError: Si la colección de algún cambio no existe
+            KeyError: Si a una fila le falta un campo
+        """
+        # Importación dinámica para evitar ciclos
+        from almacenes.capas import AlmacenConCambios
+        return AlmacenConCambios(self).aplicar(
+            cambios, version, fecha_modificacion
+        )
+
+    def con_cambios(
+        self,
+        cambios: Iterable[Cambio],
+        version: str = "",
+        fecha_modificacion: Optional[datetime] = None
+    ) -> 'AlmacenEnMemoria':
+        """
+        Construye el almacén que resulta de aplicar cambios puntuales a
+        este almacén, que no se modifica, con todas sus colecciones e
+        índices propios.
+
+        Cada cambio agrega o reemplaza una entidad completa a partir de su
+        fila JSON, o la elimina si la fila es None; se aplican en orden. Un
+        reemplazo conserva la posición de la entidad y un alta la agrega al
+        final. Como en derivar, solo se crean objetos para las entidades
+        cambiadas y los vinos cuya bodega o cepas cambiaron, y sin bajas
+        los índices se copian y se corrigen en las entradas afectadas, sin
+        recorrer las colecciones; una baja obliga a reconstruirlos. Es el
+        costo que aplicar evita, y el que paga AlmacenConCambios.consolidar.
+
+        Args:
+            cambios: Tuplas (colección, ID, fila o None), donde la colección
+                es bodegas, cepas o vinos
+            version: Versión de los datos resultantes
+            fecha_modificacion: Fecha de modificación de los datos
+
+        Returns:
+            Almacén nuevo con los cambios aplicados
+
+        Raises:
+            ValueError: Si la colección de algún cambio no existe
+            KeyError: Si a una fila le falta un campo
+        """
+        from modelos.bodega import Bodega
+        from modelos.cepa import Cepa
+
+        por_coleccion: Dict[str, List[Tuple[str, Optional[Dict]]]] = {
+            clave: [] for clave in _SECCIONES
+        }
+        for coleccion, id_, fila in cambios:
+            if coleccion not in por_coleccion:
+                raise ValueError(f"Colección no válida: {coleccion}")
+            por_coleccion[coleccion].append((id_, fila))
+
+        nuevo = AlmacenEnMemoria.__new__(AlmacenEnMemoria)
+        nuevo.__fecha_modificacion = fecha_modificacion
+        nuevo.__version = version
+        nuevo.__bodegas, bodegas_nuevas, ids_bodegas, bodegas_estables = (
+            self.__aplicarCambios(
+                por_coleccion['bodegas'], self.__bodegas,
+                self.__bodegas_por_id,
+                lambda bodega: self.__posicionEn('bodegas', bodega),
+                lambda fila: Bodega(sys.intern(fila['id']), fila['nombre'])
+            )
+        )
+        nuevo.__cepas, cepas_nuevas, ids_cepas, cepas_estables = (
+            self.__aplicarCambios(
+                por_coleccion['cepas'], self.__cepas, self.__cepas_por_id,
+                lambda cepa: self.__posicionEn('cepas', cepa),
+                lambda fila: Cepa(sys.intern(fila['id']), fila['nombre'])
+            )
+        )
+
+        # Los vinos cuya bodega o cepas cambiaron se recrean con su misma
+        # fila, ya que mantienen referencias a los objetos reemplazados
+        cambios_vinos = por_coleccion['vinos']
+        modificados = {id_ for id_, _ in cambios_vinos}
+        referentes: Dict[str, 'Vino'] = {}
+        for indice, ids in (
+            (self.__vinos_por_bodega, ids_bodegas),
+            (self.__vinos_por_cepa, ids_cepas),
+        ):
+            for id_ in ids:
+                for vino in indice.get(id_, ()):
+                    if vino.obtener_id() not in modificados:
+                        referentes[vino.obtener_id()] = vino
+        cambios_vinos = [
+            (id_, fila_json(vino)) for id_, vino in referentes.items()
+        ] + cambios_vinos
+
+        nuevo.__vinos, vinos_nuevos, ids_vinos, vinos_estables = (
+            self.__aplicarCambios(
+                cambios_vinos, self.__vinos, self.__vinos_por_id,
+                self.__posicionDeVino, _crear_vino
+            )
+        )
+        estables = bodegas_estables and cepas_estables and vinos_estables
+        if estables:
+            nuevo.__huellas_vinos = array('q', self.__huellas_vinos)
+            for posicion, vino in sorted(vinos_nuevos.items()):
+                huella = huella_vino(fila_json(vino))
+                if posicion < len(nuevo.__huellas_vinos):
+                    nuevo.__huellas_vinos[posicion] = huella
+                else:
+                    nuevo.__huellas_vinos.append(huella)
+        else:
+            nuevo.__huellas_vinos = array('q', (
+                huella_vino(fila_json(vino)) for vino in nuevo.__vinos
+            ))
+
+        nuevo.__completarDerivacion(
+            self, bodegas_nuevas, cepas_nuevas, vinos_nuevos,
+            ids_bodegas, ids_cepas, ids_vinos, estables
+        )
+        return nuevo
+
+    def __completarDerivacion(
+        self,
+        anterior: 'AlmacenEnMemoria',
+        bodegas_nuevas: Dict[int, 'Bodega'],
+        cepas_nuevas: Dict[int, 'Cepa'],
+        vinos_nuevos: Dict[int, 'Vino'],
+        ids_bodegas: Set[str],
+        ids_cepas: Set[str],
+        ids_vinos: Set[str],
+        estables: bool
+    ) -> None:
+        """
+        Completa un almacén derivado, cuyas colecciones ya están armadas,
+        con sus índices y el JSON reutilizable del almacén anterior.
+
+        Args:
+            anterior: Almacén del que se derivan los datos
+            bodegas_nuevas: Bodegas creadas, por posición
+            cepas_nuevas: Cepas creadas, por posición
+            vinos_nuevos: Vinos creados, por posición
+            ids_bodegas: IDs de las bodegas creadas o eliminadas
+            ids_cepas: IDs de las cepas creadas o eliminadas
+            ids_vinos: IDs de los vinos creados o eliminados
+            estables: True si las entidades anteriores conservan su posición
+        """
+        self.__bodegas_por_id = self.__actualizarIndicePorId(
+            anterior.__bodegas_por_id, self.__bodegas, bodegas_nuevas, estables
+        )
+        self.__cepas_por_id = self.__actualizarIndicePorId(
+            anterior.__cepas_por_id, self.__cepas, cepas_nuevas, estables
+        )
+        self.__vinos_por_id = self.__actualizarIndicePorId(
+            anterior.__vinos_por_id, self.__vinos, vinos_nuevos, estables
+        )
+        for vino in vinos_nuevos.values():
+            vino.resolver_referencias(
+                self.__bodegas_por_id, self.__cepas_por_id
+            )
+
+        # Bodegas y cepas cuyos vinos cambiaron: sus índices inversos y su
+        # JSON (que incluye los vinos) deben actualizarse
+        bodegas_afectadas = set(ids_bodegas)
+        cepas_afectadas = set(ids_cepas)
+        for id_ in ids_vinos:
+            for vino in (
+                anterior.__vinos_por_id.get(id_), self.__vinos_por_id.get(id_)
+            ):
+                if vino is not None:
+                    bodegas_afectadas.add(vino.obtener_bodega_id())
+                    cepas_afectadas.update(vino.obtener_cepa_ids())
+
+        if estables:
+            self.__parchearIndices(
+                anterior, bodegas_nuevas, cepas_nuevas, vinos_nuevos,
+                bodegas_afectadas
+            )
+        else:
+            self.__construirIndices()
+
+        self.__fragmentos = dict(anterior.__fragmentos)
+        for tipo, ids in (
+            ("Bodega", bodegas_afectadas),
+            ("Cepa", cepas_afectadas),
+            ("Vino", ids_vinos),
+        ):
+            for id_ in ids:
+                self.__fragmentos.pop((tipo, id_, False), None)
+                self.__fragmentos.pop((tipo, id_, True), None)
+
+    def exportar(self) -> Dict[str, Any]:
+        """
+        Obtiene el estado del almacén formado solo por cadenas, números,
+        listas, tuplas, diccionarios y bytes, para guardarlo en una
+        instantánea con marshal.
+
+        Los índices se exportan como posiciones y los arreglos con tobytes,
+        en el orden de bytes de la plataforma. El JSON codificado de las
+        entidades no se exporta.
+
+        Returns:
+            Diccionario con las entidades y todos los índices del almacén
+        """
+        posicion_de_vino = {
+            vino.obtener_id(): posicion
+            for posicion, vino in enumerate(self.__vinos)
+        }
+
+        def posiciones(vinos: Sequence['Vino']) -> bytes:
+            return array(
+                'I', [posicion_de_vino[vino.obtener_id()] for vino in vinos]
+            ).tobytes()
+
+        return {
+            "version": self.__version,
+            "bodegas": [
+                (bodega.obtener_id(), bodega.obtener_nombre())
+                for bodega in self.__bodegas
+            ],
+            "cepas": [
+                (cepa.obtener_id(), cepa.obtener_nombre())
+                for cepa in self.__cepas
+            ],
+            "vinos": [
+                (
+                    vino.obtener_id(), vino.obtener_nombre(),
+                    vino.obtener_bodega_id(), vino.obtener_cepa_ids(),
+                    vino.obtener_partidas()
+                )
+                for vino in self.__vinos
+            ],
+            "huellas_vinos": self.__huellas_vinos.tobytes(),
+            "vinos_por_bodega": {
+                id_: posiciones(vinos)
+                for id_, vinos in self.__vinos_por_bodega.items()
+            },
+            "vinos_por_cepa": {
+                id_: posiciones(vinos)
+                for id_, vinos in self.__vinos_por_cepa.items()
+            },
+            "cepas_por_bodega": {
+                id_: tuple(cepa.obtener_id() for cepa in cepas)
+                for id_, cepas in self.__cepas_por_bodega.items()
+            },
+            "posiciones_por_anio": {
+                anio: posiciones_anio.tobytes()
+                for anio, posiciones_anio in self.__posiciones_por_anio.items()
+            },
+            "facetas": self.__facetas.exportar(),
+            "permutaciones": {
+                coleccion: {
+                    campo: permutacion.tobytes()
+                    for campo, permutacion in permutaciones.items()
+                }
+                for coleccion, permutaciones in self.__permutaciones.items()
+            },
+            "rangos_vinos": {
+                campo: rangos.tobytes()
+                for campo, rangos in self.__rangos_vinos.items()
+            },
+            "nombres": {
+                coleccion: indice.exportar()
+                for coleccion, indice in self.__nombres.items()
+            },
+            "trigramas": {
+                coleccion: indice.exportar()
+                for coleccion, indice in self.__trigramas.items()
+            },
+        }
+
+    @classmethod
+    def restaurar(
+        cls,
+        estado: Dict[str, Any],
+        fecha_modificacion: Optional[datetime] = None
+    ) -> 'AlmacenEnMemoria':
+        """
+        Reconstruye un almacén desde el estado obtenido con exportar.
+
+        Solo se crean las entidades y se resuelven sus referencias; los
+        índices se toman del estado sin volver a calcularlos.
+
+        Args:
+            estado: Estado exportado por un almacén en esta plataforma
+            fecha_modificacion: Fecha de modificación del archivo de datos
+
+        Returns:
+            Almacén equivalente al que exportó el estado
+
+        Raises:
+            KeyError: Si al estado le falta alguna parte
+            ValueError: Si alguna parte del estado no es válida
+        """
+        from modelos.bodega import Bodega
+        from modelos.cepa import Cepa
+        from modelos.vino import Vino
+
+        almacen = cls.__new__(cls)
+        almacen.__version = estado["version"]
+        almacen.__fecha_modificacion = fecha_modificacion
+        almacen.__fragmentos = {}
+
+        almacen.__bodegas = [
+            Bodega(sys.intern(id_), nombre) for id_, nombre in estado["bodegas"]
+        ]
+        almacen.__cepas = [
+            Cepa(sys.intern(id_), nombre) for id_, nombre in estado["cepas"]
+        ]
+        almacen.__bodegas_por_id = {
+            bodega.obtener_id(): bodega for bodega in almacen.__bodegas
+        }
+        almacen.__cepas_por_id = {
+            cepa.obtener_id(): cepa for cepa in almacen.__cepas
+        }
+        # Los vinos se crean con las referencias ya resueltas, lo que
+        # equivale a crearlos con IDs y llamar a resolver_referencias
+        bodega_de = almacen.__bodegas_por_id.get
+        cepa_de = almacen.__cepas_por_id.get
+        almacen.__vinos = [
+            Vino(
+                id_, nombre, bodega_de(bodega_id, bodega_id),
+                [cepa_de(cepa_id, cepa_id) for cepa_id in cepa_ids], partidas
+            )
+            for id_, nombre, bodega_id, cepa_ids, partidas in estado["vinos"]
+        ]
+        almacen.__huellas_vinos = cls.__arreglo('q', estado["huellas_vinos"])
+        almacen.__vinos_por_id = {
+            vino.obtener_id(): vino for vino in almacen.__vinos
+        }
+
+        vino_en = almacen.__vinos.__getitem__
+        almacen.__vinos_por_bodega = {
+            id_: list(map(vino_en, cls.__arreglo('I', posiciones)))
+            for id_, posiciones in estado["vinos_por_bodega"].items()
+        }
+        almacen.__vinos_por_cepa = {
+            id_: list(map(vino_en, cls.__arreglo('I', posiciones)))
+            for id_, posiciones in estado["vinos_por_cepa"].items()
+        }
+        almacen.__cepas_por_bodega = {
+            id_: [almacen.__cepas_por_id[cepa_id] for cepa_id in cepa_ids]
+            for id_, cepa_ids in estado["cepas_por_bodega"].items()
+        }
+        almacen.__posiciones_por_anio = {
+            anio: cls.__arreglo('I', posiciones)
+            for anio, posiciones in estado["posiciones_por_anio"].items()
+        }
+        almacen.__anios = sorted(almacen.__posiciones_por_anio)
+        almacen.__facetas = FacetasVinos.restaurar(estado["facetas"])
+        almacen.__permutaciones = {
+            coleccion: {
+                campo: cls.__arreglo('I', permutacion)
+                for campo, permutacion in permutaciones.items()
+            }
+            for coleccion, permutaciones in estado["permutaciones"].items()
+        }
+        almacen.__rangos_vinos = {
+            campo: cls.__arreglo('I', rangos)
+            for campo, rangos in estado["rangos_vinos"].items()
+        }
+        almacen.__nombres = {
+            coleccion: IndiceNombres.restaurar(indice)
+            for coleccion, indice in estado["nombres"].items()
+        }
+        almacen.__trigramas = {
+            coleccion: IndiceTrigramas.restaurar(indice)
+            for coleccion, indice in estado["trigramas"].items()
+        }
+        return almacen
+
+    @staticmethod
+    def __arreglo(tipo: str, contenido: bytes) -> array:
+        """Arreglo del tipo indicado con el contenido exportado con tobytes."""
+        arreglo = array(tipo)
+        arreglo.frombytes(contenido)
+        return arreglo
+
+    @staticmethod
+    def __reutilizar(
+        filas: Iterable[Dict],
+        anteriores: Sequence[Any],
+        anteriores_por_id: Dict[str, Any],
+        sin_cambios: Callable[[Any, Dict, Optional[int]], bool],
+        crear: Callable[[Dict], Any]
+    ) -> Tuple[List[Any], Dict[int, Any], Set[str], bool]:
+        """
+        Arma una colección a partir de las filas JSON reutilizando las
+        entidades anteriores cuyo contenido no cambió.
+
+        Args:
+            filas: Filas JSON de la colección, recorridas una sola vez
+            anteriores: Colección del almacén anterior
+            anteriores_por_id: Índice por ID de la colección anterior
+            sin_cambios: Indica si una entidad anterior coincide con su
+                fila; recibe también la posición de la fila si la entidad
+                anterior ocupaba esa misma posición, o None
+            crear: Crea la entidad de una fila
+
+        Returns:
+            Tupla con la colección nueva, las entidades creadas por
+            posición, los IDs de las entidades creadas o eliminadas y si
+            las entidades anteriores conservan su posición
+        """
+        coleccion = []
+        creadas = {}
+        ids_cambiados = set()
+        cantidad = len(anteriores)
+        estable = True
+        for posicion, fila in enumerate(filas):
+            id_ = fila['id']
+            if posicion < cantidad and anteriores[posicion].obtener_id() == id_:
+                anterior = anteriores[posicion]
+                misma_posicion = posicion
+            else:
+                anterior = anteriores_por_id.get(id_)
+                misma_posicion = None
+                if posicion < cantidad or anterior is not None:
+                    estable = False
+            if anterior is not None and sin_cambios(anterior, fila, misma_posicion):
+                coleccion.append(anterior)
+            else:
+                entidad = crear(fila)
+                coleccion.append(entidad)
+                creadas[posicion] = entidad
+                ids_cambiados.add(entidad.obtener_id())
+        if len(coleccion) < cantidad:
+            estable = False
+        if not estable:
+            ids_cambiados.update(
+                set(anteriores_por_id).difference(
+                    entidad.obtener_id() for entidad in coleccion
+                )
+            )
+        return coleccion, creadas, ids_cambiados, estable
+
+    @staticmethod
+    def __aplicarCambios(
+        cambios: Sequence[Tuple[str, Optional[Dict]]],
+        anteriores: Sequence[Any],
+        anteriores_por_id: Dict[str, Any],
+        posicion_de: Callable[[Any], int],
+        crear: Callable[[Dict], Any]
+    ) -> Tuple[List[Any], Dict[int, Any], Set[str], bool]:
+        """
+        Arma una colección aplicando cambios puntuales a la anterior.
+
+        Si ningún cambio elimina una entidad existente, las posiciones de
+        las entidades reemplazadas se buscan con posicion_de y nunca se
+        recorre la colección; si no, las posiciones se recalculan.
+
+        Args:
+            cambios: Pares (ID, fila o None para eliminar), en orden
+            anteriores: Colección del almacén anterior
+            anteriores_por_id: Índice por ID de la colección anterior
+            posicion_de: Posición de una entidad de la colección anterior
+            crear: Crea la entidad de una fila
+
+        Returns:
+            Tupla con la colección nueva, las entidades creadas por
+            posición, los IDs de las entidades creadas o eliminadas y si
+            las entidades anteriores conservan su posición
+        """
+        coleccion = list(anteriores)
+        agregados: Set[str] = set()
+        estable = True
+        for id_, fila in cambios:
+            if fila is not None:
+                agregados.add(id_)
+            elif id_ in anteriores_por_id or id_ in agregados:
+                estable = False
+                break
+
+        if estable:
+            posiciones: Dict[str, int] = {}
+            creadas: Dict[int, Any] = {}
+            for id_, fila in cambios:
+                if fila is None:
+                    continue
+                posicion = posiciones.get(id_)
+                if posicion is None:
+                    anterior = anteriores_por_id.get(id_)
+                    if anterior is None:
+                        posicion = len(coleccion)
+                        coleccion.append(None)
+                    else:
+                        posicion = posicion_de(anterior)
+                    posiciones[id_] = posicion
+                coleccion[posicion] = creadas[posicion] = crear(fila)
+            return coleccion, creadas, set(posiciones), True
+
+        posiciones = {
+            entidad.obtener_id(): posicion
+            for posicion, entidad in enumerate(coleccion)
+        }
+        ultimas: Dict[str, Any] = {}
+        for id_, fila in cambios:
+            posicion = posiciones.get(id_)
+            if fila is None:
+                if posicion is not None:
+                    coleccion[posicion] = None
+                    del posiciones[id_]
+                ultimas[id_] = None
+                continue
+            entidad = ultimas[id_] = crear(fila)
+            if posicion is None:
+                posiciones[id_] = len(coleccion)
+                coleccion.append(entidad)
+            else:
+                coleccion[posicion] = entidad
+        coleccion = [entidad for entidad in coleccion if entidad is not None]
+        creadas = {
+            posicion: entidad for posicion, entidad in enumerate(coleccion)
+            if ultimas.get(entidad.obtener_id()) is entidad
+        }
+        return coleccion, creadas, set(ultimas), False
+
+    @staticmethod
+    def __actualizarIndicePorId(
+        anterior: Dict[str, Any],
+        coleccion: Sequence[Any],
+        creadas: Dict[int, Any],
+        estable: bool
+    ) -> Dict[str, Any]:
+        """
+        Obtiene el índice por ID de una colección derivada.
+
+        Args:
+            anterior: Índice de la colección anterior
+            coleccion: Colección nueva
+            creadas: Entidades creadas por posición
+            estable: True si no hubo bajas ni cambios de posición
+
+        Returns:
+            Índice por ID de la colección nueva
+        """
+        if not estable:
+            return {entidad.obtener_id(): entidad for entidad in coleccion}
+        if not creadas:
+            return anterior
+        indice = dict(anterior)
+        indice.update(
+            (entidad.obtener_id(), entidad) for entidad in creadas.values()
+        )
+        return indice
+
+    def __construirIndices(self) -> None:
+        """Construye desde cero los índices derivados de las colecciones."""
+        # Índices inversos de relaciones entre entidades
+        self.__vinos_por_bodega: Dict[str, List['Vino']] = {}
+        self.__vinos_por_cepa: Dict[str, List['Vino']] = {}
+        cepas_vistas: Dict[str, Dict[str, 'Cepa']] = {}
+        for vino in self.__vinos:
+            bodega_id = vino.obtener_bodega_id()
+            self.__vinos_por_bodega.setdefault(bodega_id, []).append(vino)
+            cepas_bodega = cepas_vistas.setdefault(bodega_id, {})
+            for cepa_id in dict.fromkeys(vino.obtener_cepa_ids()):
+                self.__vinos_por_cepa.setdefault(cepa_id, []).append(vino)
+                cepa = self.__cepas_por_id.get(cepa_id)
+                if cepa is not None:
+                    cepas_bodega.setdefault(cepa_id, cepa)
+        self.__cepas_por_bodega: Dict[str, List['Cepa']] = {
+            bodega_id: list(cepas.values())
+            for bodega_id, cepas in cepas_vistas.items()
+        }
+
+        # Índice invertido año -> posiciones de los vinos. Las posiciones
+        # se agregan en orden creciente, por lo que cada lista queda ordenada.
+        self.__posiciones_por_anio: Dict[int, array] = {}
+        for posicion, vino in enumerate(self.__vinos):
+            for anio in set(vino.obtener_partidas()):
+                self.__posiciones_por_anio.setdefault(
+                    anio, array('I')
+                ).append(posicion)
+        self.__anios: List[int] = sorted(self.__posiciones_por_anio)
+
+        # Listas y cantidades de vinos por año, bodega y cepa, con las
+        # posiciones de las bodegas y cepas como códigos
+        codigos_bodegas = {
+            bodega.obtener_id(): i for i, bodega in enumerate(self.__bodegas)
+        }
+        codigos_cepas = {
+            cepa.obtener_id(): i for i, cepa in enumerate(self.__cepas)
+        }
+        self.__facetas = FacetasVinos.desde_vinos(
+            self.__vinos,
+            lambda id_: codigos_bodegas.get(id_, -1),
+            lambda id_: codigos_cepas.get(id_, -1)
+        )
+
+        # Permutaciones ascendentes por campo de ordenamiento y sus inversas
+        self.__permutaciones: Dict[str, Dict[str, array]] = {
+            "bodegas": self.__construirPermutaciones(
+                self.__bodegas, CLAVES_BODEGAS
+            ),
+            "cepas": self.__construirPermutaciones(self.__cepas, CLAVES_CEPAS),
+            "vinos": self.__construirPermutaciones(self.__vinos, CLAVES_VINOS),
+        }
+        self.__rangos_vinos: Dict[str, array] = {}
+        for campo, permutacion in self.__permutaciones["vinos"].items():
+            rangos = array('I', bytes(permutacion.itemsize * len(permutacion)))
+            for rango, posicion in enumerate(permutacion):
+                rangos[posicion] = rango
+            self.__rangos_vinos[campo] = rangos
+
+        # Índices de prefijos y de trigramas de los nombres para las
+        # búsquedas
+        self.__nombres: Dict[str, IndiceNombres] = {}
+        self.__trigramas: Dict[str, IndiceTrigramas] = {}
+        for coleccion, entidades in (
+            ("bodegas", self.__bodegas),
+            ("cepas", self.__cepas),
+            ("vinos", self.__vinos),
+        ):
+            nombres = [entidad.obtener_nombre() for entidad in entidades]
+            self.__nombres[coleccion] = IndiceNombres(nombres)
+            self.__trigramas[coleccion] = IndiceTrigramas(nombres)
+
+    def __codigos(self, coleccion: str) -> Callable[[str], int]:
+        """
+        Obtiene una función que da el código (posición) de una bodega o
+        cepa por ID, o -1 si no existe, recordando los ya buscados.
+        """
+        por_id = {
+            "bodegas": self.__bodegas_por_id,
+            "cepas": self.__cepas_por_id,
+        }[coleccion]
+        codigos: Dict[str, int] = {}
+
+        def codigo(id_: str) -> int:
+            resultado = codigos.get(id_)
+            if resultado is None:
+                entidad = por_id.get(id_)
+                resultado = codigos[id_] = (
+                    self.__posicionEn(coleccion, entidad)
+                    if entidad is not None else -1
+                )
+            return resultado
+
+        return codigo
+
+    def __parchearIndices(
+        self,
+        anterior: 'AlmacenEnMemoria',
+        bodegas_nuevas: Dict[int, 'Bodega'],
+        cepas_nuevas: Dict[int, 'Cepa'],
+        vinos_nuevos: Dict[int, 'Vino'],
+        bodegas_afectadas: Set[str]
+    ) -> None:
+        """
+        Construye los índices copiando los del almacén anterior y
+        corrigiendo solo las entradas afectadas por las entidades creadas.
+
+        Requiere que las entidades anteriores conserven su posición, de
+        modo que las posiciones guardadas en los índices sigan siendo
+        válidas.
+
+        Args:
+            anterior: Almacén del que se derivan los datos
+            bodegas_nuevas: Bodegas creadas, por posición
+            cepas_nuevas: Cepas creadas, por posición
+            vinos_nuevos: Vinos creados, por posición
+            bodegas_afectadas: IDs de bodegas cuyos vinos o cepas cambiaron
+        """
+        cambiados = sorted(vinos_nuevos.items())
+        cantidad = len(anterior.__vinos)
+
+        # Índices inversos: solo se rearman las listas de las claves
+        # afectadas, intercalando los vinos creados por posición
+        salientes_bodega: Dict[str, List[Tuple[int, 'Vino']]] = {}
+        salientes_cepa: Dict[str, List[Tuple[int, 'Vino']]] = {}
+        entrantes_bodega: Dict[str, List[Tuple[int, 'Vino']]] = {}
+        entrantes_cepa: Dict[str, List[Tuple[int, 'Vino']]] = {}
+        for posicion, vino in cambiados:
+            if posicion < cantidad:
+                _agrupar_por_relacion(
+                    anterior.__vinos[posicion], posicion,
+                    salientes_bodega, salientes_cepa
+                )
+            _agrupar_por_relacion(
+                vino, posicion, entrantes_bodega, entrantes_cepa
+            )
+        self.__vinos_por_bodega = _parchear_listas(
+            anterior.__vinos_por_bodega, salientes_bodega, entrantes_bodega,
+            anterior.__posicionDeVino
+        )
+        self.__vinos_por_cepa = _parchear_listas(
+            anterior.__vinos_por_cepa, salientes_cepa, entrantes_cepa,
+            anterior.__posicionDeVino
+        )
+        self.__cepas_por_bodega = dict(anterior.__cepas_por_bodega)
+        for bodega_id in bodegas_afectadas:
+            vinos = self.__vinos_por_bodega.get(bodega_id)
+            if not vinos:
+                self.__cepas_por_bodega.pop(bodega_id, None)
+                continue
+            cepas: Dict[str, 'Cepa'] = {}
+            for vino in vinos:
+                for cepa_id in vino.obtener_cepa_ids():
+                    cepa = self.__cepas_por_id.get(cepa_id)
+                    if cepa is not None:
+                        cepas.setdefault(cepa_id, cepa)
+            self.__cepas_por_bodega[bodega_id] = list(cepas.values())
+
+        # Índice por año: se copian solo las listas de los años afectados
+        self.__posiciones_por_anio = dict(anterior.__posiciones_por_anio)
+        copiadas: Set[int] = set()
+        for posicion, vino in cambiados:
+            antes = (
+                set(anterior.__vinos[posicion].obtener_partidas())
+                if posicion < cantidad else set()
+            )
+            despues = set(vino.obtener_partidas())
+            for anio in antes.symmetric_difference(despues):
+                if anio not in copiadas:
+                    self.__posiciones_por_anio[anio] = array(
+                        'I', self.__posiciones_por_anio.get(anio, ())
+                    )
+                    copiadas.add(anio)
+                posiciones = self.__posiciones_por_anio[anio]
+                indice = bisect_left(posiciones, posicion)
+                if anio in antes:
+                    del posiciones[indice]
+                else:
+                    posiciones.insert(indice, posicion)
+        for anio in copiadas:
+            if not self.__posiciones_por_anio[anio]:
+                del self.__posiciones_por_anio[anio]
+        self.__anios = (
+            sorted(self.__posiciones_por_anio) if copiadas else anterior.__anios
+        )
+
+        # Permutaciones e índices de nombres: se reubican solo las
+        # posiciones cuya clave cambió
+        self.__nombres = {}
+        self.__trigramas = {}
+        self.__permutaciones = {}
+        self.__rangos_vinos = {}
+        for coleccion, anteriores, nuevas, creadas, claves in (
+            ("bodegas", anterior.__bodegas, self.__bodegas, bodegas_nuevas,
+             CLAVES_BODEGAS),
+            ("cepas", anterior.__cepas, self.__cepas, cepas_nuevas,
+             CLAVES_CEPAS),
+            ("vinos", anterior.__vinos, self.__vinos, vinos_nuevos,
+             CLAVES_VINOS),
+        ):
+            cambios_nombres = {
+                posicion: (
+                    anteriores[posicion].obtener_nombre()
+                    if posicion < len(anteriores) else None,
+                    entidad.obtener_nombre()
+                )
+                for posicion, entidad in creadas.items()
+            }
+            self.__nombres[coleccion] = anterior.__nombres[coleccion].con_cambios(
+                cambios_nombres,
+                (entidad.obtener_nombre() for entidad in nuevas)
+            )
+            self.__trigramas[coleccion] = anterior.__trigramas[coleccion].con_cambios(
+                cambios_nombres,
+                (entidad.obtener_nombre() for entidad in nuevas)
+            )
+            permutaciones = {}
+            for campo, clave in claves.items():
+                permutacion, inicio, fin = _parchear_permutacion(
+                    anterior.__permutaciones[coleccion][campo],
+                    anteriores, nuevas, sorted(creadas), clave
+                )
+                permutaciones[campo] = permutacion
+                if coleccion == "vinos":
+                    self.__rangos_vinos[campo] = _parchear_rangos(
+                        anterior.__rangos_vinos[campo], permutacion, inicio, fin
+                    )
+            self.__permutaciones[coleccion] = permutaciones
+
+        # Facetas: se corrigen las listas de los valores que cambiaron, con
+        # las posiciones de las bodegas y cepas de cada almacén como códigos
+        anteriores = (anterior.__codigos("bodegas"), anterior.__codigos("cepas"))
+        nuevos = (self.__codigos("bodegas"), self.__codigos("cepas"))
+        self.__facetas = anterior.__facetas.con_cambios(
+            {
+                posicion: (
+                    fila_de_vino(anterior.__vinos[posicion], *anteriores)
+                    if posicion < cantidad else None,
+                    fila_de_vino(vino, *nuevos)
+                )
+                for posicion, vino in cambiados
+            },
+            len(self.__vinos)
+        )
+
+    def __posicionDeVino(self, vino: 'Vino') -> int:
+        """Posición de un vino de este almacén (ver __posicionEn)."""
+        return self.__posicionEn("vinos", vino)
+
+    def __posicionEn(self, coleccion: str, entidad: Any) -> int:
+        """
+        Posición de una entidad de este almacén, buscada en la permutación
+        por id de su colección sin recorrerla.
+        """
+        entidades = {
+            "bodegas": self.__bodegas,
+            "cepas": self.__cepas,
+            "vinos": self.__vinos,
+        }[coleccion]
+        id_ = entidad.obtener_id()
+        permutacion = self.__permutaciones[coleccion]["id"]
+        indice = bisecar(
+            permutacion, (id_, id_),
+            lambda posicion: (entidades[posicion].obtener_id(),) * 2
+        )
+        while entidades[permutacion[indice]] is not entidad:
+            indice += 1
+        return permutacion[indice]
+
+    @staticmethod
+    def __construirPermutaciones(
+        entidades: Sequence[Any],
+        claves: Dict[str, Callable[[Any], Any]]
+    ) -> Dict[str, array]:
+        """
+        Calcula la permutación ascendente de una colección para cada campo.
+
+        Args:
+            entidades: Colección a ordenar
+            claves: Funciones de clave por nombre de campo
+
+        Returns:
+            Diccionario campo -> posiciones ordenadas de la colección
+        """
+        permutaciones = {}
+        for campo, clave in claves.items():
+            # El id desempata, de modo que el orden sea total y estable
+            valores = [
+                (clave(entidad), entidad.obtener_id()) for entidad in entidades
+            ]
+            permutaciones[campo] = array(
+                'I', sorted(range(len(valores)), key=valores.__getitem__)
+            )
+        return permutaciones
+
+    def obtener_version(self) -> str:
+        return self.__version
+
+    def obtener_fecha_modificacion(self) -> Optional[datetime]:
+        return self.__fecha_modificacion
+
+    def obtener_bodegas(self) -> List['Bodega']:
+        return self.__bodegas
+
+    def obtener_cepas(self) -> List['Cepa']:
+        return self.__cepas
+
+    def obtener_vinos(self) -> List['Vino']:
+        return self.__vinos
+
+    def buscar_bodega(self, id: str) -> Optional['Bodega']:
+        return self.__bodegas_por_id.get(id)
+
+    def buscar_cepa(self, id: str) -> Optional['Cepa']:
+        return self.__cepas_por_id.get(id)
+
+    def buscar_vino(self, id: str) -> Optional['Vino']:
+        return self.__vinos_por_id.get(id)
+
+    def obtener_vinos_de_bodega(self, bodega_id: str) -> List['Vino']:
+        return self.__vinos_por_bodega.get(bodega_id, [])
+
+    def obtener_vinos_de_cepa(self, cepa_id: str) -> List['Vino']:
+        return self.__vinos_por_cepa.get(cepa_id, [])
+
+    def obtener_cepas_de_bodega(self, bodega_id: str) -> List['Cepa']:
+        return self.__cepas_por_bodega.get(bodega_id, [])
+
+    def obtener_permutacion(self, coleccion: str, orden: str) -> array:
+        try:
+            return self.__permutaciones[coleccion][orden]
+        except KeyError:
+            raise ValueError(f"Orden no válido: {orden}") from None
+
+    def obtener_rangos_vinos(self, orden: str) -> array:
+        return self.__rangos_vinos[orden]
+
+    def posiciones_por_anios(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> Optional[Iterable[int]]:
+        """
+        Resuelve los filtros de año con el índice invertido.
+
+        Si el rango abarca varios años se mezclan sus listas de posiciones
+        ya ordenadas, descartando los vinos repetidos.
+
+        Args:
+            anio_desde: Año mínimo del rango (inclusive)
+            anio_hasta: Año máximo del rango (inclusive)
+
+        Returns:
+            Posiciones ordenadas de los vinos en la colección (calculadas
+            a medida que se recorren), o None si no se indicó ningún
+            filtro de año
+        """
+        if anio_desde is None and anio_hasta is None:
+            return None
+        inicio = (
+            bisect_left(self.__anios, anio_desde) if anio_desde is not None
+            else 0
+        )
+        fin = (
+            bisect_right(self.__anios, anio_hasta) if anio_hasta is not None
+            else len(self.__anios)
+        )
+        listas = [
+            self.__posiciones_por_anio[a] for a in self.__anios[inicio:fin]
+        ]
+        if len(listas) <= 1:
+            return listas[0] if listas else []
+        return mezclar_sin_repetidos(listas)
+
+    def listas_por_anio(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> List[Sequence[int]]:
+        return self.__facetas.listas_de_anios(anio_desde, anio_hasta)
+
+    def listas_por_relacion(
+        self,
+        coleccion: str,
+        ids: Iterable[str]
+    ) -> List[Sequence[int]]:
+        codigo = self.__codigos(coleccion)
+        return [self.__facetas.lista(coleccion, codigo(id_)) for id_ in ids]
+
+    def contar_facetas(
+        self,
+        posiciones: Optional[Sequence[int]]
+    ) -> Tuple[int, Dict[str, Dict[int, int]]]:
+        return self.__facetas.contar(posiciones)
+
+    def buscar_por_prefijo(
+        self,
+        coleccion: str,
+        prefijo: str,
+        limite: int
+    ) -> List[int]:
+        return self.__nombres[coleccion].buscar(prefijo, limite)
+
+    def buscar_similares(
+        self,
+        coleccion: str,
+        texto: str,
+        limite: int
+    ) -> List[Tuple[int, float]]:
+        return self.__trigramas[coleccion].buscar(texto, limite)
+
+    def obtener_fragmentos(self) -> Dict[Tuple[str, str, bool], bytes]:
+        return self.__fragmentos
+
+    def obtener_huellas_vinos(self) -> Sequence[int]:
+        """Huella del contenido de cada vino, por posición (ver huella_vino)."""
+        return self.__huellas_vinos
+
+    def obtener_facetas(self) -> FacetasVinos:
+        """Facetas de los vinos, con las posiciones de bodegas y cepas."""
+        return self.__facetas
+
+    def obtener_codigos(self, coleccion: str) -> Callable[[str], int]:
+        """
+        Función que da la posición de una bodega o cepa por ID, o -1 si no
+        existe, como los códigos de las facetas.
+        """
+        return self.__codigos(coleccion)
+
+    def posicion_de(self, coleccion: str, entidad: Any) -> int:
+        """
+        Posición de una entidad de este almacén en su colección, sin
+        recorrerla.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            entidad: Instancia publicada por este almacén
+
+        Returns:
+            Posición de la entidad
+        """
+        return self.__posicionEn(coleccion, entidad)
@@ -0,0 +1,521 @@
+"""
+Índices de búsqueda sobre los nombres de una colección.
+
+Los nombres se normalizan sin distinguir mayúsculas ni acentos ("Viñedos"
+y "VINEDOS" coinciden). IndiceNombres resuelve búsquedas por prefijo con
+dos arreglos ordenados: el nombre completo de cada entidad y, por
+separado, el resto del nombre a partir de cada palabra que no es la
+primera. Un prefijo se ubica con búsqueda binaria y los resultados son las
+entradas consecutivas que lo comparten, por lo que una búsqueda recorre
+solo las entradas que devuelve, sin depender del tamaño del catálogo.
+
+IndiceTrigramas resuelve búsquedas aproximadas, que toleran errores de
+tipeo, con un índice invertido de trigramas: cada trigrama apunta a las
+posiciones de los nombres que lo contienen, y la similitud entre dos
+textos es la proporción de trigramas que comparten.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import (
+    Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+)
+
+_PALABRA = re.compile(r"\w+")
+# Entradas a corregir por encima de las cuales conviene reconstruir el
+# índice en lugar de insertarlas de a una
+_MAXIMO_PARCHE = 1024
+# Similitud mínima de los resultados de una búsqueda aproximada, la misma
+# que usa por defecto la extensión pg_trgm de PostgreSQL
+UMBRAL_SIMILITUD = 0.3
+
+
+def normalizar(texto: str) -> str:
+    """
+    Normaliza un texto para compararlo sin mayúsculas ni acentos.
+
+    Args:
+        texto: Texto a normalizar
+
+    Returns:
+        Palabras del texto en minúsculas y sin marcas diacríticas, separadas
+        por un espacio
+    """
+    if not texto.isascii():
+        texto = "".join(
+            caracter for caracter in unicodedata.normalize("NFKD", texto)
+            if not unicodedata.combining(caracter)
+        )
+    return " ".join(_PALABRA.findall(texto.casefold()))
+
+
+def _entradas(normalizado: str) -> Iterable[Tuple[int, str]]:
+    """
+    Entradas de un nombre normalizado: (0, nombre completo) y (1, resto del
+    nombre) por cada palabra a partir de la segunda.
+    """
+    yield 0, normalizado
+    inicio = normalizado.find(" ")
+    while inicio >= 0:
+        yield 1, normalizado[inicio + 1:]
+        inicio = normalizado.find(" ", inicio + 1)
+
+
+def coincidencia(clave: str, normalizado: str) -> Optional[Tuple[int, str]]:
+    """
+    Entrada de un nombre por la que IndiceNombres.buscar lo encuentra, para
+    comparar un nombre que no está en el índice con sus resultados.
+
+    Args:
+        clave: Prefijo buscado, ya normalizado
+        normalizado: Nombre a comparar, obtenido con normalizar
+
+    Returns:
+        Menor (nivel, texto) de las entradas del nombre que empiezan con la
+        clave, o None si ninguna empieza con ella
+    """
+    mejor = None
+    for entrada in _entradas(normalizado):
+        if entrada[1].startswith(clave) and (mejor is None or entrada < mejor):
+            mejor = entrada
+    return mejor
+
+
+class IndiceNombres:
+    """
+    Índice de prefijos de los nombres de una colección, por posición.
+
+    Es inmutable: con_cambios devuelve un índice nuevo y deja este intacto,
+    de modo que puede compartirse entre almacenes derivados.
+    """
+
+    def __init__(self, nombres: Iterable[str]) -> None:
+        """
+        Construye el índice.
+
+        Args:
+            nombres: Nombre de cada entidad, en el orden de la colección
+        """
+        claves: Tuple[List[str], ...] = ([], [])
+        posiciones: Tuple[array, ...] = (array('I'), array('I'))
+        cantidad = 0
+        for posicion, nombre in enumerate(nombres):
+            for nivel, clave in _entradas(normalizar(nombre)):
+                claves[nivel].append(clave)
+                posiciones[nivel].append(posicion)
+            cantidad += 1
+        self.__cantidad = cantidad
+        self.__claves: Tuple[List[str], ...] = ([], [])
+        self.__posiciones: Tuple[array, ...] = (array('I'), array('I'))
+        for nivel in range(2):
+            # El ordenamiento es estable y las entradas se agregaron por
+            # posición: las claves iguales quedan en orden de posición
+            orden = sorted(
+                range(len(claves[nivel])), key=claves[nivel].__getitem__
+            )
+            self.__claves[nivel].extend(map(claves[nivel].__getitem__, orden))
+            self.__posiciones[nivel].extend(
+                map(posiciones[nivel].__getitem__, orden)
+            )
+
+    def __len__(self) -> int:
+        return self.__cantidad
+
+    def exportar(self) -> Dict[str, Any]:
+        """
+        Obtiene el contenido del índice, para guardarlo en una instantánea.
+
+        Returns:
+            Cantidad de nombres, claves y bytes de las posiciones de cada nivel
+        """
+        return {
+            "cantidad": self.__cantidad,
+            "claves": self.__claves,
+            "posiciones": tuple(
+                posiciones.tobytes() for posiciones in self.__posiciones
+            ),
+        }
+
+    @classmethod
+    def restaurar(cls, estado: Mapping[str, Any]) -> 'IndiceNombres':
+        """
+        Reconstruye el índice desde el contenido obtenido con exportar.
+
+        Args:
+            estado: Contenido exportado en esta plataforma
+
+        Returns:
+            Índice equivalente al exportado
+
+        Raises:
+            ValueError: Si las claves y las posiciones no se corresponden
+        """
+        indice = cls.__new__(cls)
+        indice.__cantidad = estado["cantidad"]
+        indice.__claves = tuple(list(claves) for claves in estado["claves"])
+        indice.__posiciones = tuple(
+            cls.__arreglo(contenido) for contenido in estado["posiciones"]
+        )
+        if [len(claves) for claves in indice.__claves] != [
+            len(posiciones) for posiciones in indice.__posiciones
+        ]:
+            raise ValueError("Índice de nombres inconsistente")
+        return indice
+
+    @staticmethod
+    def __arreglo(contenido: bytes) -> array:
+        """Arreglo de posiciones con el contenido exportado con tobytes."""
+        posiciones = array('I')
+        posiciones.frombytes(contenido)
+        return posiciones
+
+    def con_cambios(
+        self,
+        cambios: Mapping[int, Tuple[Optional[str], str]],
+        nombres: Iterable[str]
+    ) -> 'IndiceNombres':
+        """
+        Obtiene el índice de la colección con algunos nombres cambiados o
+        agregados al final, sin que las demás entidades cambien de posición.
+
+        Args:
+            cambios: Nombre anterior (None si la posición es nueva) y nombre
+                nuevo, por posición
+            nombres: Todos los nombres de la colección nueva, por posición;
+                solo se recorren si hay tantos cambios que conviene
+                reconstruir el índice
+
+        Returns:
+            Índice nuevo, o este mismo si ningún nombre cambió
+        """
+        quitar: List[Tuple[int, str, int]] = []
+        agregar: List[Tuple[int, str, int]] = []
+        cantidad = self.__cantidad
+        for posicion, (anterior, nuevo) in cambios.items():
+            normalizado = normalizar(nuevo)
+            if anterior is not None:
+                anterior = normalizar(anterior)
+                if anterior == normalizado:
+                    continue
+                quitar.extend(
+                    (nivel, clave, posicion)
+                    for nivel, clave in _entradas(anterior)
+                )
+            else:
+                cantidad = max(cantidad, posicion + 1)
+            agregar.extend(
+                (nivel, clave, posicion)
+                for nivel, clave in _entradas(normalizado)
+            )
+        if not agregar:
+            return self
+        if len(quitar) + len(agregar) > _MAXIMO_PARCHE:
+            return IndiceNombres(nombres)
+
+        indice = IndiceNombres.__new__(IndiceNombres)
+        indice.__cantidad = cantidad
+        indice.__claves = tuple(list(claves) for claves in self.__claves)
+        indice.__posiciones = tuple(
+            array('I', posiciones) for posiciones in self.__posiciones
+        )
+        for nivel, clave, posicion in quitar:
+            i = indice.__ubicar(nivel, clave, posicion)
+            del indice.__claves[nivel][i]
+            del indice.__posiciones[nivel][i]
+        for nivel, clave, posicion in agregar:
+            i = indice.__ubicar(nivel, clave, posicion)
+            indice.__claves[nivel].insert(i, clave)
+            indice.__posiciones[nivel].insert(i, posicion)
+        return indice
+
+    def __ubicar(self, nivel: int, clave: str, posicion: int) -> int:
+        """Índice de la entrada (clave, posición), o donde debe insertarse."""
+        claves = self.__claves[nivel]
+        posiciones = self.__posiciones[nivel]
+        i = bisect_left(claves, clave)
+        while i < len(claves) and claves[i] == clave and posiciones[i] < posicion:
+            i += 1
+        return i
+
+    def buscar(self, prefijo: str, limite: int) -> List[int]:
+        """
+        Busca los nombres con alguna palabra que empiece con el prefijo.
+
+        Primero se devuelven los nombres que empiezan con el prefijo y luego
+        los que lo tienen al comienzo de otra palabra; dentro de cada grupo,
+        en orden alfabético del texto que coincide.
+
+        Args:
+            prefijo: Texto buscado, que se normaliza como los nombres
+            limite: Cantidad máxima de resultados
+
+        Returns:
+            Posiciones de las entidades encontradas, sin repetir
+        """
+        clave = normalizar(prefijo)
+        resultado: List[int] = []
+        vistas = set()
+        for claves, posiciones in zip(self.__claves, self.__posiciones):
+            i = bisect_left(claves, clave)
+            while (
+                len(resultado) < limite and i < len(claves)
+                and claves[i].startswith(clave)
+            ):
+                posicion = posiciones[i]
+                if posicion not in vistas:
+                    vistas.add(posicion)
+                    resultado.append(posicion)
+                i += 1
+        return resultado
+
+
+def trigramas(normalizado: str) -> FrozenSet[str]:
+    """
+    Trigramas de un texto normalizado. Cada palabra se completa con dos
+    espacios al comienzo y uno al final, de modo que las palabras cortas
+    también tienen trigramas y el comienzo de cada palabra pesa más.
+
+    Args:
+        normalizado: Texto obtenido con normalizar
+
+    Returns:
+        Conjunto de trigramas distintos del texto
+    """
+    resultado = set()
+    for palabra in normalizado.split():
+        completa = "  " + palabra + " "
+        resultado.update(
+            completa[i:i + 3] for i in range(len(completa) - 2)
+        )
+    return frozenset(resultado)
+
+
+def similitud(buscados: FrozenSet[str], normalizado: str) -> float:
+    """
+    Similitud de un nombre con un texto, la misma que calcula
+    IndiceTrigramas.buscar, para comparar un nombre que no está en el
+    índice con sus resultados.
+
+    Args:
+        buscados: Trigramas del texto buscado, no vacíos
+        normalizado: Nombre a comparar, obtenido con normalizar
+
+    Returns:
+        Similitud entre 0 y 1
+    """
+    propios = trigramas(normalizado)
+    comunes = len(buscados & propios)
+    return comunes / (len(buscados) + len(propios) - comunes)
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido de trigramas de los nombres de una colección, para
+    búsquedas aproximadas.
+
+    La similitud de un nombre con el texto buscado es la cantidad de
+    trigramas que comparten dividida por la cantidad de trigramas distintos
+    entre ambos. Para que un nombre alcance la similitud mínima debe
+    compartir al menos cierta cantidad de trigramas con el texto, y por lo
+    tanto alguno de sus trigramas menos frecuentes: solo los nombres de
+    esas listas son candidatos, y para cada uno se buscan los trigramas
+    restantes en sus listas ordenadas con búsqueda binaria. Así no se
+    compara el texto con todos los nombres del catálogo.
+
+    Es inmutable: con_cambios devuelve un índice nuevo y deja este intacto.
+    """
+
+    def __init__(self, nombres: Iterable[str]) -> None:
+        """
+        Construye el índice.
+
+        Args:
+            nombres: Nombre de cada entidad, en el orden de la colección
+        """
+        self.__listas: Dict[str, array] = {}
+        self.__tamanios = array('H')
+        for posicion, nombre in enumerate(nombres):
+            propios = trigramas(normalizar(nombre))
+            self.__tamanios.append(len(propios))
+            for trigrama in propios:
+                lista = self.__listas.get(trigrama)
+                if lista is None:
+                    lista = self.__listas[trigrama] = array('I')
+                lista.append(posicion)
+
+    def __len__(self) -> int:
+        return len(self.__tamanios)
+
+    def exportar(self) -> Dict[str, Any]:
+        """
+        Obtiene el contenido del índice, para guardarlo en una instantánea.
+
+        Returns:
+            Bytes de la lista de cada trigrama y de la cantidad de trigramas
+            de cada nombre
+        """
+        return {
+            "listas": {
+                trigrama: lista.tobytes()
+                for trigrama, lista in self.__listas.items()
+            },
+            "tamanios": self.__tamanios.tobytes(),
+        }
+
+    @classmethod
+    def restaurar(cls, estado: Mapping[str, Any]) -> 'IndiceTrigramas':
+        """
+        Reconstruye el índice desde el contenido obtenido con exportar.
+
+        Args:
+            estado: Contenido exportado en esta plataforma
+
+        Returns:
+            Índice equivalente al exportado
+        """
+        indice = cls.__new__(cls)
+        indice.__listas = {}
+        for trigrama, contenido in estado["listas"].items():
+            lista = indice.__listas[trigrama] = array('I')
+            lista.frombytes(contenido)
+        indice.__tamanios = array('H')
+        indice.__tamanios.frombytes(estado["tamanios"])
+        return indice
+
+    def con_cambios(
+        self,
+        cambios: Mapping[int, Tuple[Optional[str], str]],
+        nombres: Iterable[str]
+    ) -> 'IndiceTrigramas':
+        """
+        Obtiene el índice de la colección con algunos nombres cambiados o
+        agregados al final, sin que las demás entidades cambien de posición.
+        Solo se copian las listas de los trigramas que cambian.
+
+        Args:
+            cambios: Nombre anterior (None si la posición es nueva) y nombre
+                nuevo, por posición
+            nombres: Todos los nombres de la colección nueva, por posición;
+                solo se recorren si hay tantos cambios que conviene
+                reconstruir el índice
+
+        Returns:
+            Índice nuevo, o este mismo si ningún nombre cambió
+        """
+        salientes: Dict[str, List[int]] = {}
+        entrantes: Dict[str, List[int]] = {}
+        tamanios: Dict[int, int] = {}
+        for posicion, (anterior, nuevo) in cambios.items():
+            propios = trigramas(normalizar(nuevo))
+            previos = (
+                trigramas(normalizar(anterior))
+                if anterior is not None else frozenset()
+            )
+            if anterior is not None and previos == propios:
+                continue
+            tamanios[posicion] = len(propios)
+            for trigrama in previos - propios:
+                salientes.setdefault(trigrama, []).append(posicion)
+            for trigrama in propios - previos:
+                entrantes.setdefault(trigrama, []).append(posicion)
+        if not tamanios:
+            return self
+        if len(tamanios) > _MAXIMO_PARCHE:
+            return IndiceTrigramas(nombres)
+
+        indice = IndiceTrigramas.__new__(IndiceTrigramas)
+        indice.__listas = dict(self.__listas)
+        indice.__tamanios = array('H', self.__tamanios)
+        for posicion in sorted(tamanios):
+            if posicion < len(indice.__tamanios):
+                indice.__tamanios[posicion] = tamanios[posicion]
+            else:
+                indice.__tamanios.append(tamanios[posicion])
+        for trigrama in salientes.keys() | entrantes.keys():
+            lista = array('I', indice.__listas.get(trigrama, ()))
+            for posicion in salientes.get(trigrama, ()):
+                del lista[bisect_left(lista, posicion)]
+            for posicion in entrantes.get(trigrama, ()):
+                lista.insert(bisect_left(lista, posicion), posicion)
+            if lista:
+                indice.__listas[trigrama] = lista
+            else:
+                indice.__listas.pop(trigrama, None)
+        return indice
+
+    def buscar(
+        self,
+        texto: str,
+        limite: int,
+        umbral: float = UMBRAL_SIMILITUD
+    ) -> List[Tuple[int, float]]:
+        """
+        Busca los nombres más parecidos a un texto.
+
+        Args:
+            texto: Texto buscado, que se normaliza como los nombres
+            limite: Cantidad máxima de resultados
+            umbral: Similitud mínima de los resultados, entre 0 y 1
+
+        Returns:
+            Lista de (posición, similitud), de mayor a menor similitud y, a
+            igual similitud, por posición
+        """
+        buscados = trigramas(normalizar(texto))
+        if not buscados or limite < 1:
+            return []
+        # Un nombre con similitud >= umbral comparte al menos minimo
+        # trigramas con el texto, y por lo tanto alguno de los
+        # len(buscados) - minimo + 1 menos frecuentes
+        minimo = max(1, math.ceil(umbral * len(buscados)))
+        ordenados = sorted(
+            buscados, key=lambda trigrama: len(self.__listas.get(trigrama, ()))
+        )
+        corte = len(ordenados) - minimo + 1
+        compartidos: Counter = Counter()
+        for trigrama in ordenados[:corte]:
+            compartidos.update(self.__listas.get(trigrama, ()))
+        restantes = [
+            self.__listas[trigrama] for trigrama in ordenados[corte:]
+            if trigrama in self.__listas
+        ]
+        # Los candidatos se evalúan de los que más trigramas raros comparten
+        # a los que menos; la similitud de cada uno se acota por la de
+        # compartir también todos los restantes, y se descartan los que no
+        # pueden superar al peor de los limite mejores encontrados
+        grupos: List[List[int]] = [[] for _ in range(corte + 1)]
+        for posicion, cantidad in compartidos.items():
+            grupos[cantidad].append(posicion)
+        mejores: List[Tuple[float, int]] = []
+        for cantidad in range(corte, 0, -1):
+            maximo = cantidad + len(restantes)
+            piso = mejores[0][0] if len(mejores) == limite else umbral
+            if maximo / len(buscados) < piso:
+                break
+            for posicion in grupos[cantidad]:
+                tamanio = self.__tamanios[posicion]
+                cota = min(maximo, tamanio, len(buscados))
+                piso = mejores[0][0] if len(mejores) == limite else umbral
+                if cota / (len(buscados) + tamanio - cota) < piso:
+                    continue
+                comunes = cantidad
+                for lista in restantes:
+                    i = bisect_left(lista, posicion)
+                    if i < len(lista) and lista[i] == posicion:
+                        comunes += 1
+                similitud = comunes / (len(buscados) + tamanio - comunes)
+                if similitud < umbral:
+                    continue
+                candidato = (similitud, -posicion)
+                if len(mejores) < limite:
+                    heapq.heappush(mejores, candidato)
+                elif candidato > mejores[0]:
+                    heapq.heapreplace(mejores, candidato)
+        return [
+            (-negativa, similitud)
+            for similitud, negativa in sorted(mejores, reverse=True)
+        ]
@@ -0,0 +1,828 @@
+"""
+Almacén de solo lectura sobre una base de datos SQLite.
+
+La base de datos guarda el catálogo normalizado: bodegas, cepas y vinos en
+una tabla cada uno, y las relaciones de un vino con sus cepas y sus partidas
+en tablas propias, con índices para cada consulta de la vinoteca. La
+posición de cada entidad en el archivo de datos es su clave primaria, y las
+permutaciones por campo de ordenamiento se guardan como el rango de cada
+fila en una columna indexada. Cada consulta es una sentencia parametrizada
+que sqlite3 prepara una vez y reutiliza, y crea solo los objetos Bodega,
+Cepa y Vino de su resultado.
+
+La base de datos se importa del archivo JSON recorriéndolo de a un elemento,
+sin construir los objetos en memoria, y registra el tamaño, la fecha de
+modificación y la huella SHA-1 del archivo del que proviene. Una vez
+importada no se modifica: una importación nueva escribe otro archivo que
+reemplaza al anterior, y las conexiones abiertas siguen leyendo el suyo.
+"""
+import os
+import sqlite3
+import tempfile
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple,
+    TYPE_CHECKING
+)
+
+from almacenes.base import (
+    Almacen, CLAVES_BODEGAS, CLAVES_CEPAS, validar_partidas
+)
+from almacenes.instantanea import huella_archivo
+from almacenes.lector_json import LectorJson
+from almacenes.facetas import FacetasVinos
+from almacenes.nombres import IndiceNombres, IndiceTrigramas
+
+if TYPE_CHECKING:
+    from modelos.bodega import Bodega
+    from modelos.cepa import Cepa
+    from modelos.vino import Vino
+
+# Versión del esquema, guardada en PRAGMA user_version
+_FORMATO = 1
+# Filas de vinos que se insertan por lote al importar
+_LOTE = 10_000
+
+# Expresión SQL de la clave de cada campo de ordenamiento, por tabla. Las
+# cadenas se comparan por sus bytes UTF-8, que ordenan igual que los textos.
+_CLAVES_SQL: Dict[str, Dict[str, str]] = {
+    "bodegas": {campo: campo for campo in CLAVES_BODEGAS},
+    "cepas": {campo: campo for campo in CLAVES_CEPAS},
+    "vinos": {
+        "id": "id",
+        "nombre": "nombre",
+        "bodega": (
+            "COALESCE((SELECT nombre FROM bodegas"
+            " WHERE bodegas.posicion = vinos.bodega), '')"
+        ),
+        "anio": "anio_maximo",
+        "anio_inicial": "anio_minimo",
+    },
+}
+
+
+def _columnas_de_rango(tabla: str) -> str:
+    """Definiciones de las columnas de rango de una tabla para el esquema."""
+    return "".join(f", rango_{campo} INTEGER" for campo in _CLAVES_SQL[tabla])
+
+
+_ESQUEMA = f"""
+CREATE TABLE origen (
+    tamanio INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    huella BLOB NOT NULL,
+    version TEXT NOT NULL
+);
+CREATE TABLE bodegas (
+    posicion INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    nombre TEXT NOT NULL{_columnas_de_rango("bodegas")}
+);
+CREATE TABLE cepas (
+    posicion INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    nombre TEXT NOT NULL{_columnas_de_rango("cepas")}
+);
+CREATE TABLE vinos (
+    posicion INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    bodega_id TEXT NOT NULL,
+    bodega INTEGER,
+    anio_maximo INTEGER NOT NULL,
+    anio_minimo INTEGER NOT NULL{_columnas_de_rango("vinos")}
+);
+CREATE TABLE vino_cepas (
+    vino INTEGER NOT NULL,
+    orden INTEGER NOT NULL,
+    cepa_id TEXT NOT NULL,
+    cepa INTEGER,
+    PRIMARY KEY (vino, orden)
+) WITHOUT ROWID;
+CREATE TABLE vino_partidas (
+    vino INTEGER NOT NULL,
+    orden INTEGER NOT NULL,
+    anio INTEGER NOT NULL,
+    PRIMARY KEY (vino, orden)
+) WITHOUT ROWID;
+"""
+
+# Índices que se crean después de insertar las filas, que es más rápido que
+# mantenerlos durante la importación. Las búsquedas por ID toman la última
+# posición con ese ID, igual que los índices del almacén en memoria.
+_INDICES = """
+CREATE INDEX bodegas_por_id ON bodegas (id, posicion);
+CREATE INDEX cepas_por_id ON cepas (id, posicion);
+CREATE INDEX vinos_por_id ON vinos (id, posicion);
+CREATE INDEX vinos_por_bodega ON vinos (bodega_id, posicion);
+CREATE INDEX vino_cepas_por_cepa ON vino_cepas (cepa_id, vino);
+CREATE INDEX vino_partidas_por_anio ON vino_partidas (anio, vino);
+"""
+
+
+def ruta_base_de_datos(archivo: str) -> str:
+    """
+    Obtiene la ruta de la base de datos de un archivo de datos.
+
+    Args:
+        archivo: Ruta del archivo de datos
+
+    Returns:
+        Ruta de la base de datos SQLite, junto al archivo de datos
+    """
+    return archivo + ".sqlite"
+
+
+def _insertar_entidades(
+    conexion: sqlite3.Connection,
+    tabla: str,
+    filas: Iterable[Dict]
+) -> None:
+    """Inserta las filas JSON de bodegas o cepas en su tabla."""
+    conexion.executemany(
+        f"INSERT INTO {tabla} (posicion, id, nombre) VALUES (?, ?, ?)",
+        (
+            (posicion, fila['id'], fila['nombre'])
+            for posicion, fila in enumerate(filas)
+        )
+    )
+
+
+def _insertar_vinos(conexion: sqlite3.Connection, filas: Iterable[Dict]) -> None:
+    """
+    Inserta las filas JSON de vinos y sus relaciones con cepas y partidas,
+    por lotes de _LOTE vinos.
+    """
+    vinos: List[Tuple] = []
+    cepas: List[Tuple[int, int, str]] = []
+    partidas: List[Tuple[int, int, int]] = []
+
+    def volcar() -> None:
+        conexion.executemany(
+            "INSERT INTO vinos (posicion, id, nombre, bodega_id, anio_maximo,"
+            " anio_minimo) VALUES (?, ?, ?, ?, ?, ?)",
+            vinos
+        )
+        conexion.executemany(
+            "INSERT INTO vino_cepas (vino, orden, cepa_id) VALUES (?, ?, ?)",
+            cepas
+        )
+        conexion.executemany(
+            "INSERT INTO vino_partidas (vino, orden, anio) VALUES (?, ?, ?)",
+            partidas
+        )
+        vinos.clear()
+        cepas.clear()
+        partidas.clear()
+
+    for posicion, fila in enumerate(filas):
+        validar_partidas(fila['id'], fila['partidas'])
+        vinos.append((
+            posicion, fila['id'], fila['nombre'], fila['bodega'],
+            max(fila['partidas'], default=0), min(fila['partidas'], default=0)
+        ))
+        cepas.extend(
+            (posicion, orden, cepa_id)
+            for orden, cepa_id in enumerate(fila['cepas'])
+        )
+        partidas.extend(
+            (posicion, orden, anio)
+            for orden, anio in enumerate(fila['partidas'])
+        )
+        if len(vinos) >= _LOTE:
+            volcar()
+    volcar()
+
+
+def _indexar(conexion: sqlite3.Connection) -> None:
+    """
+    Crea los índices, resuelve las referencias de los vinos y calcula los
+    rangos de cada campo de ordenamiento, una vez insertadas todas las filas.
+    """
+    conexion.executescript(_INDICES)
+    # Las referencias apuntan a la última bodega o cepa con el ID, y quedan
+    # en NULL si no existe ninguna
+    conexion.execute(
+        "UPDATE vinos SET bodega ="
+        " (SELECT MAX(posicion) FROM bodegas WHERE id = vinos.bodega_id)"
+    )
+    conexion.execute(
+        "UPDATE vino_cepas SET cepa ="
+        " (SELECT MAX(posicion) FROM cepas WHERE id = vino_cepas.cepa_id)"
+    )
+    for tabla, claves in _CLAVES_SQL.items():
+        # Todos los rangos de la tabla en una sola pasada, para reescribir
+        # cada fila una vez. El id desempata y luego la posición, como el
+        # ordenamiento estable del almacén en memoria.
+        conexion.execute(
+            f"UPDATE {tabla} SET "
+            + ", ".join(f"rango_{campo} = orden.{campo}" for campo in claves)
+            + " FROM (SELECT posicion, "
+            + ", ".join(
+                f"ROW_NUMBER() OVER (ORDER BY {expresion}, id, posicion) - 1"
+                f" AS {campo}"
+                for campo, expresion in claves.items()
+            )
+            + f" FROM {tabla}) AS orden WHERE {tabla}.posicion = orden.posicion"
+        )
+        for campo in claves:
+            conexion.execute(
+                f"CREATE UNIQUE INDEX {tabla}_por_rango_{campo}"
+                f" ON {tabla} (rango_{campo})"
+            )
+    conexion.execute("PRAGMA analysis_limit = 1000")
+    conexion.execute("ANALYZE")
+
+
+def importar_json(archivo: str, tamanio: int, mtime_ns: int) -> bool:
+    """
+    Importa un archivo de datos JSON en su base de datos SQLite.
+
+    El archivo se recorre de a un elemento y cada fila se inserta apenas se
+    lee, sin mantener el archivo ni sus entidades en memoria. La base de
+    datos se escribe en un archivo temporal que luego reemplaza a la
+    anterior, por lo que nunca se abre una importación a medias.
+
+    Args:
+        archivo: Ruta del archivo de datos
+        tamanio: Tamaño del archivo de datos al consultarlo
+        mtime_ns: Fecha de modificación del archivo de datos al consultarlo
+
+    Returns:
+        False si el archivo de datos cambió durante la importación, en cuyo
+        caso no se reemplaza la base de datos
+
+    Raises:
+        OSError: Si el archivo no puede leerse o la base de datos no puede
+            escribirse
+        ValueError: Si el contenido del archivo no es JSON válido o el año
+            de alguna partida no es válido
+        KeyError: Si a una fila le falta un campo
+        sqlite3.Error: Si la base de datos no puede escribirse
+    """
+    destino = ruta_base_de_datos(archivo)
+    descriptor, temporal = tempfile.mkstemp(
+        prefix=os.path.basename(destino) + ".",
+        dir=os.path.dirname(os.path.abspath(destino))
+    )
+    os.close(descriptor)
+    vigente = False
+    try:
+        conexion = sqlite3.connect(temporal)
+        try:
+            # El archivo es temporal hasta reemplazar al destino: no hace
+            # falta diario de transacciones
+            conexion.execute("PRAGMA journal_mode = OFF")
+            conexion.execute("PRAGMA synchronous = OFF")
+            conexion.executescript(_ESQUEMA)
+            with open(archivo, 'r', encoding='utf-8') as origen:
+                lector = LectorJson(origen)
+                importadas = set()
+                for clave, filas in lector:
+                    # Como en el almacén en memoria, vale la primera sección
+                    # de cada clave y se descartan las desconocidas
+                    if clave in importadas or clave not in _CLAVES_SQL:
+                        for _ in filas:
+                            pass
+                    elif clave == "vinos":
+                        _insertar_vinos(conexion, filas)
+                    else:
+                        _insertar_entidades(conexion, clave, filas)
+                    importadas.add(clave)
+                version = lector.obtener_huella()
+            huella = huella_archivo(archivo)
+            estado = os.stat(archivo)
+            if (estado.st_size, estado.st_mtime_ns) == (tamanio, mtime_ns):
+                _indexar(conexion)
+                conexion.execute(
+                    "INSERT INTO origen VALUES (?, ?, ?, ?)",
+                    (tamanio, mtime_ns, huella, version)
+                )
+                conexion.execute(f"PRAGMA user_version = {_FORMATO}")
+                conexion.commit()
+                vigente = True
+        finally:
+            conexion.close()
+        if vigente:
+            os.replace(temporal, destino)
+    finally:
+        if not vigente:
+            os.remove(temporal)
+    return vigente
+
+
+def abrir_base_de_datos(
+    archivo: str,
+    tamanio: int,
+    mtime_ns: int,
+    fecha_modificacion: Optional[datetime] = None
+) -> Optional['AlmacenSqlite']:
+    """
+    Abre la base de datos de un archivo de datos, si corresponde a su
+    contenido actual.
+
+    Args:
+        archivo: Ruta del archivo de datos
+        tamanio: Tamaño actual del archivo de datos
+        mtime_ns: Fecha de modificación actual del archivo de datos
+        fecha_modificacion: Fecha de modificación para el almacén
+
+    Returns:
+        Almacén sobre la base de datos, o None si no existe, es de otro
+        archivo o de otro formato, o está dañada
+    """
+    try:
+        almacen = AlmacenSqlite(
+            ruta_base_de_datos(archivo), fecha_modificacion
+        )
+        tamanio_origen, mtime_origen, huella = almacen.obtener_origen()
+        if (tamanio_origen, mtime_origen) != (tamanio, mtime_ns):
+            return None
+        if huella != huella_archivo(archivo):
+            return None
+    except (OSError, ValueError, sqlite3.Error):
+        return None
+    return almacen
+
+
+class _Consulta(Sequence):
+    """
+    Secuencia de solo lectura cuyos elementos se obtienen con una consulta
+    por índice, y que se recorre completa con una única consulta.
+    """
+
+    def __init__(
+        self,
+        cantidad: int,
+        obtener: Callable[[int], Any],
+        recorrer: Callable[[], Iterator[Any]]
+    ) -> None:
+        """
+        Args:
+            cantidad: Cantidad de elementos
+            obtener: Obtiene el elemento de un índice válido
+            recorrer: Recorre todos los elementos en orden
+        """
+        self.__cantidad = cantidad
+        self.__obtener = obtener
+        self.__recorrer = recorrer
+
+    def __len__(self) -> int:
+        return self.__cantidad
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [
+                self.__obtener(i)
+                for i in range(*indice.indices(self.__cantidad))
+            ]
+        if indice < 0:
+            indice += self.__cantidad
+        if not 0 <= indice < self.__cantidad:
+            raise IndexError("Posición fuera de rango")
+        return self.__obtener(indice)
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.__recorrer()
+
+
+class AlmacenSqlite(Almacen):
+    """
+    Almacén de solo lectura que resuelve cada consulta con sentencias SQL
+    parametrizadas sobre una base de datos importada con importar_json.
+
+    Las colecciones y permutaciones son secuencias que consultan la base de
+    datos al accederlas, por lo que del catálogo solo se mantienen en
+    memoria los rangos de los vinos ya usados para ordenar (un entero por
+    vino y campo). Como en el almacén mapeado, las entidades se
+    crean en cada consulta y su JSON no se guarda entre consultas.
+
+    La conexión se abre en modo inmutable, ya que la base de datos nunca se
+    modifica una vez importada, y se comparte entre los hilos del proceso.
+    """
+
+    def __init__(
+        self,
+        ruta: str,
+        fecha_modificacion: Optional[datetime] = None
+    ) -> None:
+        """
+        Abre una base de datos importada.
+
+        Args:
+            ruta: Ruta de la base de datos
+            fecha_modificacion: Fecha de modificación del archivo de datos
+
+        Raises:
+            sqlite3.Error: Si la base de datos no puede abrirse o está dañada
+            ValueError: Si la base de datos es de otro formato
+        """
+        # SQLite se compila habitualmente en modo serializado
+        # (sqlite3.threadsafety == 3), que admite compartir la conexión
+        self.__conexion = sqlite3.connect(
+            Path(ruta).resolve().as_uri() + "?mode=ro&immutable=1",
+            uri=True, check_same_thread=False
+        )
+        formato, = self.__conexion.execute("PRAGMA user_version").fetchone()
+        if formato != _FORMATO:
+            self.__conexion.close()
+            raise ValueError("Formato de base de datos no válido")
+        self.__fecha_modificacion = fecha_modificacion
+        tamanio, mtime_ns, huella, self.__version = self.__conexion.execute(
+            "SELECT tamanio, mtime_ns, huella, version FROM origen"
+        ).fetchone()
+        self.__origen = (tamanio, mtime_ns, huella)
+        self.__cantidades = {
+            tabla: self.__valor(f"SELECT COUNT(*) FROM {tabla}")
+            for tabla in _CLAVES_SQL
+        }
+        self.__rangos_vinos: Dict[str, array] = {}
+        self.__nombres: Dict[str, IndiceNombres] = {}
+        self.__trigramas: Dict[str, IndiceTrigramas] = {}
+        self.__facetas: Optional[FacetasVinos] = None
+        self.__coleccion_bodegas = self.__coleccion(
+            "bodegas", self.__bodegaEn, self.__recorrerBodegas
+        )
+        self.__coleccion_cepas = self.__coleccion(
+            "cepas", self.__cepaEn, self.__recorrerCepas
+        )
+        self.__coleccion_vinos = self.__coleccion(
+            "vinos", self.__vinoEn, self.__recorrerVinos
+        )
+
+    def obtener_origen(self) -> Tuple[int, int, bytes]:
+        """
+        Obtiene los datos del archivo del que se importó la base de datos.
+
+        Returns:
+            Tupla (tamaño, fecha de modificación en nanosegundos, huella
+            SHA-1 binaria)
+        """
+        return self.__origen
+
+    def __valor(self, sql: str, parametros: Tuple = ()) -> Any:
+        """Primer valor de la primera fila de una consulta, o None."""
+        fila = self.__conexion.execute(sql, parametros).fetchone()
+        return fila[0] if fila is not None else None
+
+    def __valores(self, sql: str, parametros: Tuple = ()) -> Iterator[Any]:
+        """Primer valor de cada fila de una consulta, a medida que se leen."""
+        return (fila[0] for fila in self.__conexion.execute(sql, parametros))
+
+    def __coleccion(
+        self,
+        tabla: str,
+        crear: Callable[[int], Any],
+        recorrer: Callable[[], Iterator[Any]]
+    ) -> _Consulta:
+        """Colección de una tabla en el orden del archivo de datos."""
+        return _Consulta(self.__cantidades[tabla], crear, recorrer)
+
+    def __bodegaEn(self, posicion: int) -> 'Bodega':
+        """Crea la bodega de una posición."""
+        from modelos.bodega import Bodega
+        return Bodega(*self.__conexion.execute(
+            "SELECT id, nombre FROM bodegas WHERE posicion = ?", (posicion,)
+        ).fetchone())
+
+    def __cepaEn(self, posicion: int) -> 'Cepa':
+        """Crea la cepa de una posición."""
+        from modelos.cepa import Cepa
+        return Cepa(*self.__conexion.execute(
+            "SELECT id, nombre FROM cepas WHERE posicion = ?", (posicion,)
+        ).fetchone())
+
+    def __recorrerBodegas(self) -> Iterator['Bodega']:
+        from modelos.bodega import Bodega
+        return (
+            Bodega(id_, nombre) for id_, nombre in self.__conexion.execute(
+                "SELECT id, nombre FROM bodegas ORDER BY posicion"
+            )
+        )
+
+    def __recorrerCepas(self) -> Iterator['Cepa']:
+        from modelos.cepa import Cepa
+        return (
+            Cepa(id_, nombre) for id_, nombre in self.__conexion.execute(
+                "SELECT id, nombre FROM cepas ORDER BY posicion"
+            )
+        )
+
+    @staticmethod
+    def __crearVino(
+        fila: Tuple[str, str, str, Optional[str], Optional[str]],
+        cepas: Iterable[Tuple[str, Optional[str], Optional[str]]],
+        partidas: List[int]
+    ) -> 'Vino':
+        """
+        Crea un vino con sus referencias resueltas. Las bodegas y cepas
+        inexistentes se conservan como su ID.
+
+        Args:
+            fila: (id, nombre, ID de la bodega, ID y nombre de la bodega
+                existente o None)
+            cepas: (ID de la cepa, ID y nombre de la cepa existente o None)
+                de cada cepa, en orden
+            partidas: Años de las partidas
+        """
+        from modelos.bodega import Bodega
+        from modelos.cepa import Cepa
+        from modelos.vino import Vino
+        id_, nombre, bodega_id, id_bodega, nombre_bodega = fila
+        return Vino(
+            id_, nombre,
+            Bodega(id_bodega, nombre_bodega) if id_bodega is not None else bodega_id,
+            [
+                Cepa(id_cepa, nombre_cepa) if id_cepa is not None else cepa_id
+                for cepa_id, id_cepa, nombre_cepa in cepas
+            ],
+            partidas
+        )
+
+    def __vinoEn(self, posicion: int) -> 'Vino':
+        """Crea el vino de una posición con sus referencias resueltas."""
+        fila = self.__conexion.execute(
+            "SELECT v.id, v.nombre, v.bodega_id, b.id, b.nombre FROM vinos v"
+            " LEFT JOIN bodegas b ON b.posicion = v.bodega"
+            " WHERE v.posicion = ?",
+            (posicion,)
+        ).fetchone()
+        cepas = self.__conexion.execute(
+            "SELECT vc.cepa_id, c.id, c.nombre FROM vino_cepas vc"
+            " LEFT JOIN cepas c ON c.posicion = vc.cepa"
+            " WHERE vc.vino = ? ORDER BY vc.orden",
+            (posicion,)
+        )
+        partidas = list(self.__valores(
+            "SELECT anio FROM vino_partidas WHERE vino = ? ORDER BY orden",
+            (posicion,)
+        ))
+        return self.__crearVino(fila, cepas, partidas)
+
+    def __recorrerVinos(self) -> Iterator['Vino']:
+        """
+        Recorre todos los vinos combinando tres consultas ordenadas por
+        posición, en lugar de tres consultas por vino.
+        """
+        vinos = self.__conexion.execute(
+            "SELECT v.posicion, v.id, v.nombre, v.bodega_id, b.id, b.nombre"
+            " FROM vinos v LEFT JOIN bodegas b ON b.posicion = v.bodega"
+            " ORDER BY v.posicion"
+        )
+        cepas = self.__conexion.execute(
+            "SELECT vc.vino, vc.cepa_id, c.id, c.nombre FROM vino_cepas vc"
+            " LEFT JOIN cepas c ON c.posicion = vc.cepa"
+            " ORDER BY vc.vino, vc.orden"
+        )
+        partidas = self.__conexion.execute(
+            "SELECT vino, anio FROM vino_partidas ORDER BY vino, orden"
+        )
+        cepa = next(cepas, None)
+        partida = next(partidas, None)
+        for posicion, *fila in vinos:
+            cepas_vino = []
+            while cepa is not None and cepa[0] == posicion:
+                cepas_vino.append(cepa[1:])
+                cepa = next(cepas, None)
+            partidas_vino = []
+            while partida is not None and partida[0] == posicion:
+                partidas_vino.append(partida[1])
+                partida = next(partidas, None)
+            yield self.__crearVino(fila, cepas_vino, partidas_vino)
+
+    def __buscar(self, tabla: str, id_: str) -> Optional[int]:
+        """Posición de la última entidad de una tabla con un ID, o None."""
+        return self.__valor(
+            f"SELECT posicion FROM {tabla} WHERE id = ?"
+            " ORDER BY posicion DESC LIMIT 1",
+            (id_,)
+        )
+
+    def obtener_version(self) -> str:
+        return self.__version
+
+    def obtener_fecha_modificacion(self) -> Optional[datetime]:
+        return self.__fecha_modificacion
+
+    def obtener_bodegas(self) -> Sequence['Bodega']:
+        return self.__coleccion_bodegas
+
+    def obtener_cepas(self) -> Sequence['Cepa']:
+        return self.__coleccion_cepas
+
+    def obtener_vinos(self) -> Sequence['Vino']:
+        return self.__coleccion_vinos
+
+    def buscar_bodega(self, id: str) -> Optional['Bodega']:
+        posicion = self.__buscar("bodegas", id)
+        return self.__bodegaEn(posicion) if posicion is not None else None
+
+    def buscar_cepa(self, id: str) -> Optional['Cepa']:
+        posicion = self.__buscar("cepas", id)
+        return self.__cepaEn(posicion) if posicion is not None else None
+
+    def buscar_vino(self, id: str) -> Optional['Vino']:
+        posicion = self.__buscar("vinos", id)
+        return self.__vinoEn(posicion) if posicion is not None else None
+
+    def obtener_vinos_de_bodega(self, bodega_id: str) -> List['Vino']:
+        return list(map(self.__vinoEn, list(self.__valores(
+            "SELECT posicion FROM vinos WHERE bodega_id = ? ORDER BY posicion",
+            (bodega_id,)
+        ))))
+
+    def obtener_vinos_de_cepa(self, cepa_id: str) -> List['Vino']:
+        return list(map(self.__vinoEn, list(self.__valores(
+            "SELECT DISTINCT vino FROM vino_cepas WHERE cepa_id = ?"
+            " ORDER BY vino",
+            (cepa_id,)
+        ))))
+
+    def obtener_cepas_de_bodega(self, bodega_id: str) -> List['Cepa']:
+        from modelos.cepa import Cepa
+        # Cada cepa existente una vez, en el orden en que aparece por
+        # primera vez en los vinos de la bodega
+        cepas: Dict[str, 'Cepa'] = {}
+        for id_, nombre in self.__conexion.execute(
+            "SELECT c.id, c.nombre FROM vinos v"
+            " JOIN vino_cepas vc ON vc.vino = v.posicion"
+            " JOIN cepas c ON c.posicion = vc.cepa"
+            " WHERE v.bodega_id = ? ORDER BY v.posicion, vc.orden",
+            (bodega_id,)
+        ):
+            if id_ not in cepas:
+                cepas[id_] = Cepa(id_, nombre)
+        return list(cepas.values())
+
+    def obtener_permutacion(self, coleccion: str, orden: str) -> Sequence[int]:
+        if orden not in _CLAVES_SQL[coleccion]:
+            raise ValueError(f"Orden no válido: {orden}")
+        return _Consulta(
+            self.__cantidades[coleccion],
+            lambda rango: self.__valor(
+                f"SELECT posicion FROM {coleccion} WHERE rango_{orden} = ?",
+                (rango,)
+            ),
+            lambda: self.__valores(
+                f"SELECT posicion FROM {coleccion} ORDER BY rango_{orden}"
+            )
+        )
+
+    def obtener_rangos_vinos(self, orden: str) -> array:
+        """
+        Los rangos se usan para ordenar posiciones filtradas, que los
+        consultan en cualquier orden: se leen completos la primera vez y se
+        conservan mientras viva el almacén.
+        """
+        rangos = self.__rangos_vinos.get(orden)
+        if rangos is None:
+            if orden not in _CLAVES_SQL["vinos"]:
+                raise KeyError(orden)
+            rangos = array('I', self.__valores(
+                f"SELECT rango_{orden} FROM vinos ORDER BY posicion"
+            ))
+            self.__rangos_vinos[orden] = rangos
+        return rangos
+
+    @staticmethod
+    def __condicionDeAnios(
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> Tuple[str, Tuple]:
+        """Condición SQL sobre vino_partidas.anio para un rango de años."""
+        condiciones, parametros = [], []
+        if anio_desde is not None:
+            condiciones.append("anio >= ?")
+            parametros.append(anio_desde)
+        if anio_hasta is not None:
+            condiciones.append("anio <= ?")
+            parametros.append(anio_hasta)
+        return " AND ".join(condiciones), tuple(parametros)
+
+    def posiciones_por_anios(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> Optional[Iterable[int]]:
+        if anio_desde is None and anio_hasta is None:
+            return None
+        condicion, parametros = self.__condicionDeAnios(anio_desde, anio_hasta)
+        return self.__valores(
+            f"SELECT DISTINCT vino FROM vino_partidas WHERE {condicion}"
+            " ORDER BY vino",
+            parametros
+        )
+
+    def listas_por_anio(
+        self,
+        anio_desde: Optional[int],
+        anio_hasta: Optional[int]
+    ) -> List[Sequence[int]]:
+        return self.__obtenerFacetas().listas_de_anios(anio_desde, anio_hasta)
+
+    def listas_por_relacion(
+        self,
+        coleccion: str,
+        ids: Iterable[str]
+    ) -> List[Sequence[int]]:
+        facetas = self.__obtenerFacetas()
+        listas = []
+        for id_ in ids:
+            posicion = self.__buscar(coleccion, id_)
+            listas.append(facetas.lista(
+                coleccion, -1 if posicion is None else posicion
+            ))
+        return listas
+
+    def contar_facetas(
+        self,
+        posiciones: Optional[Sequence[int]]
+    ) -> Tuple[int, Dict[str, Dict[int, int]]]:
+        return self.__obtenerFacetas().contar(posiciones)
+
+    def __obtenerFacetas(self) -> FacetasVinos:
+        """
+        Las listas de las facetas se arman en memoria la primera vez que se
+        usan, leyendo los índices por año, bodega y cepa en orden, y se
+        conservan mientras viva el almacén.
+        """
+        if self.__facetas is None:
+            self.__facetas = FacetasVinos(self.__cantidades["vinos"], {
+                faceta: self.__listasPorValor(sql) for faceta, sql in (
+                    ("anios", "SELECT DISTINCT anio, vino FROM vino_partidas"
+                     " ORDER BY anio, vino"),
+                    ("bodegas", "SELECT bodega, posicion FROM vinos"
+                     " WHERE bodega IS NOT NULL ORDER BY bodega, posicion"),
+                    ("cepas", "SELECT DISTINCT cepa, vino FROM vino_cepas"
+                     " WHERE cepa IS NOT NULL ORDER BY cepa, vino"),
+                )
+            })
+        return self.__facetas
+
+    def __listasPorValor(self, sql: str) -> Dict[int, array]:
+        """Posiciones de cada valor de una consulta de pares (valor, vino)."""
+        listas: Dict[int, array] = {}
+        for valor, posicion in self.__conexion.execute(sql):
+            lista = listas.get(valor)
+            if lista is None:
+                lista = listas[valor] = array('I')
+            lista.append(posicion)
+        return listas
+
+    def buscar_por_prefijo(
+        self,
+        coleccion: str,
+        prefijo: str,
+        limite: int
+    ) -> List[int]:
+        """
+        SQL no compara sin acentos: el índice de nombres se arma en memoria
+        la primera vez que se busca en la colección, leyendo solo los
+        nombres, y se conserva mientras viva el almacén.
+        """
+        indice = self.__nombres.get(coleccion)
+        if indice is None:
+            indice = IndiceNombres(self.__nombresDe(coleccion))
+            self.__nombres[coleccion] = indice
+        return indice.buscar(prefijo, limite)
+
+    def buscar_similares(
+        self,
+        coleccion: str,
+        texto: str,
+        limite: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Como el de nombres, el índice de trigramas se arma en memoria la
+        primera vez que se busca en la colección.
+        """
+        indice = self.__trigramas.get(coleccion)
+        if indice is None:
+            indice = IndiceTrigramas(self.__nombresDe(coleccion))
+            self.__trigramas[coleccion] = indice
+        return indice.buscar(texto, limite)
+
+    def __nombresDe(self, coleccion: str) -> Iterator[str]:
+        """Nombres de una colección, por posición."""
+        if coleccion not in _CLAVES_SQL:
+            raise KeyError(coleccion)
+        return self.__valores(
+            f"SELECT nombre FROM {coleccion} ORDER BY posicion"
+        )
+
+    def obtener_fragmentos(self) -> Dict[Tuple[str, str, bool], bytes]:
+        # Las entidades no se conservan entre consultas: no hay JSON que
+        # reutilizar
+        return {}
+
+    def contiene(self, entidad: Any) -> bool:
+        """
+        Las entidades se crean en cada consulta, por lo que ninguna es la
+        instancia publicada por este almacén.
+
+        Returns:
+            Siempre False
+        """
+        return False
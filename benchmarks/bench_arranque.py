@@ -0,0 +1,63 @@
+"""
+Benchmark del arranque de la vinoteca.
+
+Compara el tiempo de Vinoteca.inicializar cargando el archivo JSON con el
+de restaurar la instantánea binaria guardada junto a él. El arranque desde
+la instantánea incluye verificar la huella del archivo de datos. También se
+informa cuánto tarda el primer arranque, que además guarda la instantánea.
+
+Uso:
+    python benchmarks/bench_arranque.py [cantidad_vinos ...]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.instantanea import ruta_instantanea  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+REPETICIONES = 3
+
+
+def medir_arranque(ruta: str, instantanea: bool) -> float:
+    """Mejor tiempo de inicializar la vinoteca entre varias repeticiones."""
+    mejor = float("inf")
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        Vinoteca.inicializar(ruta, instantanea=instantanea)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Mide ambos arranques sobre un catálogo sintético escrito en disco."""
+    ruta = escribir_catalogo(generar_catalogo(cantidad_vinos))
+    try:
+        t_json = medir_arranque(ruta, instantanea=False)
+
+        inicio = time.perf_counter()
+        Vinoteca.inicializar(ruta, instantanea=True)
+        t_guardar = time.perf_counter() - inicio
+        t_instantanea = medir_arranque(ruta, instantanea=True)
+
+        print(
+            f"{cantidad_vinos:>9} vinos  json={t_json * 1e3:9.1f} ms  "
+            f"json+guardar={t_guardar * 1e3:9.1f} ms  "
+            f"instantánea={t_instantanea * 1e3:9.1f} ms  "
+            f"({os.path.getsize(ruta_instantanea(ruta)) / 2**20:.1f} MiB)"
+        )
+    finally:
+        Vinoteca.inicializar(ruta, instantanea=False)
+        for archivo in (ruta, ruta_instantanea(ruta)):
+            if os.path.exists(archivo):
+                os.remove(archivo)
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
@@ -0,0 +1,56 @@
+"""
+Benchmark de Vinoteca.buscar_bodega / buscar_cepa / buscar_vino.
+
+Mide el costo promedio de una búsqueda por ID a medida que crece el
+catálogo. Con los índices por clave primaria el costo debe mantenerse
+constante.
+
+Uso:
+    python benchmarks/bench_busquedas.py [cantidad_vinos ...]
+"""
+import os
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+BUSQUEDAS = 100_000
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Carga un catálogo sintético y mide las búsquedas por ID."""
+    datos = generar_catalogo(cantidad_vinos)
+    ruta = escribir_catalogo(datos)
+    try:
+        Vinoteca.inicializar(ruta)
+    finally:
+        os.remove(ruta)
+
+    azar = random.Random(0)
+    ids = {
+        "bodega": [azar.choice(datos["bodegas"])["id"] for _ in range(BUSQUEDAS)],
+        "cepa": [azar.choice(datos["cepas"])["id"] for _ in range(BUSQUEDAS)],
+        "vino": [azar.choice(datos["vinos"])["id"] for _ in range(BUSQUEDAS)],
+    }
+    funciones = {
+        "bodega": Vinoteca.buscar_bodega,
+        "cepa": Vinoteca.buscar_cepa,
+        "vino": Vinoteca.buscar_vino,
+    }
+    resultados = []
+    for entidad, buscar in funciones.items():
+        claves = ids[entidad]
+        segundos = timeit.timeit(lambda: [buscar(c) for c in claves], number=1)
+        resultados.append(f"{entidad}={segundos / BUSQUEDAS * 1e9:7.1f} ns")
+    print(f"{cantidad_vinos:>9} vinos  " + "  ".join(resultados))
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
@@ -0,0 +1,84 @@
+"""
+Benchmark de la carga inicial de la vinoteca.
+
+Compara el pico de memoria y el tiempo de construir el almacén desde el
+diccionario completo de json.load con construirlo recorriendo el archivo
+de a un elemento con LectorJson. También informa la memoria del almacén
+ya construido, que es la cota inferior de cualquier carga.
+
+Uso:
+    python benchmarks/bench_carga.py [cantidad_vinos ...]
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.lector_json import LectorJson  # noqa: E402
+from almacenes.memoria import AlmacenEnMemoria  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+
+
+def cargar_completo(ruta: str) -> AlmacenEnMemoria:
+    """Carga anterior: el archivo entero en memoria y luego el almacén."""
+    with open(ruta, "r", encoding="utf-8") as archivo:
+        datos = json.load(archivo)
+    return AlmacenEnMemoria(datos)
+
+
+def cargar_por_elementos(ruta: str) -> AlmacenEnMemoria:
+    """Carga por elementos: cada fila se descarta al crear su entidad."""
+    with open(ruta, "r", encoding="utf-8") as archivo:
+        lector = LectorJson(archivo)
+        return AlmacenEnMemoria(lector, lector.obtener_huella)
+
+
+def medir_carga(cargar, ruta: str):
+    """
+    Devuelve (segundos, pico de bytes, bytes retenidos) de una carga. El
+    tiempo se toma en una carga sin tracemalloc, que la hace mucho más lenta.
+    """
+    gc.collect()
+    inicio = time.perf_counter()
+    cargar(ruta)
+    duracion = time.perf_counter() - inicio
+    gc.collect()
+    tracemalloc.start()
+    almacen = cargar(ruta)
+    retenidos, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del almacen
+    return duracion, pico, retenidos
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Mide ambas cargas sobre un catálogo sintético escrito en disco."""
+    ruta = escribir_catalogo(generar_catalogo(cantidad_vinos))
+    try:
+        tamanio = os.path.getsize(ruta)
+        for nombre, cargar in (
+            ("json.load", cargar_completo),
+            ("por elementos", cargar_por_elementos),
+        ):
+            duracion, pico, retenidos = medir_carga(cargar, ruta)
+            print(
+                f"{cantidad_vinos:>9} vinos  {nombre:<14} "
+                f"archivo={tamanio / 2**20:7.1f} MiB  "
+                f"tiempo={duracion * 1e3:8.1f} ms  "
+                f"pico={pico / 2**20:7.1f} MiB  "
+                f"almacén={retenidos / 2**20:7.1f} MiB  "
+                f"pico/almacén={pico / retenidos:5.2f}"
+            )
+    finally:
+        os.remove(ruta)
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
@@ -0,0 +1,83 @@
+"""
+Benchmark de Vinoteca.consulta.
+
+Compara los procesos que obtienen la lista completa de vinos y la filtran,
+ordenan y cortan en Python con la misma consulta armada con
+Vinoteca.consulta, que resuelve los filtros con los índices y, con un
+límite, selecciona los primeros vinos sin ordenar el resto.
+
+Uso:
+    python benchmarks/bench_consulta.py [cantidad_vinos ...]
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.base import CLAVES_VINOS  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+REPETICIONES = 5
+LIMITE = 10
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Carga un catálogo sintético y compara consultas con listas."""
+    datos = generar_catalogo(cantidad_vinos)
+    ruta = escribir_catalogo(datos)
+    try:
+        Vinoteca.inicializar(ruta)
+    finally:
+        os.remove(ruta)
+    cepa_id = datos["cepas"][0]["id"]
+    anio = CLAVES_VINOS["anio"]
+
+    def clave_anio(vino):
+        return anio(vino), vino.obtener_id()
+
+    def cantidad_cepas(vino):
+        return len(vino.obtener_cepa_ids()), vino.obtener_id()
+
+    consultas = {
+        "cepa+anio desc": (
+            lambda: list(
+                Vinoteca.consulta().filtrar(cepa=cepa_id)
+                .ordenar("anio", reverso=True).limitar(LIMITE)
+            ),
+            lambda: sorted(
+                [v for v in Vinoteca.obtener_vinos() if cepa_id in v.obtener_cepa_ids()],
+                key=clave_anio, reverse=True
+            )[:LIMITE],
+        ),
+        "condicion+clave": (
+            lambda: list(
+                Vinoteca.consulta().filtrar(lambda v: len(v.obtener_partidas()) > 2)
+                .ordenar(clave=cantidad_cepas).limitar(LIMITE)
+            ),
+            lambda: sorted(
+                [v for v in Vinoteca.obtener_vinos() if len(v.obtener_partidas()) > 2],
+                key=cantidad_cepas
+            )[:LIMITE],
+        ),
+    }
+    resultados = []
+    for nombre, (consulta, listas) in consultas.items():
+        assert [v.obtener_id() for v in consulta()] == [
+            v.obtener_id() for v in listas()
+        ]
+        t_consulta = timeit.timeit(consulta, number=REPETICIONES) / REPETICIONES
+        t_listas = timeit.timeit(listas, number=REPETICIONES) / REPETICIONES
+        resultados.append(
+            f"{nombre}: consulta={t_consulta * 1e3:8.2f} ms "
+            f"listas={t_listas * 1e3:8.2f} ms"
+        )
+    print(f"{cantidad_vinos:>9} vinos  " + "  ".join(resultados))
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
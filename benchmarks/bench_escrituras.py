@@ -0,0 +1,125 @@
+"""
+Benchmark de las escrituras con bitácora.
+
+Para cada tamaño de catálogo mide el tiempo medio de una modificación (el
+nombre de un vino), de un alta de vino al final, de la baja de un vino y
+de la modificación de una bodega, que recrea sus vinos; cada escritura incluye su fsync en la
+bitácora. Luego compara la cantidad de escrituras por segundo de un hilo
+con la de varios hilos concurrentes, que comparten cada fsync gracias a la
+confirmación agrupada, y mide cuánto tarda compactar la bitácora en el
+archivo de datos.
+
+Uso:
+    python benchmarks/bench_escrituras.py [cantidad_vinos ...]
+"""
+import glob
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+REPETICIONES = 200
+HILOS = 8
+
+
+def promedio(escritura, argumentos) -> float:
+    """Tiempo medio en segundos de una escritura sobre varios argumentos."""
+    inicio = time.perf_counter()
+    for argumento in argumentos:
+        escritura(argumento)
+    return (time.perf_counter() - inicio) / len(argumentos)
+
+
+def por_segundo(hilos: int, cantidad_vinos: int) -> float:
+    """Escrituras por segundo repartidas entre varios hilos."""
+    def trabajar(semilla: int) -> None:
+        azar = random.Random(semilla)
+        for _ in range(REPETICIONES // hilos):
+            id_ = f"vino-{azar.randrange(cantidad_vinos):08d}"
+            Vinoteca.modificar("vinos", id_, {"nombre": f"Vino {azar.random()}"})
+
+    trabajadores = [
+        threading.Thread(target=trabajar, args=(semilla,))
+        for semilla in range(hilos)
+    ]
+    inicio = time.perf_counter()
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    return (REPETICIONES // hilos * hilos) / (time.perf_counter() - inicio)
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Mide escrituras y compactación sobre un catálogo sintético."""
+    ruta = escribir_catalogo(generar_catalogo(cantidad_vinos))
+    try:
+        Vinoteca.inicializar(ruta)
+        azar = random.Random(7)
+        vinos = [
+            f"vino-{azar.randrange(cantidad_vinos):08d}"
+            for _ in range(REPETICIONES)
+        ]
+        bodegas = [
+            Vinoteca.buscar_vino(id_).obtener_bodega_id() for id_ in vinos
+        ]
+        bodega = Vinoteca.buscar_vino(vinos[0]).obtener_bodega_id()
+        cepa = Vinoteca.buscar_vino(vinos[0]).obtener_cepa_ids()[0]
+        altas = iter(range(REPETICIONES))
+        tiempos = {
+            "modificar": promedio(
+                lambda id_: Vinoteca.modificar(
+                    "vinos", id_, {"nombre": f"Vino {azar.random()}"}
+                ),
+                vinos
+            ),
+            "alta": promedio(
+                lambda _: Vinoteca.crear("vinos", {
+                    "id": f"alta-{next(altas):08d}", "nombre": "Alta",
+                    "bodega": bodega, "cepas": [cepa], "partidas": [2024]
+                }),
+                vinos
+            ),
+            "baja": promedio(
+                lambda indice: Vinoteca.eliminar(
+                    "vinos", f"alta-{indice:08d}"
+                ),
+                range(REPETICIONES)
+            ),
+            "bodega": promedio(
+                lambda id_: Vinoteca.modificar(
+                    "bodegas", id_, {"nombre": f"Bodega {azar.random()}"}
+                ),
+                bodegas[:20]
+            ),
+        }
+        uno = por_segundo(1, cantidad_vinos)
+        varios = por_segundo(HILOS, cantidad_vinos)
+        inicio = time.perf_counter()
+        Vinoteca.compactar()
+        compactacion = time.perf_counter() - inicio
+        print(
+            f"{cantidad_vinos:>9} vinos  "
+            + "  ".join(
+                f"{nombre}={t * 1e3:7.2f} ms" for nombre, t in tiempos.items()
+            )
+            + f"  1 hilo={uno:7.0f}/s  {HILOS} hilos={varios:7.0f}/s"
+            f"  compactación={compactacion * 1e3:8.1f} ms"
+        )
+    finally:
+        Vinoteca.inicializar("vinoteca.json")
+        for archivo in [ruta] + glob.glob(ruta + ".bitacora*"):
+            os.remove(archivo)
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
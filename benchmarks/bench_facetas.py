@@ -0,0 +1,70 @@
+"""
+Benchmark de Vinoteca.obtener_facetas.
+
+Mide el costo promedio de contar los vinos por año, bodega y cepa sin
+filtros (que se lee de las tablas calculadas al cargar), dentro de un año y
+dentro de una bodega, y lo compara con obtener los vinos filtrados y
+contarlos de a uno, que es lo que hacía el cliente.
+
+Uso:
+    python benchmarks/bench_facetas.py [cantidad_vinos ...]
+"""
+import os
+import random
+import sys
+import timeit
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+REPETICIONES = 20
+
+
+def contar_recorriendo(**filtros) -> tuple:
+    """Cuenta las facetas recorriendo los vinos filtrados."""
+    anios, bodegas, cepas = Counter(), Counter(), Counter()
+    for vino in Vinoteca.obtener_vinos(**filtros):
+        anios.update(set(vino.obtener_partidas()))
+        bodegas[vino.obtener_bodega_id()] += 1
+        cepas.update(set(vino.obtener_cepa_ids()))
+    return anios, bodegas, cepas
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Carga un catálogo sintético y mide el conteo de facetas."""
+    datos = generar_catalogo(cantidad_vinos)
+    ruta = escribir_catalogo(datos)
+    try:
+        Vinoteca.inicializar(ruta)
+    finally:
+        os.remove(ruta)
+
+    azar = random.Random(0)
+    vino = azar.choice(datos["vinos"])
+    casos = {
+        "todos": {},
+        "anio": {"anio": vino["partidas"][0]},
+        "bodega": {"bodega": vino["bodega"]},
+    }
+    resultados = []
+    for nombre, filtros in casos.items():
+        indice = timeit.timeit(
+            lambda: Vinoteca.obtener_facetas(**filtros), number=REPETICIONES
+        ) / REPETICIONES
+        recorrido = timeit.timeit(
+            lambda: contar_recorriendo(**filtros), number=3
+        ) / 3
+        resultados.append(
+            f"{nombre}={indice * 1e3:7.2f} ms (recorrido {recorrido * 1e3:8.1f} ms)"
+        )
+    print(f"{cantidad_vinos:>9} vinos  " + "  ".join(resultados))
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
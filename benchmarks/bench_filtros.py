@@ -0,0 +1,99 @@
+"""
+Benchmark de los filtros combinados de Vinoteca.obtener_vinos.
+
+Compara el recorrido de los objetos Vino en Python con los filtros
+resueltos combinando las listas de posiciones de cada año, bodega y cepa,
+a partir del filtro más selectivo. Una bodega con pocos vinos junto a un
+rango de años con muchos debería costar lo mismo que la bodega sola.
+
+Uso:
+    python benchmarks/bench_filtros.py [cantidad_vinos ...]
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+REPETICIONES = 5
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Carga un catálogo sintético y mide los filtros combinados."""
+    datos = generar_catalogo(cantidad_vinos)
+    ruta = escribir_catalogo(datos)
+    try:
+        Vinoteca.inicializar(ruta)
+    finally:
+        os.remove(ruta)
+    bodega_id = datos["bodegas"][0]["id"]
+    bodega_ids = {bodega["id"] for bodega in datos["bodegas"][:3]}
+    cepa_id = datos["cepas"][0]["id"]
+    cepa_ids = {cepa["id"] for cepa in datos["cepas"][:2]}
+
+    def cepas_de(vino):
+        return {c.obtener_id() for c in vino.obtener_cepa()}
+
+    consultas = {
+        "anio+cepa": (
+            lambda: Vinoteca.obtener_vinos(2010, cepa=cepa_id),
+            lambda: [
+                vino for vino in Vinoteca.obtener_vinos()
+                if 2010 in vino.obtener_partidas()
+                and cepa_id in [c.obtener_id() for c in vino.obtener_cepa()]
+            ],
+        ),
+        "bodega+rango": (
+            lambda: Vinoteca.obtener_vinos(
+                anio_desde=2000, anio_hasta=2010, bodega=bodega_id
+            ),
+            lambda: [
+                vino for vino in Vinoteca.obtener_vinos()
+                if vino.obtener_bodega().obtener_id() == bodega_id
+                and any(2000 <= a <= 2010 for a in vino.obtener_partidas())
+            ],
+        ),
+        "bodegas+cepas": (
+            lambda: Vinoteca.obtener_vinos(
+                anio_desde=1990, bodega=sorted(bodega_ids), cepa=sorted(cepa_ids)
+            ),
+            lambda: [
+                vino for vino in Vinoteca.obtener_vinos()
+                if vino.obtener_bodega().obtener_id() in bodega_ids
+                and cepas_de(vino) & cepa_ids
+            ],
+        ),
+        "todas_las_cepas": (
+            lambda: Vinoteca.obtener_vinos(
+                cepa=sorted(cepa_ids), todas_las_cepas=True
+            ),
+            lambda: [
+                vino for vino in Vinoteca.obtener_vinos()
+                if cepas_de(vino) >= cepa_ids
+            ],
+        ),
+    }
+    resultados = []
+    for nombre, (planificado, recorrido) in consultas.items():
+        assert [v.obtener_id() for v in planificado()] == [
+            v.obtener_id() for v in recorrido()
+        ]
+        t_planificado = timeit.timeit(planificado, number=REPETICIONES) / REPETICIONES
+        t_recorrido = timeit.timeit(recorrido, number=REPETICIONES) / REPETICIONES
+        resultados.append(
+            f"{nombre}: planificado={t_planificado * 1e3:8.2f} ms "
+            f"recorrido={t_recorrido * 1e3:8.2f} ms"
+        )
+    print(f"{cantidad_vinos:>9} vinos")
+    for resultado in resultados:
+        print("    " + resultado)
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
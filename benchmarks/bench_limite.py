@@ -0,0 +1,83 @@
+"""
+Benchmark de los listados ordenados con limite.
+
+Mide el costo de pedir los primeros vinos de un orden (por ejemplo, los diez
+más recientes) con y sin filtros, y lo compara con ordenar una copia de la
+lista completa y cortarla, que es lo que hacía el cliente. Sin filtros la
+página se lee del orden precalculado; con filtros amplios se recorre ese
+orden y con filtros selectivos se seleccionan los primeros con un heap.
+También mide las facetas con limite frente a todas las bodegas y cepas.
+
+Uso:
+    python benchmarks/bench_limite.py [cantidad_vinos ...]
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.base import CLAVES_VINOS  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+REPETICIONES = 5
+LIMITE = 10
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Carga un catálogo sintético y mide los listados con limite."""
+    datos = generar_catalogo(cantidad_vinos)
+    ruta = escribir_catalogo(datos)
+    try:
+        Vinoteca.inicializar(ruta)
+    finally:
+        os.remove(ruta)
+    anio = CLAVES_VINOS["anio"]
+    cepa_id = datos["cepas"][0]["id"]
+
+    def copia_ordenada(**filtros):
+        vinos = list(Vinoteca.obtener_vinos(**filtros))
+        vinos.sort(key=lambda v: (anio(v), v.obtener_id()), reverse=True)
+        return vinos[:LIMITE]
+
+    consultas = {
+        "sin filtros": {},
+        "anio_desde": {"anio_desde": 2000},
+        "cepa": {"cepa": cepa_id},
+    }
+    print(f"{cantidad_vinos:>9} vinos")
+    for nombre, filtros in consultas.items():
+        def con_limite():
+            return Vinoteca.obtener_vinos(
+                orden="anio", reverso=True, limite=LIMITE, **filtros
+            )
+        assert [v.obtener_id() for v in con_limite()] == [
+            v.obtener_id() for v in copia_ordenada(**filtros)
+        ]
+        t_limite = timeit.timeit(con_limite, number=REPETICIONES) / REPETICIONES
+        t_copia = timeit.timeit(
+            lambda: copia_ordenada(**filtros), number=REPETICIONES
+        ) / REPETICIONES
+        print(
+            f"    {nombre:<12} limite={t_limite * 1e3:8.2f} ms "
+            f"copia+sorted={t_copia * 1e3:8.2f} ms"
+        )
+    t_limite = timeit.timeit(
+        lambda: Vinoteca.obtener_facetas(anio=2010, limite=LIMITE),
+        number=REPETICIONES
+    ) / REPETICIONES
+    t_todas = timeit.timeit(
+        lambda: Vinoteca.obtener_facetas(anio=2010), number=REPETICIONES
+    ) / REPETICIONES
+    print(
+        f"    {'facetas':<12} limite={t_limite * 1e3:8.2f} ms "
+        f"todas={t_todas * 1e3:8.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
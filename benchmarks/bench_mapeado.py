@@ -0,0 +1,106 @@
+"""
+Benchmark de memoria de varios procesos que comparten el catálogo.
+
+Carga la vinoteca en un proceso y crea varios procesos hijos con fork,
+como un servidor pre-fork. Cada hijo recorre y serializa todos los vinos y
+luego informa su memoria privada (Private_Clean + Private_Dirty de
+/proc/self/smaps_rollup): la que no comparte con los demás procesos.
+Se compara el almacén en memoria, cuyas páginas se copian en cada hijo al
+actualizarse los contadores de referencias, con el almacén mapeado.
+
+Cada medición corre en un proceso propio, y el mapa se escribe antes en
+otro, para que la memoria liberada al construirlo no se cuente como copia.
+
+Solo funciona en Linux.
+
+Uso:
+    python benchmarks/bench_mapeado.py [cantidad_vinos [procesos]]
+"""
+import gc
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.mapeado import ruta_mapa  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+
+def memoria_privada() -> int:
+    """Bytes de memoria privada del proceso actual."""
+    total = 0
+    with open("/proc/self/smaps_rollup", encoding="ascii") as smaps:
+        for linea in smaps:
+            if linea.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(linea.split()[1]) * 1024
+    return total
+
+
+def trabajar(escritura: int) -> None:
+    """Cuerpo de un proceso hijo: recorre los vinos e informa su memoria."""
+    antes = memoria_privada()
+    inicio = time.perf_counter()
+    for vino in Vinoteca.obtener_vinos():
+        Vinoteca.obtener_fragmento(vino)
+    for vino in Vinoteca.obtener_vinos(orden="nombre", anio_desde=2000):
+        vino.obtener_bodega().obtener_nombre()
+    duracion = time.perf_counter() - inicio
+    os.write(escritura, f"{antes} {memoria_privada()} {duracion}\n".encode("ascii"))
+    os._exit(0)
+
+
+def en_proceso(funcion, *argumentos) -> None:
+    """Ejecuta una función en un proceso hijo y espera a que termine."""
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        funcion(*argumentos)
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def medir(ruta: str, almacen: str, procesos: int) -> None:
+    """Mide la memoria privada de los hijos con un tipo de almacén."""
+    Vinoteca.inicializar(ruta, almacen=almacen)
+    gc.collect()
+    lectura, escritura = os.pipe()
+    hijos = []
+    for _ in range(procesos):
+        pid = os.fork()
+        if pid == 0:
+            os.close(lectura)
+            trabajar(escritura)
+        hijos.append(pid)
+    os.close(escritura)
+    with os.fdopen(lectura, encoding="ascii") as resultados:
+        medidas = [tuple(map(float, linea.split())) for linea in resultados]
+    for pid in hijos:
+        os.waitpid(pid, 0)
+    inicial = sum(medida[0] for medida in medidas) / len(medidas)
+    privada = sum(medida[1] for medida in medidas) / len(medidas)
+    duracion = sum(medida[2] for medida in medidas) / len(medidas)
+    print(
+        f"{almacen:<8} procesos={procesos}  "
+        f"privada por proceso={inicial / 2**20:6.1f} -> "
+        f"{privada / 2**20:6.1f} MiB  "
+        f"total={privada * procesos / 2**20:8.1f} MiB  "
+        f"recorrido={duracion * 1e3:8.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    cantidad_vinos = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    procesos = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    ruta = escribir_catalogo(generar_catalogo(cantidad_vinos))
+    try:
+        en_proceso(Vinoteca.inicializar, ruta, None, "mapeado")
+        for almacen in ("memoria", "mapeado"):
+            en_proceso(medir, ruta, almacen, procesos)
+    finally:
+        for archivo in (ruta, ruta_mapa(ruta)):
+            if os.path.exists(archivo):
+                os.remove(archivo)
@@ -0,0 +1,103 @@
+"""
+Benchmark de memoria por vino.
+
+Compara los bytes por vino del modelo actual (clases con __slots__ y
+referencias resueltas a Bodega/Cepa) con la representación anterior,
+basada en un __dict__ por instancia con atributos name-mangled, el
+nombre guardado dos veces y los IDs de bodega y cepas como strings.
+
+Los IDs, nombres y partidas se generan antes de medir y se comparten
+entre ambas representaciones, de modo que solo se mide lo que cada
+modelo agrega por vino.
+
+Uso:
+    python benchmarks/bench_memoria.py [cantidad_vinos]
+"""
+import gc
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modelos.bodega import Bodega  # noqa: E402
+from modelos.cepa import Cepa  # noqa: E402
+from modelos.vino import Vino  # noqa: E402
+
+
+class _VinoAnterior:
+    """Réplica de la disposición en memoria del modelo de vino anterior."""
+
+    def __init__(self, id, nombre, bodega_id, cepa_ids, partidas):
+        self._EntidadVineria__id = id
+        self._EntidadVineria__nombre = nombre
+        self._Vino__bodega_id = bodega_id
+        self._Vino__cepa_ids = cepa_ids
+        self._Vino__partidas = partidas
+        self._Vino__nombre = nombre
+
+
+def generar_filas(cantidad_vinos: int):
+    """Genera las filas de datos crudos compartidas por ambas mediciones."""
+    cantidad_bodegas = max(1, cantidad_vinos // 20)
+    bodegas = {
+        f"bodega-{i:08d}": Bodega(f"bodega-{i:08d}", f"Bodega {i}")
+        for i in range(cantidad_bodegas)
+    }
+    cepas = {
+        f"cepa-{i:04d}": Cepa(f"cepa-{i:04d}", f"Cepa {i}") for i in range(40)
+    }
+    ids_bodegas = list(bodegas)
+    ids_cepas = list(cepas)
+    filas = [
+        (
+            f"vino-{i:08d}",
+            f"Vino {i}",
+            ids_bodegas[i % cantidad_bodegas],
+            [ids_cepas[i % 40], ids_cepas[(i * 7) % 40]],
+            [2020 + i % 3, 2021 + i % 3],
+        )
+        for i in range(cantidad_vinos)
+    ]
+    return bodegas, cepas, filas
+
+
+def medir(construir, filas) -> float:
+    """Mide los bytes asignados por vino al construir la colección."""
+    gc.collect()
+    tracemalloc.start()
+    inicio, _ = tracemalloc.get_traced_memory()
+    vinos = construir(filas)
+    fin, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del vinos
+    return (fin - inicio) / len(filas)
+
+
+def construir_anterior(filas):
+    # El modelo anterior guardaba las listas de IDs y partidas tal cual
+    return [
+        _VinoAnterior(id, nombre, bodega, list(cepas), list(partidas))
+        for id, nombre, bodega, cepas, partidas in filas
+    ]
+
+
+def construir_actual(filas, bodegas, cepas):
+    vinos = [
+        Vino(id, nombre, bodega, cepas_vino, list(partidas))
+        for id, nombre, bodega, cepas_vino, partidas in filas
+    ]
+    for vino in vinos:
+        vino.resolver_referencias(bodegas, cepas)
+    return vinos
+
+
+if __name__ == "__main__":
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    bodegas, cepas, filas = generar_filas(cantidad)
+    anterior = medir(construir_anterior, filas)
+    actual = medir(lambda f: construir_actual(f, bodegas, cepas), filas)
+    print(f"{cantidad} vinos")
+    print(f"  modelo anterior: {anterior:7.1f} bytes/vino")
+    print(f"  modelo actual:   {actual:7.1f} bytes/vino")
+    print(f"  reducción:       {100 * (1 - actual / anterior):6.1f} %")
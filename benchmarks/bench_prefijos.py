@@ -0,0 +1,67 @@
+"""
+Benchmark de Vinoteca.buscar_por_prefijo.
+
+Mide el costo promedio de una búsqueda de vinos por prefijo del nombre a
+medida que crece el catálogo, para prefijos cortos (que coinciden con muchos
+nombres) y largos, y lo compara con filtrar todos los nombres, que es lo que
+hacía el cliente. Con el índice de nombres el costo depende del prefijo y
+del límite, no de la cantidad de vinos.
+
+Uso:
+    python benchmarks/bench_prefijos.py [cantidad_vinos ...]
+"""
+import os
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.nombres import normalizar  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+BUSQUEDAS = 2_000
+LIMITE = 10
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Carga un catálogo sintético y mide las búsquedas por prefijo."""
+    datos = generar_catalogo(cantidad_vinos)
+    ruta = escribir_catalogo(datos)
+    try:
+        Vinoteca.inicializar(ruta)
+    finally:
+        os.remove(ruta)
+
+    azar = random.Random(0)
+    nombres = [vino["nombre"] for vino in datos["vinos"]]
+    prefijos = {
+        "corto": ["vino " + str(azar.randrange(10)) for _ in range(BUSQUEDAS)],
+        "largo": [azar.choice(nombres)[:9] for _ in range(BUSQUEDAS)],
+    }
+    resultados = []
+    for tipo, consultas in prefijos.items():
+        segundos = timeit.timeit(
+            lambda: [
+                Vinoteca.buscar_por_prefijo("vinos", prefijo, LIMITE)
+                for prefijo in consultas
+            ],
+            number=1
+        )
+        resultados.append(f"{tipo}={segundos / BUSQUEDAS * 1e6:7.1f} µs")
+    normalizados = [normalizar(nombre) for nombre in nombres]
+    clave = normalizar(prefijos["largo"][0])
+    segundos = timeit.timeit(
+        lambda: [nombre for nombre in normalizados if nombre.startswith(clave)][:LIMITE],
+        number=10
+    )
+    resultados.append(f"recorrido={segundos / 10 * 1e6:9.1f} µs")
+    print(f"{cantidad_vinos:>9} vinos  " + "  ".join(resultados))
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
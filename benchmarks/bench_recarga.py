@@ -0,0 +1,81 @@
+"""
+Benchmark de la recarga incremental de la vinoteca.
+
+Compara construir el almacén completo con derivarlo del almacén anterior
+después de editar unas pocas filas del catálogo. Ambos tiempos excluyen
+el parseo del JSON, que es igual en los dos casos y se informa aparte.
+
+La derivación solo compara cada fila con la anterior y aplica como cambios
+puntuales las que difieren, por lo que debe tardar menos que la cuarta
+parte de la construcción completa; el benchmark falla si no se cumple.
+
+Uso:
+    python benchmarks/bench_recarga.py [cantidad_vinos ...]
+"""
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.memoria import AlmacenEnMemoria  # noqa: E402
+from catalogo_sintetico import generar_catalogo  # noqa: E402
+
+FILAS_EDITADAS = 30
+# Fracción máxima del tiempo de la construcción completa que puede tardar
+# la derivación
+COTA_INCREMENTAL = 0.25
+
+
+def editar(datos: dict, azar: random.Random) -> dict:
+    """Edita algunas filas: renombres, partidas, cepas y un alta al final."""
+    datos = json.loads(json.dumps(datos))
+    vinos = datos["vinos"]
+    for i in range(FILAS_EDITADAS):
+        vino = azar.choice(vinos)
+        if i % 3 == 0:
+            vino["nombre"] += " (edición)"
+        elif i % 3 == 1:
+            vino["partidas"] = vino["partidas"] + [2025]
+        else:
+            vino["cepas"] = [azar.choice(datos["cepas"])["id"]]
+    vinos.append(dict(vinos[0], id="vino-nuevo", nombre="Vino nuevo"))
+    return datos
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Mide la recarga completa e incremental de un catálogo sintético."""
+    datos = generar_catalogo(cantidad_vinos)
+    anterior = AlmacenEnMemoria(datos)
+    editados = editar(datos, random.Random(7))
+
+    contenido = json.dumps(editados)
+    inicio = time.perf_counter()
+    json.loads(contenido)
+    t_parseo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    AlmacenEnMemoria(editados)
+    t_completa = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    anterior.derivar(editados)
+    t_incremental = time.perf_counter() - inicio
+
+    print(
+        f"{cantidad_vinos:>9} vinos  parseo={t_parseo * 1e3:9.1f} ms  "
+        f"completa={t_completa * 1e3:9.1f} ms  "
+        f"incremental={t_incremental * 1e3:9.1f} ms"
+    )
+    assert t_incremental < t_completa * COTA_INCREMENTAL, (
+        f"La derivación tardó {t_incremental / t_completa:.0%} de la "
+        f"construcción completa (cota: {COTA_INCREMENTAL:.0%})"
+    )
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
@@ -0,0 +1,72 @@
+"""
+Benchmark de Vinoteca.buscar_similares.
+
+Mide el costo promedio de una búsqueda aproximada de vinos con errores de
+tipeo a medida que crece el catálogo, y lo compara con calcular la
+similitud del texto contra todos los nombres con difflib, que es la
+alternativa sin índice. Con el índice de trigramas solo se evalúan los
+nombres que comparten con el texto alguno de sus trigramas menos
+frecuentes.
+
+Uso:
+    python benchmarks/bench_similares.py [cantidad_vinos ...]
+"""
+import difflib
+import os
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.nombres import normalizar  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+BUSQUEDAS = 200
+LIMITE = 10
+
+
+def con_error(texto: str, azar: random.Random) -> str:
+    """Intercambia dos letras consecutivas del texto, como un error de tipeo."""
+    i = azar.randrange(len(texto) - 1)
+    return texto[:i] + texto[i + 1] + texto[i] + texto[i + 2:]
+
+
+def medir(cantidad_vinos: int) -> None:
+    """Carga un catálogo sintético y mide las búsquedas aproximadas."""
+    datos = generar_catalogo(cantidad_vinos)
+    ruta = escribir_catalogo(datos)
+    try:
+        Vinoteca.inicializar(ruta)
+    finally:
+        os.remove(ruta)
+
+    azar = random.Random(0)
+    nombres = [vino["nombre"] for vino in datos["vinos"]]
+    consultas = [con_error(azar.choice(nombres), azar) for _ in range(BUSQUEDAS)]
+    segundos = timeit.timeit(
+        lambda: [
+            Vinoteca.buscar_similares(texto, LIMITE, ["vinos"])
+            for texto in consultas
+        ],
+        number=1
+    )
+    indice = f"índice={segundos / BUSQUEDAS * 1e3:8.3f} ms"
+    normalizados = [normalizar(nombre) for nombre in nombres]
+    texto = normalizar(consultas[0])
+    segundos = timeit.timeit(
+        lambda: difflib.get_close_matches(texto, normalizados, LIMITE, 0.6),
+        number=1
+    )
+    print(
+        f"{cantidad_vinos:>9} vinos  {indice}"
+        f"  recorrido={segundos * 1e3:9.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for tamanio in tamanios:
+        medir(tamanio)
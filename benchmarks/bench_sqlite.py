@@ -0,0 +1,112 @@
+"""
+Benchmark del almacén SQLite frente al almacén en memoria.
+
+Para cada tipo de almacén mide, en un proceso propio, el arranque con los
+archivos derivados ya escritos (la base de datos SQLite se importa antes en
+otro proceso), la memoria residente que agrega la carga y el tiempo medio
+de consultas típicas de la API: búsqueda por ID, página ordenada, filtro
+combinado de bodega y cepa, y vinos de una bodega. También informa cuánto
+tarda la importación del JSON en SQLite.
+
+Solo funciona en Linux.
+
+Uso:
+    python benchmarks/bench_sqlite.py [cantidad_vinos ...]
+"""
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from almacenes.sqlite import importar_json, ruta_base_de_datos  # noqa: E402
+from catalogo_sintetico import escribir_catalogo, generar_catalogo  # noqa: E402
+from vinoteca import Vinoteca  # noqa: E402
+
+REPETICIONES = 200
+
+
+def memoria_residente() -> int:
+    """Bytes de memoria residente del proceso actual."""
+    with open("/proc/self/statm", encoding="ascii") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def promedio(consulta, argumentos) -> float:
+    """Tiempo medio en segundos de una consulta sobre varios argumentos."""
+    inicio = time.perf_counter()
+    for argumento in argumentos:
+        consulta(argumento)
+    return (time.perf_counter() - inicio) / len(argumentos)
+
+
+def medir(ruta: str, almacen: str, cantidad_vinos: int) -> None:
+    """Mide arranque, memoria y consultas con un tipo de almacén."""
+    antes = memoria_residente()
+    inicio = time.perf_counter()
+    Vinoteca.inicializar(ruta, almacen=almacen)
+    arranque = time.perf_counter() - inicio
+    residente = memoria_residente() - antes
+
+    azar = random.Random(7)
+    vinos = [f"vino-{azar.randrange(cantidad_vinos):08d}" for _ in range(REPETICIONES)]
+    bodegas = [
+        Vinoteca.buscar_vino(id_).obtener_bodega_id() for id_ in vinos
+    ]
+    tiempos = {
+        "buscar": promedio(Vinoteca.buscar_vino, vinos),
+        "página": promedio(
+            lambda anio: Vinoteca.obtener_vinos(anio=anio, orden="nombre", limite=20),
+            [azar.randint(1990, 2024) for _ in range(REPETICIONES)]
+        ),
+        "filtro": promedio(
+            lambda bodega: Vinoteca.obtener_vinos(bodega=bodega, cepa="cepa-00000001"),
+            bodegas
+        ),
+        "de bodega": promedio(Vinoteca.obtener_vinos_de_bodega, bodegas),
+    }
+    print(
+        f"{cantidad_vinos:>9} vinos  {almacen:<8} "
+        f"arranque={arranque * 1e3:8.1f} ms  "
+        f"residente={residente / 2**20:7.1f} MiB  "
+        + "  ".join(f"{nombre}={t * 1e6:7.1f} µs" for nombre, t in tiempos.items())
+    )
+
+
+def en_proceso(funcion, *argumentos) -> None:
+    """Ejecuta una función en un proceso hijo y espera a que termine."""
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        funcion(*argumentos)
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def comparar(cantidad_vinos: int) -> None:
+    """Importa un catálogo sintético y mide ambos almacenes sobre él."""
+    ruta = escribir_catalogo(generar_catalogo(cantidad_vinos))
+    try:
+        estado = os.stat(ruta)
+        inicio = time.perf_counter()
+        importar_json(ruta, estado.st_size, estado.st_mtime_ns)
+        print(
+            f"{cantidad_vinos:>9} vinos  importación="
+            f"{(time.perf_counter() - inicio) * 1e3:8.1f} ms  "
+            f"({os.path.getsize(ruta_base_de_datos(ruta)) / 2**20:.1f} MiB)"
+        )
+        for almacen in ("memoria", "sqlite"):
+            en_proceso(medir, ruta, almacen, cantidad_vinos)
+    finally:
+        for archivo in (ruta, ruta_base_de_datos(ruta)):
+            if os.path.exists(archivo):
+                os.remove(archivo)
+
+
+if __name__ == "__main__":
+    tamanios = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for tamanio in tamanios:
+        comparar(tamanio)
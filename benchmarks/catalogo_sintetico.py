@@ -0,0 +1,66 @@
+"""Generación de catálogos sintéticos para los benchmarks de la vinoteca."""
+import json
+import os
+import random
+import tempfile
+from typing import Dict
+
+
+def generar_catalogo(
+    cantidad_vinos: int,
+    cantidad_bodegas: int = 0,
+    cantidad_cepas: int = 40,
+    semilla: int = 42
+) -> Dict:
+    """
+    Genera un catálogo con la misma estructura que vinoteca.json.
+
+    Args:
+        cantidad_vinos: Cantidad de vinos a generar
+        cantidad_bodegas: Cantidad de bodegas (por defecto, una cada 20 vinos)
+        cantidad_cepas: Cantidad de cepas distintas
+        semilla: Semilla del generador aleatorio, para resultados repetibles
+
+    Returns:
+        Diccionario con las claves bodegas, cepas y vinos
+    """
+    azar = random.Random(semilla)
+    cantidad_bodegas = cantidad_bodegas or max(1, cantidad_vinos // 20)
+    bodegas = [
+        {"id": f"bodega-{i:08d}", "nombre": f"Bodega {azar.randrange(10**6)} {i}"}
+        for i in range(cantidad_bodegas)
+    ]
+    cepas = [
+        {"id": f"cepa-{i:08d}", "nombre": f"Cepa {i}"}
+        for i in range(cantidad_cepas)
+    ]
+    vinos = []
+    for i in range(cantidad_vinos):
+        primera = azar.randint(1990, 2024)
+        vinos.append({
+            "id": f"vino-{i:08d}",
+            "nombre": f"Vino {azar.randrange(10**6)} {i}",
+            "bodega": bodegas[azar.randrange(cantidad_bodegas)]["id"],
+            "cepas": [
+                cepa["id"] for cepa in azar.sample(cepas, azar.randint(1, 3))
+            ],
+            "partidas": list(range(primera, min(primera + azar.randint(1, 4), 2025))),
+        })
+    return {"bodegas": bodegas, "cepas": cepas, "vinos": vinos}
+
+
+def escribir_catalogo(datos: Dict, directorio: str = None) -> str:
+    """
+    Escribe el catálogo en un archivo JSON temporal.
+
+    Args:
+        datos: Catálogo generado con generar_catalogo
+        directorio: Directorio donde crear el archivo
+
+    Returns:
+        Ruta del archivo escrito
+    """
+    descriptor, ruta = tempfile.mkstemp(suffix=".json", dir=directorio)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+        json.dump(datos, archivo, ensure_ascii=False)
+    return ruta
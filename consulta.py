@@ -0,0 +1,624 @@
+"""
+Módulo con las consultas perezosas sobre las colecciones de la vinoteca.
+
+Una Consulta acumula filtros, orden, cursor y límite sin ejecutar nada, y
+los resuelve recién cuando se la recorre, sobre el almacén publicado en ese
+momento. Los filtros por año, bodega y cepa se resuelven con las listas de
+posiciones de los índices (ver resolver_filtros), los órdenes por campo con
+las permutaciones precalculadas y los límites pequeños con una selección
+parcial, sin copiar la colección ni armar listas intermedias completas.
+"""
+import base64
+import binascii
+import copy
+import heapq
+import json
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple,
+    TYPE_CHECKING, Union
+)
+
+from almacenes.base import (
+    Almacen, CLAVES_BODEGAS, CLAVES_CEPAS, CLAVES_POR_TIPO, CLAVES_VINOS,
+    bisecar, mezclar_sin_repetidos
+)
+
+if TYPE_CHECKING:
+    from modelos.entidad_vineria import EntidadVineria
+
+# Campos de ordenamiento de cada colección y su clave
+CLAVES_POR_COLECCION: Dict[str, Dict[str, Callable[[Any], Any]]] = {
+    "bodegas": CLAVES_BODEGAS,
+    "cepas": CLAVES_CEPAS,
+    "vinos": CLAVES_VINOS,
+}
+
+# Filtro de vinos por índices: años desde y hasta, IDs de bodegas, IDs de
+# cepas y si se exigen todas las cepas
+_FiltroIndices = Tuple[
+    Optional[int], Optional[int], Tuple[str, ...], Tuple[str, ...], bool
+]
+
+
+def acotar_anios(
+    anio: Optional[int],
+    anio_desde: Optional[int],
+    anio_hasta: Optional[int]
+) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Combina un año exacto con un rango de años en un único rango.
+
+    Args:
+        anio: Año exacto, que acota el rango por ambos extremos
+        anio_desde: Año mínimo (inclusive)
+        anio_hasta: Año máximo (inclusive)
+
+    Returns:
+        Tupla (desde, hasta); cada extremo es None si no está acotado
+    """
+    minimos = [a for a in (anio, anio_desde) if a is not None]
+    maximos = [a for a in (anio, anio_hasta) if a is not None]
+    return (
+        max(minimos) if minimos else None,
+        min(maximos) if maximos else None
+    )
+
+
+def _como_tupla(valores: Union[str, Sequence[str], None]) -> Tuple[str, ...]:
+    """
+    Normaliza un filtro que admite un ID o una lista de IDs.
+
+    Returns:
+        IDs sin repetir, en el orden indicado; vacía si no hay filtro
+    """
+    if valores is None:
+        return ()
+    if isinstance(valores, str):
+        return (valores,)
+    return tuple(dict.fromkeys(valores))
+
+
+def _contiene(lista: Sequence[int], posicion: int) -> bool:
+    """Indica si una lista ordenada de posiciones contiene una posición."""
+    indice = bisect_left(lista, posicion)
+    return indice < len(lista) and lista[indice] == posicion
+
+
+def listas_de_filtros(
+    almacen: Almacen,
+    anio_desde: Optional[int],
+    anio_hasta: Optional[int],
+    bodega: Union[str, Sequence[str], None],
+    cepa: Union[str, Sequence[str], None],
+    todas_las_cepas: bool
+) -> List[List[Sequence[int]]]:
+    """
+    Obtiene las listas de posiciones de cada filtro de vinos, para
+    resolverlos con resolver_filtros.
+
+    Args:
+        almacen: Almacén sobre el que se filtra
+        anio_desde: Año mínimo (inclusive) de alguna de las partidas
+        anio_hasta: Año máximo (inclusive) de alguna de las partidas
+        bodega: ID o lista de IDs de las bodegas admitidas
+        cepa: ID o lista de IDs de las cepas admitidas
+        todas_las_cepas: True para exigir todas las cepas de la lista
+
+    Returns:
+        Para cada filtro indicado, las listas de posiciones de los valores
+        que lo cumplen
+    """
+    filtros = []
+    if anio_desde is not None or anio_hasta is not None:
+        filtros.append(almacen.listas_por_anio(anio_desde, anio_hasta))
+    bodegas, cepas = _como_tupla(bodega), _como_tupla(cepa)
+    if bodegas:
+        filtros.append(almacen.listas_por_relacion("bodegas", bodegas))
+    if cepas:
+        listas = almacen.listas_por_relacion("cepas", cepas)
+        if todas_las_cepas:
+            filtros.extend([lista] for lista in listas)
+        else:
+            filtros.append(listas)
+    return filtros
+
+
+def resolver_filtros(filtros: List[List[Sequence[int]]]) -> Sequence[int]:
+    """
+    Obtiene las posiciones de los vinos que cumplen todos los filtros.
+
+    Cada filtro es la unión de una o más listas ordenadas de posiciones
+    (los vinos de alguno de los años del rango, de alguna de las bodegas,
+    de una cepa...). La cantidad de vinos de un filtro se estima con la
+    suma de los largos de sus listas: se parte del más selectivo y se
+    descartan los candidatos que no cumplen cada uno de los demás, de menor
+    a mayor estimación. Cuando quedan pocos candidatos frente al tamaño de
+    un filtro se los busca en sus listas con búsqueda binaria, sin
+    recorrerlas; si no, se arma el conjunto de sus posiciones.
+
+    Args:
+        filtros: Listas de posiciones de cada filtro
+
+    Returns:
+        Posiciones en orden creciente de los vinos que cumplen los filtros
+    """
+    estimados = sorted(
+        ((sum(map(len, listas)), listas) for listas in filtros),
+        key=lambda par: par[0]
+    )
+    if not estimados or estimados[0][0] == 0:
+        return []
+    listas = [lista for lista in estimados[0][1] if lista]
+    candidatos: Sequence[int] = (
+        listas[0] if len(listas) == 1
+        else list(mezclar_sin_repetidos(listas))
+    )
+    for estimado, listas in estimados[1:]:
+        if not candidatos:
+            break
+        listas = [lista for lista in listas if lista]
+        if len(candidatos) * len(listas) * estimado.bit_length() < estimado:
+            candidatos = [
+                posicion for posicion in candidatos
+                if any(_contiene(lista, posicion) for lista in listas)
+            ]
+        else:
+            conjunto = set().union(*listas)
+            candidatos = [
+                posicion for posicion in candidatos if posicion in conjunto
+            ]
+    return candidatos
+
+
+def _primeras_en_orden(
+    permutacion: Sequence[int],
+    filtros: List[List[Sequence[int]]],
+    limite: int,
+    reverso: bool,
+    condicion: Optional[Callable[[int], bool]]
+) -> Optional[List[int]]:
+    """
+    Selecciona las primeras posiciones de un orden precalculado que cumplen
+    los filtros, recorriéndolo y buscando cada posición en las listas de
+    los filtros con búsqueda binaria, sin resolverlos.
+
+    Conviene cuando los filtros admiten buena parte de la colección: si
+    admiten una fracción f, se recorren en promedio limite / f posiciones.
+    La fracción se estima suponiendo filtros independientes y sin vinos
+    repetidos entre las listas de un filtro. Cada paso busca la posición en
+    todas las listas, de modo que el recorrido se abandona cuando esas
+    búsquedas superan una fracción del tamaño del filtro más selectivo,
+    que es lo que cuesta resolverlos; una mala estimación (por ejemplo, un
+    filtro correlacionado con el orden) a lo sumo agrega ese costo.
+
+    Args:
+        permutacion: Posiciones de la colección en orden ascendente
+        filtros: Listas de posiciones de cada filtro (ver resolver_filtros)
+        limite: Cantidad de posiciones a seleccionar
+        reverso: True para recorrer el orden hacia atrás
+        condicion: Condición adicional de cada posición, si hay
+
+    Returns:
+        Hasta limite posiciones en el orden pedido, o None si conviene
+        resolver los filtros y seleccionar entre sus posiciones
+    """
+    total = len(permutacion)
+    estimados = sorted(
+        ((sum(map(len, listas)), [lista for lista in listas if lista])
+         for listas in filtros),
+        key=lambda par: par[0]
+    )
+    fraccion = 1.0
+    for estimado, _ in estimados:
+        fraccion *= min(1.0, estimado / total) if total else 0.0
+    if fraccion == 0.0:
+        return []
+    busquedas = sum(len(listas) for _, listas in estimados)
+    presupuesto = estimados[0][0] // (16 * busquedas) if estimados else total
+    if 2 * limite / fraccion > presupuesto:
+        return None
+    primeras: List[int] = []
+    indices = range(total - 1, -1, -1) if reverso else range(total)
+    for paso, indice in enumerate(indices):
+        if paso == presupuesto:
+            return None
+        posicion = permutacion[indice]
+        if all(
+            any(_contiene(lista, posicion) for lista in listas)
+            for _, listas in estimados
+        ) and (condicion is None or condicion(posicion)):
+            primeras.append(posicion)
+            if len(primeras) == limite:
+                break
+    return primeras
+
+
+def codificar_cursor(
+    entidad: 'EntidadVineria',
+    orden: str,
+    reverso: bool
+) -> str:
+    """
+    Codifica la clave de ordenamiento de una entidad (valor del campo e id)
+    en un cursor opaco apto para URLs.
+
+    Raises:
+        ValueError: Si el campo de ordenamiento no es válido
+    """
+    claves = CLAVES_POR_TIPO[type(entidad).__name__]
+    if orden not in claves:
+        raise ValueError(f"Orden no válido: {orden}")
+    contenido = json.dumps(
+        [orden, bool(reverso), claves[orden](entidad), entidad.obtener_id()],
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(contenido.encode('utf-8')).decode('ascii')
+
+
+def _decodificar_cursor(
+    cursor: str,
+    orden: str,
+    reverso: bool
+) -> Tuple[Any, str]:
+    """
+    Decodifica un cursor y verifica que corresponda al listado pedido.
+
+    Args:
+        cursor: Cursor generado por codificar_cursor
+        orden: Campo de ordenamiento del listado
+        reverso: True si el listado es descendente
+
+    Returns:
+        Clave (valor del campo, id) de la última entidad vista
+
+    Raises:
+        ValueError: Si el cursor está mal formado o fue generado para
+            otro orden
+    """
+    try:
+        campo, descendente, valor, id_ = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii'))
+        )
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Cursor no válido") from None
+    if (
+        campo != orden or descendente != bool(reverso)
+        or not isinstance(valor, (str, int)) or not isinstance(id_, str)
+    ):
+        raise ValueError("Cursor no válido")
+    return valor, id_
+
+
+def _recorrer(
+    entidades: Sequence[Any],
+    posiciones: Sequence[int],
+    clave: Callable[[Any], Any],
+    orden: str,
+    reverso: bool,
+    limite: Optional[int],
+    cursor: Optional[str]
+) -> Iterator[Any]:
+    """
+    Recorre un orden ascendente de posiciones aplicando reverso, cursor
+    y límite.
+
+    Args:
+        entidades: Colección a la que refieren las posiciones
+        posiciones: Posiciones ordenadas por (clave, id) ascendente
+        clave: Función de clave del campo de ordenamiento
+        orden: Campo de ordenamiento
+        reverso: True para recorrer el orden hacia atrás
+        limite: Cantidad máxima de entidades a devolver
+        cursor: Cursor de la última entidad de la página anterior
+
+    Returns:
+        Iterador de las entidades de la página solicitada
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    inicio, fin = 0, len(posiciones)
+    if cursor is not None:
+        objetivo = _decodificar_cursor(cursor, orden, reverso)
+
+        def clave_compuesta(posicion: int) -> Tuple[Any, str]:
+            entidad = entidades[posicion]
+            return clave(entidad), entidad.obtener_id()
+
+        try:
+            corte = bisecar(
+                posiciones, objetivo, clave_compuesta, derecha=not reverso
+            )
+        except TypeError:
+            raise ValueError("Cursor no válido") from None
+        if reverso:
+            fin = corte
+        else:
+            inicio = corte
+    tramo = range(fin - 1, inicio - 1, -1) if reverso else range(inicio, fin)
+    if limite is not None:
+        tramo = tramo[:limite]
+    return (entidades[posiciones[i]] for i in tramo)
+
+
+class Consulta:
+    """
+    Consulta perezosa sobre una colección de la vinoteca.
+
+    Se arma encadenando filtrar, ordenar, desde y limitar; cada uno
+    devuelve una consulta nueva y deja intacta la anterior, de modo que
+    una consulta puede reutilizarse o extenderse. Las cláusulas no
+    dependen del orden en que se indican: se filtra, se ordena, se continúa
+    a partir del cursor y se limita. Nada se ejecuta hasta que se la
+    recorre; cada recorrido usa el almacén publicado al comenzarlo.
+    """
+
+    def __init__(
+        self,
+        obtener_almacen: Callable[[], Almacen],
+        coleccion: str
+    ) -> None:
+        """
+        Construye una consulta de todas las entidades de una colección.
+
+        Args:
+            obtener_almacen: Función que devuelve el almacén publicado
+            coleccion: bodegas, cepas o vinos
+
+        Raises:
+            ValueError: Si la colección no es válida
+        """
+        if coleccion not in CLAVES_POR_COLECCION:
+            raise ValueError(f"Colección no válida: {coleccion}")
+        self.__obtenerAlmacen = obtener_almacen
+        self.__coleccion = coleccion
+        self.__filtros: Tuple[_FiltroIndices, ...] = ()
+        self.__condiciones: Tuple[Callable[[Any], bool], ...] = ()
+        self.__orden: Optional[str] = None
+        self.__clave: Optional[Callable[[Any], Any]] = None
+        self.__reverso = False
+        self.__cursor: Optional[str] = None
+        self.__limite: Optional[int] = None
+
+    def filtrar(
+        self,
+        condicion: Optional[Callable[[Any], bool]] = None,
+        anio: Optional[int] = None,
+        anio_desde: Optional[int] = None,
+        anio_hasta: Optional[int] = None,
+        bodega: Union[str, Sequence[str], None] = None,
+        cepa: Union[str, Sequence[str], None] = None,
+        todas_las_cepas: bool = False
+    ) -> 'Consulta':
+        """
+        Agrega filtros a la consulta. Todos los filtros, incluidos los de
+        llamadas anteriores, deben cumplirse.
+
+        Los filtros por año, bodega y cepa solo se admiten en vinos y se
+        resuelven con los índices; la condición se evalúa sobre cada
+        entidad que los cumple.
+
+        Args:
+            condicion: Función que indica si una entidad forma parte del
+                resultado
+            anio: Año de alguna de las partidas
+            anio_desde: Año mínimo (inclusive) de alguna de las partidas
+            anio_hasta: Año máximo (inclusive) de alguna de las partidas
+            bodega: ID o lista de IDs de las bodegas admitidas
+            cepa: ID o lista de IDs de las cepas admitidas
+            todas_las_cepas: True para exigir todas las cepas de la lista
+
+        Returns:
+            Consulta nueva con los filtros agregados
+
+        Raises:
+            ValueError: Si se filtra por año, bodega o cepa fuera de vinos
+        """
+        anio_desde, anio_hasta = acotar_anios(anio, anio_desde, anio_hasta)
+        filtro = (
+            anio_desde, anio_hasta, _como_tupla(bodega), _como_tupla(cepa),
+            todas_las_cepas
+        )
+        consulta = copy.copy(self)
+        if filtro[:4] != (None, None, (), ()):
+            if self.__coleccion != "vinos":
+                raise ValueError(
+                    f"Filtro por año, bodega o cepa no válido para {self.__coleccion}"
+                )
+            consulta.__filtros = self.__filtros + (filtro,)
+        if condicion is not None:
+            consulta.__condiciones = self.__condiciones + (condicion,)
+        return consulta
+
+    def ordenar(
+        self,
+        campo: Optional[str] = None,
+        reverso: bool = False,
+        clave: Optional[Callable[[Any], Any]] = None
+    ) -> 'Consulta':
+        """
+        Ordena el resultado por un campo o por una clave, reemplazando el
+        orden indicado antes.
+
+        Los campos usan las permutaciones precalculadas y desempatan por
+        id; una clave arbitraria requiere ordenar el resultado filtrado, o
+        solo seleccionar sus primeras entidades si se limita.
+
+        Args:
+            campo: Campo de CLAVES_POR_COLECCION (id si no se indica clave)
+            reverso: True para orden descendente
+            clave: Función de clave de cada entidad, en lugar de un campo
+
+        Returns:
+            Consulta nueva con el orden indicado
+
+        Raises:
+            ValueError: Si el campo no es válido o se indican campo y clave
+        """
+        if clave is not None:
+            if campo is not None:
+                raise ValueError("Se debe ordenar por un campo o por una clave")
+        else:
+            campo = campo or "id"
+            if campo not in CLAVES_POR_COLECCION[self.__coleccion]:
+                raise ValueError(f"Orden no válido: {campo}")
+        consulta = copy.copy(self)
+        consulta.__orden, consulta.__clave = campo, clave
+        consulta.__reverso = bool(reverso)
+        return consulta
+
+    def desde(self, cursor: str) -> 'Consulta':
+        """
+        Continúa el resultado a continuación de la entidad de un cursor
+        generado con el mismo orden (por id si no se indica otro). El
+        cursor se valida al recorrer la consulta.
+
+        Args:
+            cursor: Cursor de la última entidad de la página anterior
+
+        Returns:
+            Consulta nueva que comienza después del cursor
+        """
+        consulta = copy.copy(self)
+        consulta.__cursor = cursor
+        return consulta
+
+    def limitar(self, limite: int) -> 'Consulta':
+        """
+        Limita la cantidad de entidades del resultado.
+
+        Args:
+            limite: Cantidad máxima de entidades
+
+        Returns:
+            Consulta nueva con el límite indicado
+
+        Raises:
+            ValueError: Si el límite no es mayor que cero
+        """
+        if limite < 1:
+            raise ValueError("El límite debe ser mayor que cero")
+        consulta = copy.copy(self)
+        consulta.__limite = limite
+        return consulta
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Resuelve la consulta sobre el almacén publicado y devuelve el
+        iterador del resultado. Los errores del cursor se informan al
+        comenzar el recorrido.
+
+        Raises:
+            ValueError: Si el cursor no es válido o se combina con un orden
+                por clave
+        """
+        almacen = self.__obtenerAlmacen()
+        entidades = {
+            "bodegas": almacen.obtener_bodegas,
+            "cepas": almacen.obtener_cepas,
+            "vinos": almacen.obtener_vinos,
+        }[self.__coleccion]()
+        orden, clave, reverso = self.__orden, self.__clave, self.__reverso
+        limite, cursor = self.__limite, self.__cursor
+        if cursor is not None:
+            if clave is not None:
+                raise ValueError("El cursor requiere ordenar por un campo")
+            orden = orden or "id"
+        condicion = self.__condicion()
+
+        if orden is None:
+            posiciones = self.__posiciones(almacen)
+            if posiciones is None:
+                candidatos: Iterable[Any] = entidades
+            else:
+                candidatos = map(entidades.__getitem__, posiciones)
+            if condicion is not None:
+                candidatos = filter(condicion, candidatos)
+            if clave is None:
+                return islice(candidatos, limite)
+            if limite is not None:
+                seleccionar = heapq.nlargest if reverso else heapq.nsmallest
+                return iter(seleccionar(limite, candidatos, key=clave))
+            return iter(sorted(candidatos, key=clave, reverse=reverso))
+
+        claves = CLAVES_POR_COLECCION[self.__coleccion][orden]
+        if not self.__filtros:
+            recorrido = _recorrer(
+                entidades, almacen.obtener_permutacion(self.__coleccion, orden),
+                claves, orden, reverso,
+                limite if condicion is None else None, cursor
+            )
+            if condicion is None:
+                return recorrido
+            return islice(filter(condicion, recorrido), limite)
+
+        rangos = almacen.obtener_rangos_vinos(orden)
+        if limite is not None and cursor is None:
+            filtros = self.__listasDeFiltros(almacen)
+            primeras = _primeras_en_orden(
+                almacen.obtener_permutacion(self.__coleccion, orden), filtros,
+                limite, reverso,
+                None if condicion is None
+                else lambda posicion: condicion(entidades[posicion])
+            )
+            if primeras is None:
+                # Seleccionar las primeras posiciones filtradas según su rango
+                posiciones = resolver_filtros(filtros)
+                if condicion is not None:
+                    posiciones = (
+                        p for p in posiciones if condicion(entidades[p])
+                    )
+                seleccionar = heapq.nlargest if reverso else heapq.nsmallest
+                primeras = seleccionar(
+                    limite, posiciones, key=rangos.__getitem__
+                )
+            return map(entidades.__getitem__, primeras)
+
+        # Ordenar solo las posiciones filtradas según su rango
+        posiciones = self.__posiciones(almacen)
+        if condicion is not None:
+            posiciones = (p for p in posiciones if condicion(entidades[p]))
+        return _recorrer(
+            entidades, array('I', sorted(posiciones, key=rangos.__getitem__)),
+            claves, orden, reverso, limite, cursor
+        )
+
+    def __posiciones(self, almacen: Almacen) -> Optional[Iterable[int]]:
+        """
+        Resuelve los filtros por índices de la consulta.
+
+        Un único filtro solo por año mezcla las listas de sus años a medida
+        que se recorren; los demás se combinan con resolver_filtros.
+
+        Returns:
+            Posiciones ordenadas de los vinos que cumplen los filtros, o
+            None si no hay filtros por índices
+        """
+        if not self.__filtros:
+            return None
+        if len(self.__filtros) == 1 and not any(self.__filtros[0][2:4]):
+            return almacen.posiciones_por_anios(*self.__filtros[0][:2])
+        return resolver_filtros(self.__listasDeFiltros(almacen))
+
+    def __listasDeFiltros(self, almacen: Almacen) -> List[List[Sequence[int]]]:
+        """Listas de posiciones de todos los filtros por índices."""
+        filtros = []
+        for anio_desde, anio_hasta, bodegas, cepas, todas in self.__filtros:
+            filtros.extend(listas_de_filtros(
+                almacen, anio_desde, anio_hasta, bodegas, cepas, todas
+            ))
+        return filtros
+
+    def __condicion(self) -> Optional[Callable[[Any], bool]]:
+        """Combina las condiciones de la consulta en una sola, si hay."""
+        condiciones = self.__condiciones
+        if not condiciones:
+            return None
+        if len(condiciones) == 1:
+            return condiciones[0]
+        return lambda entidad: all(
+            condicion(entidad) for condicion in condiciones
+        )
@@ -1,4 +1,6 @@
 """Módulo principal de la aplicación para la API de vinoteca."""
+import os
+
 from flask import Flask, render_template_string
 from flask_restful import Api
 
@@ -6,8 +8,11 @@ from vinoteca import Vinoteca
 from recursos import (
     RecursoBodega,
     RecursoBodegas,
+    RecursoBusqueda,
     RecursoCepa,
     RecursoCepas,
+    RecursoFacetas,
+    RecursoLote,
     RecursoVino,
     RecursoVinos
 )
@@ -38,6 +43,12 @@ TEMPLATE_HTML = """
                     <ul>
                         <li>orden: Campo por el cual ordenar (nombre, id)</li>
                         <li>reverso: "si" para orden descendente</li>
+                        <li>limite: Cantidad máxima de resultados por página</li>
+                        <li>cursor: Cursor de la página siguiente (encabezado Link)</li>
+                        <li>campos: Campos a incluir, separados por coma</li>
+                        <li>stream: "1" para transmitir la respuesta de a un elemento</li>
+                        <li>ids: IDs a buscar, separados por coma</li>
+                        <li>q: Comienzo de una palabra del nombre, sin distinguir mayúsculas ni acentos</li>
                     </ul>
                 </div>
             </div>
@@ -46,6 +57,16 @@ TEMPLATE_HTML = """
                 <span class="route-path">/api/bodegas/&lt;id_&gt;</span>
                 <div class="description">Obtiene detalles de una bodega específica por ID</div>
             </div>
+            <div class="route-item">
+                <span class="route-method">POST</span>
+                <span class="route-path">/api/bodegas</span>
+                <div class="description">Crea una bodega</div>
+            </div>
+            <div class="route-item">
+                <span class="route-method">PUT / PATCH / DELETE</span>
+                <span class="route-path">/api/bodegas/&lt;id_&gt;</span>
+                <div class="description">Reemplaza, modifica o elimina una bodega</div>
+            </div>
         </div>
 
         <div class="route-section">
@@ -60,6 +81,12 @@ TEMPLATE_HTML = """
                     <ul>
                         <li>orden: Campo por el cual ordenar (nombre, id)</li>
                         <li>reverso: "si" para orden descendente</li>
+                        <li>limite: Cantidad máxima de resultados por página</li>
+                        <li>cursor: Cursor de la página siguiente (encabezado Link)</li>
+                        <li>campos: Campos a incluir, separados por coma</li>
+                        <li>stream: "1" para transmitir la respuesta de a un elemento</li>
+                        <li>ids: IDs a buscar, separados por coma</li>
+                        <li>q: Comienzo de una palabra del nombre, sin distinguir mayúsculas ni acentos</li>
                     </ul>
                 </div>
             </div>
@@ -68,6 +95,16 @@ TEMPLATE_HTML = """
                 <span class="route-path">/api/cepas/&lt;id_&gt;</span>
                 <div class="description">Obtiene detalles de una cepa específica por ID</div>
             </div>
+            <div class="route-item">
+                <span class="route-method">POST</span>
+                <span class="route-path">/api/cepas</span>
+                <div class="description">Crea una cepa</div>
+            </div>
+            <div class="route-item">
+                <span class="route-method">PUT / PATCH / DELETE</span>
+                <span class="route-path">/api/cepas/&lt;id_&gt;</span>
+                <div class="description">Reemplaza, modifica o elimina una cepa</div>
+            </div>
         </div>
 
         <div class="route-section">
@@ -81,8 +118,19 @@ TEMPLATE_HTML = """
                     Parámetros opcionales:
                     <ul>
                         <li>anio: Filtrar por año</li>
-                        <li>orden: Campo por el cual ordenar (nombre, id, bodega, anio)</li>
+                        <li>anio_desde: Año mínimo de alguna partida</li>
+                        <li>anio_hasta: Año máximo de alguna partida</li>
+                        <li>bodega: IDs de bodegas admitidas, separados por coma</li>
+                        <li>cepa: IDs de cepas de las que los vinos deben usar alguna, separados por coma</li>
+                        <li>todas_las_cepas: "si" para exigir todas las cepas indicadas</li>
+                        <li>orden: Campo por el cual ordenar (nombre, id, bodega, anio, anio_inicial)</li>
                         <li>reverso: "si" para orden descendente</li>
+                        <li>limite: Cantidad máxima de resultados por página</li>
+                        <li>cursor: Cursor de la página siguiente (encabezado Link)</li>
+                        <li>campos: Campos a incluir, separados por coma</li>
+                        <li>stream: "1" para transmitir la respuesta de a un elemento</li>
+                        <li>ids: IDs a buscar, separados por coma</li>
+                        <li>q: Comienzo de una palabra del nombre, sin distinguir mayúsculas ni acentos</li>
                     </ul>
                 </div>
             </div>
@@ -91,6 +139,67 @@ TEMPLATE_HTML = """
                 <span class="route-path">/api/vinos/&lt;id_&gt;</span>
                 <div class="description">Obtiene detalles de un vino específico por ID</div>
             </div>
+            <div class="route-item">
+                <span class="route-method">POST</span>
+                <span class="route-path">/api/vinos</span>
+                <div class="description">Crea un vino (bodega y cepas por ID)</div>
+            </div>
+            <div class="route-item">
+                <span class="route-method">PUT / PATCH / DELETE</span>
+                <span class="route-path">/api/vinos/&lt;id_&gt;</span>
+                <div class="description">Reemplaza, modifica o elimina un vino</div>
+            </div>
+        </div>
+
+        <div class="route-section">
+            <h2>Lote</h2>
+            <div class="route-item">
+                <span class="route-method">POST</span>
+                <span class="route-path">/api/lote</span>
+                <div class="description">
+                    Busca bodegas, cepas y vinos por ID en una sola solicitud.
+                    El cuerpo indica los IDs de cada colección, por ejemplo
+                    {"vinos": ["v1", "v2"], "bodegas": ["b1"]}.
+                </div>
+            </div>
+        </div>
+
+        <div class="route-section">
+            <h2>Facetas</h2>
+            <div class="route-item">
+                <span class="route-method">GET</span>
+                <span class="route-path">/api/facetas</span>
+                <div class="description">
+                    Cuenta los vinos por año, por bodega y por cepa.
+                    <br>
+                    Parámetros opcionales:
+                    <ul>
+                        <li>anio, anio_desde, anio_hasta: Cuenta solo los vinos con partidas en esos años</li>
+                        <li>bodega: Cuenta solo los vinos de alguna de las bodegas, separadas por coma</li>
+                        <li>cepa: Cuenta solo los vinos elaborados con alguna de las cepas</li>
+                        <li>todas_las_cepas: "si" para exigir todas las cepas indicadas</li>
+                        <li>limite: Cantidad máxima de bodegas y de cepas, las de más vinos</li>
+                    </ul>
+                </div>
+            </div>
+        </div>
+
+        <div class="route-section">
+            <h2>Búsqueda</h2>
+            <div class="route-item">
+                <span class="route-method">GET</span>
+                <span class="route-path">/api/busqueda?q=&lt;texto&gt;</span>
+                <div class="description">
+                    Busca bodegas, cepas y vinos por nombre tolerando errores
+                    de tipeo, del más parecido al menos.
+                    <br>
+                    Parámetros opcionales:
+                    <ul>
+                        <li>limite: Cantidad máxima de resultados (10 por defecto)</li>
+                        <li>colecciones: Colecciones donde buscar, separadas por coma</li>
+                    </ul>
+                </div>
+            </div>
         </div>
     </div>
 </body>
@@ -119,10 +228,20 @@ def create_app() -> Flask:
     api.add_resource(RecursoCepas, '/api/cepas')
     api.add_resource(RecursoVino, '/api/vinos/<id>')
     api.add_resource(RecursoVinos, '/api/vinos')
+    api.add_resource(RecursoLote, '/api/lote')
+    api.add_resource(RecursoBusqueda, '/api/busqueda')
+    api.add_resource(RecursoFacetas, '/api/facetas')
 
     return app
 
 if __name__ == "__main__":
-    Vinoteca.inicializar()
+    # Arrancar desde la instantánea binaria si el archivo no cambió, con el
+    # almacén elegido en VINOTECA_ALMACEN: memoria, mapeado o sqlite
+    Vinoteca.inicializar(
+        instantanea=True,
+        almacen=os.environ.get("VINOTECA_ALMACEN", "memoria")
+    )
+    # Recargar los datos cuando cambie el archivo, sin reiniciar
+    Vinoteca.vigilar()
     app = create_app()
     app.run(debug=True)
@@ -1,5 +1,5 @@
 import json
-from typing import List, TYPE_CHECKING
+from typing import Iterable, List, Optional, TYPE_CHECKING
 from .entidad_vineria import EntidadVineria
 
 class Bodega(EntidadVineria):
@@ -8,6 +8,8 @@ class Bodega(EntidadVineria):
     Hereda de EntidadVineria y provee funcionalidades específicas para
     gestionar vinos y cepas asociadas.
     """
+    __slots__ = ()
+    CAMPOS_JSON = ("id", "nombre", "cepas", "vinos")
 
     def __init__(self, id: str, nombre: str) -> None:
         """
@@ -18,74 +20,70 @@ class Bodega(EntidadVineria):
             nombre: Nombre de la bodega
         """
         super().__init__(id, nombre)
-        self.__vinos = []
-        self.__cepas = []
 
     def obtener_vinos(self) -> List['Vino']:
         """
         Obtiene todos los vinos que pertenecen a esta bodega.
-        Utiliza el servicio obtener_vinos de la clase Vinoteca para
-        recuperar la lista completa y filtra los que corresponden
-        a esta bodega.
+        Utiliza el índice inverso que la clase Vinoteca construye
+        al cargar los datos.
 
         Returns:
             Lista de vinos pertenecientes a esta bodega
         """
         from vinoteca import Vinoteca
-        todos_vinos = Vinoteca.obtener_vinos()
-        return [
-            vino for vino in todos_vinos
-            if vino.obtener_bodega().obtener_id() == self.obtener_id()
-        ]
+        return Vinoteca.obtener_vinos_de_bodega(self.obtener_id())
 
     def obtener_cepas(self) -> List['Cepa']:
         """
         Obtiene todas las cepas de los vinos que pertenecen a esta bodega.
-        Utiliza los IDs de las cepas para identificar las únicas.
+        Las cepas únicas se calculan una sola vez al cargar los datos.
 
         Returns:
             Lista de cepas únicas utilizadas en los vinos de esta bodega
         """
-        vinos = self.obtener_vinos()
-        todas_cepas = [cepa for vino in vinos for cepa in vino.obtener_cepa()]
-        
-        # Usamos un diccionario temporal con los IDs como claves
-        cepas_por_id = {}
-        for cepa in todas_cepas:
-            cepas_por_id[cepa.obtener_id()] = cepa
-        
-        return list(cepas_por_id.values())
+        from vinoteca import Vinoteca
+        return Vinoteca.obtener_cepas_de_bodega(self.obtener_id())
 
-    def convertir_a_json(self) -> dict:
+    def convertir_a_json(self, campos: Optional[Iterable[str]] = None) -> dict:
         """
         Convierte el objeto a un diccionario JSON básico.
         Incluye información resumida de la bodega.
 
+        Args:
+            campos: Campos a incluir; si se omite se incluyen todos. Los
+                campos derivados no pedidos no se calculan.
+
         Returns:
             Diccionario con la información básica de la bodega
         """
-        return {
-            "id": self.obtener_id(),
-            "nombre": self.obtener_nombre(),
-            "cepas": self.__mapear_cepas(),
-            "vinos": len(self.obtener_vinos()),
-        }
+        return self._serializar({
+            "id": self.obtener_id,
+            "nombre": self.obtener_nombre,
+            "cepas": self.__mapear_cepas,
+            "vinos": lambda: len(self.obtener_vinos()),
+        }, campos)
 
-    def convertir_a_json_full(self) -> dict:
+    def convertir_a_json_full(
+        self, campos: Optional[Iterable[str]] = None
+    ) -> dict:
         """
         Convierte el objeto a un diccionario JSON completo.
         Incluye toda la información de la bodega, incluyendo
         la lista completa de vinos.
 
+        Args:
+            campos: Campos a incluir; si se omite se incluyen todos. Los
+                campos derivados no pedidos no se calculan.
+
         Returns:
             Diccionario con la información completa de la bodega
         """
-        return {
-            "id": self.obtener_id(),
-            "nombre": self.obtener_nombre(),
-            "cepas": self.__mapear_cepas(),
-            "vinos": self.__mapear_vinos(),
-        }
+        return self._serializar({
+            "id": self.obtener_id,
+            "nombre": self.obtener_nombre,
+            "cepas": self.__mapear_cepas,
+            "vinos": self.__mapear_vinos,
+        }, campos)
 
     def __mapear_cepas(self) -> List[str]:
         """
@@ -1,5 +1,5 @@
 import json
-from typing import List, Dict, TYPE_CHECKING
+from typing import Dict, Iterable, List, Optional, TYPE_CHECKING
 from .entidad_vineria import EntidadVineria
 
 class Cepa(EntidadVineria):
@@ -8,6 +8,8 @@ class Cepa(EntidadVineria):
     Hereda de EntidadVineria y provee funcionalidades específicas para
     gestionar los vinos asociados a esta cepa.
     """
+    __slots__ = ()
+    CAMPOS_JSON = ("id", "nombre", "vinos")
 
     def __init__(self, id_: str, nombre: str) -> None:
         """
@@ -18,52 +20,57 @@ class Cepa(EntidadVineria):
             nombre: Nombre de la cepa
         """
         super().__init__(id_, nombre)
-        self.__vinos = []
 
     def obtener_vinos(self) -> List['Vino']:
         """
         Obtiene todos los vinos que utilizan esta cepa.
-        Utiliza el servicio obtener_vinos de la clase Vinoteca para
-        recuperar la lista completa y filtra los que incluyen esta cepa.
+        Utiliza el índice inverso que la clase Vinoteca construye
+        al cargar los datos.
 
         Returns:
             Lista de vinos que utilizan esta cepa
         """
         from vinoteca import Vinoteca
-        todos_vinos = Vinoteca.obtener_vinos()
-        return [
-            vino for vino in todos_vinos
-            if self.obtener_id() in [cepa.obtener_id() for cepa in vino.obtener_cepa()]
-        ]
+        return Vinoteca.obtener_vinos_de_cepa(self.obtener_id())
 
-    def convertir_a_json(self) -> Dict:
+    def convertir_a_json(self, campos: Optional[Iterable[str]] = None) -> Dict:
         """
         Convierte el objeto a un diccionario JSON básico.
         Incluye información resumida de la cepa.
 
+        Args:
+            campos: Campos a incluir; si se omite se incluyen todos. Los
+                campos derivados no pedidos no se calculan.
+
         Returns:
             Diccionario con la información básica de la cepa
         """
-        return {
-            "id": self.obtener_id(),
-            "nombre": self.obtener_nombre(),
-            "vinos": len(self.obtener_vinos()),
-        }
+        return self._serializar({
+            "id": self.obtener_id,
+            "nombre": self.obtener_nombre,
+            "vinos": lambda: len(self.obtener_vinos()),
+        }, campos)
 
-    def convertir_a_json_full(self) -> Dict:
+    def convertir_a_json_full(
+        self, campos: Optional[Iterable[str]] = None
+    ) -> Dict:
         """
         Convierte el objeto a un diccionario JSON completo.
         Incluye toda la información de la cepa, incluyendo
         la lista completa de vinos.
 
+        Args:
+            campos: Campos a incluir; si se omite se incluyen todos. Los
+                campos derivados no pedidos no se calculan.
+
         Returns:
             Diccionario con la información completa de la cepa
         """
-        return {
-            "id": self.obtener_id(),
-            "nombre": self.obtener_nombre(),
-            "vinos": self.__mapear_vinos(),
-        }
+        return self._serializar({
+            "id": self.obtener_id,
+            "nombre": self.obtener_nombre,
+            "vinos": self.__mapear_vinos,
+        }, campos)
 
     def __mapear_vinos(self) -> List[str]:
         """
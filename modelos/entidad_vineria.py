@@ -1,7 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
 
 class EntidadVineria(ABC):
+    # Sin __dict__ por instancia: los atributos se guardan en slots
+    __slots__ = ("__id", "__nombre")
+    # Campos que pueden pedirse en la representación JSON
+    CAMPOS_JSON: Tuple[str, ...] = ("id", "nombre")
+
     def __init__(self, id: str, nombre: str) -> None:
         self.__id = id
         self.__nombre = nombre
@@ -16,13 +21,31 @@ class EntidadVineria(ABC):
         return self.__nombre
 
     @abstractmethod
-    def convertir_a_json(self) -> Dict[str, Any]:
+    def convertir_a_json(
+        self, campos: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
         pass
 
     @abstractmethod
-    def convertir_a_json_full(self) -> Dict[str, Any]:
+    def convertir_a_json_full(
+        self, campos: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
         pass
 
+    def _serializar(
+        self,
+        generadores: Dict[str, Callable[[], Any]],
+        campos: Optional[Iterable[str]]
+    ) -> Dict[str, Any]:
+        # Solo se calculan los campos pedidos, en el orden de generadores
+        if campos is None:
+            return {campo: generar() for campo, generar in generadores.items()}
+        pedidos = set(campos)
+        return {
+            campo: generar() for campo, generar in generadores.items()
+            if campo in pedidos
+        }
+
     def __eq__(self, otro: object) -> bool:
         if not isinstance(otro, EntidadVineria):
             return False
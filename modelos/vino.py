@@ -1,14 +1,24 @@
 import json
-from typing import List, Dict, TYPE_CHECKING
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, TYPE_CHECKING
 from .entidad_vineria import EntidadVineria
 
+if TYPE_CHECKING:
+    from .bodega import Bodega
+    from .cepa import Cepa
+
 class Vino(EntidadVineria):
     """
     Clase que representa un vino en el sistema de la vinoteca.
     Hereda de EntidadVineria y mantiene información sobre la bodega,
     cepas y partidas asociadas.
+
+    La bodega y las cepas se guardan como identificadores hasta que la
+    vinoteca las resuelve con resolver_referencias; desde entonces el vino
+    mantiene referencias directas a los objetos Bodega y Cepa.
     """
-    
+    __slots__ = ("__bodega", "__cepas", "__partidas")
+    CAMPOS_JSON = ("id", "nombre", "bodega", "cepas", "partidas")
+
     def __init__(self, id: str, nombre: str, bodega_id: str, 
                  cepa_ids: List[str], partidas: List[int]) -> None:
         """
@@ -22,10 +32,9 @@ class Vino(EntidadVineria):
             partidas: Lista de años de las partidas disponibles
         """
         super().__init__(id, nombre)
-        self.__bodega_id = bodega_id
-        self.__cepa_ids = cepa_ids
+        self.__bodega = bodega_id
+        self.__cepas = tuple(cepa_ids)
         self.__partidas = partidas
-        self.__nombre = nombre
 
     def establecer_bodega(self, bodega_id: str) -> None:
         """
@@ -34,7 +43,7 @@ class Vino(EntidadVineria):
         Args:
             bodega_id: Identificador de la bodega
         """
-        self.__bodega_id = bodega_id
+        self.__bodega = bodega_id
 
     def establecer_cepa(self, cepa_ids: List[str]) -> None:
         """
@@ -43,7 +52,7 @@ class Vino(EntidadVineria):
         Args:
             cepa_ids: Lista de identificadores de cepas
         """
-        self.__cepa_ids = cepa_ids
+        self.__cepas = tuple(cepa_ids)
 
     def establecer_partidas(self, partidas: List[int]) -> None:
         """
@@ -54,27 +63,80 @@ class Vino(EntidadVineria):
         """
         self.__partidas = partidas
 
+    def resolver_referencias(
+        self,
+        bodegas_por_id: Mapping[str, 'Bodega'],
+        cepas_por_id: Mapping[str, 'Cepa']
+    ) -> None:
+        """
+        Reemplaza los identificadores de bodega y cepas por referencias
+        directas a sus objetos. Los identificadores que no se encuentran
+        se conservan y se siguen buscando en la Vinoteca.
+
+        Args:
+            bodegas_por_id: Bodegas indexadas por ID
+            cepas_por_id: Cepas indexadas por ID
+        """
+        if isinstance(self.__bodega, str):
+            self.__bodega = bodegas_por_id.get(self.__bodega, self.__bodega)
+        self.__cepas = tuple(
+            cepas_por_id.get(cepa, cepa) if isinstance(cepa, str) else cepa
+            for cepa in self.__cepas
+        )
+
     def obtener_bodega(self) -> 'Bodega':
         """
         Obtiene el objeto Bodega asociado al vino.
-        Utiliza el servicio buscarBodega de la clase Vinoteca.
+        Si la referencia no fue resuelta, utiliza el servicio buscar_bodega
+        de la clase Vinoteca.
 
         Returns:
             Objeto Bodega correspondiente a la bodega del vino
         """
+        if not isinstance(self.__bodega, str):
+            return self.__bodega
         from vinoteca import Vinoteca
-        return Vinoteca.buscar_bodega(self.__bodega_id)
+        return Vinoteca.buscar_bodega(self.__bodega)
 
     def obtener_cepa(self) -> List['Cepa']:
         """
         Obtiene la lista de objetos Cepa asociados al vino.
-        Utiliza el servicio buscarCepa de la clase Vinoteca.
+        Las referencias no resueltas se buscan con el servicio buscar_cepa
+        de la clase Vinoteca.
 
         Returns:
             Lista de objetos Cepa correspondientes a las cepas del vino
         """
         from vinoteca import Vinoteca
-        return [Vinoteca.buscar_cepa(cepa_id) for cepa_id in self.__cepa_ids]
+        return [
+            Vinoteca.buscar_cepa(cepa) if isinstance(cepa, str) else cepa
+            for cepa in self.__cepas
+        ]
+
+    def obtener_bodega_id(self) -> str:
+        """
+        Obtiene el identificador de la bodega del vino, esté o no resuelta
+        la referencia.
+
+        Returns:
+            Identificador de la bodega
+        """
+        if isinstance(self.__bodega, str):
+            return self.__bodega
+        return self.__bodega.obtener_id()
+
+    def obtener_cepa_ids(self) -> Tuple[str, ...]:
+        """
+        Obtiene los identificadores de las cepas del vino, estén o no
+        resueltas las referencias.
+
+        Returns:
+            Tupla con los identificadores de las cepas
+        """
+        return tuple(
+            cepa if isinstance(cepa, str) else cepa.obtener_id()
+            for cepa in self.__cepas
+        )
 
     def obtener_partidas(self) -> List[int]:
         """
@@ -85,30 +147,41 @@ class Vino(EntidadVineria):
         """
         return self.__partidas
 
-    def convertir_a_json(self) -> Dict:
+    def convertir_a_json(self, campos: Optional[Iterable[str]] = None) -> Dict:
         """
         Convierte el vino a una representación JSON básica.
 
+        Args:
+            campos: Campos a incluir; si se omite se incluyen todos. La
+                bodega y las cepas solo se resuelven si se piden.
+
         Returns:
             Diccionario con la información básica del vino
         """
-        return {
-            "id": self.obtener_id(),
-            "nombre": self.obtener_nombre(),
-            "bodega": self.obtener_bodega().obtener_nombre(),
-            "cepas": [cepa.obtener_nombre() for cepa in self.obtener_cepa()],
-            "partidas": self.__partidas
-        }
+        return self._serializar({
+            "id": self.obtener_id,
+            "nombre": self.obtener_nombre,
+            "bodega": lambda: self.obtener_bodega().obtener_nombre(),
+            "cepas": lambda: [
+                cepa.obtener_nombre() for cepa in self.obtener_cepa()
+            ],
+            "partidas": lambda: self.__partidas,
+        }, campos)
 
-    def convertir_a_json_full(self) -> Dict:
+    def convertir_a_json_full(
+        self, campos: Optional[Iterable[str]] = None
+    ) -> Dict:
         """
         Convierte el vino a una representación JSON completa.
         En esta implementación, retorna la misma información que convertir_a_json.
 
+        Args:
+            campos: Campos a incluir; si se omite se incluyen todos
+
         Returns:
             Diccionario con la información completa del vino
         """
-        return self.convertir_a_json()
+        return self.convertir_a_json(campos)
 
     def __repr__(self) -> str:
         """
@@ -1,18 +1,538 @@
 """Módulo para definiciones de recursos de la API REST."""
+import hashlib
 import json
+from functools import wraps
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Type
+)
+from urllib.parse import quote, urlencode
 
-from flask import request
+from flask import Response, request
 from flask_restful import Resource
 
 import vinoteca
 from modelos.bodega import Bodega
 from modelos.cepa import Cepa
+from modelos.entidad_vineria import EntidadVineria
 from modelos.vino import Vino
 
 
+MIMETYPE_NDJSON = "application/x-ndjson"
+
+# Cantidad máxima de IDs de una búsqueda por lote
+MAXIMO_LOTE = 1000
+
+# Cantidad de resultados de una búsqueda por nombre si no se indica limite
+LIMITE_BUSQUEDA = 10
+
+# Colecciones de una búsqueda aproximada si no se indica colecciones
+COLECCIONES_BUSQUEDA = ("bodegas", "cepas", "vinos")
+
+# Mensaje de las entidades no encontradas de cada colección
+_NO_ENCONTRADA = {
+    "bodegas": "Bodega no encontrada",
+    "cepas": "Cepa no encontrada",
+    "vinos": "Vino no encontrado",
+}
+
+
+def _pide_ndjson() -> bool:
+    """
+    Indica si el cliente prefiere JSON delimitado por líneas (NDJSON)
+    según el encabezado Accept.
+
+    Returns:
+        bool: True si application/x-ndjson es el formato preferido
+    """
+    preferido = request.accept_mimetypes.best_match(
+        ["application/json", MIMETYPE_NDJSON]
+    )
+    return preferido == MIMETYPE_NDJSON
+
+
+def _pide_transmision() -> bool:
+    """
+    Indica si la colección debe enviarse de a una entidad por vez, ya sea
+    por el parámetro stream o por pedir NDJSON.
+
+    Returns:
+        bool: True si la respuesta debe transmitirse en partes
+    """
+    return request.args.get("stream") in ("1", "si") or _pide_ndjson()
+
+
+def _calcular_etag() -> str:
+    """
+    Calcula el ETag de la solicitud actual a partir de la versión de los
+    datos, la ruta, los parámetros de consulta normalizados (ordenados) y
+    el formato negociado con Accept.
+
+    Returns:
+        str: Valor del ETag, sin comillas
+    """
+    consulta = urlencode(sorted(request.args.items(multi=True)))
+    formato = MIMETYPE_NDJSON if _pide_ndjson() else "application/json"
+    clave = (
+        f"{vinoteca.Vinoteca.obtener_version()}|{request.path}|{consulta}"
+        f"|{formato}"
+    )
+    return hashlib.sha1(clave.encode("utf-8")).hexdigest()
+
+
+def _condicional(metodo: Callable) -> Callable:
+    """
+    Decorador para los métodos GET que agrega ETag y Last-Modified a las
+    respuestas y responde 304 a las solicitudes condicionales cuyo
+    validador coincide, sin ejecutar la consulta ni serializar nada.
+
+    Args:
+        metodo: Método get del recurso
+
+    Returns:
+        Callable: Método decorado
+    """
+    @wraps(metodo)
+    def envoltura(*args, **kwargs):
+        etag = _calcular_etag()
+        modificacion = vinoteca.Vinoteca.obtener_fecha_modificacion()
+        if request.if_none_match:
+            no_modificado = request.if_none_match.contains(etag)
+        else:
+            no_modificado = (
+                request.if_modified_since is not None
+                and modificacion is not None
+                and modificacion <= request.if_modified_since
+            )
+        if no_modificado:
+            respuesta = Response(status=304)
+        else:
+            respuesta = metodo(*args, **kwargs)
+            if not isinstance(respuesta, Response):
+                return respuesta
+        respuesta.set_etag(etag)
+        respuesta.last_modified = modificacion
+        respuesta.vary.add("Accept")
+        return respuesta
+    return envoltura
+
+
+def _respuesta_entidad(
+    entidad: EntidadVineria,
+    campos: Optional[Tuple[str, ...]] = None
+) -> Response:
+    """
+    Arma la respuesta de un endpoint individual con el JSON completo
+    de la entidad, ya codificado por la vinoteca.
+
+    Args:
+        entidad: Bodega, cepa o vino a devolver
+        campos: Campos a incluir; si se omite se incluyen todos
+
+    Returns:
+        Response: Respuesta HTTP 200 con el JSON de la entidad
+    """
+    return Response(
+        vinoteca.Vinoteca.obtener_fragmento(entidad, True, campos),
+        status=200,
+        mimetype="application/json"
+    )
+
+
+def _transmitir_coleccion(
+    entidades: Iterable[EntidadVineria],
+    full: bool,
+    campos: Optional[Tuple[str, ...]],
+    ndjson: bool
+) -> Iterator[bytes]:
+    """
+    Genera el cuerpo de una colección de a un fragmento por vez.
+
+    Args:
+        entidades: Entidades a incluir, en orden
+        full: True para usar la representación completa de cada entidad
+        campos: Campos a incluir de cada entidad
+        ndjson: True para un objeto por línea, False para un arreglo JSON
+
+    Returns:
+        Iterator[bytes]: Partes del cuerpo de la respuesta
+    """
+    obtener_fragmento = vinoteca.Vinoteca.obtener_fragmento
+    if ndjson:
+        for entidad in entidades:
+            yield obtener_fragmento(entidad, full, campos) + b"\n"
+        return
+    separador = b"["
+    for entidad in entidades:
+        yield separador + obtener_fragmento(entidad, full, campos)
+        separador = b","
+    yield b"[]" if separador == b"[" else b"]"
+
+
+def _respuesta_coleccion(
+    entidades: Iterable[EntidadVineria],
+    full: bool = False,
+    limite: Optional[int] = None,
+    campos: Optional[Tuple[str, ...]] = None
+) -> Response:
+    """
+    Arma la respuesta de un endpoint de colección uniendo los fragmentos
+    JSON ya codificados de cada entidad, sin volver a serializarlos.
+
+    Si se pidió transmisión (stream=1 o Accept: application/x-ndjson) y no
+    hay límite de página, las entidades se recorren y envían de a una, sin
+    armar el resultado completo en memoria.
+
+    Si la página está completa, agrega un encabezado Link con rel="next"
+    cuya URL repite los parámetros actuales con el cursor de la última
+    entidad.
+
+    Args:
+        entidades: Entidades a incluir en el arreglo, en orden
+        full: True para usar la representación completa de cada entidad
+        limite: Tamaño de página solicitado, si se pidió paginar
+        campos: Campos a incluir de cada entidad; si se omite se incluyen
+            todos
+
+    Returns:
+        Response: Respuesta HTTP 200 con el arreglo JSON o con NDJSON
+    """
+    ndjson = _pide_ndjson()
+    mimetype = MIMETYPE_NDJSON if ndjson else "application/json"
+    if _pide_transmision() and limite is None:
+        return Response(
+            _transmitir_coleccion(entidades, full, campos, ndjson),
+            status=200,
+            mimetype=mimetype
+        )
+
+    entidades = list(entidades)
+    if ndjson:
+        cuerpo = b"".join(
+            _transmitir_coleccion(entidades, full, campos, ndjson)
+        )
+    else:
+        obtener_fragmento = vinoteca.Vinoteca.obtener_fragmento
+        cuerpo = b"[" + b",".join(
+            obtener_fragmento(entidad, full, campos) for entidad in entidades
+        ) + b"]"
+    respuesta = Response(cuerpo, status=200, mimetype=mimetype)
+    if limite is not None and entidades and len(entidades) == limite:
+        cursor = vinoteca.Vinoteca.cursor_de(
+            entidades[-1],
+            request.args.get("orden") or None,
+            request.args.get("reverso") == "si"
+        )
+        parametros = request.args.to_dict(flat=False)
+        parametros["cursor"] = [cursor]
+        siguiente = f"{request.base_url}?{urlencode(parametros, doseq=True)}"
+        respuesta.headers["Link"] = f'<{siguiente}>; rel="next"'
+    return respuesta
+
+
+def _leer_campos(
+    clase: Type[EntidadVineria]
+) -> Optional[Tuple[str, ...]]:
+    """
+    Lee el parámetro campos (separados por coma) de la consulta.
+
+    Args:
+        clase: Clase de las entidades que devuelve el recurso
+
+    Returns:
+        tuple | None: Campos pedidos, o None si no se indicó el parámetro
+
+    Raises:
+        ValueError: Si alguno de los campos no existe en la entidad
+    """
+    valor = request.args.get("campos")
+    if valor is None:
+        return None
+    campos = tuple(
+        campo.strip() for campo in valor.split(",") if campo.strip()
+    )
+    for campo in campos:
+        if campo not in clase.CAMPOS_JSON:
+            raise ValueError(f"Campo no válido: {campo}")
+    return campos
+
+
+def _leer_entero(nombre: str) -> Optional[int]:
+    """
+    Lee un parámetro entero opcional de la consulta.
+
+    Args:
+        nombre: Nombre del parámetro
+
+    Returns:
+        int | None: Valor del parámetro, o None si no se indicó
+
+    Raises:
+        ValueError: Si el parámetro no es un número entero
+    """
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f"El parámetro {nombre} debe ser un entero") from None
+
+
+def _leer_lista(nombre: str) -> Optional[Tuple[str, ...]]:
+    """
+    Lee un parámetro de la consulta con valores separados por coma.
+
+    Args:
+        nombre: Nombre del parámetro
+
+    Returns:
+        tuple | None: Valores indicados, o None si no se indicó el
+            parámetro
+
+    Raises:
+        ValueError: Si se indican más de MAXIMO_LOTE valores
+    """
+    valor = request.args.get(nombre)
+    if valor is None:
+        return None
+    valores = tuple(v.strip() for v in valor.split(",") if v.strip())
+    if len(valores) > MAXIMO_LOTE:
+        raise ValueError(
+            f"Se admiten hasta {MAXIMO_LOTE} valores en el parámetro {nombre}"
+        )
+    return valores
+
+
+def _leer_ids() -> Optional[Tuple[str, ...]]:
+    """
+    Lee el parámetro ids (separados por coma) de la consulta.
+
+    Returns:
+        tuple | None: IDs pedidos, o None si no se indicó el parámetro
+
+    Raises:
+        ValueError: Si se piden más de MAXIMO_LOTE IDs
+    """
+    return _leer_lista("ids")
+
+
+def _leer_busqueda() -> Optional[str]:
+    """
+    Lee el parámetro q de la consulta, sin los espacios de los extremos.
+
+    Returns:
+        str | None: Texto buscado, o None si no se indicó el parámetro
+
+    Raises:
+        ValueError: Si el parámetro está vacío o solo tiene espacios
+    """
+    texto = request.args.get("q")
+    if texto is None:
+        return None
+    texto = texto.strip()
+    if not texto:
+        raise ValueError("El parámetro q no puede estar vacío")
+    return texto
+
+
+def _leer_filtros_vinos() -> Dict[str, Any]:
+    """
+    Lee los filtros del listado de vinos: anio, anio_desde, anio_hasta,
+    bodega y cepa (uno o varios IDs separados por coma) y todas_las_cepas
+    (si para exigir todas las cepas indicadas en lugar de alguna).
+
+    Returns:
+        dict: Argumentos de filtro para Vinoteca.iterar_vinos
+
+    Raises:
+        ValueError: Si algún parámetro no es válido
+    """
+    return {
+        "anio": _leer_entero("anio"),
+        "anio_desde": _leer_entero("anio_desde"),
+        "anio_hasta": _leer_entero("anio_hasta"),
+        "bodega": _leer_lista("bodega") or None,
+        "cepa": _leer_lista("cepa") or None,
+        "todas_las_cepas": request.args.get("todas_las_cepas") == "si",
+    }
+
+
+def _cuerpo_lote(
+    coleccion: str,
+    encontradas: Dict[str, Optional[EntidadVineria]],
+    campos: Optional[Tuple[str, ...]] = None
+) -> bytes:
+    """
+    Arma el arreglo JSON de una búsqueda por lote con los fragmentos
+    completos de las entidades encontradas, en el orden pedido. Cada ID
+    no encontrado ocupa su lugar con un objeto {"id", "error"}.
+
+    Args:
+        coleccion: bodegas, cepas o vinos
+        encontradas: Entidad encontrada (o None) por ID
+        campos: Campos a incluir de cada entidad
+
+    Returns:
+        bytes: Arreglo JSON codificado
+    """
+    obtener_fragmento = vinoteca.Vinoteca.obtener_fragmento
+    error = _NO_ENCONTRADA[coleccion]
+    return b"[" + b",".join(
+        obtener_fragmento(entidad, True, campos) if entidad is not None
+        else json.dumps(
+            {"id": id_, "error": error}, ensure_ascii=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+        for id_, entidad in encontradas.items()
+    ) + b"]"
+
+
+def _respuesta_lote(
+    coleccion: str,
+    ids: Tuple[str, ...],
+    campos: Optional[Tuple[str, ...]]
+) -> Response:
+    """
+    Arma la respuesta de un listado filtrado con el parámetro ids.
+
+    Args:
+        coleccion: bodegas, cepas o vinos
+        ids: IDs pedidos
+        campos: Campos a incluir de cada entidad
+
+    Returns:
+        Response: Respuesta HTTP 200 con el arreglo JSON
+    """
+    encontradas = vinoteca.Vinoteca.buscar_varios(coleccion, ids)
+    return Response(
+        _cuerpo_lote(coleccion, encontradas, campos),
+        status=200,
+        mimetype="application/json"
+    )
+
+
+def _respuesta_busqueda(
+    coleccion: str,
+    prefijo: str,
+    campos: Optional[Tuple[str, ...]]
+) -> Response:
+    """
+    Arma la respuesta de un listado filtrado con el parámetro q: las
+    entidades cuyo nombre tiene una palabra que empieza con el prefijo,
+    de la más relevante a la menos.
+
+    Args:
+        coleccion: bodegas, cepas o vinos
+        prefijo: Texto buscado
+        campos: Campos a incluir de cada entidad
+
+    Returns:
+        Response: Respuesta HTTP 200 con el arreglo JSON
+
+    Raises:
+        ValueError: Si el límite no es un entero positivo
+    """
+    limite = _leer_entero("limite")
+    entidades = vinoteca.Vinoteca.buscar_por_prefijo(
+        coleccion, prefijo, LIMITE_BUSQUEDA if limite is None else limite
+    )
+    return _respuesta_coleccion(entidades, campos=campos)
+
+
+def _leer_cuerpo() -> Dict[str, Any]:
+    """
+    Lee el cuerpo JSON de una solicitud de escritura.
+
+    Returns:
+        dict: Objeto JSON recibido
+
+    Raises:
+        ValueError: Si el cuerpo no es un objeto JSON
+    """
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        raise ValueError("El cuerpo debe ser un objeto JSON")
+    return datos
+
+
+def _responder_escritura(
+    escribir: Callable[[], Tuple[Optional[EntidadVineria], int]],
+    no_encontrada: str = "Entidad no encontrada"
+):
+    """
+    Ejecuta una escritura de la vinoteca y arma su respuesta.
+
+    Args:
+        escribir: Realiza la escritura y devuelve la entidad resultante
+            (None si se eliminó) y el código de estado
+        no_encontrada: Mensaje de error si la entidad no existe
+
+    Returns:
+        Response | tuple: Respuesta con el JSON completo de la entidad, o
+        error y código de estado HTTP
+    """
+    try:
+        entidad, estado = escribir()
+    except vinoteca.ConflictoDeDatos as error:
+        return {"error": str(error)}, 409
+    except ValueError as error:
+        return {"error": str(error)}, 400
+    except KeyError:
+        return {"error": no_encontrada}, 404
+    except OSError:
+        return {"error": "No se pudo registrar el cambio"}, 503
+    if entidad is None:
+        return Response(status=204)
+    respuesta = _respuesta_entidad(entidad)
+    respuesta.status_code = estado
+    if estado == 201:
+        # POST se dirige a la colección y PUT a la propia entidad
+        respuesta.headers["Location"] = (
+            f"{request.base_url}/{quote(entidad.obtener_id(), safe='')}"
+            if request.method == "POST" else request.base_url
+        )
+    return respuesta
+
+
+def _crear(coleccion: str):
+    """Da de alta una entidad con el cuerpo de la solicitud (POST)."""
+    return _responder_escritura(
+        lambda: (vinoteca.Vinoteca.crear(coleccion, _leer_cuerpo()), 201)
+    )
+
+
+def _reemplazar(coleccion: str, id: str, no_encontrada: str):
+    """Reemplaza o crea una entidad con el cuerpo de la solicitud (PUT)."""
+    def escribir():
+        entidad, creada = vinoteca.Vinoteca.reemplazar(
+            coleccion, id, _leer_cuerpo()
+        )
+        return entidad, 201 if creada else 200
+    return _responder_escritura(escribir, no_encontrada)
+
+
+def _modificar(coleccion: str, id: str, no_encontrada: str):
+    """Modifica los campos de una entidad indicados en el cuerpo (PATCH)."""
+    return _responder_escritura(
+        lambda: (
+            vinoteca.Vinoteca.modificar(coleccion, id, _leer_cuerpo()), 200
+        ),
+        no_encontrada
+    )
+
+
+def _eliminar(coleccion: str, id: str, no_encontrada: str):
+    """Da de baja una entidad (DELETE)."""
+    def escribir():
+        vinoteca.Vinoteca.eliminar(coleccion, id)
+        return None, 204
+    return _responder_escritura(escribir, no_encontrada)
+
+
 class RecursoBodega(Resource):
     """Recurso para manejar endpoints individuales de bodegas."""
 
+    @_condicional
     def get(self, id):
         """
         Obtiene una bodega específica por ID.
@@ -21,44 +541,98 @@ class RecursoBodega(Resource):
             id (str): ID de la bodega
 
         Returns:
-            tuple: Respuesta JSON y código de estado HTTP
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
         """
+        try:
+            campos = _leer_campos(Bodega)
+        except ValueError as error:
+            return {"error": str(error)}, 400
         bodega = vinoteca.Vinoteca.buscar_bodega(id)
         if isinstance(bodega, Bodega):
-            return json.loads(json.dumps(bodega.convertir_a_json_full())), 200
+            return _respuesta_entidad(bodega, campos)
         return {"error": "Bodega no encontrada"}, 404
 
+    def put(self, id):
+        """
+        Reemplaza todos los campos de una bodega o la crea si no existe.
+
+        Args:
+            id (str): ID de la bodega
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _reemplazar("bodegas", id, "Bodega no encontrada")
+
+    def patch(self, id):
+        """
+        Modifica los campos de una bodega indicados en el cuerpo.
+
+        Args:
+            id (str): ID de la bodega
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _modificar("bodegas", id, "Bodega no encontrada")
+
+    def delete(self, id):
+        """
+        Elimina una bodega.
+
+        Args:
+            id (str): ID de la bodega
+
+        Returns:
+            Response | tuple: Respuesta vacía, o error y código de estado HTTP
+        """
+        return _eliminar("bodegas", id, "Bodega no encontrada")
+
 
 class RecursoBodegas(Resource):
     """Recurso para manejar endpoints de colección de bodegas."""
 
+    @_condicional
     def get(self):
         """
-        Obtiene lista de todas las bodegas con ordenamiento opcional.
+        Obtiene lista de bodegas con ordenamiento y paginación opcionales.
 
         Returns:
-            tuple: Respuesta JSON y código de estado HTTP
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
         """
-        orden = request.args.get("orden")
-        if orden:
-            reverso = request.args.get("reverso")
-            bodegas = vinoteca.Vinoteca.obtener_bodegas(
-                orden=orden,
-                reverso=reverso == "si"
+        try:
+            campos = _leer_campos(Bodega)
+            ids = _leer_ids()
+            if ids is not None:
+                return _respuesta_lote("bodegas", ids, campos)
+            texto = _leer_busqueda()
+            if texto is not None:
+                return _respuesta_busqueda("bodegas", texto, campos)
+            limite = _leer_entero("limite")
+            bodegas = vinoteca.Vinoteca.iterar_bodegas(
+                orden=request.args.get("orden") or None,
+                reverso=request.args.get("reverso") == "si",
+                limite=limite,
+                cursor=request.args.get("cursor") or None
             )
-        else:
-            bodegas = vinoteca.Vinoteca.obtener_bodegas()
-        return (
-            json.loads(
-                json.dumps(bodegas, default=lambda o: o.convertir_a_json())
-            ),
-            200,
-        )
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        return _respuesta_coleccion(bodegas, limite=limite, campos=campos)
+
+    def post(self):
+        """
+        Da de alta una bodega con los datos JSON del cuerpo.
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _crear("bodegas")
 
 
 class RecursoCepa(Resource):
     """Recurso para manejar endpoints individuales de cepas."""
 
+    @_condicional
     def get(self, id):
         """
         Obtiene una cepa específica por ID.
@@ -67,44 +641,100 @@ class RecursoCepa(Resource):
             id (str): ID de la cepa
 
         Returns:
-            tuple: Respuesta JSON y código de estado HTTP
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
         """
+        try:
+            campos = _leer_campos(Cepa)
+        except ValueError as error:
+            return {"error": str(error)}, 400
         cepa = vinoteca.Vinoteca.buscar_cepa(id)
         if isinstance(cepa, Cepa):
-            return json.loads(json.dumps(cepa.convertir_a_json_full())), 200
+            return _respuesta_entidad(cepa, campos)
         return {"error": "Cepa no encontrada"}, 404
 
+    def put(self, id):
+        """
+        Reemplaza todos los campos de una cepa o la crea si no existe.
+
+        Args:
+            id (str): ID de la cepa
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _reemplazar("cepas", id, "Cepa no encontrada")
+
+    def patch(self, id):
+        """
+        Modifica los campos de una cepa indicados en el cuerpo.
+
+        Args:
+            id (str): ID de la cepa
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _modificar("cepas", id, "Cepa no encontrada")
+
+    def delete(self, id):
+        """
+        Elimina una cepa.
+
+        Args:
+            id (str): ID de la cepa
+
+        Returns:
+            Response | tuple: Respuesta vacía, o error y código de estado HTTP
+        """
+        return _eliminar("cepas", id, "Cepa no encontrada")
+
 
 class RecursoCepas(Resource):
     """Recurso para manejar endpoints de colección de cepas."""
 
+    @_condicional
     def get(self):
         """
-        Obtiene lista de todas las cepas con ordenamiento opcional.
+        Obtiene lista de cepas con ordenamiento y paginación opcionales.
 
         Returns:
-            tuple: Respuesta JSON y código de estado HTTP
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
         """
-        orden = request.args.get("orden")
-        if orden:
-            reverso = request.args.get("reverso")
-            cepas = vinoteca.Vinoteca.obtener_cepas(
-                orden=orden,
-                reverso=reverso == "si"
+        try:
+            campos = _leer_campos(Cepa)
+            ids = _leer_ids()
+            if ids is not None:
+                return _respuesta_lote("cepas", ids, campos)
+            texto = _leer_busqueda()
+            if texto is not None:
+                return _respuesta_busqueda("cepas", texto, campos)
+            limite = _leer_entero("limite")
+            cepas = vinoteca.Vinoteca.iterar_cepas(
+                orden=request.args.get("orden") or None,
+                reverso=request.args.get("reverso") == "si",
+                limite=limite,
+                cursor=request.args.get("cursor") or None
             )
-        else:
-            cepas = vinoteca.Vinoteca.obtener_cepas()
-        return (
-            json.loads(
-                json.dumps(cepas, default=lambda o: o.convertir_a_json_full())
-            ),
-            200,
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        return _respuesta_coleccion(
+            cepas, full=True, limite=limite, campos=campos
         )
 
+    def post(self):
+        """
+        Da de alta una cepa con los datos JSON del cuerpo.
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _crear("cepas")
+
 
 class RecursoVino(Resource):
     """Recurso para manejar endpoints individuales de vinos."""
 
+    @_condicional
     def get(self, id):
         """
         Obtiene un vino específico por ID.
@@ -113,42 +743,216 @@ class RecursoVino(Resource):
             id (str): ID del vino
 
         Returns:
-            tuple: Respuesta JSON y código de estado HTTP
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
         """
+        try:
+            campos = _leer_campos(Vino)
+        except ValueError as error:
+            return {"error": str(error)}, 400
         vino = vinoteca.Vinoteca.buscar_vino(id)
         if isinstance(vino, Vino):
-            return json.loads(json.dumps(vino.convertir_a_json_full())), 200
+            return _respuesta_entidad(vino, campos)
         return {"error": "Vino no encontrado"}, 404
 
+    def put(self, id):
+        """
+        Reemplaza todos los campos de un vino o lo crea si no existe.
+
+        Args:
+            id (str): ID del vino
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _reemplazar("vinos", id, "Vino no encontrado")
+
+    def patch(self, id):
+        """
+        Modifica los campos de un vino indicados en el cuerpo.
+
+        Args:
+            id (str): ID del vino
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _modificar("vinos", id, "Vino no encontrado")
+
+    def delete(self, id):
+        """
+        Elimina un vino.
+
+        Args:
+            id (str): ID del vino
+
+        Returns:
+            Response | tuple: Respuesta vacía, o error y código de estado HTTP
+        """
+        return _eliminar("vinos", id, "Vino no encontrado")
+
 
 class RecursoVinos(Resource):
     """Recurso para manejar endpoints de colección de vinos."""
 
+    @_condicional
     def get(self):
         """
-        Obtiene lista de todos los vinos con filtrado y ordenamiento opcional.
+        Obtiene lista de vinos con filtrado, ordenamiento y paginación
+        opcionales.
 
         Returns:
-            tuple: Respuesta JSON y código de estado HTTP
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
         """
-        anio = request.args.get("anio")
-        if anio:
-            anio = int(anio)
-        orden = request.args.get("orden")
-        if orden:
-            if orden == "nombre":
-                orden = "_Vino__nombre"
-            reverso = request.args.get("reverso")
-            vinos = vinoteca.Vinoteca.obtener_vinos(
-                anio,
-                orden=orden,
-                reverso=reverso == "si"
+        try:
+            campos = _leer_campos(Vino)
+            ids = _leer_ids()
+            if ids is not None:
+                return _respuesta_lote("vinos", ids, campos)
+            texto = _leer_busqueda()
+            if texto is not None:
+                return _respuesta_busqueda("vinos", texto, campos)
+            limite = _leer_entero("limite")
+            vinos = vinoteca.Vinoteca.iterar_vinos(
+                orden=request.args.get("orden") or None,
+                reverso=request.args.get("reverso") == "si",
+                limite=limite,
+                cursor=request.args.get("cursor") or None,
+                **_leer_filtros_vinos()
             )
-        else:
-            vinos = vinoteca.Vinoteca.obtener_vinos(anio)
-        return (
-            json.loads(
-                json.dumps(vinos, default=lambda o: o.convertir_a_json())
-            ),
-            200,
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        return _respuesta_coleccion(vinos, limite=limite, campos=campos)
+
+    def post(self):
+        """
+        Da de alta un vino con los datos JSON del cuerpo.
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        return _crear("vinos")
+
+
+class RecursoLote(Resource):
+    """Recurso para buscar entidades de varias colecciones en una solicitud."""
+
+    def post(self):
+        """
+        Busca bodegas, cepas y vinos por ID. El cuerpo indica los IDs de
+        cada colección, por ejemplo {"vinos": ["v1", "v2"], "bodegas":
+        ["b1"]}; la respuesta tiene las mismas claves con el arreglo de
+        cada una, como el del parámetro ids de los listados.
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        try:
+            pedidos = _leer_cuerpo()
+            for coleccion, ids in pedidos.items():
+                if coleccion not in _NO_ENCONTRADA:
+                    raise ValueError(f"Colección no válida: {coleccion}")
+                if not isinstance(ids, list) or not all(
+                    isinstance(id_, str) for id_ in ids
+                ):
+                    raise ValueError(
+                        f"Los IDs de {coleccion} deben ser una lista de textos"
+                    )
+            if sum(map(len, pedidos.values())) > MAXIMO_LOTE:
+                raise ValueError(
+                    f"Se admiten hasta {MAXIMO_LOTE} IDs por consulta"
+                )
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        encontradas = vinoteca.Vinoteca.buscar_lote(pedidos)
+        cuerpo = b"{" + b",".join(
+            json.dumps(coleccion).encode("utf-8") + b":"
+            + _cuerpo_lote(coleccion, entidades)
+            for coleccion, entidades in encontradas.items()
+        ) + b"}"
+        return Response(cuerpo, status=200, mimetype="application/json")
+
+
+class RecursoBusqueda(Resource):
+    """Recurso para buscar entidades por nombre tolerando errores de tipeo."""
+
+    @_condicional
+    def get(self):
+        """
+        Busca bodegas, cepas y vinos con el nombre más parecido al parámetro
+        q, aunque alguno de los dos tenga errores de tipeo. Los parámetros
+        opcionales limite (por defecto LIMITE_BUSQUEDA) y colecciones
+        (separadas por coma) acotan los resultados. Cada resultado indica
+        su colección, su similitud (de 0 a 1) y la entidad, del más
+        parecido al menos.
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        try:
+            texto = request.args.get("q", "").strip()
+            if not texto:
+                raise ValueError("Falta el parámetro q")
+            colecciones = request.args.get("colecciones")
+            limite = _leer_entero("limite")
+            resultados = vinoteca.Vinoteca.buscar_similares(
+                texto,
+                LIMITE_BUSQUEDA if limite is None else limite,
+                COLECCIONES_BUSQUEDA if colecciones is None else [
+                    coleccion.strip()
+                    for coleccion in colecciones.split(",")
+                    if coleccion.strip()
+                ]
+            )
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        obtener_fragmento = vinoteca.Vinoteca.obtener_fragmento
+        cuerpo = b"[" + b",".join(
+            b'{"coleccion":' + json.dumps(coleccion).encode("utf-8")
+            + b',"similitud":' + json.dumps(round(similitud, 4)).encode("utf-8")
+            + b',"entidad":' + obtener_fragmento(entidad, False, None) + b"}"
+            for coleccion, entidad, similitud in resultados
+        ) + b"]"
+        return Response(cuerpo, status=200, mimetype="application/json")
+
+
+class RecursoFacetas(Resource):
+    """Recurso para contar vinos por año, bodega y cepa."""
+
+    @_condicional
+    def get(self):
+        """
+        Obtiene la cantidad de vinos por año, por bodega y por cepa. Acepta
+        los mismos filtros que el listado de vinos (anio, anio_desde,
+        anio_hasta, bodega, cepa y todas_las_cepas), y entonces cuenta solo
+        los vinos que los cumplen. Con limite devuelve solo las bodegas y
+        las cepas con más vinos.
+
+        Returns:
+            Response | tuple: Respuesta JSON, o error y código de estado HTTP
+        """
+        try:
+            facetas = vinoteca.Vinoteca.obtener_facetas(
+                limite=_leer_entero("limite"), **_leer_filtros_vinos()
+            )
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        cuerpo = {
+            "total": facetas["total"],
+            "anios": [
+                {"anio": anio, "vinos": cantidad}
+                for anio, cantidad in facetas["anios"]
+            ],
+        }
+        for faceta in ("bodegas", "cepas"):
+            cuerpo[faceta] = [
+                {
+                    "id": entidad.obtener_id(),
+                    "nombre": entidad.obtener_nombre(),
+                    "vinos": cantidad,
+                }
+                for entidad, cantidad in facetas[faceta]
+            ]
+        return Response(
+            json.dumps(cuerpo, ensure_ascii=False).encode("utf-8"),
+            status=200, mimetype="application/json"
         )
@@ -0,0 +1,808 @@
+import copy
+import hashlib
+import io
+import json
+import marshal
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from almacenes.base import CLAVES_BODEGAS, CLAVES_CEPAS, CLAVES_VINOS
+from almacenes.bitacora import (
+    Bitacora, codificar_cambio, leer_cambios, ruta_bitacora, ruta_compactacion
+)
+from almacenes.capas import AlmacenConCambios
+from almacenes.lector_json import LectorJson
+from almacenes.mapeado import abrir_mapa, escribir_mapa, ruta_mapa
+from almacenes.memoria import AlmacenEnMemoria
+from almacenes.nombres import IndiceNombres, IndiceTrigramas, normalizar, trigramas
+from almacenes.sqlite import (
+    abrir_base_de_datos, importar_json, ruta_base_de_datos
+)
+from consulta import listas_de_filtros, resolver_filtros
+
+
+def filtrar(almacen, anio_desde, anio_hasta, bodega, cepa):
+    """Posiciones de los vinos que cumplen los filtros, según el planificador"""
+    return list(resolver_filtros(listas_de_filtros(
+        almacen, anio_desde, anio_hasta, bodega, cepa, False
+    )))
+
+
+def resumen(almacen):
+    """Resume el contenido observable de un almacén para compararlo"""
+    def ids(entidades):
+        return [entidad.obtener_id() for entidad in entidades]
+
+    datos = {
+        "bodegas": [(b.obtener_id(), b.obtener_nombre()) for b in almacen.obtener_bodegas()],
+        "cepas": [(c.obtener_id(), c.obtener_nombre()) for c in almacen.obtener_cepas()],
+        "vinos": [
+            (v.obtener_id(), v.obtener_nombre(), v.obtener_bodega_id(),
+             v.obtener_cepa_ids(), v.obtener_partidas())
+            for v in almacen.obtener_vinos()
+        ],
+    }
+    for bodega in almacen.obtener_bodegas():
+        id_ = bodega.obtener_id()
+        datos["vinos_de_" + id_] = ids(almacen.obtener_vinos_de_bodega(id_))
+        datos["cepas_de_" + id_] = ids(almacen.obtener_cepas_de_bodega(id_))
+    for cepa in almacen.obtener_cepas():
+        id_ = cepa.obtener_id()
+        datos["vinos_de_" + id_] = ids(almacen.obtener_vinos_de_cepa(id_))
+        datos["filtro_" + id_] = filtrar(almacen, 2020, None, None, id_)
+        datos["facetas_" + id_] = almacen.contar_facetas(
+            filtrar(almacen, 2019, 2021, None, id_)
+        )
+    for coleccion in ("bodegas", "cepas"):
+        ids_ = [e.obtener_id() for e in getattr(almacen, "obtener_" + coleccion)()]
+        datos["listas_" + coleccion] = [
+            list(lista)
+            for lista in almacen.listas_por_relacion(coleccion, ids_ + ["no-existe"])
+        ]
+    for bodega in almacen.obtener_bodegas():
+        datos["facetas_" + bodega.obtener_id()] = almacen.contar_facetas(
+            filtrar(almacen, None, None, bodega.obtener_id(), None)
+        )
+    for filtros in ((None, None), (2020, 2020), (None, 2019), (2030, None)):
+        datos[("listas",) + filtros] = [
+            list(lista) for lista in almacen.listas_por_anio(*filtros)
+        ]
+        datos[("facetas",) + filtros] = almacen.contar_facetas(
+            filtrar(almacen, *filtros, None, None)
+            if filtros != (None, None) else None
+        )
+    for coleccion, claves in (
+        ("bodegas", CLAVES_BODEGAS), ("cepas", CLAVES_CEPAS), ("vinos", CLAVES_VINOS)
+    ):
+        for campo in claves:
+            datos[coleccion + "_por_" + campo] = list(
+                almacen.obtener_permutacion(coleccion, campo)
+            )
+    for campo in CLAVES_VINOS:
+        datos["rangos_" + campo] = list(almacen.obtener_rangos_vinos(campo))
+    for anio in range(2018, 2026):
+        datos[anio] = list(almacen.posiciones_por_anios(anio, anio))
+    for coleccion in ("bodegas", "cepas", "vinos"):
+        for prefijo in ("", "b", "BODEGA u", "dos", "ma", "sy", "a", "e"):
+            datos[f"prefijo_{coleccion}_{prefijo}"] = almacen.buscar_por_prefijo(
+                coleccion, prefijo, 10
+            )
+        for texto in ("malbek", "bodga", "cabernet sauvignon", "vino 1", "xyz"):
+            datos[f"similares_{coleccion}_{texto}"] = almacen.buscar_similares(
+                coleccion, texto, 5
+            )
+    return datos
+
+
+class TestDerivarAlmacen(unittest.TestCase):
+    datos = {
+        "bodegas": [
+            {"id": "b1", "nombre": "Bodega Uno"},
+            {"id": "b2", "nombre": "Bodega Dos"},
+            {"id": "b3", "nombre": "Bodega Tres"}
+        ],
+        "cepas": [
+            {"id": "c1", "nombre": "Malbec"},
+            {"id": "c2", "nombre": "Syrah"}
+        ],
+        "vinos": [
+            {"id": "v1", "nombre": "Delta", "bodega": "b1", "cepas": ["c1"], "partidas": [2020, 2021]},
+            {"id": "v2", "nombre": "Alfa", "bodega": "b2", "cepas": ["c1", "c2"], "partidas": [2021]},
+            {"id": "v3", "nombre": "Charlie", "bodega": "b1", "cepas": ["c2"], "partidas": [2019]},
+            {"id": "v4", "nombre": "Bravo", "bodega": "b3", "cepas": ["c1"], "partidas": [2022, 2023]}
+        ]
+    }
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.anterior = AlmacenEnMemoria(copy.deepcopy(self.datos))
+        self.resumen_anterior = resumen(self.anterior)
+
+    def derivar(self, editar):
+        """Deriva un almacén de una copia editada y lo compara con uno nuevo"""
+        datos = copy.deepcopy(self.datos)
+        editar(datos)
+        derivado = self.anterior.derivar(copy.deepcopy(datos), "v2")
+        self.assertEqual(resumen(derivado), resumen(AlmacenEnMemoria(datos)))
+        self.assertEqual(resumen(self.anterior), self.resumen_anterior)
+        self.assertEqual(derivado.obtener_version(), "v2")
+        return derivado
+
+    def test_edicion_de_vino(self):
+        """Solo se recrea el vino editado"""
+        def editar(datos):
+            datos["vinos"][1].update(nombre="Zulu", bodega="b1", partidas=[2024])
+        derivado = self.derivar(editar)
+        self.assertIsNot(derivado.buscar_vino("v2"), self.anterior.buscar_vino("v2"))
+        for id_ in ("v1", "v3", "v4"):
+            self.assertIs(derivado.buscar_vino(id_), self.anterior.buscar_vino(id_))
+        self.assertIs(derivado.buscar_bodega("b1"), self.anterior.buscar_bodega("b1"))
+
+    def test_renombrar_bodega_recrea_sus_vinos(self):
+        """Los vinos de una bodega renombrada apuntan a la bodega nueva"""
+        derivado = self.derivar(
+            lambda datos: datos["bodegas"][0].update(nombre="Bodega Renombrada")
+        )
+        for id_ in ("v1", "v3"):
+            self.assertIs(
+                derivado.buscar_vino(id_).obtener_bodega(),
+                derivado.buscar_bodega("b1")
+            )
+        self.assertIs(derivado.buscar_vino("v2"), self.anterior.buscar_vino("v2"))
+
+    def test_altas_al_final(self):
+        """Las altas al final se incorporan a todos los índices"""
+        def editar(datos):
+            datos["bodegas"].append({"id": "b4", "nombre": "Bodega Cuatro"})
+            datos["cepas"].append({"id": "c3", "nombre": "Bonarda"})
+            datos["vinos"].append({
+                "id": "v5", "nombre": "Eco", "bodega": "b4",
+                "cepas": ["c3", "c1"], "partidas": [2020]
+            })
+        self.derivar(editar)
+
+    def test_bajas_y_cambios_de_orden(self):
+        """Las bajas reconstruyen los índices reutilizando las entidades"""
+        def editar(datos):
+            del datos["vinos"][0]
+            datos["bodegas"].reverse()
+        derivado = self.derivar(editar)
+        self.assertIsNone(derivado.buscar_vino("v1"))
+        self.assertIs(derivado.buscar_vino("v4"), self.anterior.buscar_vino("v4"))
+
+    def test_referencias_inexistentes(self):
+        """Las referencias a entidades inexistentes se mantienen por ID"""
+        def editar(datos):
+            datos["vinos"][2].update(bodega="b9", cepas=["c9", "c2"])
+        self.derivar(editar)
+
+    def test_fragmentos_afectados_se_descartan(self):
+        """Solo se conserva el JSON de las entidades no afectadas"""
+        for id_ in ("v1", "v2"):
+            self.anterior.obtener_fragmentos()[("Vino", id_, False)] = b"{}"
+        self.anterior.obtener_fragmentos()[("Bodega", "b3", False)] = b"{}"
+        self.anterior.obtener_fragmentos()[("Bodega", "b2", False)] = b"{}"
+        derivado = self.derivar(
+            lambda datos: datos["vinos"][1].update(nombre="Zulu")
+        )
+        self.assertEqual(
+            set(derivado.obtener_fragmentos()),
+            {("Vino", "v1", False), ("Bodega", "b3", False)}
+        )
+
+
+class TestAplicarCambios(unittest.TestCase):
+    datos = TestDerivarAlmacen.datos
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.anterior = AlmacenEnMemoria(copy.deepcopy(self.datos))
+        self.resumen_anterior = resumen(self.anterior)
+
+    def aplicar(self, cambios):
+        """Aplica cambios y compara el resultado con un almacén nuevo"""
+        datos = copy.deepcopy(self.datos)
+        for coleccion, id_, fila in cambios:
+            filas = [f for f in datos[coleccion] if f["id"] != id_]
+            if fila is not None:
+                posiciones = [f["id"] for f in datos[coleccion]]
+                if id_ in posiciones:
+                    filas.insert(posiciones.index(id_), fila)
+                else:
+                    filas.append(fila)
+            datos[coleccion] = filas
+        aplicado = self.anterior.aplicar(cambios, "v2")
+        self.assertEqual(resumen(aplicado), resumen(AlmacenEnMemoria(datos)))
+        self.assertEqual(resumen(self.anterior), self.resumen_anterior)
+        self.assertEqual(aplicado.obtener_version(), "v2")
+        return aplicado
+
+    def test_modificacion_de_vino(self):
+        """Solo se recrea el vino modificado"""
+        aplicado = self.aplicar([("vinos", "v2", {
+            "id": "v2", "nombre": "Zulu", "bodega": "b1",
+            "cepas": ["c2"], "partidas": [2024]
+        })])
+        self.assertIs(aplicado.buscar_vino("v1"), self.anterior.buscar_vino("v1"))
+
+    def test_renombrar_bodega_recrea_sus_vinos(self):
+        """Los vinos de una bodega modificada apuntan a la bodega nueva"""
+        aplicado = self.aplicar(
+            [("bodegas", "b1", {"id": "b1", "nombre": "Bodega Renombrada"})]
+        )
+        for id_ in ("v1", "v3"):
+            self.assertIs(
+                aplicado.buscar_vino(id_).obtener_bodega(),
+                aplicado.buscar_bodega("b1")
+            )
+        self.assertIs(aplicado.buscar_vino("v2"), self.anterior.buscar_vino("v2"))
+
+    def test_altas_y_bajas(self):
+        """Las altas se agregan al final y las bajas reconstruyen los índices"""
+        self.aplicar([
+            ("bodegas", "b4", {"id": "b4", "nombre": "Bodega Cuatro"}),
+            ("vinos", "v5", {
+                "id": "v5", "nombre": "Eco", "bodega": "b4",
+                "cepas": ["c2"], "partidas": [2018]
+            }),
+        ])
+        self.aplicar([("vinos", "v1", None), ("vinos", "v9", None)])
+
+    def test_cambios_sucesivos_del_mismo_id(self):
+        """Dentro de un lote vale el último cambio de cada ID"""
+        aplicado = self.aplicar([
+            ("vinos", "v5", {
+                "id": "v5", "nombre": "Eco", "bodega": "b1",
+                "cepas": [], "partidas": []
+            }),
+            ("vinos", "v5", None),
+            ("cepas", "c1", {"id": "c1", "nombre": "Cot"}),
+        ])
+        self.assertIsNone(aplicado.buscar_vino("v5"))
+
+    def test_coleccion_invalida(self):
+        """Una colección desconocida se rechaza"""
+        with self.assertRaises(ValueError):
+            self.anterior.aplicar([("barricas", "x1", None)])
+
+    def test_cambios_encadenados(self):
+        """Cada lote sobre el almacén anterior equivale a un almacén nuevo"""
+        datos = copy.deepcopy(self.datos)
+        almacen = self.anterior
+        lotes = [
+            [("vinos", "v1", None), ("bodegas", "b4", {"id": "b4", "nombre": "Bodega Cuatro"})],
+            [("vinos", "v5", {
+                "id": "v5", "nombre": "Eco", "bodega": "b4",
+                "cepas": ["c2", "c1"], "partidas": [2018, 2020]
+            })],
+            [("bodegas", "b4", {"id": "b4", "nombre": "Alta Bodega"})],
+            [("vinos", "v1", {
+                "id": "v1", "nombre": "Delta", "bodega": "b2",
+                "cepas": ["c1"], "partidas": [2025]
+            }), ("vinos", "v5", None)],
+            [("cepas", "c2", {"id": "c2", "nombre": "Syrah"}), ("bodegas", "b1", None)],
+        ]
+        for numero, cambios in enumerate(lotes):
+            for coleccion, id_, fila in cambios:
+                filas = [f for f in datos[coleccion] if f["id"] != id_]
+                posiciones = [f["id"] for f in datos[coleccion]]
+                if fila is not None and id_ in posiciones:
+                    filas.insert(posiciones.index(id_), fila)
+                elif fila is not None:
+                    filas.append(fila)
+                datos[coleccion] = filas
+            anterior, resumen_anterior = almacen, resumen(almacen)
+            almacen = almacen.aplicar(cambios, f"v{numero}")
+            esperado = resumen(AlmacenEnMemoria(copy.deepcopy(datos)))
+            self.assertEqual(resumen(almacen), esperado)
+            self.assertEqual(resumen(anterior), resumen_anterior)
+        consolidado = almacen.consolidar()
+        self.assertIsInstance(consolidado, AlmacenEnMemoria)
+        self.assertEqual(resumen(consolidado), esperado)
+        self.assertEqual(consolidado.obtener_version(), "v4")
+
+    def test_consolidar_al_superar_el_maximo(self):
+        """Aplicar consolida las capas si acumulan demasiados cambios"""
+        cambio = [("cepas", "c1", {"id": "c1", "nombre": "Cot"})]
+        self.assertIsInstance(self.anterior.aplicar(cambio), AlmacenConCambios)
+        with patch("almacenes.capas.MAXIMO_CAMBIOS", 0):
+            self.assertIsInstance(self.anterior.aplicar(cambio), AlmacenEnMemoria)
+
+    def test_con_cambios_construye_indices_propios(self):
+        """con_cambios obtiene directamente el almacén consolidado"""
+        cambios = [("vinos", "v2", None)]
+        consolidado = self.anterior.con_cambios(cambios, "v2")
+        self.assertIsInstance(consolidado, AlmacenEnMemoria)
+        self.assertEqual(
+            resumen(consolidado), resumen(self.anterior.aplicar(cambios, "v2"))
+        )
+
+
+class TestFacetas(unittest.TestCase):
+    def setUp(self):
+        """Carga el almacén de los datos de prueba de derivación"""
+        self.almacen = AlmacenEnMemoria(copy.deepcopy(TestDerivarAlmacen.datos))
+
+    def test_sin_filtros(self):
+        """Sin filtros se cuentan todos los vinos de cada valor"""
+        total, facetas = self.almacen.contar_facetas(None)
+        self.assertEqual(total, 4)
+        self.assertEqual(
+            facetas["anios"], {2019: 1, 2020: 1, 2021: 2, 2022: 1, 2023: 1}
+        )
+        self.assertEqual(facetas["bodegas"], {0: 2, 1: 1, 2: 1})
+        self.assertEqual(facetas["cepas"], {0: 3, 1: 2})
+
+    def test_con_filtros_coincide_con_recorrer(self):
+        """Con filtros se cuentan solo los vinos que los cumplen"""
+        vinos = self.almacen.obtener_vinos()
+        cepas = {cepa.obtener_id(): i for i, cepa in enumerate(self.almacen.obtener_cepas())}
+        for filtros in (
+            (2021, 2021, None, None), (2020, 2022, None, "c1"),
+            (None, None, "b1", "c2"), (2019, None, "b2", None),
+        ):
+            posiciones = filtrar(self.almacen, *filtros)
+            total, facetas = self.almacen.contar_facetas(posiciones)
+            self.assertEqual(total, len(posiciones))
+            esperadas = {}
+            for posicion in posiciones:
+                for anio in set(vinos[posicion].obtener_partidas()):
+                    esperadas[anio] = esperadas.get(anio, 0) + 1
+            self.assertEqual(facetas["anios"], esperadas)
+            esperadas = {}
+            for posicion in posiciones:
+                for cepa_id in vinos[posicion].obtener_cepa_ids():
+                    esperadas[cepas[cepa_id]] = esperadas.get(cepas[cepa_id], 0) + 1
+            self.assertEqual(facetas["cepas"], esperadas)
+
+    def test_sin_numpy(self):
+        """Las listas y los conteos no dependen de NumPy"""
+        posiciones = (None, [1, 2], [0, 3], [2])
+        esperadas = [self.almacen.contar_facetas(p) for p in posiciones]
+        with patch("almacenes.facetas.np", None):
+            almacen = AlmacenEnMemoria(copy.deepcopy(TestDerivarAlmacen.datos))
+            self.assertEqual(
+                [almacen.contar_facetas(p) for p in posiciones], esperadas
+            )
+
+    def test_bodega_inexistente(self):
+        """Una bodega que no existe no tiene vinos que contar"""
+        self.assertEqual(
+            [list(lista) for lista in self.almacen.listas_por_relacion("bodegas", ["b9", "b1"])],
+            [[], [0, 2]]
+        )
+        self.assertEqual(
+            self.almacen.contar_facetas([]),
+            (0, {"anios": {}, "bodegas": {}, "cepas": {}})
+        )
+
+    def test_listas_por_anio(self):
+        """Se obtiene la lista de cada año con vinos dentro del rango"""
+        self.assertEqual(
+            [list(lista) for lista in self.almacen.listas_por_anio(2020, 2021)],
+            [list(self.almacen.posiciones_por_anios(anio, anio)) for anio in (2020, 2021)]
+        )
+        self.assertEqual(self.almacen.listas_por_anio(2030, None), [])
+
+
+class TestIndiceNombres(unittest.TestCase):
+    nombres = ["Escorihuela Gascón", "Viñedos del Sol", "Gascon", "VINO de la Casa"]
+
+    def test_normalizar(self):
+        """Se ignoran mayúsculas, acentos y signos entre palabras"""
+        self.assertEqual(normalizar("  Viñedos del-SOL "), "vinedos del sol")
+        self.assertEqual(normalizar("Gascón"), normalizar("GASCON"))
+
+    def test_prefijo_de_nombre_antes_que_de_palabra(self):
+        """Primero los nombres que empiezan con el prefijo, luego las palabras"""
+        indice = IndiceNombres(self.nombres)
+        self.assertEqual(indice.buscar("gasc", 10), [2, 0])
+        self.assertEqual(indice.buscar("vin", 10), [1, 3])
+        self.assertEqual(indice.buscar("de", 10), [3, 1])
+        self.assertEqual(indice.buscar("d", 1), [3])
+        self.assertEqual(indice.buscar("tinto", 10), [])
+
+    def test_con_cambios_equivale_a_reconstruir(self):
+        """Cambiar y agregar nombres da el mismo índice que construirlo"""
+        anterior = IndiceNombres(self.nombres)
+        nombres = self.nombres[:1] + ["Sol de Gascuña"] + self.nombres[2:] + ["Casa Nueva"]
+        indice = anterior.con_cambios(
+            {1: (self.nombres[1], nombres[1]), 4: (None, nombres[4])}, nombres
+        )
+        nuevo = IndiceNombres(nombres)
+        self.assertEqual(indice.exportar(), nuevo.exportar())
+        self.assertEqual(anterior.buscar("sol", 10), [1])
+        self.assertIs(anterior.con_cambios({2: ("Gascon", "GASCÓN")}, ()), anterior)
+        self.assertEqual(
+            IndiceNombres.restaurar(nuevo.exportar()).buscar("gas", 10), [2, 0, 1]
+        )
+
+
+class TestIndiceTrigramas(unittest.TestCase):
+    nombres = ["Cabernet Suavignon", "Malbec", "Cabernet Franc", "Syrah", "Viñedos del Sol"]
+
+    def test_trigramas(self):
+        """Cada palabra se completa con espacios y se normaliza"""
+        self.assertEqual(trigramas("sol"), {"  s", " so", "sol", "ol "})
+        self.assertEqual(trigramas(normalizar("SOL sol")), trigramas("sol"))
+
+    def test_tolera_errores_de_tipeo(self):
+        """Encuentra nombres mal escritos y textos mal escritos"""
+        indice = IndiceTrigramas(self.nombres)
+        resultados = indice.buscar("cabernet sauvignon", 10)
+        self.assertEqual([posicion for posicion, _ in resultados], [0, 2])
+        self.assertGreater(resultados[0][1], resultados[1][1])
+        self.assertEqual([posicion for posicion, _ in indice.buscar("malbek", 10)], [1])
+        self.assertEqual(indice.buscar("vinedos del sol", 1), [(4, 1.0)])
+
+    def test_umbral_y_limite(self):
+        """Se omiten los nombres poco parecidos y se respeta el límite"""
+        indice = IndiceTrigramas(self.nombres)
+        self.assertEqual(indice.buscar("tempranillo", 10), [])
+        self.assertEqual(indice.buscar("", 10), [])
+        self.assertEqual(len(indice.buscar("cabernet", 1)), 1)
+        # El nombre más corto comparte una proporción mayor de trigramas
+        self.assertEqual(
+            [posicion for posicion, _ in indice.buscar("cabernet", 10, umbral=0.1)],
+            [2, 0]
+        )
+
+    def test_con_cambios_equivale_a_reconstruir(self):
+        """Cambiar y agregar nombres da el mismo índice que construirlo"""
+        anterior = IndiceTrigramas(self.nombres)
+        nombres = ["Cabernet Sauvignon"] + self.nombres[1:] + ["Malbec Rosado"]
+        indice = anterior.con_cambios(
+            {0: (self.nombres[0], nombres[0]), 5: (None, nombres[5])}, nombres
+        )
+        nuevo = IndiceTrigramas(nombres)
+        self.assertEqual(indice.exportar(), nuevo.exportar())
+        self.assertEqual([posicion for posicion, _ in anterior.buscar("malbec", 10)], [1])
+        self.assertIs(anterior.con_cambios({3: ("Syrah", "SYRAH")}, ()), anterior)
+        self.assertEqual(
+            IndiceTrigramas.restaurar(nuevo.exportar()).buscar("cabernet sauvignon", 1),
+            [(0, 1.0)]
+        )
+
+
+class TestBitacora(unittest.TestCase):
+    def setUp(self):
+        """Crea un archivo de datos temporal sin bitácora"""
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        self.archivo = os.path.join(directorio, "datos.json")
+
+    def test_confirmacion_agrupada(self):
+        """Confirmar un cambio escribe también los anteriores pendientes"""
+        bitacora = Bitacora(self.archivo)
+        cambios = [("vinos", f"v{numero}", None) for numero in range(4)]
+        bitacora.confirmar(bitacora.agregar(codificar_cambio(cambios[0])))
+        numeros = [bitacora.agregar(codificar_cambio(cambio)) for cambio in cambios[1:]]
+        with patch("os.fsync") as fsync:
+            bitacora.confirmar(numeros[-1])
+            bitacora.confirmar(numeros[0])
+        self.assertEqual(fsync.call_count, 1)
+        bitacora.cerrar()
+        self.assertEqual([cambio for cambio, _ in leer_cambios(self.archivo)], cambios)
+
+    def test_escritura_interrumpida_se_descarta(self):
+        """Una línea incompleta al final se ignora y se trunca al escribir"""
+        with open(ruta_bitacora(self.archivo), "wb") as archivo:
+            archivo.write(codificar_cambio(("cepas", "c1", None)) + b'["vinos","v')
+        self.assertEqual(
+            [cambio for cambio, _ in leer_cambios(self.archivo)], [("cepas", "c1", None)]
+        )
+        bitacora = Bitacora(self.archivo)
+        bitacora.confirmar(bitacora.agregar(codificar_cambio(("vinos", "v2", None))))
+        bitacora.cerrar()
+        self.assertEqual(
+            [cambio for cambio, _ in leer_cambios(self.archivo)],
+            [("cepas", "c1", None), ("vinos", "v2", None)]
+        )
+
+    def test_rotar_conserva_la_bitacora_apartada(self):
+        """Rotar sobre una compactación inconclusa agrega a continuación"""
+        bitacora = Bitacora(self.archivo)
+        bitacora.confirmar(bitacora.agregar(codificar_cambio(("vinos", "v1", None))))
+        self.assertTrue(bitacora.rotar())
+        bitacora.confirmar(bitacora.agregar(codificar_cambio(("vinos", "v2", None))))
+        self.assertTrue(bitacora.rotar())
+        self.assertFalse(os.path.exists(ruta_bitacora(self.archivo)))
+        self.assertEqual(
+            [cambio[1] for cambio, _ in leer_cambios(self.archivo)], ["v1", "v2"]
+        )
+        bitacora.descartar_compactada()
+        self.assertFalse(os.path.exists(ruta_compactacion(self.archivo)))
+        self.assertFalse(bitacora.rotar())
+
+
+class TestAlmacenDesdeSecciones(unittest.TestCase):
+    datos = TestDerivarAlmacen.datos
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.anterior = AlmacenEnMemoria(copy.deepcopy(self.datos))
+        self.resumen_anterior = resumen(self.anterior)
+
+    def lector(self, datos):
+        """Lector por bloques pequeños del JSON de los datos"""
+        return LectorJson(io.StringIO(json.dumps(datos)), 16)
+
+    def test_construccion_desde_lector(self):
+        """Construir desde el lector equivale a construir desde el diccionario"""
+        lector = self.lector(self.datos)
+        almacen = AlmacenEnMemoria(lector, lector.obtener_huella)
+        self.assertEqual(resumen(almacen), self.resumen_anterior)
+        self.assertEqual(
+            almacen.obtener_version(),
+            hashlib.sha1(json.dumps(self.datos).encode('utf-8')).hexdigest()
+        )
+
+    def test_secciones_fuera_de_orden(self):
+        """Las secciones se aceptan en cualquier orden y las desconocidas se ignoran"""
+        secciones = [
+            ("vinos", iter(self.datos["vinos"])),
+            ("otros", iter([1, 2])),
+            ("cepas", iter(self.datos["cepas"])),
+            ("bodegas", iter(self.datos["bodegas"])),
+        ]
+        almacen = AlmacenEnMemoria(secciones, "v1")
+        self.assertEqual(resumen(almacen), self.resumen_anterior)
+
+    def test_derivar_desde_lector(self):
+        """Derivar desde el lector equivale a derivar desde el diccionario"""
+        datos = copy.deepcopy(self.datos)
+        datos["vinos"][1].update(nombre="Zulu")
+        del datos["bodegas"][2]
+        lector = self.lector(datos)
+        derivado = self.anterior.derivar(lector, lector.obtener_huella)
+        self.assertEqual(resumen(derivado), resumen(AlmacenEnMemoria(datos)))
+        self.assertEqual(derivado.obtener_version(), lector.obtener_huella())
+        self.assertIs(derivado.buscar_vino("v1"), self.anterior.buscar_vino("v1"))
+
+
+class TestExportarAlmacen(unittest.TestCase):
+    def test_restaurar_equivale_al_original(self):
+        """El almacén restaurado tiene las mismas entidades e índices"""
+        datos = copy.deepcopy(TestDerivarAlmacen.datos)
+        datos["vinos"][2].update(bodega="b9", cepas=["c9", "c2"])
+        original = AlmacenEnMemoria(datos, "v1")
+        estado = marshal.loads(marshal.dumps(original.exportar()))
+        restaurado = AlmacenEnMemoria.restaurar(estado)
+        self.assertEqual(resumen(restaurado), resumen(original))
+        self.assertEqual(restaurado.obtener_version(), "v1")
+        vino = restaurado.buscar_vino("v1")
+        self.assertIs(vino.obtener_bodega(), restaurado.buscar_bodega("b1"))
+        self.assertEqual(vino.obtener_cepa_ids(), ("c1",))
+        self.assertEqual(restaurado.buscar_vino("v3").obtener_bodega_id(), "b9")
+
+
+class TestAlmacenMapeado(unittest.TestCase):
+    def setUp(self):
+        """Escribe los datos de prueba y su mapa en archivos temporales"""
+        self.datos = copy.deepcopy(TestDerivarAlmacen.datos)
+        self.datos["vinos"][2].update(bodega="b9", cepas=["c9", "c2"])
+        self.datos["bodegas"].append({"id": "bñ", "nombre": "Bodega Ñandú"})
+        descriptor, self.ruta = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+            json.dump(self.datos, archivo)
+        self.addCleanup(os.remove, self.ruta)
+        estado = os.stat(self.ruta)
+        self.clave = (estado.st_size, estado.st_mtime_ns)
+        self.memoria = AlmacenEnMemoria(self.datos, "v1")
+        self.assertTrue(escribir_mapa(self.memoria, self.ruta, *self.clave))
+        self.addCleanup(os.remove, ruta_mapa(self.ruta))
+        self.mapeado = abrir_mapa(self.ruta, *self.clave)
+
+    def test_consultas_equivalentes(self):
+        """El mapa responde igual que el almacén en memoria"""
+        self.assertEqual(resumen(self.mapeado), resumen(self.memoria))
+        self.assertEqual(self.mapeado.obtener_version(), "v1")
+        for id_ in ("b9", "bñ", "zz"):
+            self.assertEqual(
+                [v.obtener_id() for v in self.mapeado.obtener_vinos_de_bodega(id_)],
+                [v.obtener_id() for v in self.memoria.obtener_vinos_de_bodega(id_)]
+            )
+        self.assertEqual(
+            filtrar(self.mapeado, None, None, "b1", "c2"),
+            filtrar(self.memoria, None, None, "b1", "c2")
+        )
+
+    def test_entidades(self):
+        """Las entidades se crean con sus referencias resueltas"""
+        self.assertEqual(self.mapeado.buscar_bodega("bñ").obtener_nombre(), "Bodega Ñandú")
+        self.assertIsNone(self.mapeado.buscar_vino("v9"))
+        vino = self.mapeado.buscar_vino("v1")
+        self.assertEqual(
+            vino.convertir_a_json(), self.memoria.buscar_vino("v1").convertir_a_json()
+        )
+        huerfano = self.mapeado.buscar_vino("v3")
+        self.assertEqual(huerfano.obtener_bodega_id(), "b9")
+        self.assertEqual(huerfano.obtener_cepa_ids(), ("c9", "c2"))
+        self.assertEqual(
+            [v.obtener_id() for v in self.mapeado.obtener_vinos()[-2:]], ["v3", "v4"]
+        )
+        self.assertFalse(self.mapeado.contiene(vino))
+
+    def test_mapa_de_otro_contenido(self):
+        """El mapa solo se abre para el contenido del que se escribió"""
+        tamanio, mtime_ns = self.clave
+        self.assertIsNone(abrir_mapa(self.ruta, tamanio, mtime_ns + 1))
+        with open(self.ruta, "r+b") as archivo:
+            archivo.write(b" ")
+        os.utime(self.ruta, ns=(mtime_ns, mtime_ns))
+        self.assertIsNone(abrir_mapa(self.ruta, tamanio, mtime_ns))
+
+    def test_mapa_daniado(self):
+        """Un mapa truncado o inexistente no se abre"""
+        with open(ruta_mapa(self.ruta), "r+b") as archivo:
+            archivo.truncate(os.path.getsize(ruta_mapa(self.ruta)) // 2)
+        self.assertIsNone(abrir_mapa(self.ruta, *self.clave))
+        self.assertIsNone(abrir_mapa(self.ruta + ".otro", *self.clave))
+
+
+class TestAniosFueraDeRango(unittest.TestCase):
+    datos = {
+        "bodegas": [{"id": "b1", "nombre": "Bodega Uno"}],
+        "cepas": [{"id": "c1", "nombre": "Malbec"}],
+        "vinos": [
+            {"id": "v1", "nombre": "Antiguo", "bodega": "b1", "cepas": ["c1"], "partidas": [-5]},
+            {"id": "v2", "nombre": "Lejano", "bodega": "b1", "cepas": ["c1"], "partidas": [99999]},
+            {"id": "v3", "nombre": "Actual", "bodega": "b1", "cepas": ["c1"], "partidas": [2020]}
+        ]
+    }
+
+    def test_anios_negativos_y_mayores_a_16_bits(self):
+        """Los años fuera de 0..65535 se cargan en los tres almacenes"""
+        descriptor, ruta = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+            json.dump(self.datos, archivo)
+        self.addCleanup(os.remove, ruta)
+        estado = os.stat(ruta)
+        clave = (estado.st_size, estado.st_mtime_ns)
+        with open(ruta, "r", encoding="utf-8") as archivo:
+            lector = LectorJson(archivo)
+            memoria = AlmacenEnMemoria(lector, lector.obtener_huella)
+        self.assertEqual(list(memoria.posiciones_por_anios(-10, 0)), [0])
+        self.assertEqual(list(memoria.posiciones_por_anios(70000, None)), [1])
+        self.assertEqual(
+            memoria.contar_facetas(None)[1]["anios"], {-5: 1, 2020: 1, 99999: 1}
+        )
+
+        self.assertTrue(escribir_mapa(memoria, ruta, *clave))
+        self.addCleanup(os.remove, ruta_mapa(ruta))
+        self.assertEqual(resumen(abrir_mapa(ruta, *clave)), resumen(memoria))
+        self.assertTrue(importar_json(ruta, *clave))
+        self.addCleanup(os.remove, ruta_base_de_datos(ruta))
+        self.assertEqual(
+            resumen(abrir_base_de_datos(ruta, *clave)), resumen(memoria)
+        )
+
+    def test_anio_no_entero(self):
+        """Un año que no es un entero de 32 bits se rechaza con ValueError"""
+        for anio in (2020.5, 2 ** 40, "2020"):
+            datos = copy.deepcopy(self.datos)
+            datos["vinos"][2]["partidas"] = [anio]
+            with self.assertRaisesRegex(ValueError, "v3"):
+                AlmacenEnMemoria(datos)
+        anterior = AlmacenEnMemoria(copy.deepcopy(self.datos))
+        datos = copy.deepcopy(self.datos)
+        datos["vinos"][0]["partidas"] = [-2 ** 40]
+        with self.assertRaisesRegex(ValueError, "v1"):
+            anterior.derivar(datos, "v2")
+
+
+class TestIdsRepetidos(unittest.TestCase):
+    def test_los_tres_almacenes_usan_la_ultima_entidad(self):
+        """Con IDs repetidos todos los almacenes resuelven la última entidad"""
+        datos = copy.deepcopy(TestDerivarAlmacen.datos)
+        datos["bodegas"].append({"id": "b1", "nombre": "Bodega Uno Bis"})
+        datos["cepas"].insert(0, {"id": "c2", "nombre": "Syrah Anterior"})
+        datos["vinos"].append(
+            {"id": "v2", "nombre": "Alfa Bis", "bodega": "b1", "cepas": ["c2"], "partidas": [2024]}
+        )
+        descriptor, ruta = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo)
+        self.addCleanup(os.remove, ruta)
+        estado = os.stat(ruta)
+        clave = (estado.st_size, estado.st_mtime_ns)
+        with open(ruta, "r", encoding="utf-8") as archivo:
+            lector = LectorJson(archivo)
+            memoria = AlmacenEnMemoria(lector, lector.obtener_huella)
+        self.assertTrue(escribir_mapa(memoria, ruta, *clave))
+        self.addCleanup(os.remove, ruta_mapa(ruta))
+        self.assertTrue(importar_json(ruta, *clave))
+        self.addCleanup(os.remove, ruta_base_de_datos(ruta))
+
+        for almacen in (memoria, abrir_mapa(ruta, *clave), abrir_base_de_datos(ruta, *clave)):
+            with self.subTest(almacen=type(almacen).__name__):
+                self.assertEqual(almacen.buscar_bodega("b1").obtener_nombre(), "Bodega Uno Bis")
+                self.assertEqual(almacen.buscar_cepa("c2").obtener_nombre(), "Syrah")
+                vino = almacen.buscar_vino("v2")
+                self.assertEqual(vino.obtener_nombre(), "Alfa Bis")
+                self.assertEqual(vino.obtener_bodega().obtener_nombre(), "Bodega Uno Bis")
+                self.assertEqual(
+                    [cepa.obtener_nombre() for cepa in vino.obtener_cepa()], ["Syrah"]
+                )
+                self.assertEqual(resumen(almacen), resumen(memoria))
+
+
+class TestAlmacenSqlite(unittest.TestCase):
+    def setUp(self):
+        """Importa los datos de prueba en una base de datos temporal"""
+        self.datos = copy.deepcopy(TestDerivarAlmacen.datos)
+        self.datos["vinos"][2].update(bodega="b9", cepas=["c9", "c2"])
+        self.datos["bodegas"].append({"id": "bñ", "nombre": "Bodega Ñandú"})
+        descriptor, self.ruta = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+            json.dump(self.datos, archivo)
+        self.addCleanup(os.remove, self.ruta)
+        estado = os.stat(self.ruta)
+        self.clave = (estado.st_size, estado.st_mtime_ns)
+        with open(self.ruta, "r", encoding="utf-8") as archivo:
+            lector = LectorJson(archivo)
+            self.memoria = AlmacenEnMemoria(lector, lector.obtener_huella)
+        self.assertTrue(importar_json(self.ruta, *self.clave))
+        self.addCleanup(os.remove, ruta_base_de_datos(self.ruta))
+        self.sqlite = abrir_base_de_datos(self.ruta, *self.clave)
+
+    def test_consultas_equivalentes(self):
+        """La base de datos responde igual que el almacén en memoria"""
+        self.assertEqual(resumen(self.sqlite), resumen(self.memoria))
+        self.assertEqual(self.sqlite.obtener_version(), self.memoria.obtener_version())
+        for id_ in ("b9", "bñ", "zz"):
+            self.assertEqual(
+                [v.obtener_id() for v in self.sqlite.obtener_vinos_de_bodega(id_)],
+                [v.obtener_id() for v in self.memoria.obtener_vinos_de_bodega(id_)]
+            )
+        for filtros in (
+            (None, None, "b1", "c2"), (2021, 2022, None, "c1"),
+            (None, None, "b9", None), (None, 2020, "b1", None),
+        ):
+            self.assertEqual(
+                filtrar(self.sqlite, *filtros), filtrar(self.memoria, *filtros)
+            )
+
+    def test_entidades(self):
+        """Las entidades se crean con sus referencias resueltas"""
+        self.assertEqual(self.sqlite.buscar_bodega("bñ").obtener_nombre(), "Bodega Ñandú")
+        self.assertIsNone(self.sqlite.buscar_vino("v9"))
+        vino = self.sqlite.buscar_vino("v1")
+        self.assertEqual(
+            vino.convertir_a_json(), self.memoria.buscar_vino("v1").convertir_a_json()
+        )
+        huerfano = self.sqlite.buscar_vino("v3")
+        self.assertEqual(huerfano.obtener_bodega_id(), "b9")
+        self.assertEqual(huerfano.obtener_cepa_ids(), ("c9", "c2"))
+        self.assertEqual(
+            [v.obtener_id() for v in self.sqlite.obtener_vinos()[-2:]], ["v3", "v4"]
+        )
+        self.assertFalse(self.sqlite.contiene(vino))
+
+    def test_base_de_datos_de_otro_contenido(self):
+        """La base de datos solo se abre para el contenido del que se importó"""
+        tamanio, mtime_ns = self.clave
+        self.assertIsNone(abrir_base_de_datos(self.ruta, tamanio, mtime_ns + 1))
+        with open(self.ruta, "r+b") as archivo:
+            archivo.write(b" ")
+        os.utime(self.ruta, ns=(mtime_ns, mtime_ns))
+        self.assertIsNone(abrir_base_de_datos(self.ruta, tamanio, mtime_ns))
+
+    def test_archivo_modificado_durante_la_importacion(self):
+        """Si el archivo cambió desde que se consultó, no se reemplaza la base"""
+        tamanio, mtime_ns = self.clave
+        self.assertFalse(importar_json(self.ruta, tamanio, mtime_ns + 1))
+        self.assertIsNotNone(abrir_base_de_datos(self.ruta, *self.clave))
+
+    def test_base_de_datos_daniada(self):
+        """Una base de datos dañada no se abre"""
+        with open(ruta_base_de_datos(self.ruta), "r+b") as archivo:
+            archivo.truncate(100)
+        self.assertIsNone(abrir_base_de_datos(self.ruta, *self.clave))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import patch
+
+from almacenes import facetas
+from almacenes.facetas import FacetasVinos, fila_de_vino, listas_por_valor
+from modelos.bodega import Bodega
+from modelos.cepa import Cepa
+from modelos.vino import Vino
+
+
+class TestFacetasVinos(unittest.TestCase):
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        bodegas = {"b1": Bodega("b1", "Bodega 1"), "b2": Bodega("b2", "Bodega 2")}
+        cepas = {"c1": Cepa("c1", "Cepa 1"), "c2": Cepa("c2", "Cepa 2")}
+        self.vinos = [
+            Vino("v0", "Vino 0", "b1", ["c1"], [2019, 2020]),
+            Vino("v1", "Vino 1", "b2", ["c1", "c2"], [2021]),
+            Vino("v2", "Vino 2", "b1", ["c2"], []),
+            Vino("v3", "Vino 3", "b1", ["c1", "c2", "c9"], [2022, 2023, -5]),
+        ]
+        for vino in self.vinos:
+            vino.resolver_referencias(bodegas, cepas)
+        codigos_bodegas = {"b1": 0, "b2": 1}
+        codigos_cepas = {"c1": 0, "c2": 1}
+        self.codigos = (
+            lambda id_: codigos_bodegas.get(id_, -1),
+            lambda id_: codigos_cepas.get(id_, -1),
+        )
+
+    def listas(self, facetas_vinos):
+        """Listas de posiciones de cada valor de cada faceta"""
+        return {
+            faceta: {
+                valor: list(facetas_vinos.lista(faceta, valor))
+                for valor in facetas_vinos.contar()[1][faceta]
+            }
+            for faceta in facetas.FACETAS
+        }
+
+    def verificar_listas(self):
+        """Verifica la inversión de los valores de los vinos"""
+        facetas_vinos = FacetasVinos.desde_vinos(self.vinos, *self.codigos)
+        self.assertEqual(len(facetas_vinos), 4)
+        self.assertEqual(self.listas(facetas_vinos), {
+            "anios": {
+                -5: [3], 2019: [0], 2020: [0], 2021: [1], 2022: [3], 2023: [3]
+            },
+            "bodegas": {0: [0, 2, 3], 1: [1]},
+            "cepas": {0: [0, 1, 3], 1: [1, 2, 3]},
+        })
+
+    @unittest.skipIf(facetas.np is None, "NumPy no está instalado")
+    def test_listas_vectorizadas(self):
+        """Prueba la inversión con NumPy"""
+        self.verificar_listas()
+
+    def test_listas_sin_numpy(self):
+        """Prueba la inversión recorriendo los vinos"""
+        with patch.object(facetas, "np", None):
+            self.verificar_listas()
+
+    def test_listas_por_valor_sin_repetidos(self):
+        """Un valor repetido en un vino lo incluye una sola vez"""
+        for np in (facetas.np, None):
+            with patch.object(facetas, "np", np):
+                self.assertEqual(
+                    {
+                        valor: list(posiciones) for valor, posiciones in
+                        listas_por_valor([7, 7, 3, -1, 7], [0, 2, 3, 5]).items()
+                    },
+                    {3: [1], 7: [0, 2]}
+                )
+
+    def test_cambios(self):
+        """con_cambios corrige las listas sin alterar las facetas originales"""
+        originales = FacetasVinos.desde_vinos(self.vinos, *self.codigos)
+        reemplazo = Vino("v1", "Vino 1", "b1", ["c2"], [2018, 2019, 2020])
+        agregado = Vino("v4", "Vino 4", "b2", ["c1"], [2024])
+        cambiadas = originales.con_cambios({
+            1: (fila_de_vino(self.vinos[1], *self.codigos),
+                fila_de_vino(reemplazo, *self.codigos)),
+            4: (None, fila_de_vino(agregado, *self.codigos)),
+        }, 5)
+        self.assertEqual(len(cambiadas), 5)
+        listas = self.listas(cambiadas)
+        self.assertEqual(listas["bodegas"][0], [0, 1, 2, 3])
+        self.assertEqual(listas["cepas"][0], [0, 3, 4])
+        self.assertEqual(listas["anios"][2018], [1])
+        self.assertEqual(listas["anios"][2019], [0, 1])
+        self.assertEqual(listas["anios"][2024], [4])
+        self.assertNotIn(2021, listas["anios"])
+        self.assertEqual(self.listas(originales)["bodegas"][0], [0, 2, 3])
+
+    def test_coleccion_vacia(self):
+        """Las facetas de una colección vacía no fallan"""
+        for np in (facetas.np, None):
+            with patch.object(facetas, "np", np):
+                self.assertEqual(
+                    self.listas(FacetasVinos.desde_vinos([], *self.codigos)),
+                    {"anios": {}, "bodegas": {}, "cepas": {}}
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import hashlib
+import io
+import json
+import unittest
+
+from almacenes.lector_json import LectorJson
+
+
+def leer(texto, tamanio_bloque=1 << 16):
+    """Recorre todas las secciones del texto y las devuelve en un diccionario"""
+    lector = LectorJson(io.StringIO(texto), tamanio_bloque)
+    return {clave: list(elementos) for clave, elementos in lector}
+
+
+class TestLectorJson(unittest.TestCase):
+    texto = json.dumps({
+        "bodegas": [{"id": "b1", "nombre": "Bodega Ñandú"}],
+        "meta": {"generado": "hoy", "total": [1, 2]},
+        "vinos": [
+            {"id": "v1", "nombre": "Vino \"1\"", "partidas": [2019, 2020]},
+            {"id": "v2", "nombre": "Vino 2", "precio": -12.5e1, "activo": True},
+        ],
+        "numeros": [12345, 1.5e3, -0.25E-2, 0, None, [1, [2, []]]],
+        "vacias": [],
+    }, indent=2, ensure_ascii=False) + "\n"
+
+    def test_secciones_en_orden(self):
+        """Solo se recorren los arreglos, en el orden del archivo"""
+        esperado = {
+            clave: valor for clave, valor in json.loads(self.texto).items()
+            if isinstance(valor, list)
+        }
+        resultado = leer(self.texto)
+        self.assertEqual(resultado, esperado)
+        self.assertEqual(list(resultado), ["bodegas", "vinos", "numeros", "vacias"])
+
+    def test_bloques_pequenios(self):
+        """Los valores cortados entre bloques se decodifican completos"""
+        esperado = leer(self.texto)
+        for tamanio in (1, 2, 3, 5, 7, 64):
+            with self.subTest(tamanio=tamanio):
+                self.assertEqual(leer(self.texto, tamanio), esperado)
+
+    def test_secciones_no_consumidas(self):
+        """Los elementos no recorridos de una sección se descartan"""
+        lector = LectorJson(io.StringIO(self.texto), 4)
+        claves = [clave for clave, _ in lector]
+        self.assertEqual(claves, ["bodegas", "vinos", "numeros", "vacias"])
+
+    def test_huella(self):
+        """La huella identifica el contenido del archivo leído"""
+        lector = LectorJson(io.StringIO(self.texto))
+        for _ in lector:
+            pass
+        self.assertEqual(
+            lector.obtener_huella(),
+            hashlib.sha1(self.texto.encode('utf-8')).hexdigest()
+        )
+        otro = LectorJson(io.StringIO(self.texto.replace("Vino 2", "Vino 3")))
+        for _ in otro:
+            pass
+        self.assertNotEqual(otro.obtener_huella(), lector.obtener_huella())
+
+    def test_objeto_vacio(self):
+        """Un objeto vacío no tiene secciones"""
+        self.assertEqual(leer(" {} "), {})
+
+    def test_contenido_invalido(self):
+        """El contenido que no es un objeto JSON válido se rechaza"""
+        for texto in (
+            "", "[]", '{"a": [1, 2}', '{"a": [1,, 2]}', '{"a": [1]',
+            '{"a": [tru]}', '{1: [1]}', '{"a": [1]} x',
+        ):
+            with self.subTest(texto=texto):
+                with self.assertRaises(ValueError):
+                    leer(texto)
+
+
+if __name__ == '__main__':
+    unittest.main()
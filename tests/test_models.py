@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 from modelos.bodega import Bodega
 from modelos.cepa import Cepa
 from modelos.vino import Vino
@@ -53,6 +54,18 @@ class TestBodega(unittest.TestCase):
         self.assertIn("cepas", json_completo)
         self.assertIn("vinos", json_completo)
 
+    def test_conversion_json_parcial(self):
+        """Prueba que los campos derivados no pedidos no se calculan"""
+        with patch("vinoteca.Vinoteca.obtener_vinos_de_bodega") as vinos, \
+                patch("vinoteca.Vinoteca.obtener_cepas_de_bodega") as cepas:
+            json_parcial = self.bodega.convertir_a_json(["nombre", "id"])
+            vinos.assert_not_called()
+            cepas.assert_not_called()
+        self.assertEqual(
+            list(json_parcial.items()),
+            [("id", "bod1"), ("nombre", "Bodega Test")]
+        )
+
 
 class TestCepa(unittest.TestCase):
     def setUp(self):
@@ -90,6 +103,19 @@ class TestVino(unittest.TestCase):
         """Prueba los métodos getter específicos de Vino"""
         self.assertEqual(self.vino.obtener_partidas(), [2020, 2021])
 
+    def test_sin_dict_por_instancia(self):
+        """Prueba que las entidades usan slots en lugar de __dict__"""
+        for entidad in (self.vino, Bodega("bod1", "B"), Cepa("cep1", "C")):
+            self.assertFalse(hasattr(entidad, "__dict__"))
+
+    def test_resolver_referencias(self):
+        """Prueba que las referencias resueltas apuntan a los objetos"""
+        bodega = Bodega("bod1", "Bodega Test")
+        cepa = Cepa("cep1", "Cepa Test")
+        self.vino.resolver_referencias({"bod1": bodega}, {"cep1": cepa})
+        self.assertIs(self.vino.obtener_bodega(), bodega)
+        self.assertIs(self.vino.obtener_cepa()[0], cepa)
+
     def test_setters(self):
         """Prueba los métodos setter específicos de Vino"""
         self.vino.establecer_bodega("bod2")
@@ -1,15 +1,18 @@
 import unittest
 from unittest.mock import patch
 import json
-from flask import Flask
+import os
+import tempfile
+from flask import Flask, Response
 from flask.testing import FlaskClient
 
 # Importaciones locales
 from recursos import (
-    RecursoBodega, RecursoBodegas,
-    RecursoCepa, RecursoCepas,
+    RecursoBodega, RecursoBodegas, RecursoBusqueda,
+    RecursoCepa, RecursoCepas, RecursoFacetas, RecursoLote,
     RecursoVino, RecursoVinos
 )
+from almacenes.bitacora import ruta_bitacora
 from vinoteca import Vinoteca
 from modelos.bodega import Bodega
 from modelos.cepa import Cepa
@@ -60,6 +63,12 @@ class TestRecursosBase(unittest.TestCase):
                 json.dumps(self.datos_prueba)
             Vinoteca.inicializar()
 
+    def respuesta(self, resultado):
+        """Normaliza el resultado de un recurso a (datos, código de estado)"""
+        if isinstance(resultado, Response):
+            return json.loads(resultado.get_data()), resultado.status_code
+        return resultado
+
 
 class TestRecursoBodega(TestRecursosBase):
     def setUp(self):
@@ -69,17 +78,19 @@ class TestRecursoBodega(TestRecursosBase):
 
     def test_get_bodega_existente(self):
         """Prueba obtener una bodega que existe"""
-        response, status = self.recurso.get("b1")
-        self.assertEqual(status, 200)
-        self.assertEqual(response["nombre"], "Bodega Test 1")
-        self.assertIn("vinos", response)
-        self.assertIn("cepas", response)
+        with self.app.test_request_context():
+            response, status = self.respuesta(self.recurso.get("b1"))
+            self.assertEqual(status, 200)
+            self.assertEqual(response["nombre"], "Bodega Test 1")
+            self.assertIn("vinos", response)
+            self.assertIn("cepas", response)
 
     def test_get_bodega_inexistente(self):
         """Prueba obtener una bodega que no existe"""
-        response, status = self.recurso.get("inexistente")
-        self.assertEqual(status, 404)
-        self.assertIn("error", response)
+        with self.app.test_request_context():
+            response, status = self.respuesta(self.recurso.get("inexistente"))
+            self.assertEqual(status, 404)
+            self.assertIn("error", response)
 
 
 class TestRecursoBodegas(TestRecursosBase):
@@ -91,14 +102,14 @@ class TestRecursoBodegas(TestRecursosBase):
     def test_get_todas_bodegas(self):
         """Prueba obtener todas las bodegas sin filtros"""
         with self.app.test_request_context():
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(len(response), 2)
 
     def test_get_bodegas_ordenadas(self):
         """Prueba obtener bodegas con ordenamiento"""
         with self.app.test_request_context('/?orden=nombre&reverso=si'):
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(response[0]["nombre"], "Bodega Test 2")
 
@@ -111,16 +122,18 @@ class TestRecursoCepa(TestRecursosBase):
 
     def test_get_cepa_existente(self):
         """Prueba obtener una cepa que existe"""
-        response, status = self.recurso.get("c1")
-        self.assertEqual(status, 200)
-        self.assertEqual(response["nombre"], "Cepa Test 1")
-        self.assertIn("vinos", response)
+        with self.app.test_request_context():
+            response, status = self.respuesta(self.recurso.get("c1"))
+            self.assertEqual(status, 200)
+            self.assertEqual(response["nombre"], "Cepa Test 1")
+            self.assertIn("vinos", response)
 
     def test_get_cepa_inexistente(self):
         """Prueba obtener una cepa que no existe"""
-        response, status = self.recurso.get("inexistente")
-        self.assertEqual(status, 404)
-        self.assertIn("error", response)
+        with self.app.test_request_context():
+            response, status = self.respuesta(self.recurso.get("inexistente"))
+            self.assertEqual(status, 404)
+            self.assertIn("error", response)
 
 
 class TestRecursoCepas(TestRecursosBase):
@@ -132,14 +145,14 @@ class TestRecursoCepas(TestRecursosBase):
     def test_get_todas_cepas(self):
         """Prueba obtener todas las cepas sin filtros"""
         with self.app.test_request_context():
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(len(response), 2)
 
     def test_get_cepas_ordenadas(self):
         """Prueba obtener cepas con ordenamiento"""
         with self.app.test_request_context('/?orden=nombre&reverso=si'):
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(response[0]["nombre"], "Cepa Test 2")
 
@@ -152,18 +165,20 @@ class TestRecursoVino(TestRecursosBase):
 
     def test_get_vino_existente(self):
         """Prueba obtener un vino que existe"""
-        response, status = self.recurso.get("v1")
-        self.assertEqual(status, 200)
-        self.assertEqual(response["nombre"], "Vino Test 1")
-        self.assertIn("bodega", response)
-        self.assertIn("cepas", response)
-        self.assertIn("partidas", response)
+        with self.app.test_request_context():
+            response, status = self.respuesta(self.recurso.get("v1"))
+            self.assertEqual(status, 200)
+            self.assertEqual(response["nombre"], "Vino Test 1")
+            self.assertIn("bodega", response)
+            self.assertIn("cepas", response)
+            self.assertIn("partidas", response)
 
     def test_get_vino_inexistente(self):
         """Prueba obtener un vino que no existe"""
-        response, status = self.recurso.get("inexistente")
-        self.assertEqual(status, 404)
-        self.assertIn("error", response)
+        with self.app.test_request_context():
+            response, status = self.respuesta(self.recurso.get("inexistente"))
+            self.assertEqual(status, 404)
+            self.assertIn("error", response)
 
 
 class TestRecursoVinos(TestRecursosBase):
@@ -175,32 +190,380 @@ class TestRecursoVinos(TestRecursosBase):
     def test_get_todos_vinos(self):
         """Prueba obtener todos los vinos sin filtros"""
         with self.app.test_request_context():
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(len(response), 2)
 
     def test_get_vinos_por_anio(self):
         """Prueba obtener vinos filtrados por año"""
         with self.app.test_request_context('/?anio=2020'):
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(len(response), 1)
             self.assertEqual(response[0]["nombre"], "Vino Test 1")
 
+    def test_get_vinos_por_rango_de_anios(self):
+        """Prueba obtener vinos filtrados por rango de años"""
+        with self.app.test_request_context('/?anio_desde=2022&anio_hasta=2030'):
+            response, status = self.respuesta(self.recurso.get())
+            self.assertEqual(status, 200)
+            self.assertEqual(len(response), 1)
+            self.assertEqual(response[0]["nombre"], "Vino Test 2")
+
     def test_get_vinos_ordenados(self):
         """Prueba obtener vinos con diferentes ordenamientos"""
         # Por nombre
         with self.app.test_request_context('/?orden=nombre'):
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(response[0]["nombre"], "Vino Test 1")
         
         # Por bodega
         with self.app.test_request_context('/?orden=bodega'):
-            response, status = self.recurso.get()
+            response, status = self.respuesta(self.recurso.get())
             self.assertEqual(status, 200)
             self.assertEqual(response[0]["bodega"], "Bodega Test 1")
 
+    def test_get_vinos_por_bodegas_y_cepas(self):
+        """Prueba filtrar por varias bodegas y por todas las cepas indicadas"""
+        with self.app.test_request_context('/?bodega=b1,b2&cepa=c2'):
+            response, status = self.respuesta(self.recurso.get())
+            self.assertEqual(status, 200)
+            self.assertEqual([v["nombre"] for v in response], ["Vino Test 2"])
+        with self.app.test_request_context('/?cepa=c1,c2&todas_las_cepas=si&anio=2020'):
+            response, status = self.respuesta(self.recurso.get())
+            self.assertEqual(status, 200)
+            self.assertEqual(response, [])
+
+    def test_get_vinos_orden_invalido(self):
+        """Prueba que un campo de orden desconocido responde 400"""
+        with self.app.test_request_context('/?orden=precio'):
+            response, status = self.respuesta(self.recurso.get())
+            self.assertEqual(status, 400)
+            self.assertIn("error", response)
+
+
+class TestCamposParciales(TestRecursosBase):
+    def test_coleccion_con_campos(self):
+        """Prueba que solo se devuelven los campos pedidos"""
+        with self.app.test_request_context('/api/bodegas?campos=id,nombre'):
+            response, status = self.respuesta(RecursoBodegas().get())
+            self.assertEqual(status, 200)
+            self.assertEqual(response[0], {"id": "b1", "nombre": "Bodega Test 1"})
+
+    def test_entidad_con_campos(self):
+        """Prueba los campos parciales en un endpoint individual"""
+        with self.app.test_request_context('/api/vinos/v2?campos=partidas'):
+            response, status = self.respuesta(RecursoVino().get("v2"))
+            self.assertEqual(status, 200)
+            self.assertEqual(response, {"partidas": [2021, 2022]})
+
+    def test_campo_invalido(self):
+        """Prueba que un campo desconocido responde 400"""
+        with self.app.test_request_context('/api/cepas?campos=id,precio'):
+            response, status = self.respuesta(RecursoCepas().get())
+            self.assertEqual(status, 400)
+            self.assertIn("error", response)
+
+
+class TestTransmision(TestRecursosBase):
+    def test_stream_json(self):
+        """Prueba que stream=1 transmite un arreglo JSON válido"""
+        with self.app.test_request_context('/api/vinos?stream=1&orden=nombre'):
+            respuesta = RecursoVinos().get()
+        self.assertTrue(respuesta.is_streamed)
+        datos = json.loads(respuesta.get_data())
+        self.assertEqual([vino["id"] for vino in datos], ["v1", "v2"])
+
+    def test_stream_json_vacio(self):
+        """Prueba la transmisión de una colección vacía"""
+        with self.app.test_request_context('/api/vinos?stream=1&anio=1990'):
+            respuesta = RecursoVinos().get()
+        self.assertEqual(json.loads(respuesta.get_data()), [])
+
+    def test_ndjson_por_accept(self):
+        """Prueba que Accept: application/x-ndjson envía un objeto por línea"""
+        with self.app.test_request_context(
+            '/api/bodegas', headers={"Accept": "application/x-ndjson"}
+        ):
+            respuesta = RecursoBodegas().get()
+        self.assertTrue(respuesta.is_streamed)
+        self.assertEqual(respuesta.mimetype, "application/x-ndjson")
+        lineas = respuesta.get_data().decode("utf-8").splitlines()
+        self.assertEqual(
+            [json.loads(linea)["id"] for linea in lineas], ["b1", "b2"]
+        )
+
+    def test_orden_invalido_antes_de_transmitir(self):
+        """Prueba que los errores se informan antes de comenzar a transmitir"""
+        with self.app.test_request_context('/api/cepas?stream=1&orden=precio'):
+            response, status = self.respuesta(RecursoCepas().get())
+        self.assertEqual(status, 400)
+
+
+class TestPaginacionRecursos(TestRecursosBase):
+    def test_enlace_a_la_pagina_siguiente(self):
+        """Una página completa incluye el enlace a la siguiente"""
+        recurso = RecursoVinos()
+        with self.app.test_request_context('/api/vinos?limite=1&orden=nombre'):
+            respuesta = recurso.get()
+            self.assertEqual(json.loads(respuesta.get_data())[0]["nombre"], "Vino Test 1")
+            enlace = respuesta.headers["Link"]
+        siguiente = enlace[enlace.index("/api"):enlace.index(">")]
+        with self.app.test_request_context(siguiente):
+            respuesta = recurso.get()
+            self.assertEqual(json.loads(respuesta.get_data())[0]["nombre"], "Vino Test 2")
+            self.assertIn("Link", respuesta.headers)
+
+    def test_ultima_pagina_sin_enlace(self):
+        """Una página incompleta no incluye enlace a la siguiente"""
+        with self.app.test_request_context('/api/cepas?limite=5'):
+            respuesta = RecursoCepas().get()
+            self.assertEqual(len(json.loads(respuesta.get_data())), 2)
+            self.assertNotIn("Link", respuesta.headers)
+
+    def test_limite_invalido(self):
+        """Un límite que no es entero responde 400"""
+        with self.app.test_request_context('/api/bodegas?limite=diez'):
+            response, status = self.respuesta(RecursoBodegas().get())
+            self.assertEqual(status, 400)
+            self.assertIn("error", response)
+
+
+class TestRespuestasCondicionales(TestRecursosBase):
+    def setUp(self):
+        """Configuración específica para tests de solicitudes condicionales"""
+        super().setUp()
+        self.recurso = RecursoVinos()
+
+    def test_respuesta_incluye_validadores(self):
+        """Las respuestas incluyen ETag fuerte y Last-Modified"""
+        with self.app.test_request_context('/api/vinos'):
+            respuesta = self.recurso.get()
+            etag, debil = respuesta.get_etag()
+            self.assertTrue(etag)
+            self.assertFalse(debil)
+            self.assertIsNotNone(respuesta.last_modified)
+
+    def test_if_none_match_responde_304(self):
+        """Un ETag vigente responde 304 sin cuerpo"""
+        with self.app.test_request_context('/api/vinos?anio=2021'):
+            etag, _ = self.recurso.get().get_etag()
+        with self.app.test_request_context(
+            '/api/vinos?anio=2021', headers={"If-None-Match": f'"{etag}"'}
+        ):
+            respuesta = self.recurso.get()
+            self.assertEqual(respuesta.status_code, 304)
+            self.assertEqual(respuesta.get_data(), b"")
+
+    def test_etag_depende_de_los_parametros(self):
+        """Parámetros distintos generan ETags distintos; su orden no importa"""
+        with self.app.test_request_context('/api/vinos?anio=2021&orden=id'):
+            etag_1, _ = self.recurso.get().get_etag()
+        with self.app.test_request_context('/api/vinos?orden=id&anio=2021'):
+            etag_2, _ = self.recurso.get().get_etag()
+        with self.app.test_request_context('/api/vinos?anio=2020&orden=id'):
+            etag_3, _ = self.recurso.get().get_etag()
+        self.assertEqual(etag_1, etag_2)
+        self.assertNotEqual(etag_1, etag_3)
+
+    def test_if_modified_since_responde_304(self):
+        """Una fecha posterior a la modificación de los datos responde 304"""
+        with self.app.test_request_context(
+            '/api/vinos', headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+        ):
+            self.assertEqual(self.recurso.get().status_code, 304)
+
+
+
+class TestBusquedaPorLote(TestRecursosBase):
+    def test_ids_en_orden_sin_repetir(self):
+        """Los IDs se devuelven en el orden pedido, sin repetidos"""
+        with self.app.test_request_context('/api/vinos?ids=v2,v9,v1,v2'):
+            response, status = self.respuesta(RecursoVinos().get())
+            self.assertEqual(status, 200)
+            self.assertEqual(
+                [vino["id"] for vino in response], ["v2", "v9", "v1"]
+            )
+            self.assertEqual(
+                response[1], {"id": "v9", "error": "Vino no encontrado"}
+            )
+
+    def test_ids_con_campos(self):
+        """El parámetro campos se aplica a cada entidad del lote"""
+        with self.app.test_request_context('/api/cepas?ids=c1&campos=nombre'):
+            response, _ = self.respuesta(RecursoCepas().get())
+            self.assertEqual(response, [{"nombre": "Cepa Test 1"}])
+
+    def test_lote_de_varias_colecciones(self):
+        """POST /api/lote busca en cada colección pedida"""
+        cuerpo = {"vinos": ["v1"], "bodegas": ["b2", "b3"]}
+        with self.app.test_request_context('/api/lote', method='POST', json=cuerpo):
+            response, status = self.respuesta(RecursoLote().post())
+        self.assertEqual(status, 200)
+        self.assertEqual(set(response), {"vinos", "bodegas"})
+        self.assertEqual(response["vinos"][0]["nombre"], "Vino Test 1")
+        self.assertEqual(
+            [bodega["id"] for bodega in response["bodegas"]], ["b2", "b3"]
+        )
+        self.assertIn("error", response["bodegas"][1])
+        # Los marcadores de error son JSON compacto, como los fragmentos
+        with self.app.test_request_context('/api/lote', method='POST', json=cuerpo):
+            self.assertIn(
+                b'{"id":"b3","error":"Bodega no encontrada"}',
+                RecursoLote().post().get_data()
+            )
+
+    def test_lote_invalido(self):
+        """Colecciones desconocidas o IDs que no son textos responden 400"""
+        for cuerpo in ({"barricas": ["x"]}, {"vinos": "v1"}, {"vinos": [1]}, []):
+            with self.app.test_request_context('/api/lote', method='POST', json=cuerpo):
+                self.assertEqual(self.respuesta(RecursoLote().post())[1], 400)
+
+class TestBusquedaPorPrefijo(TestRecursosBase):
+    def test_q_sin_mayusculas_ni_acentos(self):
+        """q busca por el comienzo de cualquier palabra del nombre"""
+        with self.app.test_request_context('/api/vinos?q=TEST 2'):
+            response, status = self.respuesta(RecursoVinos().get())
+            self.assertEqual(status, 200)
+            self.assertEqual([vino["id"] for vino in response], ["v2"])
+        with self.app.test_request_context('/api/bodegas?q=bodega&limite=1'):
+            response, _ = self.respuesta(RecursoBodegas().get())
+            self.assertEqual([bodega["id"] for bodega in response], ["b1"])
+
+    def test_q_con_limite_invalido(self):
+        """Un límite que no es positivo responde 400"""
+        with self.app.test_request_context('/api/cepas?q=cepa&limite=0'):
+            self.assertEqual(self.respuesta(RecursoCepas().get())[1], 400)
+
+    def test_q_vacio(self):
+        """Un q vacío o con solo espacios responde 400; con espacios se recorta"""
+        for recurso, ruta in (
+            (RecursoBodegas, '/api/bodegas'),
+            (RecursoCepas, '/api/cepas'),
+            (RecursoVinos, '/api/vinos'),
+        ):
+            for consulta in ('?q=', '?q=%20%20'):
+                with self.app.test_request_context(ruta + consulta):
+                    self.assertEqual(self.respuesta(recurso().get())[1], 400)
+        with self.app.test_request_context('/api/vinos?q=%20test%202%20'):
+            response, status = self.respuesta(RecursoVinos().get())
+            self.assertEqual(status, 200)
+            self.assertEqual([vino["id"] for vino in response], ["v2"])
+
+
+class TestBusquedaAproximada(TestRecursosBase):
+    def test_tolera_errores_de_tipeo(self):
+        """Devuelve colección, similitud y entidad, del más parecido al menos"""
+        with self.app.test_request_context('/api/busqueda?q=bodgea tes 2'):
+            response, status = self.respuesta(RecursoBusqueda().get())
+            self.assertEqual(status, 200)
+            self.assertEqual(response[0]["coleccion"], "bodegas")
+            self.assertEqual(response[0]["entidad"]["id"], "b2")
+            similitudes = [resultado["similitud"] for resultado in response]
+            self.assertEqual(similitudes, sorted(similitudes, reverse=True))
+
+    def test_colecciones_y_limite(self):
+        """colecciones restringe la búsqueda y limite la cantidad"""
+        with self.app.test_request_context('/api/busqueda?q=test&colecciones=vinos&limite=1'):
+            response, _ = self.respuesta(RecursoBusqueda().get())
+            self.assertEqual(len(response), 1)
+            self.assertEqual(response[0]["coleccion"], "vinos")
+
+    def test_parametros_invalidos(self):
+        """Sin q, con una colección desconocida o un límite inválido responde 400"""
+        for consulta in ('', '?q=test&colecciones=uvas', '?q=test&limite=0'):
+            with self.app.test_request_context('/api/busqueda' + consulta):
+                self.assertEqual(self.respuesta(RecursoBusqueda().get())[1], 400)
+
+
+class TestFacetasRecursos(TestRecursosBase):
+    def test_facetas_con_filtro(self):
+        """Cuenta por año, bodega y cepa los vinos que cumplen los filtros"""
+        with self.app.test_request_context('/api/facetas?anio=2020'):
+            response, status = self.respuesta(RecursoFacetas().get())
+            self.assertEqual(status, 200)
+            self.assertEqual(response["total"], 1)
+            self.assertEqual(
+                response["anios"],
+                [{"anio": 2020, "vinos": 1}, {"anio": 2021, "vinos": 1}]
+            )
+            self.assertEqual(
+                response["bodegas"],
+                [{"id": "b1", "nombre": "Bodega Test 1", "vinos": 1}]
+            )
+
+    def test_facetas_con_limite(self):
+        """Con limite devuelve solo las bodegas y cepas con más vinos"""
+        with self.app.test_request_context('/api/facetas?limite=1'):
+            response, status = self.respuesta(RecursoFacetas().get())
+            self.assertEqual(status, 200)
+            self.assertEqual(len(response["bodegas"]), 1)
+            self.assertEqual(response["cepas"][0]["vinos"], 2)
+        with self.app.test_request_context('/api/facetas?limite=0'):
+            self.assertEqual(self.respuesta(RecursoFacetas().get())[1], 400)
+
+    def test_anio_invalido(self):
+        """Un año que no es entero responde 400"""
+        with self.app.test_request_context('/api/facetas?anio=dos'):
+            self.assertEqual(self.respuesta(RecursoFacetas().get())[1], 400)
+
+
+class TestEscriturasRecursos(TestRecursosBase):
+    def setUp(self):
+        """Carga los datos de prueba desde un archivo temporal"""
+        descriptor, ruta = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+            json.dump(self.datos_prueba, archivo)
+        for eliminar in (ruta, ruta_bitacora(ruta)):
+            self.addCleanup(lambda r=eliminar: os.path.exists(r) and os.remove(r))
+        self.addCleanup(Vinoteca.inicializar, "vinoteca.json")
+        Vinoteca.inicializar(ruta)
+
+    def test_post_crea_la_entidad(self):
+        """POST responde 201 con la ubicación de la entidad creada"""
+        cuerpo = {"id": "v3", "nombre": "Vino Test 3", "bodega": "b1",
+                  "cepas": ["c2"], "partidas": [2023]}
+        with self.app.test_request_context('/api/vinos', method='POST', json=cuerpo):
+            response, status = self.respuesta(RecursoVinos().post())
+            self.assertEqual(status, 201)
+            self.assertEqual(response["bodega"], "Bodega Test 1")
+        with self.app.test_request_context('/api/vinos', method='POST', json=cuerpo):
+            _, status = self.respuesta(RecursoVinos().post())
+            self.assertEqual(status, 409)
+
+    def test_put_patch_y_delete(self):
+        """PUT crea o reemplaza, PATCH modifica y DELETE elimina"""
+        recurso = RecursoCepa()
+        with self.app.test_request_context('/api/cepas/c3', method='PUT', json={"nombre": "Bonarda"}):
+            respuesta = recurso.put("c3")
+            self.assertEqual(respuesta.status_code, 201)
+            self.assertEqual(respuesta.headers["Location"], "http://localhost/api/cepas/c3")
+        with self.app.test_request_context('/api/cepas/c3', method='PATCH', json={"nombre": "Cot"}):
+            response, status = self.respuesta(recurso.patch("c3"))
+            self.assertEqual((response["nombre"], status), ("Cot", 200))
+        with self.app.test_request_context('/api/cepas/c3', method='DELETE'):
+            self.assertEqual(recurso.delete("c3").status_code, 204)
+        with self.app.test_request_context('/api/cepas/c3', method='DELETE'):
+            self.assertEqual(self.respuesta(recurso.delete("c3"))[1], 404)
+
+    def test_errores_de_escritura(self):
+        """Cuerpos inválidos responden 400 y bajas en conflicto 409"""
+        with self.app.test_request_context('/api/vinos/v1', method='PATCH', data="no es JSON"):
+            self.assertEqual(self.respuesta(RecursoVino().patch("v1"))[1], 400)
+        with self.app.test_request_context('/api/vinos/v1', method='PATCH', json={"cepas": ["c9"]}):
+            self.assertEqual(self.respuesta(RecursoVino().patch("v1"))[1], 400)
+        with self.app.test_request_context('/api/vinos/v1', method='PATCH', json={"cepas": ["c1", "c1"]}):
+            self.assertEqual(self.respuesta(RecursoVino().patch("v1"))[1], 400)
+        with self.app.test_request_context('/api/bodegas/b1', method='DELETE'):
+            self.assertEqual(self.respuesta(RecursoBodega().delete("b1"))[1], 409)
+
+    def test_falla_de_la_bitacora(self):
+        """Si el cambio no puede confirmarse responde 503 y no se publica"""
+        with patch("os.fsync", side_effect=OSError("disco lleno")):
+            with self.app.test_request_context('/api/vinos/v1', method='PATCH', json={"nombre": "Nuevo"}):
+                self.assertEqual(self.respuesta(RecursoVino().patch("v1"))[1], 503)
+        self.assertEqual(Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Test 1")
 
 if __name__ == '__main__':
     unittest.main()
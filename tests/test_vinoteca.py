@@ -0,0 +1,1126 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from almacenes.base import CLAVES_VINOS
+from almacenes.bitacora import Bitacora, ruta_bitacora, ruta_compactacion
+from almacenes.capas import AlmacenConCambios
+from almacenes.instantanea import ruta_instantanea
+from almacenes.mapeado import ruta_mapa
+from almacenes.sqlite import ruta_base_de_datos
+from consulta import _primeras_en_orden, resolver_filtros
+from vinoteca import ConflictoDeDatos, Vinoteca
+
+
+class TestVinotecaBase(unittest.TestCase):
+    """Base para pruebas que cargan la vinoteca desde un archivo temporal."""
+
+    datos_prueba = {
+        "bodegas": [
+            {"id": "b1", "nombre": "Bodega Test 1"},
+            {"id": "b2", "nombre": "Bodega Test 2"}
+        ],
+        "cepas": [
+            {"id": "c1", "nombre": "Cepa Test 1"},
+            {"id": "c2", "nombre": "Cepa Test 2"}
+        ],
+        "vinos": [
+            {
+                "id": "v1",
+                "nombre": "Vino Test 1",
+                "bodega": "b1",
+                "cepas": ["c1"],
+                "partidas": [2020, 2021]
+            },
+            {
+                "id": "v2",
+                "nombre": "Vino Test 2",
+                "bodega": "b2",
+                "cepas": ["c1", "c2"],
+                "partidas": [2021, 2022]
+            }
+        ]
+    }
+
+    def cargar(self, datos):
+        """Escribe los datos en un archivo temporal e inicializa la vinoteca"""
+        descriptor, ruta = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo)
+        self.addCleanup(os.remove, ruta)
+        Vinoteca.inicializar(ruta)
+        return ruta
+
+    def setUp(self):
+        """Configuración que se ejecuta antes de cada test"""
+        self.cargar(self.datos_prueba)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Restaura el archivo de datos por defecto"""
+        Vinoteca.inicializar("vinoteca.json")
+
+
+class TestBusquedasPorId(TestVinotecaBase):
+    def test_buscar_retorna_la_instancia_cargada(self):
+        """Las búsquedas por ID devuelven los mismos objetos de los listados"""
+        self.assertIs(Vinoteca.buscar_bodega("b2"), Vinoteca.obtener_bodegas()[1])
+        self.assertIs(Vinoteca.buscar_cepa("c1"), Vinoteca.obtener_cepas()[0])
+        self.assertIs(Vinoteca.buscar_vino("v2"), Vinoteca.obtener_vinos()[1])
+
+    def test_buscar_inexistente(self):
+        """Las búsquedas de IDs desconocidos devuelven None"""
+        self.assertIsNone(Vinoteca.buscar_bodega("inexistente"))
+        self.assertIsNone(Vinoteca.buscar_cepa("inexistente"))
+        self.assertIsNone(Vinoteca.buscar_vino("inexistente"))
+
+    def test_buscar_lote(self):
+        """El lote busca cada ID una vez y conserva el orden pedido"""
+        lote = Vinoteca.buscar_lote({"vinos": ["v2", "v9", "v2"], "cepas": ["c1"]})
+        self.assertEqual(list(lote["vinos"]), ["v2", "v9"])
+        self.assertIs(lote["vinos"]["v2"], Vinoteca.buscar_vino("v2"))
+        self.assertIsNone(lote["vinos"]["v9"])
+        self.assertIs(lote["cepas"]["c1"], Vinoteca.buscar_cepa("c1"))
+        with self.assertRaises(ValueError):
+            Vinoteca.buscar_varios("barricas", ["x1"])
+
+    def test_buscar_por_prefijo(self):
+        """Busca por el comienzo de las palabras del nombre, hasta el límite"""
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.buscar_por_prefijo("vinos", "vino test")],
+            ["v1", "v2"]
+        )
+        self.assertEqual(Vinoteca.buscar_por_prefijo("cepas", "test 2", 1)[0].obtener_id(), "c2")
+        with self.assertRaises(ValueError):
+            Vinoteca.buscar_por_prefijo("vinos", "vino", 0)
+
+    def test_buscar_similares(self):
+        """Busca en todas las colecciones tolerando errores de tipeo"""
+        resultados = Vinoteca.buscar_similares("cepa tets 1")
+        self.assertEqual(
+            (resultados[0][0], resultados[0][1].obtener_id()), ("cepas", "c1")
+        )
+        self.assertEqual(
+            {coleccion for coleccion, _, _ in Vinoteca.buscar_similares("test", 10, ["vinos"])},
+            {"vinos"}
+        )
+        with self.assertRaises(ValueError):
+            Vinoteca.buscar_similares("test", 10, ["uvas"])
+
+    def test_indices_se_actualizan_al_recargar(self):
+        """Recargar los datos reemplaza el contenido de los índices"""
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["bodegas"] = [{"id": "b3", "nombre": "Bodega Nueva"}]
+        self.cargar(datos)
+        self.assertIsNone(Vinoteca.buscar_bodega("b1"))
+        self.assertEqual(
+            Vinoteca.buscar_bodega("b3").obtener_nombre(), "Bodega Nueva"
+        )
+
+
+class TestFacetas(TestVinotecaBase):
+    def test_sin_filtros(self):
+        """Cuenta todos los vinos por año, bodega y cepa"""
+        facetas = Vinoteca.obtener_facetas()
+        self.assertEqual(facetas["total"], 2)
+        self.assertEqual(facetas["anios"], [(2020, 1), (2021, 2), (2022, 1)])
+        self.assertEqual(
+            [(cepa.obtener_id(), cantidad) for cepa, cantidad in facetas["cepas"]],
+            [("c1", 2), ("c2", 1)]
+        )
+
+    def test_con_filtros(self):
+        """Con filtros cuenta solo los vinos que los cumplen"""
+        facetas = Vinoteca.obtener_facetas(anio=2022)
+        self.assertEqual(facetas["total"], 1)
+        self.assertEqual(facetas["anios"], [(2021, 1), (2022, 1)])
+        self.assertEqual(
+            [(bodega.obtener_id(), cantidad) for bodega, cantidad in facetas["bodegas"]],
+            [("b2", 1)]
+        )
+        self.assertEqual(Vinoteca.obtener_facetas(cepa="c2", bodega="b1")["total"], 0)
+
+    def test_limite(self):
+        """Con límite devuelve las bodegas y cepas con más vinos"""
+        facetas = Vinoteca.obtener_facetas(limite=1)
+        self.assertEqual(len(facetas["anios"]), 3)
+        self.assertEqual(
+            [(cepa.obtener_id(), cantidad) for cepa, cantidad in facetas["cepas"]],
+            [("c1", 2)]
+        )
+        # A igual cantidad se desempata por nombre
+        self.assertEqual(
+            [bodega.obtener_id() for bodega, _ in facetas["bodegas"]], ["b1"]
+        )
+        with self.assertRaises(ValueError):
+            Vinoteca.obtener_facetas(limite=0)
+
+
+class TestVersionDeDatos(TestVinotecaBase):
+    def test_version_depende_del_contenido(self):
+        """La versión cambia con el contenido y se repite para el mismo"""
+        version = Vinoteca.obtener_version()
+        self.cargar(self.datos_prueba)
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["bodegas"][0]["nombre"] = "Otra Bodega"
+        self.cargar(datos)
+        self.assertNotEqual(Vinoteca.obtener_version(), version)
+        self.assertIsNotNone(Vinoteca.obtener_fecha_modificacion())
+
+
+class TestIndicesInversos(TestVinotecaBase):
+    def test_vinos_de_bodega(self):
+        """Cada bodega obtiene solo sus vinos desde el índice inverso"""
+        vinos = Vinoteca.buscar_bodega("b1").obtener_vinos()
+        self.assertEqual([vino.obtener_id() for vino in vinos], ["v1"])
+        self.assertEqual(Vinoteca.obtener_vinos_de_bodega("inexistente"), [])
+
+    def test_vinos_de_cepa(self):
+        """Cada cepa obtiene los vinos que la utilizan"""
+        vinos = Vinoteca.buscar_cepa("c1").obtener_vinos()
+        self.assertEqual([vino.obtener_id() for vino in vinos], ["v1", "v2"])
+
+    def test_cepas_de_bodega_sin_duplicados(self):
+        """Las cepas de una bodega no se repiten aunque varios vinos las usen"""
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["vinos"][1]["bodega"] = "b1"
+        self.cargar(datos)
+        cepas = Vinoteca.buscar_bodega("b1").obtener_cepas()
+        self.assertEqual([cepa.obtener_id() for cepa in cepas], ["c1", "c2"])
+        self.assertEqual(Vinoteca.buscar_bodega("b2").obtener_cepas(), [])
+
+
+class TestIndiceAnios(TestVinotecaBase):
+    def ids(self, vinos):
+        return [vino.obtener_id() for vino in vinos]
+
+    def test_filtro_por_anio_exacto(self):
+        """El año exacto se resuelve con la lista de posiciones del índice"""
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(2020)), ["v1"])
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(2021)), ["v1", "v2"])
+        self.assertEqual(Vinoteca.obtener_vinos(1999), [])
+
+    def test_filtro_por_rango_sin_duplicados(self):
+        """Un rango mezcla las listas de cada año sin repetir vinos"""
+        vinos = Vinoteca.obtener_vinos(anio_desde=2020, anio_hasta=2022)
+        self.assertEqual(self.ids(vinos), ["v1", "v2"])
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(anio_desde=2022)), ["v2"])
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(anio_hasta=2020)), ["v1"])
+
+    def test_anio_exacto_combinado_con_rango(self):
+        """El año exacto y el rango se combinan como intersección"""
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(2022, anio_hasta=2021)), []
+        )
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(2022, anio_desde=2021)), ["v2"]
+        )
+
+
+class TestFiltrosCombinados(TestVinotecaBase):
+    def ids(self, vinos):
+        return [vino.obtener_id() for vino in vinos]
+
+    def test_filtro_por_bodega_y_cepa(self):
+        """Los filtros por bodega y cepa se resuelven con las facetas"""
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(bodega="b2")), ["v2"])
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(cepa="c1")), ["v1", "v2"])
+        self.assertEqual(Vinoteca.obtener_vinos(bodega="b1", cepa="c2"), [])
+
+    def test_filtro_combinado_con_anio_y_orden(self):
+        """Los filtros combinados admiten año, orden y reverso"""
+        vinos = Vinoteca.obtener_vinos(
+            2021, orden="nombre", reverso=True, cepa="c1"
+        )
+        self.assertEqual(self.ids(vinos), ["v2", "v1"])
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(anio_hasta=2020, cepa="c1")), ["v1"]
+        )
+
+    def test_varias_bodegas_y_cepas(self):
+        """Varias bodegas o cepas admiten cualquiera, o todas las cepas"""
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(bodega=["b1", "b2", "b9"])), ["v1", "v2"]
+        )
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(cepa=["c2", "c9"], anio=2021)), ["v2"]
+        )
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(cepa=["c1", "c2"], todas_las_cepas=True)),
+            ["v2"]
+        )
+        self.assertEqual(
+            Vinoteca.obtener_vinos(cepa=["c1", "c9"], todas_las_cepas=True), []
+        )
+
+    def test_coincide_con_recorrido(self):
+        """Las combinaciones de filtros coinciden con recorrer los vinos"""
+        azar = random.Random(7)
+        datos = {
+            "bodegas": [{"id": f"b{i}", "nombre": f"B {i}"} for i in range(30)],
+            "cepas": [{"id": f"c{i}", "nombre": f"C {i}"} for i in range(8)],
+            "vinos": [],
+        }
+        for i in range(600):
+            primera = azar.randint(2000, 2020)
+            datos["vinos"].append({
+                "id": f"v{i:03d}", "nombre": f"V {i}",
+                "bodega": f"b{azar.randrange(30)}",
+                "cepas": [f"c{c}" for c in azar.sample(range(8), azar.randint(1, 3))],
+                "partidas": list(range(primera, primera + azar.randint(1, 4))),
+            })
+        self.cargar(datos)
+        for _ in range(200):
+            bodegas = [f"b{b}" for b in azar.sample(range(32), azar.randint(0, 3))]
+            cepas = [f"c{c}" for c in azar.sample(range(9), azar.randint(0, 3))]
+            desde = azar.choice([None, 2005, 2015])
+            hasta = azar.choice([None, 2006, 2018])
+            todas = azar.random() < 0.5
+            esperados = [
+                vino["id"] for vino in datos["vinos"]
+                if (not bodegas or vino["bodega"] in bodegas)
+                and (not cepas or (all if todas else any)(
+                    cepa in vino["cepas"] for cepa in cepas
+                ))
+                and any(
+                    (desde is None or anio >= desde) and (hasta is None or anio <= hasta)
+                    for anio in vino["partidas"]
+                )
+            ]
+            self.assertEqual(
+                self.ids(Vinoteca.obtener_vinos(
+                    anio_desde=desde, anio_hasta=hasta, bodega=bodegas or None,
+                    cepa=cepas or None, todas_las_cepas=todas
+                )),
+                esperados
+            )
+            self.assertEqual(
+                Vinoteca.obtener_facetas(
+                    anio_desde=desde, anio_hasta=hasta, bodega=bodegas or None,
+                    cepa=cepas or None, todas_las_cepas=todas
+                )["total"],
+                len(esperados)
+            )
+            # Los primeros de un orden coinciden con cortar el orden completo
+            orden = azar.choice(["anio", "anio_inicial", "nombre"])
+            filtros = dict(
+                anio_desde=desde, anio_hasta=hasta, bodega=bodegas or None,
+                cepa=cepas or None, todas_las_cepas=todas, orden=orden,
+                reverso=todas
+            )
+            self.assertEqual(
+                self.ids(Vinoteca.obtener_vinos(limite=5, **filtros)),
+                self.ids(Vinoteca.obtener_vinos(**filtros))[:5]
+            )
+
+    def test_plan_parte_del_filtro_mas_selectivo(self):
+        """Un filtro selectivo evita recorrer las listas de uno común"""
+        class Lista(list):
+            accesos = 0
+
+            def __getitem__(self, indice):
+                Lista.accesos += 1
+                return super().__getitem__(indice)
+
+            def __iter__(self):
+                Lista.accesos += len(self)
+                return super().__iter__()
+
+        comun = [Lista(range(0, 100_000, 2)), Lista(range(1, 100_000, 2))]
+        self.assertEqual(resolver_filtros([comun, [[7, 5000, 99_999]]]), [7, 5000, 99_999])
+        self.assertLess(Lista.accesos, 200)
+        self.assertEqual(resolver_filtros([comun, [[]]]), [])
+
+    def test_primeras_en_orden(self):
+        """Con filtros amplios se recorre el orden en lugar de resolverlos"""
+        permutacion = list(range(9999, -1, -1))
+        pares, multiplos = [list(range(0, 10_000, 2))], [list(range(0, 10_000, 3))]
+        self.assertEqual(
+            _primeras_en_orden(permutacion, [pares], 3, False, None), [9998, 9996, 9994]
+        )
+        self.assertEqual(
+            _primeras_en_orden(permutacion, [pares, multiplos], 2, True, None), [0, 6]
+        )
+        self.assertEqual(
+            _primeras_en_orden(
+                permutacion, [pares], 2, False, lambda posicion: posicion % 10 == 0
+            ),
+            [9990, 9980]
+        )
+        # Un filtro selectivo se resuelve en lugar de recorrer el orden
+        self.assertIsNone(_primeras_en_orden(permutacion, [[[5, 7]]], 1, False, None))
+        self.assertEqual(_primeras_en_orden(permutacion, [[[]]], 1, False, None), [])
+
+
+class TestPermutacionesDeOrden(TestVinotecaBase):
+    def ids(self, entidades):
+        return [entidad.obtener_id() for entidad in entidades]
+
+    def test_orden_por_bodega_y_reverso(self):
+        """El reverso recorre la permutación precalculada hacia atrás"""
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(orden="bodega")), ["v1", "v2"])
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(orden="bodega", reverso=True)),
+            ["v2", "v1"]
+        )
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_bodegas(orden="nombre", reverso=True)),
+            ["b2", "b1"]
+        )
+
+    def test_orden_por_ultima_y_primera_partida(self):
+        """Los vinos se ordenan por su última o su primera partida"""
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["vinos"][0]["partidas"] = [2019, 2023]
+        self.cargar(datos)
+        self.assertEqual(self.ids(Vinoteca.obtener_vinos(orden="anio")), ["v2", "v1"])
+        self.assertEqual(
+            self.ids(Vinoteca.obtener_vinos(orden="anio_inicial")), ["v1", "v2"]
+        )
+
+    def test_orden_sobre_vinos_filtrados(self):
+        """El orden se aplica también a los resultados filtrados por año"""
+        vinos = Vinoteca.obtener_vinos(2021, orden="nombre", reverso=True)
+        self.assertEqual(self.ids(vinos), ["v2", "v1"])
+
+    def test_orden_invalido(self):
+        """Un campo de orden desconocido se rechaza sin llegar al modelo"""
+        with self.assertRaises(ValueError):
+            Vinoteca.obtener_vinos(orden="_Vino__nombre")
+        with self.assertRaises(ValueError):
+            Vinoteca.obtener_cepas(orden="__class__")
+
+
+class TestFragmentosJson(TestVinotecaBase):
+    def test_fragmento_se_codifica_una_vez(self):
+        """El fragmento de una entidad se reutiliza entre llamadas"""
+        vino = Vinoteca.buscar_vino("v2")
+        fragmento = Vinoteca.obtener_fragmento(vino)
+        self.assertIs(Vinoteca.obtener_fragmento(vino), fragmento)
+        self.assertEqual(json.loads(fragmento), vino.convertir_a_json())
+
+    def test_fragmento_basico_y_completo(self):
+        """Las representaciones básica y completa se guardan por separado"""
+        bodega = Vinoteca.buscar_bodega("b1")
+        self.assertEqual(json.loads(Vinoteca.obtener_fragmento(bodega))["vinos"], 1)
+        self.assertEqual(
+            json.loads(Vinoteca.obtener_fragmento(bodega, full=True))["vinos"],
+            ["Vino Test 1"]
+        )
+
+    def test_fragmentos_se_descartan_al_recargar(self):
+        """Una nueva carga de datos invalida los fragmentos anteriores"""
+        Vinoteca.obtener_fragmento(Vinoteca.buscar_cepa("c1"))
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["cepas"][0]["nombre"] = "Cepa Renombrada"
+        self.cargar(datos)
+        fragmento = Vinoteca.obtener_fragmento(Vinoteca.buscar_cepa("c1"))
+        self.assertEqual(json.loads(fragmento)["nombre"], "Cepa Renombrada")
+
+
+class TestPaginacion(TestVinotecaBase):
+    datos_prueba = {
+        "bodegas": [{"id": "b1", "nombre": "Bodega"}],
+        "cepas": [{"id": "c1", "nombre": "Cepa"}],
+        "vinos": [
+            {
+                "id": f"v{i}",
+                "nombre": f"Vino {i % 3}",
+                "bodega": "b1",
+                "cepas": ["c1"],
+                "partidas": [2020 + i % 2]
+            }
+            for i in range(7)
+        ]
+    }
+
+    def recorrer(self, **parametros):
+        """Recorre todas las páginas de a dos vinos siguiendo los cursores"""
+        vistos, cursor = [], None
+        while True:
+            pagina = Vinoteca.obtener_vinos(limite=2, cursor=cursor, **parametros)
+            vistos.extend(vino.obtener_id() for vino in pagina)
+            if len(pagina) < 2:
+                return vistos
+            cursor = Vinoteca.cursor_de(
+                pagina[-1], parametros.get("orden"), parametros.get("reverso", False)
+            )
+
+    def test_paginas_cubren_el_orden_completo(self):
+        """Las páginas concatenadas reproducen el listado ordenado completo"""
+        for reverso in (False, True):
+            esperado = [
+                vino.obtener_id()
+                for vino in Vinoteca.obtener_vinos(orden="nombre", reverso=reverso)
+            ]
+            self.assertEqual(self.recorrer(orden="nombre", reverso=reverso), esperado)
+
+    def test_paginas_con_filtro_de_anio(self):
+        """La paginación respeta el filtro por año"""
+        esperado = [
+            vino.obtener_id()
+            for vino in Vinoteca.obtener_vinos(2021, orden="nombre", reverso=True)
+        ]
+        self.assertEqual(
+            self.recorrer(anio=2021, orden="nombre", reverso=True), esperado
+        )
+
+    def test_paginar_sin_orden_usa_el_id(self):
+        """Sin orden explícito las páginas siguen el orden por id"""
+        self.assertEqual(self.recorrer(), sorted(f"v{i}" for i in range(7)))
+        pagina = Vinoteca.obtener_bodegas(limite=1)
+        self.assertEqual([bodega.obtener_id() for bodega in pagina], ["b1"])
+
+    def test_cursor_invalido(self):
+        """Un cursor corrupto o de otro orden se rechaza"""
+        cursor = Vinoteca.cursor_de(Vinoteca.buscar_vino("v1"), "nombre")
+        with self.assertRaises(ValueError):
+            Vinoteca.obtener_vinos(orden="id", limite=2, cursor=cursor)
+        with self.assertRaises(ValueError):
+            Vinoteca.obtener_vinos(limite=2, cursor="no-es-un-cursor")
+        with self.assertRaises(ValueError):
+            Vinoteca.obtener_cepas(limite=0)
+
+class TestConsulta(TestVinotecaBase):
+    datos_prueba = {
+        "bodegas": [{"id": f"b{i}", "nombre": f"Bodega {i % 2}"} for i in range(3)],
+        "cepas": [{"id": "c1", "nombre": "Cepa 1"}, {"id": "c2", "nombre": "Cepa 2"}],
+        "vinos": [
+            {
+                "id": f"v{i}",
+                "nombre": f"Vino {i % 4}",
+                "bodega": f"b{i % 3}",
+                "cepas": ["c1", "c2"][: 1 + i % 2],
+                "partidas": [2015 + i % 5, 2016 + i % 7]
+            }
+            for i in range(20)
+        ]
+    }
+
+    def ids(self, entidades):
+        return [entidad.obtener_id() for entidad in entidades]
+
+    def test_se_ejecuta_al_recorrerla(self):
+        """La consulta no se ejecuta al armarla sino al recorrerla"""
+        consulta = Vinoteca.consulta().filtrar(bodega="b1").ordenar("nombre")
+        self.cargar(TestVinotecaBase.datos_prueba)
+        self.assertEqual(
+            [vino.obtener_nombre() for vino in consulta], ["Vino Test 1"]
+        )
+
+    def test_coincide_con_filtrar_y_ordenar_la_lista(self):
+        """El resultado coincide con filtrar, ordenar y cortar en Python"""
+        vinos = Vinoteca.obtener_vinos()
+        nombre = CLAVES_VINOS["nombre"]
+        def es_par(vino):
+            return int(vino.obtener_id()[1:]) % 2 == 0
+        for reverso in (False, True):
+            for limite in (None, 1, 3, 50):
+                esperados = sorted(
+                    [v for v in vinos if es_par(v) and 2017 in v.obtener_partidas()],
+                    key=lambda v: (nombre(v), v.obtener_id()), reverse=reverso
+                )[:limite]
+                consulta = (
+                    Vinoteca.consulta().filtrar(es_par).filtrar(anio=2017)
+                    .ordenar("nombre", reverso)
+                )
+                if limite is not None:
+                    consulta = consulta.limitar(limite)
+                self.assertEqual(self.ids(consulta), self.ids(esperados))
+
+                def clave(vino):
+                    return len(vino.obtener_cepa_ids()), vino.obtener_id()
+                esperados = sorted(
+                    [v for v in vinos if v.obtener_bodega_id() != "b0"],
+                    key=clave, reverse=reverso
+                )[:limite]
+                consulta = Vinoteca.consulta().filtrar(bodega=["b1", "b2"]).ordenar(
+                    clave=clave, reverso=reverso
+                )
+                if limite is not None:
+                    consulta = consulta.limitar(limite)
+                self.assertEqual(self.ids(consulta), self.ids(esperados))
+
+    def test_filtros_se_acumulan_y_la_consulta_no_cambia(self):
+        """Cada cláusula devuelve una consulta nueva y los filtros se suman"""
+        base = Vinoteca.consulta().filtrar(cepa="c2")
+        acotada = base.filtrar(bodega="b0").limitar(2)
+        self.assertEqual(self.ids(base), [f"v{i}" for i in range(1, 20, 2)])
+        self.assertEqual(self.ids(acotada), ["v3", "v9"])
+        self.assertEqual(
+            self.ids(Vinoteca.consulta("bodegas").filtrar(
+                lambda b: b.obtener_nombre().endswith("0")
+            ).ordenar("id", True)),
+            ["b2", "b0"]
+        )
+
+    def test_paginas_con_cursor(self):
+        """desde continúa el orden a partir de un cursor"""
+        consulta = Vinoteca.consulta().filtrar(bodega="b2").ordenar("anio").limitar(3)
+        pagina = list(consulta)
+        siguiente = list(consulta.desde(Vinoteca.cursor_de(pagina[-1], "anio")))
+        completo = list(Vinoteca.consulta().filtrar(bodega="b2").ordenar("anio"))
+        self.assertEqual(self.ids(pagina + siguiente), self.ids(completo[:6]))
+
+    def test_parametros_no_validos(self):
+        """Las cláusulas no válidas responden ValueError"""
+        with self.assertRaises(ValueError):
+            Vinoteca.consulta("barricas")
+        with self.assertRaises(ValueError):
+            Vinoteca.consulta("bodegas").filtrar(anio=2020)
+        with self.assertRaises(ValueError):
+            Vinoteca.consulta().ordenar("precio")
+        with self.assertRaises(ValueError):
+            Vinoteca.consulta().limitar(0)
+        with self.assertRaises(ValueError):
+            iter(Vinoteca.consulta().ordenar(clave=len).desde("x"))
+        with self.assertRaises(ValueError):
+            iter(Vinoteca.consulta().desde("no-es-un-cursor"))
+
+
+class TestRecarga(TestVinotecaBase):
+    def setUp(self):
+        """Carga los datos de prueba y guarda la ruta del archivo"""
+        self.ruta = self.cargar(self.datos_prueba)
+        self.addCleanup(Vinoteca.detener_vigilancia)
+
+    def reescribir(self, contenido):
+        """Reemplaza el archivo de datos forzando un cambio de mtime"""
+        estado = os.stat(self.ruta)
+        with open(self.ruta, "w", encoding="utf-8") as archivo:
+            archivo.write(contenido)
+        marca = estado.st_mtime_ns + 1_000_000_000
+        os.utime(self.ruta, ns=(marca, marca))
+
+    def datos_modificados(self):
+        """Datos de prueba con un vino renombrado y uno nuevo"""
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["vinos"][0]["nombre"] = "Vino Renombrado"
+        datos["vinos"].append({
+            "id": "v3", "nombre": "Vino Test 3", "bodega": "b1",
+            "cepas": ["c2"], "partidas": [2023]
+        })
+        return datos
+
+    def test_sin_cambios_no_recarga(self):
+        """Si el archivo no cambió se conserva la versión publicada"""
+        vinos = Vinoteca.obtener_vinos()
+        self.assertFalse(Vinoteca.recargar())
+        self.assertIs(Vinoteca.obtener_vinos(), vinos)
+        # Forzada, la recarga vuelve a publicar los datos, que comparten
+        # las colecciones del almacén anterior ya que ninguna cambió
+        self.assertTrue(Vinoteca.recargar(forzar=True))
+        self.assertEqual(list(Vinoteca.obtener_vinos()), list(vinos))
+
+    def test_recarga_publica_datos_nuevos(self):
+        """Tras modificar el archivo la recarga publica los datos nuevos"""
+        version = Vinoteca.obtener_version()
+        self.reescribir(json.dumps(self.datos_modificados()))
+        self.assertTrue(Vinoteca.recargar())
+        self.assertNotEqual(Vinoteca.obtener_version(), version)
+        self.assertEqual(
+            Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado"
+        )
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(2023)], ["v3"]
+        )
+        self.assertEqual(len(Vinoteca.obtener_vinos_de_bodega("b1")), 2)
+
+    def test_consulta_en_curso_termina_sobre_la_version_anterior(self):
+        """Un recorrido iniciado antes de la recarga no ve datos mezclados"""
+        recorrido = Vinoteca.iterar_vinos(orden="nombre")
+        primero = next(recorrido)
+        self.reescribir(json.dumps(self.datos_modificados()))
+        Vinoteca.recargar()
+        resto = list(recorrido)
+        self.assertEqual(
+            [primero.obtener_nombre()] + [v.obtener_nombre() for v in resto],
+            ["Vino Test 1", "Vino Test 2"]
+        )
+
+    def test_fragmento_de_version_anterior_no_se_guarda(self):
+        """Serializar una entidad reemplazada no contamina la caché nueva"""
+        anterior = Vinoteca.buscar_vino("v1")
+        self.reescribir(json.dumps(self.datos_modificados()))
+        Vinoteca.recargar()
+        self.assertIn(b"Vino Test 1", Vinoteca.obtener_fragmento(anterior))
+        self.assertIn(
+            b"Vino Renombrado",
+            Vinoteca.obtener_fragmento(Vinoteca.buscar_vino("v1"))
+        )
+
+    def test_recarga_incremental_reutiliza_lo_que_no_cambio(self):
+        """La recarga solo recrea las entidades modificadas y su JSON"""
+        v2 = Vinoteca.buscar_vino("v2")
+        fragmento_v2 = Vinoteca.obtener_fragmento(v2)
+        Vinoteca.obtener_fragmento(Vinoteca.buscar_bodega("b1"), full=True)
+        self.reescribir(json.dumps(self.datos_modificados()))
+        Vinoteca.recargar()
+        self.assertIs(Vinoteca.buscar_vino("v2"), v2)
+        self.assertIs(Vinoteca.obtener_fragmento(v2), fragmento_v2)
+        bodega = json.loads(Vinoteca.obtener_fragmento(
+            Vinoteca.buscar_bodega("b1"), full=True
+        ))
+        self.assertEqual(bodega["vinos"], ["Vino Renombrado", "Vino Test 3"])
+
+    def test_archivo_invalido_conserva_los_datos(self):
+        """Un archivo a medio escribir no reemplaza los datos publicados"""
+        version = Vinoteca.obtener_version()
+        self.reescribir('{"bodegas": [')
+        with self.assertRaises(ValueError):
+            Vinoteca.recargar()
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        self.assertEqual(len(Vinoteca.obtener_vinos()), 2)
+        # El mismo archivo inválido no se vuelve a intentar
+        self.assertFalse(Vinoteca.recargar())
+
+    def test_vigilar_recarga_automaticamente(self):
+        """El hilo vigilante publica los cambios del archivo"""
+        Vinoteca.vigilar(intervalo=0.01)
+        self.reescribir(json.dumps(self.datos_modificados()))
+        limite = time.monotonic() + 5
+        while Vinoteca.buscar_vino("v3") is None and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertIsNotNone(Vinoteca.buscar_vino("v3"))
+
+    def test_vigilante_sobrevive_a_errores_de_carga(self):
+        """Un archivo que no se puede cargar no detiene al hilo vigilante"""
+        def esperar_registro(registros, cantidad):
+            limite = time.monotonic() + 5
+            while len(registros.records) < cantidad and time.monotonic() < limite:
+                time.sleep(0.01)
+            self.assertEqual(len(registros.records), cantidad)
+
+        Vinoteca.vigilar(intervalo=0.01)
+        invalidos = self.datos_modificados()
+        invalidos["vinos"][2]["partidas"] = [2 ** 40]
+        with self.assertLogs("vinoteca", level="ERROR") as registros:
+            self.reescribir(json.dumps(invalidos))
+            esperar_registro(registros, 1)
+            with patch.object(
+                AlmacenConCambios, "aplicar", side_effect=OverflowError
+            ):
+                self.reescribir(json.dumps(self.datos_modificados()))
+                esperar_registro(registros, 2)
+        self.assertIsNone(Vinoteca.buscar_vino("v3"))
+
+        # Corregido el archivo, el mismo hilo publica los datos nuevos
+        self.reescribir(json.dumps(self.datos_modificados()))
+        limite = time.monotonic() + 5
+        while Vinoteca.buscar_vino("v3") is None and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertIsNotNone(Vinoteca.buscar_vino("v3"))
+
+
+class TestEscrituras(TestVinotecaBase):
+    def setUp(self):
+        """Carga los datos de prueba y elimina la bitácora al terminar"""
+        self.ruta = self.cargar(self.datos_prueba)
+        for ruta in (ruta_bitacora(self.ruta), ruta_compactacion(self.ruta)):
+            self.addCleanup(lambda r=ruta: os.path.exists(r) and os.remove(r))
+
+    def test_escrituras_se_publican(self):
+        """Altas, modificaciones y bajas se ven en las consultas siguientes"""
+        version = Vinoteca.obtener_version()
+        Vinoteca.crear("vinos", {
+            "id": "v3", "nombre": "Vino Test 3", "bodega": "b1",
+            "cepas": ["c2"], "partidas": [2023]
+        })
+        Vinoteca.modificar("bodegas", "b1", {"nombre": "Bodega Renombrada"})
+        Vinoteca.eliminar("vinos", "v2")
+        self.assertNotEqual(Vinoteca.obtener_version(), version)
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos_de_bodega("b1")],
+            ["v1", "v3"]
+        )
+        self.assertEqual(
+            Vinoteca.buscar_vino("v3").obtener_bodega().obtener_nombre(),
+            "Bodega Renombrada"
+        )
+        self.assertIsNone(Vinoteca.buscar_vino("v2"))
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(2023)], ["v3"]
+        )
+        self.assertEqual(
+            [b.obtener_id() for b in Vinoteca.buscar_por_prefijo("bodegas", "renombr")],
+            ["b1"]
+        )
+
+    def test_reemplazar_crea_o_reemplaza(self):
+        """Reemplazar indica si la entidad se creó"""
+        cepa, creada = Vinoteca.reemplazar("cepas", "c3", {"nombre": "Bonarda"})
+        self.assertTrue(creada)
+        self.assertIs(Vinoteca.buscar_cepa("c3"), cepa)
+        _, creada = Vinoteca.reemplazar("cepas", "c3", {"nombre": "Cot"})
+        self.assertFalse(creada)
+        self.assertEqual(Vinoteca.buscar_cepa("c3").obtener_nombre(), "Cot")
+
+    def test_escrituras_invalidas(self):
+        """Las escrituras inválidas se rechazan sin cambiar los datos"""
+        version = Vinoteca.obtener_version()
+        with self.assertRaises(ConflictoDeDatos):
+            Vinoteca.crear("bodegas", {"id": "b1", "nombre": "Repetida"})
+        with self.assertRaises(ConflictoDeDatos):
+            Vinoteca.eliminar("cepas", "c1")
+        with self.assertRaises(KeyError):
+            Vinoteca.modificar("vinos", "v9", {"nombre": "Nuevo"})
+        with self.assertRaises(ValueError):
+            Vinoteca.modificar("vinos", "v1", {"bodega": "b9"})
+        with self.assertRaises(ValueError):
+            Vinoteca.modificar("vinos", "v1", {"partidas": ["2020"]})
+        with self.assertRaisesRegex(ValueError, "repetida"):
+            Vinoteca.modificar("vinos", "v1", {"cepas": ["c1", "c1"]})
+        with self.assertRaises(ValueError):
+            Vinoteca.crear("barricas", {"id": "x1"})
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        self.assertFalse(os.path.exists(ruta_bitacora(self.ruta)))
+
+    def test_partidas_con_la_regla_de_la_carga(self):
+        """Las escrituras validan los años con la misma regla que la carga"""
+        for anio in (2 ** 31, True, 2020.0):
+            with self.assertRaisesRegex(ValueError, "v1"):
+                Vinoteca.modificar("vinos", "v1", {"partidas": [anio]})
+        Vinoteca.modificar("vinos", "v1", {"partidas": [-5, 99999]})
+        self.assertEqual(
+            Vinoteca.buscar_vino("v1").obtener_partidas(), [-5, 99999]
+        )
+
+    def test_la_bitacora_se_aplica_al_cargar(self):
+        """Al inicializar se aplican los cambios registrados en la bitácora"""
+        Vinoteca.modificar("vinos", "v1", {"nombre": "Vino Renombrado"})
+        Vinoteca.eliminar("vinos", "v2")
+        version = Vinoteca.obtener_version()
+        Vinoteca.inicializar(self.ruta)
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        self.assertEqual(
+            Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado"
+        )
+        self.assertIsNone(Vinoteca.buscar_vino("v2"))
+
+    def test_solo_la_bitacora_crecio(self):
+        """Si el archivo no cambió solo se vuelve a aplicar la bitácora"""
+        Vinoteca.modificar("vinos", "v1", {"nombre": "Vino Renombrado"})
+        with patch("vinoteca.LectorJson", side_effect=AssertionError):
+            Vinoteca.inicializar(self.ruta)
+            Vinoteca.eliminar("vinos", "v2")
+            version = Vinoteca.obtener_version()
+            Vinoteca.inicializar(self.ruta)
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        self.assertEqual(
+            Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado"
+        )
+        self.assertIsNone(Vinoteca.buscar_vino("v2"))
+        # Con otro contenido el archivo se vuelve a leer
+        with open(self.ruta, "w", encoding="utf-8") as archivo:
+            json.dump(self.datos_prueba, archivo, indent=1)
+        with patch("vinoteca.LectorJson", side_effect=AssertionError):
+            with self.assertRaises(AssertionError):
+                Vinoteca.inicializar(self.ruta)
+
+    def test_compactar_incorpora_la_bitacora(self):
+        """Compactar reescribe el archivo de datos y descarta la bitácora"""
+        Vinoteca.modificar("cepas", "c2", {"nombre": "Syrah"})
+        self.assertTrue(Vinoteca.compactar())
+        self.assertFalse(os.path.exists(ruta_bitacora(self.ruta)))
+        self.assertFalse(os.path.exists(ruta_compactacion(self.ruta)))
+        with open(self.ruta, encoding="utf-8") as archivo:
+            datos = json.load(archivo)
+        self.assertEqual(datos["cepas"][1], {"id": "c2", "nombre": "Syrah"})
+        self.assertEqual(datos["vinos"], self.datos_prueba["vinos"])
+        self.assertFalse(Vinoteca.recargar())
+        self.assertFalse(Vinoteca.compactar())
+
+    def test_compactacion_inconclusa_se_vuelve_a_aplicar(self):
+        """Una bitácora apartada que no se descartó se aplica sin efecto"""
+        Vinoteca.modificar("vinos", "v1", {"nombre": "Vino Renombrado"})
+        with patch("vinoteca.Bitacora.descartar_compactada"):
+            self.assertTrue(Vinoteca.compactar())
+        self.assertTrue(os.path.exists(ruta_compactacion(self.ruta)))
+        Vinoteca.inicializar(self.ruta)
+        self.assertEqual(
+            Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado"
+        )
+
+    def test_cambio_se_publica_recien_confirmado(self):
+        """Mientras se espera la confirmación las consultas no ven el cambio"""
+        confirmar = Bitacora.confirmar
+        nombres = []
+
+        def confirmar_observando(bitacora, numero):
+            nombres.append(Vinoteca.buscar_vino("v1").obtener_nombre())
+            confirmar(bitacora, numero)
+
+        with patch.object(Bitacora, "confirmar", confirmar_observando):
+            Vinoteca.modificar("vinos", "v1", {"nombre": "Vino Renombrado"})
+        self.assertEqual(nombres, ["Vino Test 1"])
+        self.assertEqual(
+            Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado"
+        )
+
+    def test_falla_de_fsync_no_publica_el_cambio(self):
+        """Si la bitácora no se sincroniza el cambio falla y no se publica"""
+        version = Vinoteca.obtener_version()
+        with patch("os.fsync", side_effect=OSError("disco lleno")):
+            with self.assertRaises(OSError):
+                Vinoteca.modificar("vinos", "v1", {"nombre": "Vino Renombrado"})
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        self.assertEqual(Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Test 1")
+        # La bitácora no acepta cambios hasta volver a cargar los datos
+        with self.assertRaises(OSError):
+            Vinoteca.modificar("vinos", "v2", {"nombre": "Otro Nombre"})
+        self.assertEqual(Vinoteca.buscar_vino("v2").obtener_nombre(), "Vino Test 2")
+
+    def test_escrituras_concurrentes_comparten_el_fsync(self):
+        """Las escrituras que esperan un fsync en curso se confirman con el siguiente"""
+        # La primera escritura crea la bitácora, lo que sincroniza también
+        # el directorio
+        Vinoteca.crear("cepas", {"id": "c10", "nombre": "Cepa 10"})
+        fsync = os.fsync
+        sincronizaciones = []
+
+        def fsync_lento(descriptor):
+            sincronizaciones.append(descriptor)
+            time.sleep(0.05)
+            fsync(descriptor)
+
+        hilos = 8
+        largada = threading.Barrier(hilos)
+
+        def escribir(indice):
+            largada.wait()
+            Vinoteca.crear("cepas", {"id": f"c2{indice}", "nombre": f"Cepa {indice}"})
+
+        trabajadores = [
+            threading.Thread(target=escribir, args=(indice,))
+            for indice in range(hilos)
+        ]
+        with patch("os.fsync", fsync_lento):
+            for trabajador in trabajadores:
+                trabajador.start()
+            for trabajador in trabajadores:
+                trabajador.join()
+        self.assertLessEqual(len(sincronizaciones), 3)
+        for indice in range(hilos):
+            self.assertIsNotNone(Vinoteca.buscar_cepa(f"c2{indice}"))
+
+    def test_consolidar_publica_un_almacen_equivalente(self):
+        """Consolidar las capas de cambios no altera los datos publicados"""
+        Vinoteca.crear("vinos", {
+            "id": "v3", "nombre": "Vino Test 3", "bodega": "b1",
+            "cepas": ["c2"], "partidas": [2023]
+        })
+        Vinoteca.eliminar("vinos", "v2")
+        version = Vinoteca.obtener_version()
+        vinos = [v.obtener_id() for v in Vinoteca.obtener_vinos(orden="nombre")]
+        self.assertTrue(Vinoteca.consolidar())
+        self.assertFalse(Vinoteca.consolidar())
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(orden="nombre")], vinos
+        )
+        Vinoteca.modificar("vinos", "v3", {"nombre": "Vino Renombrado"})
+        self.assertEqual(
+            Vinoteca.buscar_vino("v3").obtener_nombre(), "Vino Renombrado"
+        )
+
+    def test_almacen_de_solo_lectura(self):
+        """El almacén mapeado no admite escrituras"""
+        self.addCleanup(Vinoteca.inicializar, None, None, "memoria")
+        self.addCleanup(lambda: os.path.exists(ruta_mapa(self.ruta)) and os.remove(ruta_mapa(self.ruta)))
+        Vinoteca.inicializar(self.ruta, almacen="mapeado")
+        with self.assertRaises(ConflictoDeDatos):
+            Vinoteca.modificar("vinos", "v1", {"nombre": "Vino Renombrado"})
+
+
+class TestInstantanea(TestVinotecaBase):
+    def setUp(self):
+        """Carga la vinoteca guardando su instantánea"""
+        self.ruta = self.cargar(self.datos_prueba)
+        self.addCleanup(Vinoteca.inicializar, None, False)
+        Vinoteca.inicializar(self.ruta, instantanea=True)
+        self.instantanea = ruta_instantanea(self.ruta)
+        self.addCleanup(
+            lambda: os.path.exists(self.instantanea) and os.remove(self.instantanea)
+        )
+
+    def inicializar_sin_json(self):
+        """Inicializa la vinoteca fallando si se intenta leer el JSON"""
+        with patch("vinoteca.LectorJson", side_effect=AssertionError):
+            Vinoteca.inicializar(self.ruta)
+
+    def test_arranque_desde_instantanea(self):
+        """Si el archivo no cambió, los datos se restauran sin leer el JSON"""
+        self.assertTrue(os.path.exists(self.instantanea))
+        version = Vinoteca.obtener_version()
+        self.inicializar_sin_json()
+        self.assertEqual(Vinoteca.obtener_version(), version)
+        vino = Vinoteca.buscar_vino("v2")
+        self.assertIs(vino.obtener_bodega(), Vinoteca.buscar_bodega("b2"))
+        self.assertEqual(
+            [cepa.obtener_id() for cepa in Vinoteca.obtener_cepas_de_bodega("b2")],
+            ["c1", "c2"]
+        )
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(anio=2021, orden="nombre")],
+            ["v1", "v2"]
+        )
+
+    def test_cambio_de_contenido_invalida_la_instantanea(self):
+        """Un archivo con otro contenido, aun con igual tamaño y fecha, se lee del JSON"""
+        estado = os.stat(self.ruta)
+        with open(self.ruta, "r", encoding="utf-8") as archivo:
+            contenido = archivo.read()
+        with open(self.ruta, "w", encoding="utf-8") as archivo:
+            archivo.write(contenido.replace("Vino Test 1", "Vino Test X"))
+        os.utime(self.ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+        with self.assertRaises(AssertionError):
+            self.inicializar_sin_json()
+        Vinoteca.inicializar(self.ruta)
+        self.assertEqual(Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Test X")
+        # La instantánea se actualizó con el contenido nuevo
+        self.inicializar_sin_json()
+        self.assertEqual(Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Test X")
+
+    def test_instantanea_daniada_se_ignora(self):
+        """Una instantánea dañada se descarta y se carga el JSON"""
+        with open(self.instantanea, "r+b") as archivo:
+            archivo.truncate(os.path.getsize(self.instantanea) - 10)
+        Vinoteca.inicializar(self.ruta)
+        self.assertIsNotNone(Vinoteca.buscar_vino("v2"))
+        self.inicializar_sin_json()
+        self.assertIsNotNone(Vinoteca.buscar_vino("v2"))
+
+
+class TestAlmacenMapeadoEnVinoteca(TestVinotecaBase):
+    def setUp(self):
+        """Carga la vinoteca sobre el mapa del archivo de datos"""
+        self.ruta = self.cargar(self.datos_prueba)
+        self.addCleanup(Vinoteca.inicializar, None, None, "memoria")
+        Vinoteca.inicializar(self.ruta, almacen="mapeado")
+        self.addCleanup(
+            lambda: os.path.exists(ruta_mapa(self.ruta)) and os.remove(ruta_mapa(self.ruta))
+        )
+
+    def test_consultas_sobre_el_mapa(self):
+        """Las consultas de la vinoteca funcionan sobre el mapa"""
+        self.assertTrue(os.path.exists(ruta_mapa(self.ruta)))
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(anio=2022, orden="nombre")],
+            ["v2"]
+        )
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(cepa="c1", reverso=True, orden="id")],
+            ["v2", "v1"]
+        )
+        bodega = Vinoteca.buscar_bodega("b2")
+        self.assertEqual([v.obtener_id() for v in bodega.obtener_vinos()], ["v2"])
+        self.assertEqual(
+            json.loads(Vinoteca.obtener_fragmento(Vinoteca.buscar_vino("v2"))),
+            {"id": "v2", "nombre": "Vino Test 2", "bodega": "Bodega Test 2",
+             "cepas": ["Cepa Test 1", "Cepa Test 2"], "partidas": [2021, 2022]}
+        )
+        pagina = Vinoteca.obtener_bodegas(orden="nombre", limite=1)
+        siguiente = Vinoteca.obtener_bodegas(
+            orden="nombre", limite=1, cursor=Vinoteca.cursor_de(pagina[0], "nombre")
+        )
+        self.assertEqual([b.obtener_id() for b in siguiente], ["b2"])
+
+    def test_otro_proceso_abre_el_mismo_mapa(self):
+        """Si el mapa corresponde al archivo, se abre sin leer el JSON"""
+        version = Vinoteca.obtener_version()
+        with patch("vinoteca.LectorJson", side_effect=AssertionError):
+            Vinoteca.inicializar(self.ruta)
+        self.assertEqual(Vinoteca.obtener_version(), version)
+
+    def test_recarga_escribe_un_mapa_nuevo(self):
+        """Al recargar se escribe y se publica el mapa del contenido nuevo"""
+        vino = Vinoteca.buscar_vino("v1")
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["vinos"][0]["nombre"] = "Vino Renombrado"
+        estado = os.stat(self.ruta)
+        with open(self.ruta, "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo)
+        marca = estado.st_mtime_ns + 1_000_000_000
+        os.utime(self.ruta, ns=(marca, marca))
+        self.assertTrue(Vinoteca.recargar())
+        self.assertEqual(Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado")
+        self.assertEqual(vino.obtener_nombre(), "Vino Test 1")
+        with patch("vinoteca.LectorJson", side_effect=AssertionError):
+            Vinoteca.inicializar(self.ruta)
+
+    def test_tipo_de_almacen_invalido(self):
+        """Un tipo de almacén desconocido se rechaza"""
+        with self.assertRaises(ValueError):
+            Vinoteca.inicializar(self.ruta, almacen="disco")
+
+
+class TestAlmacenSqliteEnVinoteca(TestVinotecaBase):
+    def setUp(self):
+        """Carga la vinoteca sobre la base de datos importada del archivo"""
+        self.ruta = self.cargar(self.datos_prueba)
+        self.base = ruta_base_de_datos(self.ruta)
+        self.addCleanup(Vinoteca.inicializar, None, None, "memoria")
+        Vinoteca.inicializar(self.ruta, almacen="sqlite")
+        self.addCleanup(lambda: os.path.exists(self.base) and os.remove(self.base))
+
+    def inicializar_sin_importar(self):
+        """Inicializa la vinoteca fallando si se intenta leer el JSON"""
+        with patch("vinoteca.LectorJson", side_effect=AssertionError), \
+                patch("almacenes.sqlite.LectorJson", side_effect=AssertionError):
+            Vinoteca.inicializar(self.ruta)
+
+    def test_consultas_sobre_la_base_de_datos(self):
+        """Las consultas de la vinoteca se resuelven con SQL"""
+        self.assertTrue(os.path.exists(self.base))
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(anio=2021, orden="nombre", reverso=True)],
+            ["v2", "v1"]
+        )
+        self.assertEqual(
+            [v.obtener_id() for v in Vinoteca.obtener_vinos(bodega="b1", anio_desde=2020)],
+            ["v1"]
+        )
+        self.assertEqual(
+            [c.obtener_id() for c in Vinoteca.buscar_bodega("b2").obtener_cepas()],
+            ["c1", "c2"]
+        )
+        self.assertEqual(
+            json.loads(Vinoteca.obtener_fragmento(Vinoteca.buscar_vino("v2"))),
+            {"id": "v2", "nombre": "Vino Test 2", "bodega": "Bodega Test 2",
+             "cepas": ["Cepa Test 1", "Cepa Test 2"], "partidas": [2021, 2022]}
+        )
+        pagina = Vinoteca.obtener_vinos(orden="anio", limite=1)
+        siguiente = Vinoteca.obtener_vinos(
+            orden="anio", limite=1, cursor=Vinoteca.cursor_de(pagina[0], "anio")
+        )
+        self.assertEqual([v.obtener_id() for v in pagina + siguiente], ["v1", "v2"])
+
+    def test_base_de_datos_vigente_no_se_reimporta(self):
+        """Si la base de datos corresponde al archivo, se abre sin leer el JSON"""
+        version = Vinoteca.obtener_version()
+        self.inicializar_sin_importar()
+        self.assertEqual(Vinoteca.obtener_version(), version)
+
+    def test_recarga_importa_el_contenido_nuevo(self):
+        """Al recargar se importa y se publica el contenido nuevo"""
+        datos = json.loads(json.dumps(self.datos_prueba))
+        datos["vinos"][0]["nombre"] = "Vino Renombrado"
+        estado = os.stat(self.ruta)
+        with open(self.ruta, "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo)
+        marca = estado.st_mtime_ns + 1_000_000_000
+        os.utime(self.ruta, ns=(marca, marca))
+        self.assertTrue(Vinoteca.recargar())
+        self.assertEqual(Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado")
+        self.inicializar_sin_importar()
+        self.assertEqual(Vinoteca.buscar_vino("v1").obtener_nombre(), "Vino Renombrado")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,103 @@
+import hashlib
+import heapq
 import json
-from typing import List, Optional, Dict, TYPE_CHECKING
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional,
+    Sequence, Tuple, TYPE_CHECKING, Union
+)
+
+from almacenes.base import (
+    Almacen, fila_json, validar_partidas
+)
+from almacenes.bitacora import (
+    Bitacora, codificar_cambio, compactar, leer_cambios, ruta_bitacora,
+    ruta_compactacion
+)
+from almacenes.capas import AlmacenConCambios
+from almacenes.instantanea import (
+    cargar_instantanea, guardar_instantanea, huella_archivo
+)
+from almacenes.lector_json import LectorJson
+from almacenes.mapeado import abrir_mapa, escribir_mapa
+from almacenes.memoria import AlmacenEnMemoria
+from almacenes.sqlite import abrir_base_de_datos, importar_json
+from consulta import (
+    Consulta, acotar_anios, codificar_cursor, listas_de_filtros,
+    resolver_filtros
+)
 
 if TYPE_CHECKING:
+    from modelos.entidad_vineria import EntidadVineria
     from modelos.bodega import Bodega
     from modelos.cepa import Cepa
     from modelos.vino import Vino
 
+_registro = logging.getLogger(__name__)
+
+# Campos que pueden escribirse en cada colección, además del id
+_CAMPOS_ESCRITURA: Dict[str, Tuple[str, ...]] = {
+    "bodegas": ("nombre",),
+    "cepas": ("nombre",),
+    "vinos": ("nombre", "bodega", "cepas", "partidas"),
+}
+
+
+# Almacenes que admiten escrituras: aplicar deriva de ellos un almacén nuevo
+_ALMACENES_EDITABLES = (AlmacenEnMemoria, AlmacenConCambios)
+
+
+class ConflictoDeDatos(ValueError):
+    """
+    Error de una escritura que no puede aplicarse sobre los datos actuales:
+    un alta con un ID existente, la baja de una entidad que otras utilizan
+    o un almacén que no admite escrituras.
+    """
+
+
+def _encadenar_version(version: str, linea: bytes) -> str:
+    """
+    Obtiene la versión de los datos tras aplicar un cambio de la bitácora.
+
+    Args:
+        version: Versión de los datos antes del cambio
+        linea: Cambio codificado
+
+    Returns:
+        Huella hexadecimal de la versión anterior y el cambio
+    """
+    return hashlib.sha1(version.encode("ascii") + b"\n" + linea).hexdigest()
+
+
+def _validar_texto(valor: Any, campo: str) -> str:
+    """
+    Valida un campo de texto escrito por la API.
+
+    Raises:
+        ValueError: Si el valor no es un texto con contenido
+    """
+    if not isinstance(valor, str) or not valor.strip():
+        raise ValueError(f"El campo {campo} debe ser un texto no vacío")
+    return valor
+
+
+def _validar_partidas(valor: Any, vino_id: str) -> List[int]:
+    """
+    Valida la lista de partidas de un vino escrita por la API, con la misma
+    regla que al cargar el archivo de datos (ver validar_partidas).
+
+    Raises:
+        ValueError: Si no es una lista o algún año no es válido
+    """
+    if not isinstance(valor, list):
+        raise ValueError("El campo partidas debe ser una lista de años")
+    validar_partidas(vino_id, valor)
+    return list(valor)
+
 
 class Vinoteca:
     """
@@ -15,98 +107,895 @@ class Vinoteca:
     """
     # Atributos de clase según el diagrama
     __archivoDeDatos: str = "vinoteca.json"
-    __bodegas: List['Bodega'] = []
-    __cepas: List['Cepa'] = []
-    __vinos: List['Vino'] = []
+    # Datos publicados: entidades e índices de la última carga. Se
+    # reemplaza completo en cada carga, nunca se modifica en el lugar.
+    __almacen: Almacen = AlmacenEnMemoria({})
+    # Firma (mtime, tamaño, inodo) del archivo de la última carga
+    __firma: Optional[Tuple[int, int, int]] = None
+    # Firma y almacén con los datos del archivo de la última carga, sin los
+    # cambios de la bitácora; comparte con el publicado las entidades sin
+    # cambios
+    __almacenDelArchivo: Optional[Tuple[Tuple[int, int, int], Almacen]] = None
+    # Serializa las cargas; las consultas nunca lo toman
+    __cerrojo_carga = threading.Lock()
+    # Hilo que vigila el archivo de datos y su señal de detención
+    __vigilante: Optional[threading.Thread] = None
+    __detener_vigilante = threading.Event()
+    # Si se guarda y se usa una instantánea binaria junto al archivo
+    __usarInstantanea: bool = False
+    # Tipo de almacén: "memoria", "mapeado" (archivo de mapa compartido) o
+    # "sqlite" (base de datos importada del archivo)
+    __tipoDeAlmacen: str = "memoria"
+    TIPOS_DE_ALMACEN = ("memoria", "mapeado", "sqlite")
+    # Bitácora de las escrituras sobre el archivo de datos actual; se
+    # crea al cargarlo y abre su archivo recién con el primer cambio
+    __bitacora: Optional[Bitacora] = None
+    # Último almacén derivado por una escritura cuyo cambio todavía no se
+    # confirmó, con el número del cambio en la bitácora: las escrituras
+    # siguientes parten de él, pero las consultas siguen viendo __almacen
+    __pendiente: Optional[Tuple[int, Almacen]] = None
+    # Número del último cambio de la bitácora actual ya publicado
+    __publicado: int = 0
+    # Cambios de la bitácora actual con su número, desde el primero que
+    # falta publicar o que no incluye la consolidación en curso
+    __cambios: List[Tuple[int, Tuple[str, str, Optional[Dict]]]] = []
+    # Hilo que compacta la bitácora y cerrojo que serializa compactaciones
+    __compactador: Optional[threading.Thread] = None
+    __cerrojo_compactacion = threading.Lock()
+    # Bytes de bitácora a partir de los cuales se compacta en segundo plano
+    UMBRAL_COMPACTACION = 1 << 20
+    # Hilo que consolida las capas de cambios del almacén publicado, número
+    # del último cambio que incluye la consolidación en curso y cerrojo que
+    # serializa las consolidaciones
+    __consolidador: Optional[threading.Thread] = None
+    __consolidando: Optional[int] = None
+    __cerrojo_consolidacion = threading.Lock()
+    # Cambios acumulados en capas a partir de los cuales se consolida el
+    # almacén publicado en segundo plano
+    UMBRAL_CONSOLIDACION = 256
 
     @classmethod
-    def inicializar(cls) -> None:
+    def inicializar(
+        cls,
+        archivo: Optional[str] = None,
+        instantanea: Optional[bool] = None,
+        almacen: Optional[str] = None
+    ) -> None:
         """
         Inicializa las colecciones de la vinoteca desde el archivo JSON.
+
+        Con instantáneas habilitadas, los datos se restauran de la
+        instantánea binaria guardada junto al archivo si corresponde a su
+        contenido actual (mismo tamaño, fecha de modificación y huella);
+        si no, se cargan del JSON y se guarda una instantánea nueva.
+
+        Los cambios de la bitácora que todavía no se compactaron en el
+        archivo se aplican sobre los datos cargados. Mientras haya cambios
+        pendientes, los datos se cargan en memoria aunque se haya elegido
+        otro tipo de almacén, ya que los demás no admiten cambios.
+
+        Args:
+            archivo: Ruta alternativa del archivo de datos. Si se indica,
+                reemplaza al archivo por defecto para esta y las próximas
+                cargas.
+            instantanea: True para usar y guardar instantáneas binarias,
+                False para no hacerlo. Si se indica, se aplica también a
+                las próximas cargas.
+            almacen: "memoria" para construir los objetos e índices en
+                memoria, o "mapeado" para consultar un mapa del archivo
+                abierto con mmap, compartido por todos los procesos que lo
+                abren, o "sqlite" para importar el archivo en una base de
+                datos SQLite y resolver cada consulta con SQL. Si se
+                indica, se aplica también a las próximas cargas.
+
+        Raises:
+            ValueError: Si el tipo de almacén no es válido
+        """
+        if almacen is not None and almacen not in cls.TIPOS_DE_ALMACEN:
+            raise ValueError(f"Tipo de almacén no válido: {almacen}")
+        with cls.__cerrojo_carga:
+            if archivo is not None and archivo != cls.__archivoDeDatos:
+                cls.__cerrarBitacora()
+                cls.__archivoDeDatos = archivo
+                cls.__almacenDelArchivo = None
+            if instantanea is not None:
+                cls.__usarInstantanea = instantanea
+            if almacen is not None:
+                cls.__tipoDeAlmacen = almacen
+            cls.__cargar(cls.__firmaDelArchivo())
+
+    @classmethod
+    def recargar(cls, forzar: bool = False) -> bool:
+        """
+        Vuelve a cargar el archivo de datos si cambió desde la última carga.
+
+        El nuevo almacén se deriva del publicado, sin modificarlo,
+        reutilizando las entidades e índices que no cambiaron, y luego se
+        publica reemplazando una única referencia: las consultas
+        en curso terminan sobre la versión anterior y las nuevas ven la
+        versión completa, nunca una carga a medias. Si el archivo no puede
+        leerse o no es válido se conserva la versión publicada.
+
+        Args:
+            forzar: True para recargar aunque el archivo no haya cambiado
+
+        Returns:
+            True si se publicó una nueva versión de los datos
+
+        Raises:
+            OSError: Si el archivo de datos no puede leerse
+            ValueError: Si el contenido del archivo no es JSON válido
+        """
+        with cls.__cerrojo_carga:
+            firma = cls.__firmaDelArchivo()
+            if firma is None or (firma == cls.__firma and not forzar):
+                return False
+            # Registrar la firma antes de cargar evita reintentar en cada
+            # consulta un archivo inválido que no vuelve a cambiar
+            cls.__firma = firma
+            cls.__cargar(firma, incremental=True)
+            return True
+
+    @classmethod
+    def vigilar(cls, intervalo: float = 2.0) -> None:
+        """
+        Inicia un hilo que consulta periódicamente la fecha de modificación
+        del archivo de datos y lo recarga cuando cambia.
+
+        Si ya hay un hilo vigilando el archivo no se inicia otro.
+
+        Args:
+            intervalo: Segundos entre consultas al archivo
+        """
+        with cls.__cerrojo_carga:
+            if cls.__vigilante is not None and cls.__vigilante.is_alive():
+                return
+            cls.__detener_vigilante.clear()
+            cls.__vigilante = threading.Thread(
+                target=cls.__vigilarArchivo, args=(intervalo,),
+                name="vigilante-vinoteca", daemon=True
+            )
+            cls.__vigilante.start()
+
+    @classmethod
+    def detener_vigilancia(cls) -> None:
+        """Detiene el hilo iniciado con vigilar, si está en ejecución."""
+        cls.__detener_vigilante.set()
+        vigilante = cls.__vigilante
+        if vigilante is not None:
+            vigilante.join()
+        cls.__vigilante = None
+
+    @classmethod
+    def __vigilarArchivo(cls, intervalo: float) -> None:
+        """
+        Cuerpo del hilo vigilante: recarga el archivo cada vez que cambia.
+
+        Args:
+            intervalo: Segundos entre consultas al archivo
+        """
+        while not cls.__detener_vigilante.wait(intervalo):
+            try:
+                cls.recargar()
+            except Exception:
+                # Cualquier error de carga conserva el almacén publicado: el
+                # hilo sigue vigilando hasta que el archivo se corrija
+                _registro.exception(
+                    "No se pudo recargar %s", cls.__archivoDeDatos
+                )
+
+    @classmethod
+    def __cargar(
+        cls,
+        firma: Optional[Tuple[int, int, int]],
+        incremental: bool = False
+    ) -> None:
+        """
+        Construye un almacén nuevo desde el archivo de datos y lo publica.
+
+        Args:
+            firma: Firma del archivo tomada antes de leerlo
+            incremental: True para derivar el almacén nuevo del publicado,
+                reconstruyendo solo las entidades e índices que cambiaron
+        """
+        fecha = cls.__fechaDelArchivo()
+        # Los cambios agregados a la bitácora anterior se escriben antes de
+        # leerla, para no perder los que todavía esperan su confirmación
+        cls.__cerrarBitacora()
+        cls.__bitacora = Bitacora(cls.__archivoDeDatos)
+        cambios = leer_cambios(cls.__archivoDeDatos) if firma is not None else []
+        tipo = cls.__tipoDeAlmacen if firma is not None and not cambios else "memoria"
+        usar_instantanea = (
+            cls.__usarInstantanea and firma is not None and tipo == "memoria"
+        )
+        almacen = None
+        if (
+            cambios
+            and cls.__almacenDelArchivo is not None
+            and cls.__almacenDelArchivo[0] == firma
+            and huella_archivo(cls.__archivoDeDatos).hex()
+            == cls.__almacenDelArchivo[1].obtener_version()
+        ):
+            # Si el archivo conserva la firma y la huella de la última
+            # lectura solo cambió la bitácora: se vuelve a aplicar sin
+            # analizar el JSON
+            almacen = cls.__almacenDelArchivo[1]
+        if almacen is None and (
+            tipo != "memoria" or (usar_instantanea and not incremental)
+        ):
+            # Otro proceso pudo haber escrito ya el mapa o la base de datos
+            # de este contenido
+            mtime_ns, tamanio, _ = firma
+            abrir = {
+                "memoria": cargar_instantanea,
+                "mapeado": abrir_mapa,
+                "sqlite": abrir_base_de_datos,
+            }[tipo]
+            almacen = abrir(cls.__archivoDeDatos, tamanio, mtime_ns, fecha)
+            if almacen is None and tipo == "sqlite":
+                almacen = cls.__importarBaseDeDatos(firma, fecha)
+        if almacen is None:
+            anterior = cls.__almacen
+            # El archivo se recorre de a un elemento: cada fila se convierte
+            # en su entidad y se descarta, sin mantener el árbol JSON completo
+            with open(cls.__archivoDeDatos, 'r', encoding='utf-8') as archivo:
+                lector = LectorJson(archivo)
+                if incremental and isinstance(anterior, _ALMACENES_EDITABLES):
+                    almacen = anterior.derivar(
+                        lector, lector.obtener_huella, fecha
+                    )
+                else:
+                    almacen = AlmacenEnMemoria(
+                        lector, lector.obtener_huella, fecha
+                    )
+            if isinstance(almacen, AlmacenConCambios) and (
+                tipo == "mapeado" or usar_instantanea
+            ):
+                # El mapa y la instantánea se escriben desde los índices
+                almacen = almacen.consolidar()
+            if tipo == "mapeado":
+                almacen = cls.__escribirMapa(almacen, firma, fecha)
+            elif usar_instantanea:
+                # La instantánea corresponde al archivo, sin la bitácora
+                cls.__guardarInstantanea(almacen, firma)
+        cls.__almacenDelArchivo = (
+            (firma, almacen)
+            if firma is not None and isinstance(almacen, _ALMACENES_EDITABLES)
+            else None
+        )
+        if cambios:
+            almacen = cls.__aplicarBitacora(almacen, cambios, fecha)
+        cls.__almacen = almacen
+        cls.__firma = firma
+
+    @classmethod
+    def __aplicarBitacora(
+        cls,
+        almacen: Almacen,
+        cambios: List[Tuple[Any, bytes]],
+        fecha: datetime
+    ) -> Almacen:
+        """
+        Aplica sobre los datos del archivo los cambios pendientes de su
+        bitácora, en un único paso.
+
+        La versión resultante encadena la del archivo con cada cambio, por
+        lo que coincide con la que tenían los datos al escribirse el último.
+
+        Args:
+            almacen: Almacén construido desde el archivo de datos
+            cambios: Cambios leídos con leer_cambios
+            fecha: Fecha de modificación del archivo de datos
+
+        Returns:
+            Almacén con los cambios aplicados
+        """
+        version = almacen.obtener_version()
+        for _, linea in cambios:
+            version = _encadenar_version(version, linea)
+        for ruta in (
+            ruta_compactacion(cls.__archivoDeDatos),
+            ruta_bitacora(cls.__archivoDeDatos),
+        ):
+            if os.path.exists(ruta):
+                fecha = max(fecha, datetime.fromtimestamp(
+                    os.path.getmtime(ruta), timezone.utc
+                ).replace(microsecond=0))
+        return almacen.aplicar(
+            [cambio for cambio, _ in cambios], version, fecha
+        )
+
+    @classmethod
+    def __cerrarBitacora(cls) -> None:
+        """
+        Escribe los cambios pendientes de la bitácora actual y la cierra.
+        Si no pueden escribirse, solo se registra: esos cambios nunca se
+        confirmaron y la próxima carga parte de lo que está en el disco.
+        """
+        bitacora, cls.__bitacora = cls.__bitacora, None
+        pendiente, cls.__pendiente = cls.__pendiente, None
+        cls.__publicado = 0
+        cls.__cambios = []
+        if bitacora is None:
+            return
+        try:
+            bitacora.cerrar()
+        except OSError as error:
+            _registro.error(
+                "No se pudo escribir la bitácora de %s: %s",
+                cls.__archivoDeDatos, error
+            )
+            return
+        if pendiente is not None:
+            # Los cambios que esperaban su confirmación ya están en el disco
+            cls.__almacen = pendiente[1]
+
+    @classmethod
+    def __importarBaseDeDatos(
+        cls,
+        firma: Tuple[int, int, int],
+        fecha: datetime
+    ) -> Optional[Almacen]:
+        """
+        Importa el archivo de datos en su base de datos SQLite y la abre. Si
+        la base de datos no puede escribirse se cargan los datos en memoria.
+
+        Args:
+            firma: Firma del archivo tomada antes de leerlo
+            fecha: Fecha de modificación del archivo de datos
+
+        Returns:
+            Almacén sobre la base de datos, o None si no pudo importarse
+
+        Raises:
+            ValueError: Si el contenido del archivo no es JSON válido
+            KeyError: Si a una fila le falta un campo
+        """
+        mtime_ns, tamanio, _ = firma
+        try:
+            if importar_json(cls.__archivoDeDatos, tamanio, mtime_ns):
+                return abrir_base_de_datos(
+                    cls.__archivoDeDatos, tamanio, mtime_ns, fecha
+                )
+        except (OSError, sqlite3.Error) as error:
+            _registro.warning(
+                "No se pudo importar %s en SQLite: %s",
+                cls.__archivoDeDatos, error
+            )
+        return None
+
+    @classmethod
+    def __escribirMapa(
+        cls,
+        almacen: AlmacenEnMemoria,
+        firma: Tuple[int, int, int],
+        fecha: datetime
+    ) -> Almacen:
+        """
+        Escribe el mapa de los datos recién cargados y lo abre. Si no puede
+        escribirse se siguen usando los datos en memoria.
+
+        Args:
+            almacen: Almacén construido desde el archivo de datos
+            firma: Firma del archivo tomada antes de leerlo
+            fecha: Fecha de modificación del archivo de datos
+
+        Returns:
+            Almacén sobre el mapa, o el almacén en memoria recibido
+        """
+        mtime_ns, tamanio, _ = firma
+        try:
+            if escribir_mapa(almacen, cls.__archivoDeDatos, tamanio, mtime_ns):
+                return abrir_mapa(
+                    cls.__archivoDeDatos, tamanio, mtime_ns, fecha
+                ) or almacen
+        except (OSError, ValueError) as error:
+            _registro.warning(
+                "No se pudo escribir el mapa de %s: %s",
+                cls.__archivoDeDatos, error
+            )
+        return almacen
+
+    @classmethod
+    def __guardarInstantanea(
+        cls,
+        almacen: AlmacenEnMemoria,
+        firma: Tuple[int, int, int]
+    ) -> None:
+        """
+        Guarda la instantánea de los datos recién cargados. Un error al
+        escribirla no impide usar los datos: solo se registra.
+
+        Args:
+            almacen: Almacén construido desde el archivo de datos
+            firma: Firma del archivo tomada antes de leerlo
+        """
+        mtime_ns, tamanio, _ = firma
+        try:
+            guardar_instantanea(almacen, cls.__archivoDeDatos, tamanio, mtime_ns)
+        except (OSError, ValueError) as error:
+            _registro.warning(
+                "No se pudo guardar la instantánea de %s: %s",
+                cls.__archivoDeDatos, error
+            )
+
+    @classmethod
+    def obtener_version(cls) -> str:
+        """
+        Obtiene la versión de los datos cargados.
+
+        La versión es una huella del contenido del archivo de datos, por lo
+        que dos cargas del mismo contenido comparten versión, incluso en
+        procesos distintos.
+
+        Returns:
+            Huella hexadecimal del contenido cargado
         """
-        datos = cls.__parsearArchivoDeDatos()
-        cls.__convertirJsonAListas(datos)
+        return cls.__almacen.obtener_version()
+
+    @classmethod
+    def obtener_fecha_modificacion(cls) -> Optional[datetime]:
+        """
+        Obtiene la fecha de modificación del archivo de datos cargado.
+
+        Returns:
+            Fecha en UTC, sin microsegundos, o None si no hay datos cargados
+        """
+        return cls.__almacen.obtener_fecha_modificacion()
 
     @classmethod
     def obtener_bodegas(
         cls,
         orden: Optional[str] = None,
-        reverso: bool = False
+        reverso: bool = False,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None
     ) -> List['Bodega']:
         """
-        Obtiene la lista de bodegas, opcionalmente ordenada.
+        Obtiene la lista de bodegas, opcionalmente ordenada y paginada.
 
         Args:
-            orden: Atributo por el cual ordenar
+            orden: Campo por el cual ordenar (id o nombre). Al paginar sin
+                orden se utiliza el id.
             reverso: True para orden descendente, False para ascendente
+            limite: Cantidad máxima de bodegas a devolver
+            cursor: Cursor obtenido con cursor_de para la última bodega de
+                la página anterior
 
         Returns:
             Lista de bodegas ordenada según los parámetros
+
+        Raises:
+            ValueError: Si el campo de ordenamiento, el límite o el cursor
+                no son válidos
         """
-        if orden is not None:
-            return sorted(
-                cls.__bodegas[:],  # Copia de la colección
-                key=lambda x: getattr(x, orden),
-                reverse=reverso
-            )
-        return cls.__bodegas
+        if orden is None and limite is None and cursor is None:
+            return cls.__almacen.obtener_bodegas()
+        return list(cls.iterar_bodegas(orden, reverso, limite, cursor))
+
+    @classmethod
+    def iterar_bodegas(
+        cls,
+        orden: Optional[str] = None,
+        reverso: bool = False,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Iterator['Bodega']:
+        """
+        Recorre las bodegas de a una, con los mismos parámetros que
+        obtener_bodegas, sin armar la lista del resultado.
+
+        Los parámetros se validan al llamar al método, antes de comenzar
+        el recorrido.
+
+        Returns:
+            Iterador de bodegas en el orden solicitado
+
+        Raises:
+            ValueError: Si el campo de ordenamiento, el límite o el cursor
+                no son válidos
+        """
+        return iter(cls.__paginar(
+            cls.consulta("bodegas"), orden, reverso, limite, cursor
+        ))
 
     @classmethod
     def obtener_cepas(
         cls,
         orden: Optional[str] = None,
-        reverso: bool = False
+        reverso: bool = False,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None
     ) -> List['Cepa']:
         """
-        Obtiene la lista de cepas, opcionalmente ordenada.
+        Obtiene la lista de cepas, opcionalmente ordenada y paginada.
 
         Args:
-            orden: Atributo por el cual ordenar
+            orden: Campo por el cual ordenar (id o nombre). Al paginar sin
+                orden se utiliza el id.
             reverso: True para orden descendente, False para ascendente
+            limite: Cantidad máxima de cepas a devolver
+            cursor: Cursor obtenido con cursor_de para la última cepa de
+                la página anterior
 
         Returns:
             Lista de cepas ordenada según los parámetros
+
+        Raises:
+            ValueError: Si el campo de ordenamiento, el límite o el cursor
+                no son válidos
         """
-        if orden is not None:
-            return sorted(
-                cls.__cepas[:],  # Copia de la colección
-                key=lambda x: getattr(x, orden),
-                reverse=reverso
-            )
-        return cls.__cepas
+        if orden is None and limite is None and cursor is None:
+            return cls.__almacen.obtener_cepas()
+        return list(cls.iterar_cepas(orden, reverso, limite, cursor))
+
+    @classmethod
+    def iterar_cepas(
+        cls,
+        orden: Optional[str] = None,
+        reverso: bool = False,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Iterator['Cepa']:
+        """
+        Recorre las cepas de a una, con los mismos parámetros que
+        obtener_cepas, sin armar la lista del resultado.
+
+        Los parámetros se validan al llamar al método, antes de comenzar
+        el recorrido.
+
+        Returns:
+            Iterador de cepas en el orden solicitado
+
+        Raises:
+            ValueError: Si el campo de ordenamiento, el límite o el cursor
+                no son válidos
+        """
+        return iter(cls.__paginar(
+            cls.consulta("cepas"), orden, reverso, limite, cursor
+        ))
 
     @classmethod
     def obtener_vinos(
         cls,
         anio: Optional[int] = None,
         orden: Optional[str] = None,
-        reverso: bool = False
+        reverso: bool = False,
+        anio_desde: Optional[int] = None,
+        anio_hasta: Optional[int] = None,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None,
+        bodega: Union[str, Sequence[str], None] = None,
+        cepa: Union[str, Sequence[str], None] = None,
+        todas_las_cepas: bool = False
     ) -> List['Vino']:
         """
-        Obtiene la lista de vinos, opcionalmente filtrada por año y ordenada.
+        Obtiene la lista de vinos, opcionalmente filtrada por año, bodega y
+        cepa, ordenada y paginada.
 
         Args:
             anio: Año de la partida para filtrar
-            orden: Atributo por el cual ordenar
+            orden: Campo por el cual ordenar (id, nombre, bodega, anio
+                o anio_inicial). Al paginar sin orden se utiliza el id.
             reverso: True para orden descendente, False para ascendente
+            anio_desde: Año mínimo (inclusive) de alguna de las partidas
+            anio_hasta: Año máximo (inclusive) de alguna de las partidas
+            limite: Cantidad máxima de vinos a devolver
+            cursor: Cursor obtenido con cursor_de para el último vino de
+                la página anterior
+            bodega: ID de la bodega de los vinos, o lista de IDs de las
+                bodegas admitidas
+            cepa: ID de una cepa que los vinos deben utilizar, o lista de
+                IDs de cepas de las que deben utilizar alguna
+            todas_las_cepas: True para exigir que los vinos utilicen todas
+                las cepas de la lista, en lugar de alguna
 
         Returns:
             Lista de vinos filtrada y ordenada según los parámetros
+
+        Raises:
+            ValueError: Si el campo de ordenamiento, el límite o el cursor
+                no son válidos
+        """
+        if all(parametro is None for parametro in (
+            anio, orden, anio_desde, anio_hasta, limite, cursor, bodega, cepa
+        )):
+            return cls.__almacen.obtener_vinos()
+        return list(cls.iterar_vinos(
+            anio, orden, reverso, anio_desde, anio_hasta, limite, cursor,
+            bodega, cepa, todas_las_cepas
+        ))
+
+    @classmethod
+    def iterar_vinos(
+        cls,
+        anio: Optional[int] = None,
+        orden: Optional[str] = None,
+        reverso: bool = False,
+        anio_desde: Optional[int] = None,
+        anio_hasta: Optional[int] = None,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None,
+        bodega: Union[str, Sequence[str], None] = None,
+        cepa: Union[str, Sequence[str], None] = None,
+        todas_las_cepas: bool = False
+    ) -> Iterator['Vino']:
+        """
+        Recorre los vinos de a uno, con los mismos parámetros que
+        obtener_vinos, sin armar la lista del resultado.
+
+        Los parámetros se validan al llamar al método, antes de comenzar
+        el recorrido, que se resuelve con una Consulta (ver consulta).
+
+        Los filtros solo por año se resuelven con el índice invertido,
+        mezclando las listas de los años a medida que se recorren. Los que
+        involucran bodegas o cepas combinan las listas de posiciones de cada
+        valor partiendo del filtro más selectivo (ver resolver_filtros), de
+        modo que una bodega con pocos vinos y un año con muchos no recorren
+        los vinos de ese año.
+
+        Returns:
+            Iterador de vinos filtrados en el orden solicitado
+
+        Raises:
+            ValueError: Si el campo de ordenamiento, el límite o el cursor
+                no son válidos
+        """
+        consulta = cls.consulta("vinos").filtrar(
+            anio=anio, anio_desde=anio_desde, anio_hasta=anio_hasta,
+            bodega=bodega, cepa=cepa, todas_las_cepas=todas_las_cepas
+        )
+        return iter(cls.__paginar(consulta, orden, reverso, limite, cursor))
+
+    @classmethod
+    def consulta(cls, coleccion: str = "vinos") -> Consulta:
+        """
+        Crea una consulta perezosa sobre una colección, que se arma
+        encadenando filtrar, ordenar, desde y limitar y se ejecuta recién al
+        recorrerla, por ejemplo
+        Vinoteca.consulta().filtrar(bodega="b1").ordenar("anio", True).limitar(10).
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+
+        Returns:
+            Consulta de todas las entidades de la colección
+
+        Raises:
+            ValueError: Si la colección no es válida
+        """
+        return Consulta(lambda: cls.__almacen, coleccion)
+
+    @staticmethod
+    def __paginar(
+        consulta: Consulta,
+        orden: Optional[str],
+        reverso: bool,
+        limite: Optional[int],
+        cursor: Optional[str]
+    ) -> Consulta:
+        """
+        Agrega a una consulta el orden y la paginación de los métodos
+        obtener_* e iterar_*: al paginar sin orden se ordena por id.
+        """
+        if orden is not None or limite is not None or cursor is not None:
+            consulta = consulta.ordenar(orden or "id", reverso)
+        if cursor is not None:
+            consulta = consulta.desde(cursor)
+        if limite is not None:
+            consulta = consulta.limitar(limite)
+        return consulta
+
+    @classmethod
+    def cursor_de(
+        cls,
+        entidad: 'EntidadVineria',
+        orden: Optional[str] = None,
+        reverso: bool = False
+    ) -> str:
+        """
+        Genera el cursor opaco que permite continuar un listado paginado
+        a continuación de una entidad.
+
+        El cursor codifica la clave de ordenamiento de la entidad (valor del
+        campo e id), por lo que la página siguiente se obtiene buscando esa
+        clave en el orden precalculado, sin recorrer las páginas previas.
+
+        Args:
+            entidad: Última entidad de la página actual
+            orden: Campo de ordenamiento del listado (id si se omite)
+            reverso: True si el listado es descendente
+
+        Returns:
+            Cursor codificado en base64 apto para URLs
+
+        Raises:
+            ValueError: Si el campo de ordenamiento no es válido
+        """
+        return codificar_cursor(entidad, orden or "id", reverso)
+
+    @classmethod
+    def obtener_vinos_de_bodega(cls, bodega_id: str) -> List['Vino']:
+        """
+        Obtiene los vinos producidos por una bodega.
+
+        Args:
+            bodega_id: Identificador de la bodega
+
+        Returns:
+            Lista de vinos de la bodega, vacía si no tiene ninguno
+        """
+        return cls.__almacen.obtener_vinos_de_bodega(bodega_id)
+
+    @classmethod
+    def obtener_vinos_de_cepa(cls, cepa_id: str) -> List['Vino']:
+        """
+        Obtiene los vinos elaborados con una cepa.
+
+        Args:
+            cepa_id: Identificador de la cepa
+
+        Returns:
+            Lista de vinos que utilizan la cepa, vacía si no hay ninguno
+        """
+        return cls.__almacen.obtener_vinos_de_cepa(cepa_id)
+
+    @classmethod
+    def obtener_cepas_de_bodega(cls, bodega_id: str) -> List['Cepa']:
         """
-        vinos_filtrados = cls.__vinos
-        if anio is not None:
-            vinos_filtrados = [
-                vino for vino in cls.__vinos
-                if anio in vino.obtener_partidas()
+        Obtiene las cepas distintas utilizadas en los vinos de una bodega.
+
+        Args:
+            bodega_id: Identificador de la bodega
+
+        Returns:
+            Lista de cepas sin duplicados, en orden de aparición
+        """
+        return cls.__almacen.obtener_cepas_de_bodega(bodega_id)
+
+    @classmethod
+    def obtener_facetas(
+        cls,
+        anio: Optional[int] = None,
+        anio_desde: Optional[int] = None,
+        anio_hasta: Optional[int] = None,
+        bodega: Union[str, Sequence[str], None] = None,
+        cepa: Union[str, Sequence[str], None] = None,
+        todas_las_cepas: bool = False,
+        limite: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Cuenta los vinos por año, por bodega y por cepa, opcionalmente entre
+        los que cumplen los filtros de obtener_vinos.
+
+        Las cantidades sin filtros se calculan al cargar los datos; con
+        filtros se resuelven como en iterar_vinos y se cuentan las
+        posiciones obtenidas en las listas de cada valor, sin recorrer el
+        catálogo. Con límite, las primeras bodegas y cepas se seleccionan
+        con un heap y solo se obtienen las entidades de los valores cuya
+        cantidad alcanza para quedar entre ellas.
+
+        Args:
+            anio: Año de la partida para filtrar
+            anio_desde: Año mínimo (inclusive) de alguna de las partidas
+            anio_hasta: Año máximo (inclusive) de alguna de las partidas
+            bodega: ID o lista de IDs de las bodegas admitidas
+            cepa: ID o lista de IDs de las cepas admitidas
+            todas_las_cepas: True para exigir todas las cepas de la lista
+            limite: Cantidad máxima de bodegas y de cepas a devolver
+
+        Returns:
+            Diccionario con total (cantidad de vinos que cumplen los
+            filtros), anios (pares año y cantidad, por año) y bodegas y
+            cepas (pares entidad y cantidad, de mayor a menor cantidad y a
+            igual cantidad por nombre). Los valores sin vinos se omiten.
+
+        Raises:
+            ValueError: Si el límite no es mayor que cero
+        """
+        if limite is not None and limite < 1:
+            raise ValueError("El límite debe ser mayor que cero")
+        almacen = cls.__almacen
+        anio_desde, anio_hasta = acotar_anios(anio, anio_desde, anio_hasta)
+        filtros = listas_de_filtros(
+            almacen, anio_desde, anio_hasta, bodega, cepa, todas_las_cepas
+        )
+        total, conteos = almacen.contar_facetas(
+            resolver_filtros(filtros) if filtros else None
+        )
+
+        def por_entidad(
+            entidades: Sequence['EntidadVineria'],
+            cantidades: Dict[int, int]
+        ) -> List[Tuple['EntidadVineria', int]]:
+            if limite is not None and limite < len(cantidades):
+                minima = heapq.nlargest(limite, cantidades.values())[-1]
+                cantidades = {
+                    posicion: cantidad
+                    for posicion, cantidad in cantidades.items()
+                    if cantidad >= minima
+                }
+            pares = [
+                (entidades[posicion], cantidad)
+                for posicion, cantidad in cantidades.items()
             ]
-        
-        if orden is not None:
-            return sorted(
-                vinos_filtrados[:],  # Copia de la colección
-                key=lambda x: getattr(x, orden),
-                reverse=reverso
+
+            def clave(par: Tuple['EntidadVineria', int]) -> Tuple[int, str, str]:
+                return -par[1], par[0].obtener_nombre(), par[0].obtener_id()
+
+            if limite is not None:
+                return heapq.nsmallest(limite, pares, key=clave)
+            return sorted(pares, key=clave)
+
+        return {
+            "total": total,
+            "anios": sorted(conteos["anios"].items()),
+            "bodegas": por_entidad(almacen.obtener_bodegas(), conteos["bodegas"]),
+            "cepas": por_entidad(almacen.obtener_cepas(), conteos["cepas"]),
+        }
+
+    @classmethod
+    def obtener_fragmento(
+        cls,
+        entidad: 'EntidadVineria',
+        full: bool = False,
+        campos: Optional[Sequence[str]] = None
+    ) -> bytes:
+        """
+        Obtiene la representación JSON de una entidad ya codificada en UTF-8.
+
+        Cada entidad se serializa una sola vez por carga de datos; las
+        llamadas siguientes reutilizan los bytes guardados. Las
+        representaciones parciales (con campos) no se guardan, ya que solo
+        calculan los campos pedidos. Tampoco se guardan las de entidades de
+        una versión anterior de los datos, que una consulta en curso puede
+        seguir serializando después de una recarga.
+
+        Args:
+            entidad: Bodega, cepa o vino a serializar
+            full: True para usar convertir_a_json_full, False para
+                convertir_a_json
+            campos: Campos a incluir; si se omite se incluyen todos
+
+        Returns:
+            Bytes con el objeto JSON de la entidad
+        """
+        if campos is not None:
+            return cls.__codificar(
+                entidad.convertir_a_json_full(campos) if full
+                else entidad.convertir_a_json(campos)
+            )
+        almacen = cls.__almacen
+        if not almacen.contiene(entidad):
+            return cls.__codificar(
+                entidad.convertir_a_json_full() if full
+                else entidad.convertir_a_json()
             )
-        return vinos_filtrados
+        fragmentos = almacen.obtener_fragmentos()
+        clave = (type(entidad).__name__, entidad.obtener_id(), full)
+        fragmento = fragmentos.get(clave)
+        if fragmento is None:
+            fragmento = cls.__codificar(
+                entidad.convertir_a_json_full() if full
+                else entidad.convertir_a_json()
+            )
+            fragmentos[clave] = fragmento
+        return fragmento
+
+    @staticmethod
+    def __codificar(datos: Dict[str, Any]) -> bytes:
+        """
+        Codifica un diccionario como JSON compacto en UTF-8.
+
+        Args:
+            datos: Diccionario a codificar
+
+        Returns:
+            Bytes con el JSON
+        """
+        return json.dumps(
+            datos, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
 
     @classmethod
     def buscar_bodega(cls, id: str) -> Optional['Bodega']:
@@ -119,10 +1008,7 @@ class Vinoteca:
         Returns:
             Bodega encontrada o None si no existe
         """
-        for bodega in cls.__bodegas:
-            if bodega.obtener_id() == id:
-                return bodega
-        return None
+        return cls.__almacen.buscar_bodega(id)
 
     @classmethod
     def buscar_cepa(cls, id: str) -> Optional['Cepa']:
@@ -135,10 +1021,7 @@ class Vinoteca:
         Returns:
             Cepa encontrada o None si no existe
         """
-        for cepa in cls.__cepas:
-            if cepa.obtener_id() == id:
-                return cepa
-        return None
+        return cls.__almacen.buscar_cepa(id)
 
     @classmethod
     def buscar_vino(cls, id: str) -> Optional['Vino']:
@@ -151,60 +1034,713 @@ class Vinoteca:
         Returns:
             Vino encontrado o None si no existe
         """
-        for vino in cls.__vinos:
-            if vino.obtener_id() == id:
-                return vino
-        return None
+        return cls.__almacen.buscar_vino(id)
 
     @classmethod
-    def __parsearArchivoDeDatos(cls) -> Dict:
+    def buscar_varios(
+        cls,
+        coleccion: str,
+        ids: Iterable[str]
+    ) -> Dict[str, Optional['EntidadVineria']]:
         """
-        Lee y parsea el archivo JSON de datos.
+        Busca varias entidades de una colección por sus IDs.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            ids: Identificadores buscados; los repetidos se buscan una vez
 
         Returns:
-            Diccionario con los datos del archivo JSON
+            Entidad encontrada (o None) por ID, en el orden de la primera
+            aparición de cada ID
+
+        Raises:
+            ValueError: Si la colección no es válida
         """
-        with open(cls.__archivoDeDatos, 'r', encoding='utf-8') as archivo:
-            datos = json.load(archivo)
-        return datos
+        return cls.buscar_lote({coleccion: ids})[coleccion]
 
     @classmethod
-    def __convertirJsonAListas(cls, listas: Dict) -> None:
+    def buscar_lote(
+        cls,
+        pedidos: Mapping[str, Iterable[str]]
+    ) -> Dict[str, Dict[str, Optional['EntidadVineria']]]:
         """
-        Convierte los datos JSON en objetos y los almacena en las listas
-        correspondientes.
+        Busca entidades de varias colecciones por sus IDs.
+
+        Todas las búsquedas se resuelven sobre la misma versión publicada
+        de los datos, aunque una recarga o una escritura la reemplace
+        mientras tanto, y cada ID repetido se busca una sola vez.
 
         Args:
-            listas: Diccionario con los datos a convertir
+            pedidos: IDs buscados de cada colección (bodegas, cepas o vinos)
+
+        Returns:
+            Por colección, la entidad encontrada (o None) por ID, en el
+            orden de la primera aparición de cada ID
+
+        Raises:
+            ValueError: Si alguna colección no es válida
+        """
+        for coleccion in pedidos:
+            if coleccion not in _CAMPOS_ESCRITURA:
+                raise ValueError(f"Colección no válida: {coleccion}")
+        almacen = cls.__almacen
+        return {
+            coleccion: {
+                id_: cls.__buscarEn(almacen, coleccion, id_)
+                for id_ in dict.fromkeys(ids)
+            }
+            for coleccion, ids in pedidos.items()
+        }
+
+    @classmethod
+    def buscar_por_prefijo(
+        cls,
+        coleccion: str,
+        prefijo: str,
+        limite: int = 10
+    ) -> List['EntidadVineria']:
+        """
+        Busca entidades por el comienzo de alguna palabra de su nombre, sin
+        distinguir mayúsculas ni acentos.
+
+        La búsqueda usa el índice de nombres del almacén: recorre solo las
+        entradas que devuelve, por lo que su costo depende del prefijo y
+        del límite y no del tamaño del catálogo.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            prefijo: Texto buscado
+            limite: Cantidad máxima de resultados
+
+        Returns:
+            Entidades encontradas, primero las que empiezan con el prefijo y
+            luego las que lo tienen en otra palabra, en orden alfabético
+
+        Raises:
+            ValueError: Si la colección no es válida o el límite no es
+                positivo
+        """
+        if coleccion not in _CAMPOS_ESCRITURA:
+            raise ValueError(f"Colección no válida: {coleccion}")
+        if limite < 1:
+            raise ValueError("El límite debe ser un entero positivo")
+        almacen = cls.__almacen
+        entidades = {
+            "bodegas": almacen.obtener_bodegas,
+            "cepas": almacen.obtener_cepas,
+            "vinos": almacen.obtener_vinos,
+        }[coleccion]()
+        return [
+            entidades[posicion]
+            for posicion in almacen.buscar_por_prefijo(
+                coleccion, prefijo, limite
+            )
+        ]
+
+    @classmethod
+    def buscar_similares(
+        cls,
+        texto: str,
+        limite: int = 10,
+        colecciones: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, 'EntidadVineria', float]]:
+        """
+        Busca entidades por nombre tolerando errores de tipeo, en el texto
+        buscado o en los datos ("Cabernet Suavignon" para "cabernet
+        sauvignon").
+
+        La búsqueda usa el índice de trigramas del almacén: solo se evalúan
+        los nombres que comparten con el texto alguno de sus trigramas menos
+        frecuentes, sin calcular distancias contra todo el catálogo.
+
+        Args:
+            texto: Texto buscado
+            limite: Cantidad máxima de resultados, entre todas las colecciones
+            colecciones: Colecciones donde buscar; por defecto, todas
+
+        Returns:
+            Lista de (colección, entidad, similitud), de la más parecida a
+            la menos; la similitud va de 0 a 1
+
+        Raises:
+            ValueError: Si alguna colección no es válida o el límite no es
+                positivo
+        """
+        if colecciones is None:
+            colecciones = ("bodegas", "cepas", "vinos")
+        colecciones = list(dict.fromkeys(colecciones))
+        for coleccion in colecciones:
+            if coleccion not in _CAMPOS_ESCRITURA:
+                raise ValueError(f"Colección no válida: {coleccion}")
+        if limite < 1:
+            raise ValueError("El límite debe ser un entero positivo")
+        almacen = cls.__almacen
+        candidatos = []
+        for orden, coleccion in enumerate(colecciones):
+            for posicion, similitud in almacen.buscar_similares(
+                coleccion, texto, limite
+            ):
+                candidatos.append((-similitud, orden, posicion))
+        resultados = []
+        for negativa, orden, posicion in sorted(candidatos)[:limite]:
+            coleccion = colecciones[orden]
+            entidades = {
+                "bodegas": almacen.obtener_bodegas,
+                "cepas": almacen.obtener_cepas,
+                "vinos": almacen.obtener_vinos,
+            }[coleccion]()
+            resultados.append((coleccion, entidades[posicion], -negativa))
+        return resultados
+
+    @classmethod
+    def crear(cls, coleccion: str, datos: Dict[str, Any]) -> 'EntidadVineria':
+        """
+        Da de alta una bodega, cepa o vino.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            datos: Campos de la entidad, incluido su id. Los vinos indican
+                su bodega y sus cepas por ID.
+
+        Returns:
+            Entidad creada
+
+        Raises:
+            ConflictoDeDatos: Si ya existe una entidad con ese ID o el
+                almacén no admite escrituras
+            ValueError: Si la colección o los datos no son válidos
+            OSError: Si el cambio no pudo escribirse en la bitácora
+        """
+        if not isinstance(datos, dict):
+            raise ValueError("Los datos deben ser un objeto JSON")
+        id_ = _validar_texto(datos.get("id"), "id")
+
+        def construir(almacen: Almacen, anterior: Optional['EntidadVineria']):
+            if anterior is not None:
+                raise ConflictoDeDatos(f"Ya existe una entidad con ID {id_}")
+            return cls.__construirFila(almacen, coleccion, id_, datos, None)
+
+        creada, _ = cls.__escribir(coleccion, id_, construir)
+        return creada
+
+    @classmethod
+    def reemplazar(
+        cls,
+        coleccion: str,
+        id: str,
+        datos: Dict[str, Any]
+    ) -> Tuple['EntidadVineria', bool]:
+        """
+        Reemplaza todos los campos de una entidad, o la crea si no existe.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            id: Identificador de la entidad
+            datos: Todos los campos de la entidad; el id es opcional, pero
+                si se indica debe coincidir
+
+        Returns:
+            Tupla con la entidad resultante y True si se creó
+
+        Raises:
+            ConflictoDeDatos: Si el almacén no admite escrituras
+            ValueError: Si la colección o los datos no son válidos
+            OSError: Si el cambio no pudo escribirse en la bitácora
+        """
+        entidad, anterior = cls.__escribir(
+            coleccion, id,
+            lambda almacen, _: cls.__construirFila(
+                almacen, coleccion, id, datos, None
+            )
+        )
+        return entidad, anterior is None
+
+    @classmethod
+    def modificar(
+        cls,
+        coleccion: str,
+        id: str,
+        datos: Dict[str, Any]
+    ) -> 'EntidadVineria':
+        """
+        Modifica algunos campos de una entidad existente. Los campos se
+        aplican con los mutadores del modelo sobre una copia de la entidad:
+        la entidad publicada no se modifica.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            id: Identificador de la entidad
+            datos: Campos a modificar
+
+        Returns:
+            Entidad modificada
+
+        Raises:
+            KeyError: Si la entidad no existe
+            ConflictoDeDatos: Si el almacén no admite escrituras
+            ValueError: Si la colección o los datos no son válidos
+            OSError: Si el cambio no pudo escribirse en la bitácora
+        """
+        def construir(almacen: Almacen, anterior: Optional['EntidadVineria']):
+            if anterior is None:
+                raise KeyError(id)
+            return cls.__construirFila(almacen, coleccion, id, datos, anterior)
+
+        entidad, _ = cls.__escribir(coleccion, id, construir)
+        return entidad
+
+    @classmethod
+    def eliminar(cls, coleccion: str, id: str) -> None:
+        """
+        Da de baja una entidad. Una bodega o cepa que algún vino utiliza
+        no puede eliminarse.
+
+        Las bajas no conservan las posiciones de las demás entidades, por
+        lo que reconstruyen los índices en lugar de corregirlos.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            id: Identificador de la entidad
+
+        Raises:
+            KeyError: Si la entidad no existe
+            ConflictoDeDatos: Si la entidad está en uso o el almacén no
+                admite escrituras
+            ValueError: Si la colección no es válida
+            OSError: Si el cambio no pudo escribirse en la bitácora
+        """
+        def construir(almacen: Almacen, anterior: Optional['EntidadVineria']):
+            if anterior is None:
+                raise KeyError(id)
+            if coleccion == "bodegas" and almacen.obtener_vinos_de_bodega(id):
+                raise ConflictoDeDatos(f"La bodega {id} tiene vinos")
+            if coleccion == "cepas" and almacen.obtener_vinos_de_cepa(id):
+                raise ConflictoDeDatos(f"La cepa {id} se utiliza en vinos")
+            return None
+
+        cls.__escribir(coleccion, id, construir)
+
+    @classmethod
+    def compactar(cls) -> bool:
+        """
+        Incorpora al archivo de datos los cambios de la bitácora.
+
+        La bitácora se aparta y se reemplaza por una vacía mientras se
+        detienen las escrituras, lo que solo demora un instante; el archivo
+        nuevo se escribe después desde el almacén publicado, que es
+        inmutable, sin bloquear consultas ni escrituras, y reemplaza al
+        anterior con un renombrado atómico. Como los cambios son
+        idempotentes, si el proceso termina antes de descartar la bitácora
+        apartada la próxima carga la vuelve a aplicar sin efecto.
+
+        No se compacta si el archivo cambió desde la última carga, para no
+        reemplazar cambios externos que todavía no se recargaron.
+
+        Returns:
+            True si se escribió un archivo de datos nuevo
+
+        Raises:
+            OSError: Si la bitácora o el archivo no pueden escribirse
+        """
+        with cls.__cerrojo_compactacion:
+            with cls.__cerrojo_carga:
+                archivo = cls.__archivoDeDatos
+                almacen = cls.__almacen
+                bitacora = cls.__bitacora
+                if (
+                    bitacora is None
+                    or not isinstance(almacen, _ALMACENES_EDITABLES)
+                    or cls.__firma is None
+                    or cls.__firmaDelArchivo() != cls.__firma
+                    or not bitacora.rotar()
+                ):
+                    return False
+                if cls.__pendiente is not None:
+                    # rotar confirmó todos los cambios agregados
+                    cls.__publicarConfirmado(bitacora, *cls.__pendiente)
+                almacen = cls.__almacen
+            compactar(almacen, archivo)
+            with cls.__cerrojo_carga:
+                if cls.__archivoDeDatos == archivo:
+                    # El archivo nuevo ya incluye los datos publicados
+                    cls.__firma = cls.__firmaDelArchivo()
+                bitacora.descartar_compactada()
+            return True
+
+    @classmethod
+    def consolidar(cls) -> bool:
+        """
+        Reemplaza el almacén publicado, si acumula cambios en capas sobre
+        otro, por uno equivalente con colecciones e índices propios.
+
+        La consolidación, que recorre todo el catálogo, se hace sin el
+        cerrojo de carga, sobre el almacén publicado, que es inmutable. Los
+        cambios publicados o agregados a la bitácora mientras tanto se
+        vuelven a aplicar después sobre el almacén consolidado, con el
+        cerrojo tomado pero con un costo que depende solo de ellos.
+
+        Returns:
+            True si se publicó un almacén consolidado
+        """
+        with cls.__cerrojo_consolidacion:
+            with cls.__cerrojo_carga:
+                almacen = cls.__almacen
+                bitacora = cls.__bitacora
+                if not isinstance(almacen, AlmacenConCambios):
+                    return False
+                numero = cls.__consolidando = cls.__publicado
+            try:
+                consolidado = almacen.consolidar()
+            finally:
+                with cls.__cerrojo_carga:
+                    cls.__consolidando = None
+            with cls.__cerrojo_carga:
+                if cls.__bitacora is not bitacora:
+                    # Los datos se volvieron a cargar mientras tanto
+                    return False
+                cls.__almacen = cls.__rebasar(
+                    consolidado, numero, cls.__publicado, cls.__almacen
+                )
+                if cls.__pendiente is not None:
+                    pendiente_numero, pendiente = cls.__pendiente
+                    cls.__pendiente = (pendiente_numero, cls.__rebasar(
+                        consolidado, numero, pendiente_numero, pendiente
+                    ))
+                cls.__descartarCambios()
+            return True
+
+    @classmethod
+    def __rebasar(
+        cls,
+        consolidado: Almacen,
+        desde: int,
+        hasta: int,
+        almacen: Almacen
+    ) -> Almacen:
+        """
+        Aplica sobre un almacén consolidado los cambios posteriores a los
+        que incluye. Se llama con el cerrojo de carga tomado.
+
+        Args:
+            consolidado: Almacén con los cambios hasta el número desde
+            desde: Número del último cambio incluido en el consolidado
+            hasta: Número del último cambio a aplicar
+            almacen: Almacén con los cambios hasta el número hasta, del que
+                se toman la versión y la fecha de modificación
+
+        Returns:
+            Almacén equivalente a almacen, derivado del consolidado
+        """
+        if hasta <= desde:
+            return consolidado
+        return consolidado.aplicar(
+            [cambio for numero, cambio in cls.__cambios if desde < numero <= hasta],
+            almacen.obtener_version(), almacen.obtener_fecha_modificacion()
+        )
+
+    @classmethod
+    def __descartarCambios(cls) -> None:
+        """
+        Descarta los cambios ya publicados que no hacen falta para volver a
+        aplicarlos tras la consolidación en curso. Se llama con el cerrojo
+        de carga tomado.
+        """
+        limite = cls.__publicado
+        if cls.__consolidando is not None:
+            limite = min(limite, cls.__consolidando)
+        indice = 0
+        while indice < len(cls.__cambios) and cls.__cambios[indice][0] <= limite:
+            indice += 1
+        if indice:
+            del cls.__cambios[:indice]
+
+    @classmethod
+    def __escribir(
+        cls,
+        coleccion: str,
+        id_: str,
+        construir: Callable[
+            [Almacen, Optional['EntidadVineria']], Optional[Dict[str, Any]]
+        ]
+    ) -> Tuple[Optional['EntidadVineria'], Optional['EntidadVineria']]:
+        """
+        Aplica un cambio a los datos publicados y lo registra en la
+        bitácora.
+
+        El cambio se valida y se aplica fuera del cerrojo de carga,
+        derivando un almacén nuevo del último derivado, que comparte con
+        él todo lo que no cambió. Con el cerrojo tomado solo se comprueba
+        que ese almacén siga siendo el último, y si no se vuelve a
+        empezar, y se agrega el cambio a la bitácora, de modo que el orden
+        de la bitácora es el de derivación. La confirmación en disco se
+        espera fuera del cerrojo: así las escrituras concurrentes se
+        confirman juntas con un único fsync. El almacén nuevo se publica
+        recién confirmado el cambio; si la confirmación falla se descarta
+        y las consultas nunca lo ven.
+
+        Args:
+            coleccion: bodegas, cepas o vinos
+            id_: Identificador de la entidad
+            construir: Recibe el almacén publicado y la entidad actual (o
+                None) y devuelve la fila nueva, o None para eliminarla
+
+        Returns:
+            Tupla (entidad resultante o None si se eliminó, entidad anterior)
+
+        Raises:
+            OSError: Si el cambio no pudo escribirse en la bitácora
+        """
+        if coleccion not in _CAMPOS_ESCRITURA:
+            raise ValueError(f"Colección no válida: {coleccion}")
+        while True:
+            with cls.__cerrojo_carga:
+                almacen = cls.__ultimoDerivado()
+            if not isinstance(almacen, _ALMACENES_EDITABLES):
+                raise ConflictoDeDatos(
+                    f"El almacén {cls.__tipoDeAlmacen} no admite escrituras"
+                )
+            anterior = cls.__buscarEn(almacen, coleccion, id_)
+            cambio = (coleccion, id_, construir(almacen, anterior))
+            linea = codificar_cambio(cambio)
+            nuevo = almacen.aplicar(
+                [cambio],
+                _encadenar_version(almacen.obtener_version(), linea),
+                datetime.now(timezone.utc).replace(microsecond=0)
+            )
+            with cls.__cerrojo_carga:
+                if cls.__ultimoDerivado() is not almacen:
+                    # Otra escritura, carga o consolidación se adelantó
+                    continue
+                if cls.__bitacora is None:
+                    cls.__bitacora = Bitacora(cls.__archivoDeDatos)
+                bitacora = cls.__bitacora
+                numero = bitacora.agregar(linea)
+                cls.__pendiente = (numero, nuevo)
+                cls.__cambios.append((numero, cambio))
+            break
+        try:
+            bitacora.confirmar(numero)
+        except OSError:
+            with cls.__cerrojo_carga:
+                if cls.__bitacora is bitacora:
+                    # Ningún cambio del lote fallido llega a publicarse
+                    cls.__pendiente = None
+                    cls.__cambios = [
+                        (n, c) for n, c in cls.__cambios if n <= cls.__publicado
+                    ]
+            raise
+        with cls.__cerrojo_carga:
+            cls.__publicarConfirmado(bitacora, numero, nuevo)
+            consolidar = (
+                isinstance(cls.__almacen, AlmacenConCambios)
+                and cls.__almacen.obtener_cantidad_de_cambios()
+                >= cls.UMBRAL_CONSOLIDACION
+            )
+        if consolidar:
+            cls.__programarConsolidacion()
+        if bitacora.obtener_tamanio() >= cls.UMBRAL_COMPACTACION:
+            cls.__programarCompactacion()
+        return cls.__buscarEn(nuevo, coleccion, id_), anterior
+
+    @classmethod
+    def __ultimoDerivado(cls) -> Almacen:
+        """
+        Almacén del que parten las escrituras: el derivado por el último
+        cambio agregado a la bitácora, o el publicado. Se llama con el
+        cerrojo de carga tomado.
+        """
+        if cls.__pendiente is not None:
+            return cls.__pendiente[1]
+        return cls.__almacen
+
+    @classmethod
+    def __publicarConfirmado(
+        cls,
+        bitacora: Bitacora,
+        numero: int,
+        almacen: Almacen
+    ) -> None:
+        """
+        Publica el almacén derivado por un cambio ya confirmado, salvo que
+        se haya publicado uno posterior o que los datos se hayan vuelto a
+        cargar. Se llama con el cerrojo de carga tomado.
+
+        Args:
+            bitacora: Bitácora en la que se confirmó el cambio
+            numero: Número del cambio en esa bitácora
+            almacen: Almacén con el cambio aplicado
+        """
+        if cls.__bitacora is not bitacora or numero <= cls.__publicado:
+            return
+        if cls.__pendiente is not None and cls.__pendiente[0] <= numero:
+            # Si hubo una consolidación, el pendiente es el equivalente
+            # derivado del almacén consolidado
+            if cls.__pendiente[0] == numero:
+                almacen = cls.__pendiente[1]
+            cls.__pendiente = None
+        cls.__almacen = almacen
+        cls.__publicado = numero
+        cls.__descartarCambios()
+
+    @staticmethod
+    def __buscarEn(
+        almacen: Almacen,
+        coleccion: str,
+        id_: str
+    ) -> Optional['EntidadVineria']:
+        """Busca una entidad por ID en la colección indicada de un almacén."""
+        return {
+            "bodegas": almacen.buscar_bodega,
+            "cepas": almacen.buscar_cepa,
+            "vinos": almacen.buscar_vino,
+        }[coleccion](id_)
+
+    @staticmethod
+    def __construirFila(
+        almacen: Almacen,
+        coleccion: str,
+        id_: str,
+        datos: Dict[str, Any],
+        anterior: Optional['EntidadVineria']
+    ) -> Dict[str, Any]:
+        """
+        Arma la fila de una entidad aplicando los campos recibidos con los
+        mutadores del modelo, sobre una copia de la entidad anterior o
+        sobre una entidad nueva.
+
+        Args:
+            almacen: Almacén publicado, donde se buscan las referencias
+            coleccion: bodegas, cepas o vinos
+            id_: Identificador de la entidad
+            datos: Campos recibidos
+            anterior: Entidad a modificar, o None para exigir todos los
+                campos
+
+        Returns:
+            Fila JSON de la entidad resultante
+
+        Raises:
+            ValueError: Si algún campo falta, sobra o no es válido
         """
-        # Importaciones dinámicas para evitar ciclos
         from modelos.bodega import Bodega
         from modelos.cepa import Cepa
         from modelos.vino import Vino
-        
-        # Limpiar las listas existentes
-        cls.__bodegas.clear()
-        cls.__cepas.clear()
-        cls.__vinos.clear()
-
-        # Convertir datos JSON en objetos
-        for bodega_data in listas.get('bodegas', []):
-            cls.__bodegas.append(Bodega(
-                bodega_data['id'],
-                bodega_data['nombre']
-            ))
-
-        for cepa_data in listas.get('cepas', []):
-            cls.__cepas.append(Cepa(
-                cepa_data['id'],
-                cepa_data['nombre']
-            ))
-
-        for vino_data in listas.get('vinos', []):
-            cls.__vinos.append(Vino(
-                vino_data['id'],
-                vino_data['nombre'],
-                vino_data['bodega'],
-                vino_data['cepas'],
-                vino_data['partidas']
-            ))
+
+        if not isinstance(datos, dict):
+            raise ValueError("Los datos deben ser un objeto JSON")
+        campos = _CAMPOS_ESCRITURA[coleccion]
+        for campo in datos:
+            if campo != "id" and campo not in campos:
+                raise ValueError(f"Campo no válido: {campo}")
+        if datos.get("id", id_) != id_:
+            raise ValueError("El id de los datos no coincide con el indicado")
+        if anterior is None:
+            for campo in campos:
+                if campo not in datos:
+                    raise ValueError(f"Falta el campo {campo}")
+            fila = {"nombre": "", "bodega": "", "cepas": [], "partidas": []}
+        else:
+            fila = fila_json(anterior)
+
+        if coleccion == "vinos":
+            entidad = Vino(
+                id_, fila["nombre"], fila["bodega"], fila["cepas"],
+                fila["partidas"]
+            )
+        elif coleccion == "bodegas":
+            entidad = Bodega(id_, fila["nombre"])
+        else:
+            entidad = Cepa(id_, fila["nombre"])
+        if "nombre" in datos:
+            entidad.establecer_nombre(_validar_texto(datos["nombre"], "nombre"))
+        if "bodega" in datos:
+            bodega_id = _validar_texto(datos["bodega"], "bodega")
+            if almacen.buscar_bodega(bodega_id) is None:
+                raise ValueError(f"No existe la bodega {bodega_id}")
+            entidad.establecer_bodega(bodega_id)
+        if "cepas" in datos:
+            cepa_ids = datos["cepas"]
+            if not isinstance(cepa_ids, list):
+                raise ValueError("El campo cepas debe ser una lista de IDs")
+            vistas = set()
+            for cepa_id in cepa_ids:
+                if almacen.buscar_cepa(_validar_texto(cepa_id, "cepas")) is None:
+                    raise ValueError(f"No existe la cepa {cepa_id}")
+                if cepa_id in vistas:
+                    raise ValueError(f"La cepa {cepa_id} está repetida")
+                vistas.add(cepa_id)
+            entidad.establecer_cepa(cepa_ids)
+        if "partidas" in datos:
+            entidad.establecer_partidas(
+                _validar_partidas(datos["partidas"], id_)
+            )
+        return fila_json(entidad)
+
+    @classmethod
+    def __programarCompactacion(cls) -> None:
+        """Inicia la compactación en segundo plano si no hay una en curso."""
+        with cls.__cerrojo_carga:
+            if cls.__compactador is not None and cls.__compactador.is_alive():
+                return
+            cls.__compactador = threading.Thread(
+                target=cls.__compactarEnSegundoPlano,
+                name="compactador-vinoteca", daemon=True
+            )
+            cls.__compactador.start()
+
+    @classmethod
+    def __programarConsolidacion(cls) -> None:
+        """Inicia la consolidación en segundo plano si no hay una en curso."""
+        with cls.__cerrojo_carga:
+            if (
+                cls.__consolidador is not None
+                and cls.__consolidador.is_alive()
+            ):
+                return
+            cls.__consolidador = threading.Thread(
+                target=cls.consolidar, name="consolidador-vinoteca",
+                daemon=True
+            )
+            cls.__consolidador.start()
+
+    @classmethod
+    def __compactarEnSegundoPlano(cls) -> None:
+        """Cuerpo del hilo compactador: registra los errores sin propagarlos."""
+        try:
+            cls.compactar()
+        except OSError as error:
+            _registro.warning(
+                "No se pudo compactar la bitácora de %s: %s",
+                cls.__archivoDeDatos, error
+            )
+
+    @classmethod
+    def __fechaDelArchivo(cls) -> datetime:
+        """
+        Obtiene la fecha de modificación del archivo de datos.
+
+        Returns:
+            Fecha de modificación en UTC, o la fecha actual si el archivo
+            no puede consultarse
+        """
+        try:
+            marca = os.path.getmtime(cls.__archivoDeDatos)
+        except OSError:
+            return datetime.now(timezone.utc).replace(microsecond=0)
+        return datetime.fromtimestamp(marca, timezone.utc).replace(microsecond=0)
+
+    @classmethod
+    def __firmaDelArchivo(cls) -> Optional[Tuple[int, int, int]]:
+        """
+        Obtiene una firma del archivo de datos que cambia al modificarlo o
+        reemplazarlo.
+
+        Returns:
+            Tupla (mtime en nanosegundos, tamaño, inodo), o None si el
+            archivo no puede consultarse
+        """
+        try:
+            estado = os.stat(cls.__archivoDeDatos)
+        except OSError:
+            return None
+        return estado.st_mtime_ns, estado.st_size, estado.st_ino